@@ -1,6 +1,6 @@
 """
 Unified pipeline for processing new student data.
-Handles: text extraction -> dialogue processing -> repair detection
+Handles: text extraction -> dialogue processing -> repair detection -> Parquet export
 
 Usage:
     # Process specific students and weeks
@@ -14,20 +14,33 @@ Usage:
     
     # Skip repair detection (only preprocessing)
     python run_full_pipeline.py --student 18 --week 2 --skip-repairs
+    
+    # Skip the Parquet export of turns and repairs (data/columnar)
+    python run_full_pipeline.py --student 18 --week 2 --skip-export
 """
 import argparse
 import json
 import sys
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
 
 # Add scripts to path
 sys.path.insert(0, str(Path(__file__).parent / 'scripts'))
 
-from preprocessing_pipeline import run_pipeline as run_preprocessing
-from repair_detector import detect_repairs, save_repair_annotations, get_gemini_model, validate_repair_annotation
+from artifact_writer import batched_directory_sync
+from preprocessing_pipeline import run_pipeline as run_preprocessing, load_config
+from repair_detector import save_repair_annotations, validate_repair_annotation
+from detector_backends import BACKENDS, REFERENCE_BACKENDS, GeminiBackend, RepairDetectorBackend, backend_from_config
+from repair_schema import PARSE_STATS
+from stage_timing import TIMER, print_timing_report, stage
+from telemetry import LEDGER, RUN_ID, run_report
 from task_classifier import add_task_topic_to_dialogue
 
+# Provider SDKs, python-dotenv, numpy and the document libraries are imported
+# by the stages that use them, so e.g. --skip-repairs starts quickly
+if TYPE_CHECKING:
+    from repair_prefilter import RepairPrefilter
+
 # Configure output encoding for Windows
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -35,6 +48,21 @@ if sys.platform == 'win32':
 PROJECT_ROOT = Path(__file__).parent
 PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs" / "production"
+# Outside data/repairs, so these runs are not read as an annotation batch
+EXPERIMENTAL_REPAIRS_DIR = PROJECT_ROOT / "data" / "experimental_repairs"
+
+
+def default_repairs_dir(backend: RepairDetectorBackend) -> Path:
+    """
+    Where a backend's repair files go unless --repairs-dir is given.
+
+    Reference LLM backends write the production labels; the rule-based and
+    experimental backends write to data/experimental_repairs/<backend> so they
+    cannot overwrite them by accident.
+    """
+    if backend.name in REFERENCE_BACKENDS:
+        return REPAIRS_DIR
+    return EXPERIMENTAL_REPAIRS_DIR / backend.name
 
 
 def load_dialogue_json(file_path: Path) -> Dict[str, Any]:
@@ -43,32 +71,55 @@ def load_dialogue_json(file_path: Path) -> Dict[str, Any]:
         return json.load(f)
 
 
+# Repair files are fsync'ed one by one; the output directory once at the end
+@batched_directory_sync()
 def process_repair_detection(
     dialogue_files: List[Path],
     repairs_dir: Path,
     model=None,
-    verbose: bool = True
+    verbose: bool = True,
+    stream: bool = False,
+    backend: Optional[RepairDetectorBackend] = None,
+    prefilter: Optional["RepairPrefilter"] = None
 ) -> Dict[str, Any]:
     """
     Process repair detection for a list of dialogue files.
     
+    With ``stream=True`` responses are consumed incrementally: each repair is
+    validated as soon as it is complete, and a timeout or truncated response
+    still yields the repairs generated before it.
+    
+    Args:
+        dialogue_files: Processed dialogue JSON files
+        repairs_dir: Output directory for *_repairs.json files
+        model: Optional Gemini model instance (shorthand for a Gemini backend)
+        verbose: Print detailed progress
+        stream: Stream LLM responses and validate repairs as they arrive
+        backend: Detector backend (default: the one configured in
+            config/preprocessing_config.json)
+        prefilter: Optional calibrated pre-filter; dialogues it predicts to
+            have no repair are saved as [] without calling the detector
+    
     Returns:
         Summary dictionary with success/failure counts
     """
-    if model is None:
+    if backend is None:
+        backend = GeminiBackend(model=model) if model is not None else backend_from_config(load_config())
+    
+    if verbose:
+        print(f"\nInitializing detector backend: {backend.name}...")
+    try:
+        backend.prepare()
         if verbose:
-            print("\nInitializing Gemini API...")
-        try:
-            model = get_gemini_model()
-            if verbose:
-                print(f"  [OK] Using model: {model._model_name}")
-        except Exception as e:
-            print(f"  [ERROR] Failed to initialize Gemini API: {e}")
-            return {"successful": 0, "failed": len(dialogue_files), "errors": [str(e)]}
+            print(f"  [OK] Using backend: {backend.describe()}")
+    except Exception as e:
+        print(f"  [ERROR] Failed to initialize {backend.name} backend: {e}")
+        return {"successful": 0, "failed": len(dialogue_files), "errors": [str(e)]}
     
     successful = 0
     failed = 0
     errors = []
+    prefilter_skipped = 0
     
     for dialogue_file in dialogue_files:
         if verbose:
@@ -76,7 +127,8 @@ def process_repair_detection(
         
         try:
             # Load dialogue
-            dialogue_data = load_dialogue_json(dialogue_file)
+            with stage("load"):
+                dialogue_data = load_dialogue_json(dialogue_file)
             
             # Add dialogue_id if not present
             if 'dialogue_id' not in dialogue_data:
@@ -92,19 +144,34 @@ def process_repair_detection(
             # Detect repairs
             if verbose:
                 print(f"  Detecting repairs in {len(dialogue_data['turns'])} turns...")
-            repairs = detect_repairs(dialogue_data, model=model)
+            if prefilter is not None and not prefilter.is_candidate(dialogue_data):
+                repairs_dir.mkdir(parents=True, exist_ok=True)
+                output_file = repairs_dir / f"{dialogue_file.stem}_repairs.json"
+                with stage("write"):
+                    save_repair_annotations([], output_file)
+                if verbose:
+                    print("  [PREFILTER] No trouble signals; skipped detector call")
+                prefilter_skipped += 1
+                successful += 1
+                continue
             
-            # Validate repairs
+            # Validate each repair as soon as the detector emits it
             dialogue_id = dialogue_data['dialogue_id']
             valid_repairs = []
-            for repair in repairs:
-                if validate_repair_annotation(repair, dialogue_id):
-                    valid_repairs.append(repair)
+            
+            def collect_valid(repair: Dict[str, Any]) -> None:
+                with stage("validation"):
+                    if validate_repair_annotation(repair, dialogue_id):
+                        valid_repairs.append(repair)
+            
+            with stage("detection"):
+                backend.detect(dialogue_data, stream=stream, on_repair=collect_valid)
             
             # Save repairs
             repairs_dir.mkdir(parents=True, exist_ok=True)
             output_file = repairs_dir / f"{dialogue_file.stem}_repairs.json"
-            save_repair_annotations(valid_repairs, output_file)
+            with stage("write"):
+                save_repair_annotations(valid_repairs, output_file)
             
             if verbose:
                 print(f"  Found {len(valid_repairs)} repair sequence(s)")
@@ -122,7 +189,10 @@ def process_repair_detection(
     return {
         "successful": successful,
         "failed": failed,
-        "errors": errors
+        "errors": errors,
+        "parse_stats": PARSE_STATS.to_dict(),
+        "prefilter_skipped": prefilter_skipped,
+        "telemetry": run_report(LEDGER.read(RUN_ID))
     }
 
 
@@ -131,7 +201,14 @@ def run_full_pipeline(
     selected_weeks: Optional[List[int]] = None,
     force: bool = False,
     skip_repairs: bool = False,
-    verbose: bool = True
+    verbose: bool = True,
+    stream: bool = False,
+    backend_name: Optional[str] = None,
+    model_name: Optional[str] = None,
+    use_prefilter: bool = False,
+    profile: bool = False,
+    skip_export: bool = False,
+    repairs_dir: Optional[Path] = None
 ) -> Dict[str, Any]:
     """
     Run the complete pipeline: preprocessing + repair detection.
@@ -142,10 +219,23 @@ def run_full_pipeline(
         force: Reprocess files even if outputs are newer
         skip_repairs: Skip repair detection step
         verbose: Print detailed progress
+        stream: Stream LLM responses and validate repairs as they arrive
+        backend_name: Detector backend (overrides config "repair_detection.backend")
+        model_name: Model for the detector backend (overrides config "repair_detection.model")
+        use_prefilter: Skip detector calls for dialogues the calibrated
+            pre-filter (config/prefilter_calibration.json) predicts have no repair
+        profile: Also capture cProfile and tracemalloc statistics per stage
+            (written next to the timing report in data/profiles/<run id>/)
+        skip_export: Skip the incremental Parquet export (data/columnar)
+        repairs_dir: Output directory for repair files (default: data/repairs/production
+            for the reference LLM backends, data/experimental_repairs/<backend> otherwise)
     
     Returns:
         Summary dictionary with processing results
     """
+    if profile:
+        TIMER.enable_profiling()
+    
     print("=" * 80)
     print("FULL PIPELINE: PREPROCESSING + REPAIR DETECTION")
     print("=" * 80)
@@ -155,12 +245,13 @@ def run_full_pipeline(
     print("STEP 1: PREPROCESSING (Text Extraction + Dialogue Processing)")
     print("=" * 80)
     
-    preprocessing_summary = run_preprocessing(
-        selected_students=selected_students,
-        selected_weeks=selected_weeks,
-        force=force,
-        verbose=verbose
-    )
+    with stage("preprocessing"):
+        preprocessing_summary = run_preprocessing(
+            selected_students=selected_students,
+            selected_weeks=selected_weeks,
+            force=force,
+            verbose=verbose
+        )
     
     if not skip_repairs:
         # Step 2: Repair Detection
@@ -202,38 +293,106 @@ def run_full_pipeline(
             if verbose:
                 print(f"\nFound {len(dialogue_files)} dialogue file(s) to process")
             
-            repair_summary = process_repair_detection(
-                dialogue_files=dialogue_files,
-                repairs_dir=REPAIRS_DIR,
-                model=None,  # Will be created inside
-                verbose=verbose
-            )
+            backend = backend_from_config(load_config(), name=backend_name, model=model_name)
+            output_dir = Path(repairs_dir) if repairs_dir is not None else default_repairs_dir(backend)
+            if verbose:
+                print(f"Repair files go to: {output_dir}")
+            prefilter = None
+            if use_prefilter:
+                from repair_prefilter import RepairPrefilter, CALIBRATION_PATH as PREFILTER_CALIBRATION_PATH
+                prefilter = RepairPrefilter.load(PREFILTER_CALIBRATION_PATH)
+                if verbose:
+                    print(f"\nPre-filter threshold {prefilter.threshold:.3f} "
+                          f"(calibrated recall {prefilter.metrics.get('recall', 0):.1%})")
+            with stage("repair_detection"):
+                repair_summary = process_repair_detection(
+                    dialogue_files=dialogue_files,
+                    repairs_dir=output_dir,
+                    verbose=verbose,
+                    stream=stream,
+                    backend=backend,
+                    prefilter=prefilter
+                )
     else:
         repair_summary = {"successful": 0, "failed": 0, "errors": [], "skipped": True}
     
+    if not skip_export:
+        # Step 3: Columnar export (only weeks whose sources changed are rewritten)
+        print("\n" + "=" * 80)
+        print("STEP 3: COLUMNAR EXPORT (Parquet)")
+        print("=" * 80)
+        try:
+            from columnar_export import export_columnar
+        except ImportError as e:
+            print(f"\n[WARNING] Skipping Parquet export ({e}); install pyarrow to enable it")
+            export_summary = {"skipped": True, "error": str(e)}
+        else:
+            with stage("columnar_export"):
+                export_summary = export_columnar(
+                    processed_dir=PROCESSED_DIR,
+                    repairs_dir=REPAIRS_DIR.parent,
+                    verbose=verbose
+                )
+    else:
+        export_summary = {"skipped": True}
+    
     # Final Summary
     print("\n" + "=" * 80)
     print("FINAL SUMMARY")
     print("=" * 80)
-    print(f"\nPreprocessing:")
+    print("\nPreprocessing:")
     print(f"  Processed files: {len(preprocessing_summary.get('processed', []))}")
     print(f"  Skipped files: {len(preprocessing_summary.get('skipped', []))}")
     print(f"  Errors: {len(preprocessing_summary.get('errors', []))}")
     
     if not skip_repairs:
-        print(f"\nRepair Detection:")
+        print("\nRepair Detection:")
         print(f"  Successfully processed: {repair_summary.get('successful', 0)} file(s)")
         print(f"  Failed: {repair_summary.get('failed', 0)} file(s)")
         if repair_summary.get('errors'):
             print(f"  Errors: {len(repair_summary['errors'])}")
+        if use_prefilter:
+            print(f"  Pre-filter skipped: {repair_summary.get('prefilter_skipped', 0)} detector call(s)")
+        parse_stats = repair_summary.get('parse_stats')
+        if parse_stats and parse_stats['calls']:
+            print(f"  Parse failures: {parse_stats['parse_failures']}/{parse_stats['calls']} "
+                  f"({parse_stats['failures_per_100_calls']:.1f} per 100 calls)")
+        telemetry = repair_summary.get('telemetry')
+        if telemetry and telemetry['calls']:
+            latency = telemetry['wall_seconds']
+            tokens = telemetry['tokens_per_dialogue']
+            print(f"  LLM calls: {telemetry['calls']} (retries: {telemetry['retries']}), "
+                  f"latency p50/p95/p99: {latency['p50']:.1f}/{latency['p95']:.1f}/{latency['p99']:.1f}s")
+            print(f"  Tokens per dialogue p50/p95: {tokens['p50']:.0f}/{tokens['p95']:.0f}, "
+                  f"estimated cost: ${telemetry['estimated_cost_usd']:.4f}")
+            print(f"  Telemetry run id: {RUN_ID} (python scripts/telemetry.py --run {RUN_ID})")
+    else:
+        print("\nRepair Detection: SKIPPED")
+    
+    if not export_summary.get("skipped"):
+        print("\nColumnar Export:")
+        for name in ("turns", "repairs"):
+            result = export_summary[name]
+            print(f"  {name}: {result['rows']} rows, {len(result['written'])} week(s) rebuilt, "
+                  f"{len(result['unchanged'])} unchanged")
     else:
-        print(f"\nRepair Detection: SKIPPED")
+        print("\nColumnar Export: SKIPPED")
+    
+    timing_path = TIMER.save()
+    timing = TIMER.report()
+    print()
+    print_timing_report(timing)
+    print(f"  Timing report: {timing_path}")
+    if profile:
+        print(f"  Per-stage profiles: {timing_path.parent}/*.prof (python -m pstats <file>)")
     
     print("=" * 80)
     
     return {
         "preprocessing": preprocessing_summary,
-        "repair_detection": repair_summary
+        "repair_detection": repair_summary,
+        "columnar_export": export_summary,
+        "timing": timing
     }
 
 
@@ -255,6 +414,20 @@ Examples:
   
   # Skip repair detection (only preprocessing)
   python run_full_pipeline.py --student 18 --week 2 --skip-repairs
+  
+  # Skip the Parquet export of turns and repairs (data/columnar)
+  python run_full_pipeline.py --student 18 --week 2 --skip-export
+  
+  # Stream LLM responses (partial results survive timeouts)
+  python run_full_pipeline.py --student 18 --week 2 --stream
+  
+  # Run offline with the rule-based detector (no API keys needed);
+  # writes to data/experimental_repairs/local unless --repairs-dir is given
+  python run_full_pipeline.py --student 18 --week 2 --backend local
+  
+  # Profile each stage (cProfile + tracemalloc), then compare with the previous run
+  python run_full_pipeline.py --student 18 --week 2 --profile
+  python scripts/stage_timing.py
         """
     )
     
@@ -290,6 +463,51 @@ Examples:
         help='Skip repair detection step (only run preprocessing)'
     )
     
+    parser.add_argument(
+        '--skip-export',
+        action='store_true',
+        help='Skip the Parquet export of turns and repairs (data/columnar)'
+    )
+    
+    parser.add_argument(
+        '--backend',
+        choices=sorted(BACKENDS),
+        help='Repair detector backend (default: config "repair_detection.backend", else gemini). '
+             '"local" is rule-based and needs no API key or network'
+    )
+    
+    parser.add_argument(
+        '--model',
+        help='Model name for the detector backend (e.g. gpt-4o, gemini-2.5-flash)'
+    )
+    
+    parser.add_argument(
+        '--repairs-dir',
+        type=Path,
+        help='Output directory for repair files (default: data/repairs/production for '
+             f'{", ".join(REFERENCE_BACKENDS)}; data/experimental_repairs/<backend> otherwise)'
+    )
+    
+    parser.add_argument(
+        '--prefilter',
+        action='store_true',
+        help='Skip detector calls for dialogues with no trouble signals '
+             '(calibrate first: python scripts/repair_prefilter.py)'
+    )
+    
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Stream LLM responses (keeps partial results on timeouts/truncation)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Capture cProfile and tracemalloc statistics per stage (slower; '
+             'stage timings are always recorded)'
+    )
+    
     parser.add_argument(
         '--quiet',
         action='store_true',
@@ -314,7 +532,14 @@ def main():
         selected_weeks=selected_weeks,
         force=force,
         skip_repairs=skip_repairs,
-        verbose=verbose
+        verbose=verbose,
+        stream=args.stream,
+        backend_name=args.backend,
+        model_name=args.model,
+        use_prefilter=args.prefilter,
+        profile=args.profile,
+        skip_export=args.skip_export,
+        repairs_dir=args.repairs_dir
     )
 
 
@@ -1,16 +1,19 @@
 """
 Phase 2: LLM Repair Detection
-Processes all dialogue JSON files and detects repair sequences using Gemini API.
+Processes all dialogue JSON files and detects repair sequences using Gemini API
+(or another detector backend selected with --backend).
 """
+import argparse
 import json
 import sys
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 # Add scripts to path
 sys.path.insert(0, str(Path(__file__).parent / 'scripts'))
 
-from repair_detector import detect_repairs, save_repair_annotations, get_gemini_model, validate_repair_annotation
+from repair_detector import save_repair_annotations, validate_repair_annotation
+from detector_backends import BACKENDS, GeminiBackend, RepairDetectorBackend, create_backend
 from task_classifier import add_task_topic_to_dialogue
 
 # Configure output encoding for Windows
@@ -35,13 +38,21 @@ def create_dialogue_id(file_path: Path) -> str:
     return f"{filename}_S{student_id}"
 
 
-def process_dialogue_file(dialogue_file: Path, repairs_dir: Path, model=None) -> bool:
+def process_dialogue_file(
+    dialogue_file: Path,
+    repairs_dir: Path,
+    model=None,
+    stream: bool = True,
+    backend: Optional[RepairDetectorBackend] = None
+) -> bool:
     """
     Process a single dialogue file for repair detection.
     
     Args:
         dialogue_file: Path to dialogue JSON file
-        model: Optional Gemini model instance
+        model: Optional Gemini model instance (used when no backend is given)
+        stream: Stream the response so partial results survive truncation
+        backend: Detector backend (default: Gemini)
     
     Returns:
         True if successful, False otherwise
@@ -63,15 +74,18 @@ def process_dialogue_file(dialogue_file: Path, repairs_dir: Path, model=None) ->
         
         # Detect repairs
         print(f"  Detecting repairs in {len(dialogue_data['turns'])} turns...")
-        repairs = detect_repairs(dialogue_data, model=model)
-        
-        # Validate repairs
+        # Validate each repair as soon as the detector emits it
         dialogue_id = dialogue_data['dialogue_id']
         valid_repairs = []
-        for repair in repairs:
+        
+        def collect_valid(repair: Dict[str, Any]) -> None:
             if validate_repair_annotation(repair, dialogue_id):
                 valid_repairs.append(repair)
         
+        if backend is None:
+            backend = GeminiBackend(model=model)
+        backend.detect(dialogue_data, stream=stream, on_repair=collect_valid)
+        
         # Save repairs
         repairs_dir.mkdir(parents=True, exist_ok=True)
         output_file = repairs_dir / f"{dialogue_file.stem}_repairs.json"
@@ -90,6 +104,11 @@ def process_dialogue_file(dialogue_file: Path, repairs_dir: Path, model=None) ->
 
 def main():
     """Main function to process all dialogue files."""
+    arg_parser = argparse.ArgumentParser(description="Phase 2: repair detection over data/processed")
+    arg_parser.add_argument('--backend', choices=sorted(BACKENDS), default='gemini', help='Repair detector backend')
+    arg_parser.add_argument('--model', help='Model name for the detector backend')
+    args = arg_parser.parse_args()
+    
     print("="*60)
     print("PHASE 2: LLM REPAIR DETECTION")
     print("="*60)
@@ -111,13 +130,14 @@ def main():
     repairs_dir = Path('data/repairs')
     repairs_dir.mkdir(parents=True, exist_ok=True)
     
-    # Get Gemini model (reuse for all dialogues)
+    # Initialize the detector backend (reused for all dialogues)
+    backend = create_backend(args.backend, model=args.model)
     try:
-        print("\nInitializing Gemini API...")
-        model = get_gemini_model()
-        print(f"  [OK] Using model: {model._model_name}")
+        print(f"\nInitializing {backend.name} backend...")
+        backend.prepare()
+        print(f"  [OK] Using backend: {backend.describe()}")
     except Exception as e:
-        print(f"  [ERROR] Failed to initialize Gemini API: {e}")
+        print(f"  [ERROR] Failed to initialize {backend.name} backend: {e}")
         return
     
     # Process each dialogue
@@ -125,7 +145,7 @@ def main():
     failed = 0
     
     for dialogue_file in dialogue_files:
-        if process_dialogue_file(dialogue_file, repairs_dir=repairs_dir, model=model):
+        if process_dialogue_file(dialogue_file, repairs_dir=repairs_dir, backend=backend):
             successful += 1
         else:
             failed += 1
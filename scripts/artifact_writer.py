@@ -0,0 +1,139 @@
+"""
+Atomic, durable writes for pipeline artifacts.
+
+Every artifact (processed dialogues, extracted text, repair annotations,
+reports) is written to a temporary file in the target directory, flushed
+and fsync'ed, then renamed over the target. Readers and reruns see either
+the old file or the complete new one, never a truncated artifact, even if
+the run is interrupted or several workers write at once.
+
+After the rename the directory is fsync'ed too, so the new name survives a
+power loss. Loops that write many files can defer that to one fsync per
+directory at the end of the batch:
+
+    with batched_directory_sync():
+        for ...:
+            write_json(path, data)      # file contents fsync'ed, rename recorded
+    # each touched directory fsync'ed once here
+
+Temporary files are named ``.<name>.<random>.tmp`` so globs such as
+``*_repairs.json`` never match a half-written artifact.
+"""
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, List, Set, Union
+
+PathLike = Union[str, Path]
+
+# Mode of new files, as open() would create them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+_lock = threading.Lock()
+_batches: List[Set[Path]] = []
+
+
+def _fsync_directory(directory: Path) -> None:
+    """Persist a rename in a directory (no-op where directories cannot be opened, e.g. Windows)."""
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def batched_directory_sync() -> Iterator[Set[Path]]:
+    """
+    Defer directory fsyncs of writes in this block (from any thread) to its end.
+
+    File contents are still fsync'ed before each rename, so an interrupted
+    batch never leaves partial artifacts; at worst the last renames are lost
+    and those files are rewritten by the next run.
+    """
+    directories: Set[Path] = set()
+    with _lock:
+        _batches.append(directories)
+    try:
+        yield directories
+    finally:
+        with _lock:
+            _batches.remove(directories)
+            pending = sorted(directories)
+        for directory in pending:
+            _fsync_directory(directory)
+
+
+def _record_rename(directory: Path) -> None:
+    with _lock:
+        if _batches:
+            _batches[-1].add(directory)
+            return
+    _fsync_directory(directory)
+
+
+def write_bytes(path: PathLike, data: bytes, durable: bool = True) -> Path:
+    """
+    Atomically replace path with data.
+
+    Args:
+        path: Target file (parent directories are created)
+        data: File contents
+        durable: fsync the file and its directory (False: atomic only, e.g. for caches)
+
+    Returns:
+        The target path
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        os.chmod(tmp_name, FILE_MODE)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    if durable:
+        _record_rename(path.parent)
+    return path
+
+
+def write_text(path: PathLike, text: str, durable: bool = True) -> Path:
+    """Atomically write UTF-8 text."""
+    return write_bytes(path, text.encode('utf-8'), durable=durable)
+
+
+def dumps_json(data: Any, compact: bool = False) -> str:
+    """JSON as the pipeline writes it: indented by default, minimal separators when compact."""
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def write_json(path: PathLike, data: Any, compact: bool = False, durable: bool = True) -> Path:
+    """Atomically write JSON (indent=2, or compact without whitespace)."""
+    return write_text(path, dumps_json(data, compact), durable=durable)
+
+
+def is_complete_json(path: PathLike) -> bool:
+    """True if path holds a whole JSON document (False for missing, empty or truncated files)."""
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            json.load(f)
+        return True
+    except (OSError, ValueError):
+        return False
+
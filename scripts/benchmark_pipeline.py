@@ -0,0 +1,405 @@
+"""
+Reproducible benchmark of the pipeline over the bundled corpus.
+
+Replays ``data/raw`` through every offline stage and times each one with
+``stage_timing``:
+
+- preprocessing via ``preprocessing_pipeline.run_pipeline`` (discovery,
+  extraction, filtering, normalisation, task splitting, turn parsing,
+  alignment, writes; output to a temporary directory, the tree is never modified),
+- detection over ``data/processed`` via ``run_full_pipeline.process_repair_detection``
+  with ``StubBackend`` (fixed, seeded latency instead of an LLM; it replays the
+  production annotations as its output, which are validated and written like
+  real detector output),
+- validation (preprocessing, repair and cross-validation rules in one corpus pass),
+- calibration matching (all label-set pairs, stub output vs validation labels),
+- corpus statistics.
+
+The suite runs ``--repeat`` times and reports median stage times, throughput
+(documents and turns per second of the whole preprocessing stage,
+dialogues/s), peak RSS and the import time of the entry
+points against ``IMPORT_BUDGET_SECONDS``. An entry point is also over budget
+if importing it loads any of ``DEFERRED_MODULES`` (provider SDKs, dotenv,
+document libraries, scipy), which only the stages that need them may import.
+
+    python scripts/benchmark_pipeline.py --save-baseline         # record a baseline
+    python scripts/benchmark_pipeline.py --compare               # flag regressions (exit 1)
+    python scripts/benchmark_pipeline.py --latency 0.2 --repeat 1
+    python scripts/benchmark_pipeline.py --imports-only          # import budget check (exit 1)
+
+Baselines are machine-specific: record one before a change and compare after
+it on the same machine.
+"""
+import contextlib
+import io
+import json
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent))
+# run_full_pipeline lives in the project root
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from artifact_writer import write_json
+from stage_timing import StageTimer, use_timer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SCRIPTS_DIR = PROJECT_ROOT / "scripts"
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
+BENCHMARK_DIR = PROJECT_ROOT / "data" / "benchmarks"
+BASELINE_PATH = BENCHMARK_DIR / "baseline.json"
+LATEST_PATH = BENCHMARK_DIR / "latest.json"
+
+DEFAULT_LATENCY = 0.005
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.20
+# Changes smaller than this are noise, whatever the percentage
+MIN_REGRESSION_SECONDS = 0.05
+
+# Seconds to import each entry point in a fresh interpreter
+IMPORT_BUDGET_SECONDS = {
+    "run_full_pipeline": 0.5,
+    "preprocessing_pipeline": 0.3,
+    "validate_preprocessing": 0.3,
+    "validate_repair_results": 0.3,
+    "calibrate_repair_detection": 0.5,
+}
+
+# Heavy modules that must not be loaded just by importing an entry point
+DEFERRED_MODULES = (
+    "google.generativeai", "openai", "dotenv", "docx", "pdfplumber", "PyPDF2", "scipy", "pyarrow",
+)
+
+
+class StubBackend:
+    """
+    Detector backend with controllable latency and no network access.
+
+    Each call sleeps ``latency`` seconds (plus up to ``jitter`` seconds drawn
+    from a seeded generator) and returns the production annotations for the
+    dialogue, so downstream validation and matching see realistic output.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: float = DEFAULT_LATENCY, jitter: float = 0.0, seed: int = 0,
+                 annotations: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.annotations = annotations or {}
+        self._random = random.Random(seed)
+
+    def prepare(self) -> None:
+        pass
+
+    def describe(self) -> str:
+        return f"{self.name} ({self.latency * 1000:.0f} ms + {self.jitter * 1000:.0f} ms jitter)"
+
+    def detect(self, dialogue_data, stream=False, on_repair=None):
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        repairs = [dict(r) for r in self.annotations.get(dialogue_data.get('dialogue_id'), [])]
+        if on_repair is not None:
+            for repair in repairs:
+                on_repair(repair)
+        return repairs
+
+
+def peak_rss_mib() -> Optional[float]:
+    """Peak resident set size of this process so far (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_import_times(modules: Dict[str, float] = IMPORT_BUDGET_SECONDS, runs: int = 3) -> Dict[str, Dict[str, Any]]:
+    """Median cold import time of each module in a fresh interpreter, and any deferred modules it loaded."""
+    results = {}
+    for module, budget in modules.items():
+        code = (
+            f"import sys, time; sys.path[:0] = [{str(PROJECT_ROOT)!r}, {str(SCRIPTS_DIR)!r}]; "
+            f"t = time.perf_counter(); import {module}; print(time.perf_counter() - t); "
+            f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+        )
+        timings = []
+        loaded: List[str] = []
+        for _ in range(runs):
+            completed = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT,
+                                       capture_output=True, text=True)
+            if completed.returncode != 0:
+                timings = None
+                break
+            seconds_line, loaded_line = completed.stdout.splitlines()[-2:]
+            timings.append(float(seconds_line))
+            loaded = [m for m in loaded_line.split(",") if m]
+        seconds = statistics.median(timings) if timings else None
+        results[module] = {
+            "seconds": round(seconds, 4) if seconds is not None else None,
+            "budget_seconds": budget,
+            "deferred_modules_loaded": loaded,
+            "within_budget": seconds is not None and seconds <= budget and not loaded,
+        }
+    return results
+
+
+def run_suite(latency: float = DEFAULT_LATENCY, jitter: float = 0.0, seed: int = 0) -> Dict[str, Any]:
+    """
+    Run every benchmark stage once; return the timing report and work counts.
+
+    Preprocessing and detection go through the pipeline's own entry points
+    (``preprocessing_pipeline.run_pipeline`` and
+    ``run_full_pipeline.process_repair_detection`` with ``StubBackend``), so
+    their nested stages are the ones a real run records. Their output goes to a
+    temporary directory.
+    """
+    from generate_final_statistics import aggregate_statistics
+    from preprocessing_pipeline import load_config, run_pipeline
+    from repair_matching import LABEL_SETS, aggregate_scores, load_label_set, score_all_pairs, score_repairs
+    from run_full_pipeline import process_repair_detection
+    from validation_engine import run_validation
+
+    timer = StageTimer()
+    span = timer.span
+    counts = {"documents": 0, "extraction_errors": 0, "dialogues": 0, "turns": 0,
+              "detected_dialogues": 0, "validated_dialogues": 0}
+    rss = {}
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as tmp, use_timer(timer):
+        output_dir = Path(tmp)
+        config = load_config()
+        config["naming"] = {**config.get("naming", {}), "processed_dir": str(output_dir / "processed")}
+        config_path = output_dir / "preprocessing_config.json"
+        config_path.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+
+        with span("preprocessing"):
+            summary = run_pipeline(force=True, verbose=False, config_path=config_path,
+                                   extracted_text_dir=output_dir / "extracted_text")
+        processed = summary["processed"]
+        counts["documents"] = len({(item["student_id"], item["week"]) for item in processed})
+        counts["extraction_errors"] = len(summary["errors"])
+        counts["dialogues"] = len(processed)
+        counts["turns"] = sum(item["turns"] for item in processed)
+        rss["preprocessing"] = peak_rss_mib()
+
+        dialogue_files = sorted(PROCESSED_DIR.glob("S*_W*_T*.json"))
+        production = load_label_set(REPAIRS_DIR / "production")
+        backend = StubBackend(latency=latency, jitter=jitter, seed=seed, annotations=production)
+        detected_dir = output_dir / "repairs"
+        with span("detection"):
+            detection = process_repair_detection(dialogue_files, repairs_dir=detected_dir,
+                                                 verbose=False, backend=backend)
+        counts["detected_dialogues"] = detection["successful"]
+        detected = load_label_set(detected_dir)
+        rss["detection"] = peak_rss_mib()
+
+    with span("validation"):
+        # All three reports (preprocessing, repairs, cross) in one pass over the corpus
+        validation_run = run_validation(PROCESSED_DIR, REPAIRS_DIR, verbose=False)
+        counts["validated_dialogues"] = validation_run["total_dialogues"]
+    rss["validation"] = peak_rss_mib()
+
+    with span("calibration_matching"):
+        label_sets = {name: load_label_set(REPAIRS_DIR / name) for name in LABEL_SETS if (REPAIRS_DIR / name).exists()}
+        score_all_pairs(label_sets)
+        validation = label_sets.get("validation", {})
+        aggregate_scores([score_repairs(detected[d], validation[d]) for d in validation if d in detected])
+    rss["calibration_matching"] = peak_rss_mib()
+
+    with span("statistics"):
+        aggregate_statistics(REPAIRS_DIR, use_cache=False, save_cache=False)
+    rss["statistics"] = peak_rss_mib()
+
+    return {"timing": timer.report(), "counts": counts, "rss_mib": rss}
+
+
+def summarize_runs(runs: List[Dict[str, Any]], latency: float, jitter: float,
+                   imports: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Median stage times across repeated runs, with throughput and memory."""
+    paths = list(dict.fromkeys(s["path"] for run in runs for s in run["timing"]["stages"]))
+    stages = {}
+    for path in paths:
+        totals = [next((s["total_seconds"] for s in run["timing"]["stages"] if s["path"] == path), 0.0) for run in runs]
+        stages[path] = {
+            "median_seconds": round(statistics.median(totals), 6),
+            "min_seconds": round(min(totals), 6),
+            "max_seconds": round(max(totals), 6),
+        }
+
+    counts = runs[-1]["counts"]
+
+    def rate(count: int, path: str) -> Optional[float]:
+        seconds = stages.get(path, {}).get("median_seconds")
+        return round(count / seconds, 2) if seconds else None
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "repeat": len(runs),
+        "stub_latency_seconds": latency,
+        "stub_jitter_seconds": jitter,
+        "counts": counts,
+        "throughput": {
+            "documents_per_second": rate(counts["documents"], "preprocessing"),
+            "turns_per_second": rate(counts["turns"], "preprocessing"),
+            "dialogues_per_second_detection": rate(counts["detected_dialogues"], "detection"),
+            "dialogues_per_second_validation": rate(counts["validated_dialogues"], "validation"),
+        },
+        "peak_rss_mib": peak_rss_mib(),
+        "rss_after_stage_mib": runs[0]["rss_mib"],
+        "stages": stages,
+        "imports": imports or {},
+    }
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Regressions of more than ``threshold`` (relative) against a baseline.
+
+    Covers stage times (ignoring changes under ``MIN_REGRESSION_SECONDS``),
+    throughput drops, peak RSS growth and import times.
+    """
+    regressions = []
+
+    def check(metric: str, now: Optional[float], before: Optional[float], higher_is_worse: bool = True,
+              min_delta: float = 0.0) -> None:
+        if now is None or not before:
+            return
+        change = (now - before) / before
+        worse = change if higher_is_worse else -change
+        if worse > threshold and abs(now - before) >= min_delta:
+            regressions.append({"metric": metric, "baseline": before, "current": now, "change": round(change, 4)})
+
+    for path, stats in current["stages"].items():
+        before = baseline.get("stages", {}).get(path)
+        if before:
+            check(f"stage:{path}", stats["median_seconds"], before["median_seconds"], min_delta=MIN_REGRESSION_SECONDS)
+    for metric, value in current["throughput"].items():
+        check(f"throughput:{metric}", value, baseline.get("throughput", {}).get(metric), higher_is_worse=False)
+    check("peak_rss_mib", current.get("peak_rss_mib"), baseline.get("peak_rss_mib"))
+    for module, stats in current.get("imports", {}).items():
+        before = baseline.get("imports", {}).get(module, {})
+        check(f"import:{module}", stats.get("seconds"), before.get("seconds"), min_delta=MIN_REGRESSION_SECONDS)
+    return regressions
+
+
+def print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    print("=" * 80)
+    print(f"PIPELINE BENCHMARK (median of {results['repeat']} run(s), stub latency "
+          f"{results['stub_latency_seconds'] * 1000:.0f} ms)")
+    print("=" * 80)
+    counts = results["counts"]
+    print(f"Corpus: {counts['documents']} documents, {counts['dialogues']} dialogues, {counts['turns']} turns; "
+          f"{counts['detected_dialogues']} processed dialogues")
+
+    print(f"\n{'Stage':<40} {'Median (s)':>11} {'Min':>9} {'Max':>9} {'Baseline':>10}")
+    print("-" * 82)
+    for path, stats in results["stages"].items():
+        before = (baseline or {}).get("stages", {}).get(path, {}).get("median_seconds")
+        indent = "  " * path.count("/")
+        print(f"{indent + path.rsplit('/', 1)[-1]:<40} {stats['median_seconds']:>11.3f} "
+              f"{stats['min_seconds']:>9.3f} {stats['max_seconds']:>9.3f} "
+              f"{before if before is not None else '-':>10}")
+
+    print("\nThroughput:")
+    for metric, value in results["throughput"].items():
+        print(f"  {metric:<34} {value if value is not None else '-'}")
+    if results.get("peak_rss_mib") is not None:
+        print(f"Peak RSS: {results['peak_rss_mib']:.1f} MiB")
+
+    if results.get("imports"):
+        print_import_times(results["imports"])
+
+
+def print_import_times(imports: Dict[str, Dict[str, Any]]) -> None:
+    print("\nImport time (fresh interpreter):")
+    for module, stats in imports.items():
+        seconds = stats["seconds"]
+        status = "[OK]" if stats["within_budget"] else "[WARNING] over budget"
+        shown = f"{seconds:.3f}s" if seconds is not None else "failed"
+        loaded = stats.get("deferred_modules_loaded")
+        print(f"  {module:<30} {shown:>8} (budget {stats['budget_seconds']:.1f}s) {status}"
+              + (f" - loads {', '.join(loaded)}" if loaded else ""))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages over the bundled corpus")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs to take the median over")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY, help="Stub detector latency per dialogue (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random stub latency, up to this many seconds")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the stub latency jitter")
+    parser.add_argument("--skip-imports", action="store_true", help="Do not measure entry point import times")
+    parser.add_argument("--imports-only", action="store_true",
+                        help="Only check entry point import times against the budget; exit 1 if over")
+    parser.add_argument("--output", default=str(LATEST_PATH), help="Where to write the results JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store the results as the baseline")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline JSON file")
+    parser.add_argument("--compare", action="store_true", help="Compare with the baseline; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.imports_only:
+        imports = measure_import_times()
+        print_import_times(imports)
+        over = [module for module, stats in imports.items() if not stats["within_budget"]]
+        if over:
+            print(f"\n[ERROR] Over import budget: {', '.join(over)}")
+            sys.exit(1)
+        print("\n[OK] All entry points within the import budget")
+        return
+
+    runs = []
+    for i in range(max(1, args.repeat)):
+        print(f"[INFO] Benchmark run {i + 1}/{max(1, args.repeat)}...")
+        # The pipeline functions print per-file progress; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            runs.append(run_suite(latency=args.latency, jitter=args.jitter, seed=args.seed))
+    imports = None if args.skip_imports else measure_import_times()
+    results = summarize_runs(runs, args.latency, args.jitter, imports)
+
+    baseline = None
+    baseline_path = Path(args.baseline)
+    if args.compare:
+        if not baseline_path.exists():
+            print(f"[ERROR] Baseline not found: {baseline_path} (record one with --save-baseline)")
+            sys.exit(2)
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+
+    output_paths = [Path(args.output)] + ([baseline_path] if args.save_baseline else [])
+    for path in output_paths:
+        write_json(path, results)
+        print(f"[OK] Results saved to: {path}")
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, threshold=args.threshold)
+        if regressions:
+            print(f"\n[WARNING] {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"  {r['metric']}: {r['baseline']} -> {r['current']} ({r['change']:+.1%})")
+            sys.exit(1)
+        print(f"\n[OK] No regressions beyond {args.threshold:.0%} against {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,38 @@
 """
 Calibration script: Test repair detection on dialogues with known annotations.
 Measures accuracy by comparing to existing repair annotations.
+
+Dialogues run concurrently and every result is appended to a JSONL
+checkpoint, so an interrupted run resumes where it stopped:
+
+    python scripts/calibrate_repair_detection.py --model gpt gemini --labels-dir data/repairs/validation
 """
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Any, Set, Tuple
+from typing import Dict, List, Any, Tuple, Callable, Optional
 import sys
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from repair_detector_gpt import detect_repairs_gpt, get_openai_client
-from repair_detector import detect_repairs, get_gemini_model
+from artifact_writer import write_json
+from repair_detector_gpt import get_openai_client
+from repair_detector import detect_repairs, get_gemini_model, create_user_prompt
 from repair_detector_enhanced import detect_repairs_enhanced
+from repair_schema import PARSE_STATS
+from detector_backends import create_backend
+from few_shot_index import load_or_build_index
+from repair_matching import DEFAULT_MIN_OVERLAP, aggregate_scores, score_repairs
+
+CHECKPOINT_PATH = Path('data/calibration_checkpoint.jsonl')
+RESULTS_PATH = Path('data/calibration_results.json')
 
 
 def load_dialogue(dialogue_file: Path) -> Dict[str, Any]:
     """Load dialogue JSON."""
-    with open(dialogue_file, 'r', encoding='utf-8') as f:
+    with open(dialogue_file, 'r', encoding='utf-8-sig') as f:
         return json.load(f)
 
 
@@ -24,259 +40,377 @@ def load_repairs(repair_file: Path) -> List[Dict[str, Any]]:
     """Load repair annotations."""
     if not repair_file.exists():
         return []
-    with open(repair_file, 'r', encoding='utf-8') as f:
+    with open(repair_file, 'r', encoding='utf-8-sig') as f:
         return json.load(f)
 
 
-def normalize_repair(repair: Dict[str, Any]) -> Dict[str, Any]:
-    """Normalize repair for comparison (remove dialogue_id, sort turn_indices)."""
-    # Handle case where repair might not be a dict
-    if not isinstance(repair, dict):
-        return None
-    
-    normalized = {
-        "repair_id": repair.get('repair_id'),
-        "turn_indices": sorted(repair.get('turn_indices', [])),
-        "initiation": repair.get('initiation'),
-        "resolution": repair.get('resolution'),
-        "trigger": repair.get('trigger', '').lower().strip()
-    }
-    return normalized
-
-
 def compare_repairs(
     predicted: List[Dict[str, Any]],
-    actual: List[Dict[str, Any]]
+    actual: List[Dict[str, Any]],
+    min_overlap: float = DEFAULT_MIN_OVERLAP
 ) -> Dict[str, Any]:
-    """Compare predicted repairs to actual repairs."""
-    
-    # Normalize both (filter out None values)
-    pred_norm = [r for r in [normalize_repair(r) for r in predicted] if r is not None]
-    actual_norm = [r for r in [normalize_repair(r) for r in actual] if r is not None]
-    
-    # Exact matches
-    exact_matches = 0
-    partial_matches = 0
-    
-    matched_pred = set()
-    matched_actual = set()
-    
-    # Find exact matches
-    for i, pred in enumerate(pred_norm):
-        for j, act in enumerate(actual_norm):
-            if (pred['turn_indices'] == act['turn_indices'] and
-                pred['initiation'] == act['initiation'] and
-                pred['resolution'] == act['resolution']):
-                exact_matches += 1
-                matched_pred.add(i)
-                matched_actual.add(j)
-                break
-    
-    # Find partial matches (same turn_indices, different classification)
-    for i, pred in enumerate(pred_norm):
-        if i in matched_pred:
+    """
+    Compare predicted repairs to actual repairs.
+
+    Repairs are paired by optimal assignment over turn-set overlap
+    (``repair_matching``). Exact, overlap (Jaccard >= ``min_overlap``) and
+    label-level (overlap plus matching codes) metrics are returned.
+    """
+    return score_repairs(predicted, actual, min_overlap=min_overlap)
+
+
+def config_label(model_type: str, model_name: str) -> str:
+    """Checkpoint/results key for a calibration configuration."""
+    return f"{model_type}:{model_name}" if model_type == "gpt" else model_type
+
+
+def load_calibration_set(processed_dir: Path, repairs_dir: Path) -> List[Dict[str, Any]]:
+    """
+    Load every labelled dialogue once, with its prompt, for all configurations.
+
+    Returns:
+        List of {"dialogue", "dialogue_data", "actual", "user_prompt"} items
+    """
+    items = []
+    for repair_file in sorted(repairs_dir.glob("*_repairs.json")):
+        dialogue_name = repair_file.stem.replace("_repairs", "")
+        dialogue_file = processed_dir / f"{dialogue_name}.json"
+
+        if not dialogue_file.exists():
+            print(f"[SKIP] Dialogue not found: {dialogue_file}")
             continue
-        for j, act in enumerate(actual_norm):
-            if j in matched_actual:
+
+        actual_repairs = load_repairs(repair_file)
+        if not actual_repairs:
+            continue
+
+        dialogue_data = load_dialogue(dialogue_file)
+        items.append({
+            "dialogue": dialogue_name,
+            "dialogue_data": dialogue_data,
+            "actual": actual_repairs,
+            "user_prompt": create_user_prompt(dialogue_data),
+        })
+    return items
+
+
+def load_checkpoint(checkpoint_path: Path) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    Read completed results from a JSONL checkpoint, keyed by (config, dialogue).
+
+    A partially written last line (crash mid-write) is ignored, and only
+    successful records count as done, so failed dialogues are retried.
+    """
+    done = {}
+    if not checkpoint_path.exists():
+        return done
+    with open(checkpoint_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
                 continue
-            if pred['turn_indices'] == act['turn_indices']:
-                partial_matches += 1
-                matched_pred.add(i)
-                matched_actual.add(j)
-                break
-    
-    # Calculate metrics
-    total_pred = len(predicted)
-    total_actual = len(actual)
-    
-    true_positives = exact_matches
-    false_positives = total_pred - len(matched_pred)
-    false_negatives = total_actual - len(matched_actual)
-    
-    precision = true_positives / total_pred if total_pred > 0 else 0
-    recall = true_positives / total_actual if total_actual > 0 else 0
-    f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-    
+            if record.get("status") == "ok":
+                done[(record["config"], record["dialogue"])] = record
+    return done
+
+
+def make_detector(model_type: str, model_name: str) -> Tuple[Callable[[Dict[str, Any]], List[Dict[str, Any]]], Any]:
+    """
+    Initialise a configuration's detector.
+
+    Returns:
+        (detect function taking a calibration item, backend or None)
+    """
+    if model_type == "gpt":
+        client = get_openai_client()
+        few_shot_index = load_or_build_index()
+        print("[OK] Initialized OpenAI client")
+        print(f"[OK] Few-shot index: {len(few_shot_index)} validated examples")
+
+        def detect(item):
+            # Use enhanced version for better accuracy
+            return detect_repairs_enhanced(
+                item["dialogue_data"], model=model_name, client=client, use_enhanced_prompt=True,
+                few_shot_index=few_shot_index, user_prompt=item["user_prompt"], raise_errors=True
+            )
+        return detect, None
+
+    if model_type == "gemini":
+        model = get_gemini_model()
+        print("[OK] Initialized Gemini model")
+
+        def detect(item):
+            return detect_repairs(item["dialogue_data"], model=model, user_prompt=item["user_prompt"], raise_errors=True)
+        return detect, None
+
+    # Any registered detector backend (cascade, local, ...)
+    backend = create_backend(model_type)
+    backend.prepare()
+    print(f"[OK] Initialized backend: {backend.describe()}")
+    return (lambda item: backend.detect(item["dialogue_data"])), backend
+
+
+def summarize_results(
+    records: List[Dict[str, Any]],
+    calibration_set: List[Dict[str, Any]],
+    model_type: str,
+    model_name: str
+) -> Dict[str, Any]:
+    """Compute overall metrics from checkpoint records, sorted by dialogue."""
+    actual_by_dialogue = {item["dialogue"]: item["actual"] for item in calibration_set}
+    results = []
+    for record in sorted(records, key=lambda r: r["dialogue"]):
+        # Re-score from the stored predictions so metric changes apply to old checkpoints
+        metrics = compare_repairs(record["predicted"], actual_by_dialogue[record["dialogue"]])
+        results.append({
+            "dialogue": record["dialogue"],
+            "metrics": metrics
+        })
+
+    overall = aggregate_scores([r["metrics"] for r in results])
+
     return {
-        "total_predicted": total_pred,
-        "total_actual": total_actual,
-        "exact_matches": exact_matches,
-        "partial_matches": partial_matches,
-        "true_positives": true_positives,
-        "false_positives": false_positives,
-        "false_negatives": false_negatives,
-        "precision": precision,
-        "recall": recall,
-        "f1_score": f1
+        "model_type": model_type,
+        "model_name": model_name,
+        "dialogues_tested": len(results),
+        "dialogues_missing": len(calibration_set) - len(results),
+        "overall_metrics": overall,
+        "per_dialogue": results
     }
 
 
+def print_calibration_summary(summary: Dict[str, Any]) -> None:
+    """Print the overall metrics of one configuration."""
+    overall = summary["overall_metrics"]
+    print("=" * 80)
+    print(f"CALIBRATION SUMMARY: {config_label(summary['model_type'], summary['model_name'])}")
+    print("=" * 80)
+    print(f"Dialogues tested: {summary['dialogues_tested']}")
+    if summary.get("dialogues_missing"):
+        print(f"Dialogues missing (failed, rerun to retry): {summary['dialogues_missing']}")
+    print(f"Total predicted repairs: {overall['total_predicted']}")
+    print(f"Total actual repairs: {overall['total_actual']}")
+    print(f"Exact matches: {overall['exact_matches']}")
+    print(f"Partial matches: {overall['partial_matches']}")
+    print(f"\nOverall Precision: {overall['precision']:.2%}")
+    print(f"Overall Recall: {overall['recall']:.2%}")
+    print(f"Overall F1 Score: {overall['f1_score']:.2%}")
+    print(f"Overlap F1 (Jaccard >= {DEFAULT_MIN_OVERLAP}): {overall['overlap_f1']:.2%}, "
+          f"label-level F1: {overall['label_f1']:.2%}, mean Jaccard: {overall['mean_jaccard']:.2f}")
+    print(f"Parse failures: {summary['parse_stats']['failures_per_100_calls']:.1f} per 100 calls (this run)")
+    if "routing" in summary:
+        routing = summary["routing"]
+        print(f"Escalated: {routing['escalated']}/{routing['dialogues']} dialogues ({routing['escalation_rate']:.1%}, this run)")
+    if "review" in summary:
+        review = summary["review"]
+        print(f"Flagged for review: {review['needs_review']}/{review['dialogues']} dialogues ({review['review_rate']:.1%}, this run)")
+
+
 def calibrate_model(
     processed_dir: Path,
     repairs_dir: Path,
     model_type: str = "gpt",
-    model_name: str = "gpt-4o"
+    model_name: str = "gpt-4o",
+    workers: int = 4,
+    checkpoint_path: Path = CHECKPOINT_PATH,
+    calibration_set: Optional[List[Dict[str, Any]]] = None,
+    output_file: Optional[Path] = RESULTS_PATH
 ) -> Dict[str, Any]:
-    """Calibrate repair detection on known dialogues."""
-    
+    """
+    Calibrate repair detection on known dialogues.
+
+    Dialogues run concurrently (API calls are throttled by the shared
+    ``rate_limiter``). Each finished dialogue is appended to the JSONL
+    checkpoint immediately; dialogues already in the checkpoint for this
+    configuration are not re-run, and the summary is computed from it.
+    Detector failures (including cascade and self-consistency backends whose
+    API calls all failed) are recorded as errors and retried on the next run.
+
+    Args:
+        processed_dir: Directory with processed dialogue JSON files
+        repairs_dir: Directory with reference *_repairs.json files
+        model_type: gpt, gemini, or a detector backend name (cascade, local)
+        model_name: GPT model name (gpt only)
+        workers: Number of dialogues processed concurrently
+        checkpoint_path: JSONL checkpoint to append to and resume from
+        calibration_set: Preloaded ``load_calibration_set`` output (shared across configurations)
+        output_file: Where to save the summary (None to skip)
+
+    Returns:
+        Summary dictionary (empty if the model could not be initialised)
+    """
+    label = config_label(model_type, model_name)
     print("=" * 80)
     print(f"CALIBRATION: {model_type.upper()} ({model_name})")
     print("=" * 80)
-    
-    # Find dialogues with existing repairs
-    repair_files = sorted(repairs_dir.glob("*_repairs.json"))
-    
-    if not repair_files:
+
+    if calibration_set is None:
+        calibration_set = load_calibration_set(processed_dir, repairs_dir)
+    if not calibration_set:
         print("[ERROR] No existing repair files found for calibration")
         return {}
-    
-    print(f"\nFound {len(repair_files)} dialogues with existing repairs")
-    print("Testing on these dialogues...\n")
-    
-    # Initialize model
-    model = None
-    client = None
-    if model_type == "gpt":
+
+    # The checkpoint may hold dialogues of other label sets (--labels-dir); predictions
+    # do not depend on the labels, so records of dialogues in this set are reused
+    dialogues = {item["dialogue"] for item in calibration_set}
+    done = {dialogue: record for (config, dialogue), record in load_checkpoint(checkpoint_path).items()
+            if config == label and dialogue in dialogues}
+    pending = [item for item in calibration_set if item["dialogue"] not in done]
+
+    print(f"\nFound {len(calibration_set)} dialogues with existing repairs")
+    print(f"Already in checkpoint: {len(calibration_set) - len(pending)}, to run: {len(pending)}\n")
+
+    backend = None
+    if pending:
         try:
-            client = get_openai_client()
-            print(f"[OK] Initialized OpenAI client")
+            detect, backend = make_detector(model_type, model_name)
         except Exception as e:
-            print(f"[ERROR] Failed to initialize OpenAI: {e}")
+            print(f"[ERROR] Failed to initialize {model_type}: {e}")
             return {}
-    else:
+
+    PARSE_STATS.reset()
+    write_lock = threading.Lock()
+
+    # Terminate a line left partial by a crash so new records start cleanly
+    if checkpoint_path.exists() and checkpoint_path.stat().st_size > 0:
+        with open(checkpoint_path, 'rb+') as f:
+            f.seek(-1, 2)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def run(item: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        record = {"config": label, "model_type": model_type, "model_name": model_name, "dialogue": item["dialogue"]}
         try:
-            model = get_gemini_model()
-            print(f"[OK] Initialized Gemini model")
+            predicted = detect(item)
+            record.update({"status": "ok", "predicted": predicted,
+                           "metrics": compare_repairs(predicted, item["actual"])})
         except Exception as e:
-            print(f"[ERROR] Failed to initialize Gemini: {e}")
-            return {}
-    
-    results = []
-    all_metrics = {
-        "total_predicted": 0,
-        "total_actual": 0,
-        "exact_matches": 0,
-        "partial_matches": 0,
-        "true_positives": 0,
-        "false_positives": 0,
-        "false_negatives": 0
-    }
-    
-    for repair_file in repair_files:
-        # Find corresponding dialogue
-        dialogue_name = repair_file.stem.replace("_repairs", "")
-        dialogue_file = processed_dir / f"{dialogue_name}.json"
-        
-        if not dialogue_file.exists():
-            print(f"[SKIP] Dialogue not found: {dialogue_file}")
-            continue
-        
-        dialogue_data = load_dialogue(dialogue_file)
-        actual_repairs = load_repairs(repair_file)
-        
-        if not actual_repairs:
-            continue
-        
-        print(f"Testing: {dialogue_file.name}")
-        
-        # Get predicted repairs
-        try:
-            if model_type == "gpt":
-                # Use enhanced version for better accuracy
-                predicted_repairs = detect_repairs_enhanced(dialogue_data, model=model_name, client=client, use_enhanced_prompt=True)
+            record.update({"status": "error", "error": str(e)})
+        record["seconds"] = round(time.perf_counter() - started, 3)
+
+        with write_lock:
+            checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(checkpoint_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+
+            print(f"Tested: {item['dialogue']} ({record['seconds']:.1f}s)")
+            if record["status"] != "ok":
+                print(f"  [ERROR] {record['error']}")
             else:
-                predicted_repairs = detect_repairs(dialogue_data, model=model)
-        except Exception as e:
-            print(f"  [ERROR] {e}")
-            continue
-        
-        # Compare
-        metrics = compare_repairs(predicted_repairs, actual_repairs)
-        results.append({
-            "dialogue": dialogue_name,
-            "metrics": metrics
-        })
-        
-        # Aggregate
-        for key in all_metrics:
-            all_metrics[key] += metrics.get(key, 0)
-        
-        print(f"  Predicted: {metrics['total_predicted']}, Actual: {metrics['total_actual']}")
-        print(f"  Exact matches: {metrics['exact_matches']}, Partial: {metrics['partial_matches']}")
-        print(f"  Precision: {metrics['precision']:.2%}, Recall: {metrics['recall']:.2%}, F1: {metrics['f1_score']:.2%}")
-        print()
-    
-    # Calculate overall metrics
-    total_pred = all_metrics['total_predicted']
-    total_actual = all_metrics['total_actual']
-    
-    overall_precision = all_metrics['true_positives'] / total_pred if total_pred > 0 else 0
-    overall_recall = all_metrics['true_positives'] / total_actual if total_actual > 0 else 0
-    overall_f1 = 2 * (overall_precision * overall_recall) / (overall_precision + overall_recall) if (overall_precision + overall_recall) > 0 else 0
-    
-    summary = {
-        "model_type": model_type,
-        "model_name": model_name,
-        "dialogues_tested": len(results),
-        "overall_metrics": {
-            "total_predicted": total_pred,
-            "total_actual": total_actual,
-            "exact_matches": all_metrics['exact_matches'],
-            "partial_matches": all_metrics['partial_matches'],
-            "true_positives": all_metrics['true_positives'],
-            "false_positives": all_metrics['false_positives'],
-            "false_negatives": all_metrics['false_negatives'],
-            "precision": overall_precision,
-            "recall": overall_recall,
-            "f1_score": overall_f1
-        },
-        "per_dialogue": results
-    }
-    
-    # Print summary
-    print("=" * 80)
-    print("CALIBRATION SUMMARY")
-    print("=" * 80)
-    print(f"Dialogues tested: {len(results)}")
-    print(f"Total predicted repairs: {total_pred}")
-    print(f"Total actual repairs: {total_actual}")
-    print(f"Exact matches: {all_metrics['exact_matches']}")
-    print(f"Partial matches: {all_metrics['partial_matches']}")
-    print(f"\nOverall Precision: {overall_precision:.2%}")
-    print(f"Overall Recall: {overall_recall:.2%}")
-    print(f"Overall F1 Score: {overall_f1:.2%}")
-    
-    # Save results
-    output_file = Path('data/calibration_results.json')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
-    
-    print(f"\n[OK] Calibration results saved to: {output_file}")
-    
+                metrics = record["metrics"]
+                print(f"  Predicted: {metrics['total_predicted']}, Actual: {metrics['total_actual']}")
+                print(f"  Exact matches: {metrics['exact_matches']}, Partial: {metrics['partial_matches']}, Overlap: {metrics['overlap_matches']}")
+                print(f"  Precision: {metrics['precision']:.2%}, Recall: {metrics['recall']:.2%}, F1: {metrics['f1_score']:.2%}")
+        return record
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for record in pool.map(run, pending):
+            if record["status"] == "ok":
+                done[record["dialogue"]] = record
+    print()
+
+    summary = summarize_results(list(done.values()), calibration_set, model_type, model_name)
+    summary["parse_stats"] = PARSE_STATS.to_dict()
+    if hasattr(backend, "routing_summary"):
+        summary["routing"] = backend.routing_summary()
+    if hasattr(backend, "review_summary"):
+        summary["review"] = backend.review_summary()
+
+    print_calibration_summary(summary)
+
+    if output_file is not None:
+        write_json(output_file, summary)
+        print(f"\n[OK] Calibration results saved to: {output_file}")
+
     return summary
 
 
+def calibrate_models(
+    processed_dir: Path,
+    repairs_dir: Path,
+    configs: List[Tuple[str, str]],
+    workers: int = 4,
+    checkpoint_path: Path = CHECKPOINT_PATH,
+    output_file: Path = RESULTS_PATH
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Calibrate several (model_type, model_name) configurations in one pass.
+
+    Dialogues and prompts are loaded once and shared by every configuration.
+    With a single configuration the saved file has the same layout as
+    ``calibrate_model``; otherwise it maps configuration labels to summaries.
+    """
+    calibration_set = load_calibration_set(processed_dir, repairs_dir)
+    summaries = {}
+    for model_type, model_name in configs:
+        summary = calibrate_model(
+            processed_dir, repairs_dir, model_type=model_type, model_name=model_name,
+            workers=workers, checkpoint_path=checkpoint_path,
+            calibration_set=calibration_set, output_file=None
+        )
+        if summary:
+            summaries[config_label(model_type, model_name)] = summary
+        print()
+
+    if summaries:
+        saved = next(iter(summaries.values())) if len(configs) == 1 else summaries
+        write_json(output_file, saved)
+        print(f"[OK] Calibration results saved to: {output_file}")
+
+    if len(summaries) > 1:
+        print("=" * 80)
+        print("CONFIGURATION COMPARISON")
+        print("=" * 80)
+        for label, summary in summaries.items():
+            overall = summary["overall_metrics"]
+            print(f"{label:<30} P={overall['precision']:.2%}  R={overall['recall']:.2%}  F1={overall['f1_score']:.2%}  "
+                  f"overlap F1={overall['overlap_f1']:.2%}  label F1={overall['label_f1']:.2%}")
+
+    return summaries
+
+
 def main():
     """Main calibration function."""
     import argparse
     
     parser = argparse.ArgumentParser(description="Calibrate repair detection on known dialogues")
-    parser.add_argument("--model", choices=["gpt", "gemini"], default="gpt", help="Model to test")
-    parser.add_argument("--gpt-model", default="gpt-4o", help="GPT model name (gpt-4o, gpt-4-turbo-preview, etc.)")
+    parser.add_argument("--model", nargs="+", choices=["gpt", "gemini", "cascade", "self-consistency", "local"], default=["gpt"],
+                        help="Model(s) to test (cascade: Gemini first, escalate uncertain dialogues to enhanced GPT-4o)")
+    parser.add_argument("--gpt-model", nargs="+", default=["gpt-4o"],
+                        help="GPT model name(s) (gpt-4o, gpt-4-turbo-preview, etc.)")
+    parser.add_argument("--labels-dir", default="data/repairs", help="Directory with reference *_repairs.json files")
+    parser.add_argument("--workers", type=int, default=4, help="Dialogues processed concurrently")
+    parser.add_argument("--checkpoint", default=str(CHECKPOINT_PATH), help="JSONL checkpoint to resume from")
+    parser.add_argument("--fresh", action="store_true", help="Discard the checkpoint and rerun everything")
     
     args = parser.parse_args()
     
     processed_dir = Path('data/processed')
-    repairs_dir = Path('data/repairs')
+    repairs_dir = Path(args.labels_dir)
+    checkpoint_path = Path(args.checkpoint)
+
+    if args.fresh and checkpoint_path.exists():
+        checkpoint_path.unlink()
+        print(f"[INFO] Removed checkpoint: {checkpoint_path}")
+
+    configs = []
+    for model_type in args.model:
+        if model_type == "gpt":
+            configs.extend(("gpt", name) for name in args.gpt_model)
+        else:
+            configs.append((model_type, model_type))
     
-    results = calibrate_model(
+    calibrate_models(
         processed_dir,
         repairs_dir,
-        model_type=args.model,
-        model_name=args.gpt_model
+        configs,
+        workers=args.workers,
+        checkpoint_path=checkpoint_path
     )
 
 
 if __name__ == "__main__":
     main()
-
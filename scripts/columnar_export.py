@@ -0,0 +1,379 @@
+"""
+Export processed turns and repair annotations as partitioned Parquet datasets.
+
+Two Hive-partitioned datasets are written under ``data/columnar``:
+
+    data/columnar/
+    ├── manifest.json
+    ├── turns/week=1/part-0.parquet       # one row per turn
+    └── repairs/week=1/part-0.parquet     # one row per repair, all batches
+
+Speaker, initiation, resolution, batch and dialogue_id are dictionary-encoded
+columns. ``manifest.json`` records the SHA-256 of every source JSON file per
+partition; a rerun only rebuilds the weeks whose sources were added, changed
+or removed (size and mtime are checked before hashing), so the export is
+cheap after each pipeline run.
+
+Analytics jobs read only the columns and weeks they need:
+
+    from columnar_export import read_dataset
+    repairs = read_dataset("repairs", columns=["initiation", "resolution"], weeks=[1, 2])
+
+Usage:
+    python scripts/columnar_export.py                 # incremental export
+    python scripts/columnar_export.py --force         # rebuild every partition
+    python scripts/columnar_export.py --compare       # bytes and load time vs. the JSON tree
+"""
+import hashlib
+import json
+import re
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from artifact_writer import batched_directory_sync, write_bytes, write_json
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
+COLUMNAR_DIR = PROJECT_ROOT / "data" / "columnar"
+MANIFEST_NAME = "manifest.json"
+# Bump when a schema changes; older exports are rebuilt
+EXPORT_VERSION = 1
+PART_NAME = "part-0.parquet"
+COMPRESSION = "zstd"
+
+_SOURCE_NAME = re.compile(r"^S(\d+)_W(\d+)_T(\d+)")
+
+TURNS_SCHEMA = pa.schema([
+    ("dialogue_id", pa.dictionary(pa.int32(), pa.string())),
+    ("student_id", pa.int16()),
+    ("task", pa.int8()),
+    ("turn", pa.int32()),
+    ("speaker", pa.dictionary(pa.int8(), pa.string())),
+    ("text", pa.string()),
+    ("words", pa.int32()),
+    ("source_start", pa.int32()),
+    ("source_end", pa.int32()),
+])
+
+REPAIRS_SCHEMA = pa.schema([
+    ("batch", pa.dictionary(pa.int8(), pa.string())),
+    ("dialogue_id", pa.dictionary(pa.int32(), pa.string())),
+    ("student_id", pa.int16()),
+    ("task", pa.int8()),
+    ("repair_id", pa.int32()),
+    ("turn_indices", pa.list_(pa.int32())),
+    ("first_turn", pa.int32()),
+    ("last_turn", pa.int32()),
+    ("initiation", pa.dictionary(pa.int8(), pa.string())),
+    ("resolution", pa.dictionary(pa.int8(), pa.string())),
+    ("trigger", pa.string()),
+    ("evidence_summary", pa.string()),
+])
+
+WEEK_PARTITIONING = ds.partitioning(pa.schema([("week", pa.int8())]), flavor="hive")
+
+
+def _relative_path(path: Path) -> str:
+    try:
+        return path.resolve().relative_to(PROJECT_ROOT).as_posix()
+    except ValueError:
+        return path.resolve().as_posix()
+
+
+def _load_json(path: Path) -> Any:
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return json.load(f)
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def _dictionary_columns(schema: pa.Schema) -> List[str]:
+    return [field.name for field in schema if pa.types.is_dictionary(field.type)]
+
+
+def source_key(path: Path) -> Optional[Tuple[int, int, int]]:
+    """(student, week, task) of an S*_W*_T* source file, None for other names."""
+    match = _SOURCE_NAME.match(path.name)
+    return tuple(int(g) for g in match.groups()) if match else None
+
+
+def turns_table(dialogue_files: List[Path]) -> pa.Table:
+    """One row per turn of the given processed dialogue files."""
+    columns: Dict[str, List[Any]] = {field.name: [] for field in TURNS_SCHEMA}
+    for dialogue_file in dialogue_files:
+        student_id, _, task = source_key(dialogue_file)
+        dialogue = _load_json(dialogue_file)
+        turns = dialogue.get("turns", [])
+        spans = (dialogue.get("source_alignment") or {}).get("spans") or []
+        if len(spans) != len(turns):
+            spans = [None] * len(turns)
+        dialogue_id = dialogue.get("dialogue_id") or dialogue_file.stem
+        for position, (turn, span) in enumerate(zip(turns, spans), 1):
+            columns["dialogue_id"].append(dialogue_id)
+            columns["student_id"].append(student_id)
+            columns["task"].append(task)
+            columns["turn"].append(_int_or_none(turn.get("turn")) or position)
+            columns["speaker"].append(turn.get("speaker"))
+            columns["text"].append(turn.get("text", ""))
+            columns["source_start"].append(span[0] if span else None)
+            columns["source_end"].append(span[1] if span else None)
+
+    arrays = {field.name: pa.array(columns[field.name], type=field.type)
+              for field in TURNS_SCHEMA if field.name != "words"}
+    arrays["words"] = pc.count_substring_regex(arrays["text"], r"\S+").cast(pa.int32())
+    return pa.Table.from_pydict(arrays, schema=TURNS_SCHEMA)
+
+
+def repairs_table(repair_files: List[Path]) -> pa.Table:
+    """One row per repair of the given *_repairs.json files (batch = parent directory)."""
+    columns: Dict[str, List[Any]] = {field.name: [] for field in REPAIRS_SCHEMA}
+    for repair_file in repair_files:
+        student_id, _, task = source_key(repair_file)
+        repairs = _load_json(repair_file)
+        if not isinstance(repairs, list):
+            continue
+        for repair in repairs:
+            if not isinstance(repair, dict):
+                continue
+            turn_indices = [t for t in repair.get("turn_indices", []) if _int_or_none(t) is not None]
+            columns["batch"].append(repair_file.parent.name)
+            columns["dialogue_id"].append(str(repair.get("dialogue_id") or repair_file.name[:-len("_repairs.json")]))
+            columns["student_id"].append(student_id)
+            columns["task"].append(task)
+            columns["repair_id"].append(_int_or_none(repair.get("repair_id")))
+            columns["turn_indices"].append(turn_indices)
+            columns["first_turn"].append(min(turn_indices) if turn_indices else None)
+            columns["last_turn"].append(max(turn_indices) if turn_indices else None)
+            for field in ("initiation", "resolution", "trigger", "evidence_summary"):
+                value = repair.get(field)
+                columns[field].append(str(value) if value is not None else None)
+    return pa.Table.from_pydict({field.name: pa.array(columns[field.name], type=field.type)
+                                 for field in REPAIRS_SCHEMA}, schema=REPAIRS_SCHEMA)
+
+
+def parquet_bytes(table: pa.Table) -> bytes:
+    """Table as Parquet: dictionary-encoded categorical columns, zstd pages, statistics for pruning."""
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression=COMPRESSION,
+                   use_dictionary=_dictionary_columns(table.schema), write_statistics=True)
+    return sink.getvalue().to_pybytes()
+
+
+def _fingerprints(files: Iterable[Path], previous: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """SHA-256, size and mtime per source; files whose size and mtime are unchanged are not re-read."""
+    fingerprints = {}
+    for path in files:
+        key = _relative_path(path)
+        stat = path.stat()
+        old = previous.get(key)
+        if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+            fingerprints[key] = old
+        else:
+            fingerprints[key] = {"sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+                                 "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return fingerprints
+
+
+def _same_sources(old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]) -> bool:
+    return old.keys() == new.keys() and all(old[k]["sha256"] == new[k]["sha256"] for k in new)
+
+
+def export_dataset(
+    name: str,
+    files: List[Path],
+    build: Callable[[List[Path]], pa.Table],
+    output_dir: Path,
+    manifest: Dict[str, Any],
+    force: bool = False,
+    verbose: bool = True
+) -> Dict[str, Any]:
+    """
+    Bring one week-partitioned dataset up to date with its source files.
+
+    Args:
+        name: Dataset name (subdirectory of output_dir and manifest key)
+        files: All source files of the dataset (S*_W*_T* names)
+        build: Builds the table of one partition from its source files
+        output_dir: Root of the columnar export
+        manifest: Loaded manifest, updated in place
+        force: Rebuild every partition
+        verbose: Print one line per rebuilt or removed partition
+
+    Returns:
+        Dictionary with written, unchanged and removed weeks, rows and bytes
+    """
+    partitions = manifest["datasets"].setdefault(name, {})
+    by_week: Dict[int, List[Path]] = defaultdict(list)
+    for path in files:
+        key = source_key(path)
+        if key:
+            by_week[key[1]].append(path)
+
+    summary = {"written": [], "unchanged": [], "removed": [], "rows": 0, "bytes": 0}
+    for week in sorted(set(by_week) | {int(w) for w in partitions}):
+        part_path = output_dir / name / f"week={week}" / PART_NAME
+        entry = partitions.get(str(week))
+        if week not in by_week:
+            if part_path.exists():
+                part_path.unlink()
+            partitions.pop(str(week), None)
+            summary["removed"].append(week)
+            if verbose:
+                print(f"  [INFO] {name}/week={week}: removed (no sources)")
+            continue
+
+        sources = _fingerprints(sorted(by_week[week]), entry["sources"] if entry else {})
+        if (not force and entry and part_path.exists() and part_path.stat().st_size == entry["bytes"]
+                and _same_sources(entry["sources"], sources)):
+            entry["sources"] = sources
+            summary["unchanged"].append(week)
+        else:
+            table = build(sorted(by_week[week]))
+            data = parquet_bytes(table)
+            write_bytes(part_path, data)
+            entry = {"file": part_path.relative_to(output_dir).as_posix(), "rows": table.num_rows,
+                     "bytes": len(data), "sources": sources}
+            partitions[str(week)] = entry
+            summary["written"].append(week)
+            if verbose:
+                print(f"  [OK] {name}/week={week}: {table.num_rows} rows from {len(sources)} file(s)")
+        summary["rows"] += entry["rows"]
+        summary["bytes"] += entry["bytes"]
+    return summary
+
+
+def load_manifest(output_dir: Path = COLUMNAR_DIR) -> Dict[str, Any]:
+    """The export manifest (empty when missing or from another export version)."""
+    manifest_path = output_dir / MANIFEST_NAME
+    if manifest_path.exists():
+        try:
+            manifest = _load_json(manifest_path)
+            if manifest.get("version") == EXPORT_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+    return {"version": EXPORT_VERSION, "datasets": {}}
+
+
+@batched_directory_sync()
+def export_columnar(
+    processed_dir: Path = PROCESSED_DIR,
+    repairs_dir: Path = REPAIRS_DIR,
+    output_dir: Path = COLUMNAR_DIR,
+    force: bool = False,
+    verbose: bool = True
+) -> Dict[str, Any]:
+    """
+    Export the turns and repairs datasets, rebuilding only changed weeks.
+
+    Args:
+        processed_dir: Directory of processed S*_W*_T*.json dialogues
+        repairs_dir: Directory with one subdirectory per repair batch
+        output_dir: Root of the columnar export
+        force: Rebuild every partition
+        verbose: Print progress
+
+    Returns:
+        Per-dataset summaries (see export_dataset)
+    """
+    manifest = load_manifest(output_dir)
+    dialogue_files = [f for f in sorted(processed_dir.glob("S*_W*_T*.json")) if not f.name.endswith("_repairs.json")]
+    repair_files = sorted(repairs_dir.glob("*/S*_W*_T*_repairs.json"))
+
+    summary = {
+        "turns": export_dataset("turns", dialogue_files, turns_table, output_dir, manifest, force, verbose),
+        "repairs": export_dataset("repairs", repair_files, repairs_table, output_dir, manifest, force, verbose),
+    }
+    # Written last: an interrupted export leaves a stale manifest, so the next run redoes those weeks
+    write_json(output_dir / MANIFEST_NAME, manifest)
+    return summary
+
+
+def read_dataset(
+    name: str,
+    columns: Optional[List[str]] = None,
+    weeks: Optional[List[int]] = None,
+    output_dir: Path = COLUMNAR_DIR
+) -> pa.Table:
+    """
+    Read columns of an exported dataset, only touching the requested weeks.
+
+    Args:
+        name: 'turns' or 'repairs'
+        columns: Columns to read (None = all, including the 'week' partition column)
+        weeks: Weeks to read (None = all)
+        output_dir: Root of the columnar export
+
+    Returns:
+        Arrow table (use .to_pandas() for a DataFrame with categorical dictionary columns)
+    """
+    dataset = ds.dataset(output_dir / name, format="parquet", partitioning=WEEK_PARTITIONING)
+    week_filter = ds.field("week").isin(weeks) if weeks else None
+    return dataset.to_table(columns=columns, filter=week_filter)
+
+
+def compare_with_json(processed_dir: Path, repairs_dir: Path, output_dir: Path) -> None:
+    """Print bytes and load time of the JSON tree vs. the Parquet datasets."""
+    json_files = {"turns": sorted(processed_dir.glob("S*_W*_T*.json")),
+                  "repairs": sorted(repairs_dir.glob("*/S*_W*_T*_repairs.json"))}
+    queries = {"turns": ["speaker", "words"], "repairs": ["initiation", "resolution"]}
+    for name, files in json_files.items():
+        start = time.perf_counter()
+        for path in files:
+            _load_json(path)
+        json_seconds = time.perf_counter() - start
+        json_bytes = sum(path.stat().st_size for path in files)
+
+        start = time.perf_counter()
+        table = read_dataset(name, output_dir=output_dir)
+        parquet_seconds = time.perf_counter() - start
+        parquet_bytes_total = sum(p.stat().st_size for p in (output_dir / name).glob("week=*/*.parquet"))
+
+        start = time.perf_counter()
+        read_dataset(name, columns=queries[name], output_dir=output_dir)
+        column_seconds = time.perf_counter() - start
+
+        print(f"  {name}: {table.num_rows} rows")
+        print(f"    JSON:    {json_bytes / 2**20:7.2f} MiB in {len(files)} files, parsed in {json_seconds:.3f}s")
+        print(f"    Parquet: {parquet_bytes_total / 2**20:7.2f} MiB, all columns in {parquet_seconds:.3f}s, "
+              f"{'/'.join(queries[name])} in {column_seconds:.3f}s")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Export turns and repairs as week-partitioned Parquet")
+    parser.add_argument("--processed-dir", default=str(PROCESSED_DIR), help="Directory of processed dialogues")
+    parser.add_argument("--repairs-dir", default=str(REPAIRS_DIR), help="Directory of repair batches")
+    parser.add_argument("--output-dir", default=str(COLUMNAR_DIR), help="Root of the Parquet datasets")
+    parser.add_argument("--force", action="store_true", help="Rebuild every partition")
+    parser.add_argument("--compare", action="store_true", help="Compare size and load time with the JSON tree")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    args = parser.parse_args()
+    processed_dir, repairs_dir, output_dir = Path(args.processed_dir), Path(args.repairs_dir), Path(args.output_dir)
+
+    summary = export_columnar(processed_dir, repairs_dir, output_dir, force=args.force, verbose=not args.quiet)
+    for name, result in summary.items():
+        print(f"[OK] {name}: {result['rows']} rows in {len(result['written']) + len(result['unchanged'])} week(s), "
+              f"{len(result['written'])} rebuilt, {len(result['unchanged'])} unchanged, {len(result['removed'])} removed")
+    print(f"[INFO] Manifest: {output_dir / MANIFEST_NAME}")
+
+    if args.compare:
+        print()
+        compare_with_json(processed_dir, repairs_dir, output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+Columnar corpus analysis for notebooks/02_statistical_analysis.ipynb.
+
+The processed dialogues and repair annotations are loaded into typed pandas
+frames in one pass over the files:
+
+- ``turns``: one row per turn (categorical ``dialogue_id``/``speaker``,
+  Arrow-backed ``text`` when pyarrow is installed, vectorised ``words``)
+- ``repairs``: one row per repair (categorical ``initiation``/``resolution``/
+  ``trigger_category``)
+- ``dialogues``: per-dialogue features computed with group-bys over
+  ``turns`` and ``repairs`` (turn/repair counts, words per turn by speaker,
+  LI/BI/R/U-A/U-P counts)
+
+The week/student tables, the initiation x resolution contingency table and
+its chi-square test are plain functions of these frames, so the notebook and
+batch reports compute them the same way.
+
+Usage:
+    from corpus_analysis import load_corpus, weekly_statistics, chi_square_test
+    corpus = load_corpus()
+    weekly_statistics(corpus["dialogues"])
+
+    python scripts/corpus_analysis.py                      # production batch
+    python scripts/corpus_analysis.py --repairs-dir data/repairs/validation
+"""
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs" / "production"
+
+SPEAKERS = ("learner", "bot")
+INITIATIONS = ("LI", "BI")
+RESOLUTIONS = ("R", "U-A", "U-P")
+SIGNIFICANCE_LEVEL = 0.05
+
+# Codebook trigger categories, first matching pattern wins
+TRIGGER_CATEGORIES = (
+    ("ASR/Pronunciation", r"asr|pronunciation|misrecognition"),
+    ("Vocabulary/Lexical", r"vocabulary|lexical"),
+    ("Comprehension", r"comprehension|understand"),
+    ("Bot Misunderstanding", r"bot"),
+    ("Self-Correction", r"self"),
+    ("Unclear Phrasing", r"unclear|fragmented"),
+    ("Contextual Error", r"context"),
+)
+OTHER_TRIGGER = "Other"
+
+_DIALOGUE_ID = re.compile(r"^(?:S(?P<student_id>\d+)_)?W(?P<week>\d+)_T(?P<task>\d+)")
+
+try:
+    import pyarrow  # noqa: F401
+    TEXT_DTYPE = "string[pyarrow]"
+except ImportError:
+    TEXT_DTYPE = "string"
+
+
+def _categorical(values: Iterable[Any], known: Sequence[str] = ()) -> pd.Categorical:
+    """Categorical with the codebook categories first, then any other observed values."""
+    values = list(values)
+    extra = sorted({v for v in values if v not in known and v is not None}, key=str)
+    return pd.Categorical(values, categories=list(known) + extra)
+
+
+def _load_json(path: Path) -> Any:
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return json.load(f)
+
+
+def parse_dialogue_ids(dialogue_ids: Sequence[str]) -> pd.DataFrame:
+    """Student, week and task numbers of S*_W*_T* (or legacy W*_T*) dialogue ids, NaN where absent."""
+    parsed = pd.Series(list(dialogue_ids), dtype=TEXT_DTYPE).str.extract(_DIALOGUE_ID)
+    return parsed.apply(pd.to_numeric, downcast="integer")
+
+
+def load_turns(processed_dir: Path = PROCESSED_DIR) -> pd.DataFrame:
+    """
+    Load every processed dialogue into one turn-level frame.
+
+    Args:
+        processed_dir: Directory of S*_W*_T*.json dialogue files
+
+    Returns:
+        DataFrame with dialogue_id, student_id, week, task, turn, speaker,
+        text and words (whitespace-separated tokens), one row per turn
+    """
+    dialogue_ids: List[str] = []
+    turn_counts: List[int] = []
+    turn_numbers: List[int] = []
+    speakers: List[Optional[str]] = []
+    texts: List[str] = []
+
+    for dialogue_file in sorted(processed_dir.glob("*_T*.json")):
+        if dialogue_file.name.endswith("_repairs.json"):
+            continue
+        dialogue = _load_json(dialogue_file)
+        turns = dialogue.get("turns", [])
+        dialogue_ids.append(dialogue.get("dialogue_id") or dialogue_file.stem)
+        turn_counts.append(len(turns))
+        for position, turn in enumerate(turns, 1):
+            turn_numbers.append(turn.get("turn", position))
+            speakers.append(turn.get("speaker"))
+            texts.append(turn.get("text", ""))
+
+    # Identifiers are factorised and parsed once per dialogue, then repeated per turn
+    codes, unique_ids = pd.factorize(pd.Index(dialogue_ids, dtype=object))
+    turn_codes = np.repeat(codes, turn_counts)
+    parsed = parse_dialogue_ids(unique_ids)
+
+    text = pd.Series(texts, dtype=TEXT_DTYPE)
+    frame = pd.DataFrame({
+        "dialogue_id": pd.Categorical.from_codes(turn_codes, categories=unique_ids),
+        "student_id": parsed["student_id"].to_numpy()[turn_codes],
+        "week": parsed["week"].to_numpy()[turn_codes],
+        "task": parsed["task"].to_numpy()[turn_codes],
+        "turn": np.asarray(turn_numbers, dtype=np.int32),
+        "speaker": _categorical(speakers, SPEAKERS),
+        "text": text,
+        "words": text.str.count(r"\S+").fillna(0).astype(np.int32),
+    })
+    return frame
+
+
+def trigger_categories(triggers: pd.Series) -> pd.Categorical:
+    """Codebook category of each trigger description (case-insensitive keyword match)."""
+    lowered = triggers.astype(TEXT_DTYPE).str.lower().fillna("")
+    conditions = [lowered.str.contains(pattern, regex=True).to_numpy(dtype=bool)
+                  for _, pattern in TRIGGER_CATEGORIES]
+    labels = [label for label, _ in TRIGGER_CATEGORIES]
+    return pd.Categorical(np.select(conditions, labels, default=OTHER_TRIGGER),
+                          categories=labels + [OTHER_TRIGGER])
+
+
+def load_repairs(repairs_dir: Path = REPAIRS_DIR) -> pd.DataFrame:
+    """
+    Load every repair annotation of a batch into one repair-level frame.
+
+    Args:
+        repairs_dir: Directory of *_repairs.json files
+
+    Returns:
+        DataFrame with dialogue_id, repair_id, initiation, resolution, trigger,
+        trigger_category, num_turns_in_repair, first_turn and last_turn
+    """
+    columns: Dict[str, List[Any]] = {name: [] for name in (
+        "dialogue_id", "repair_id", "initiation", "resolution", "trigger",
+        "num_turns_in_repair", "first_turn", "last_turn")}
+
+    for repair_file in sorted(repairs_dir.glob("*_repairs.json")):
+        repairs = _load_json(repair_file)
+        if not isinstance(repairs, list):
+            continue
+        for repair in repairs:
+            if not isinstance(repair, dict):
+                continue
+            turn_indices = [t for t in repair.get("turn_indices", []) if isinstance(t, int)]
+            columns["dialogue_id"].append(repair.get("dialogue_id", "Unknown"))
+            columns["repair_id"].append(repair.get("repair_id", 0))
+            columns["initiation"].append(repair.get("initiation", "Unknown"))
+            columns["resolution"].append(repair.get("resolution", "Unknown"))
+            columns["trigger"].append(repair.get("trigger", "Unknown"))
+            columns["num_turns_in_repair"].append(len(repair.get("turn_indices", [])))
+            columns["first_turn"].append(min(turn_indices) if turn_indices else -1)
+            columns["last_turn"].append(max(turn_indices) if turn_indices else -1)
+
+    trigger = pd.Series(columns["trigger"], dtype=TEXT_DTYPE)
+    return pd.DataFrame({
+        "dialogue_id": pd.Categorical(columns["dialogue_id"]),
+        "repair_id": pd.to_numeric(pd.Series(columns["repair_id"], dtype=object), errors="coerce")
+                       .fillna(0).astype(np.int32),
+        "initiation": _categorical(columns["initiation"], INITIATIONS),
+        "resolution": _categorical(columns["resolution"], RESOLUTIONS),
+        "trigger": trigger,
+        "trigger_category": trigger_categories(trigger),
+        "num_turns_in_repair": np.asarray(columns["num_turns_in_repair"], dtype=np.int32),
+        "first_turn": np.asarray(columns["first_turn"], dtype=np.int32),
+        "last_turn": np.asarray(columns["last_turn"], dtype=np.int32),
+    })
+
+
+def dialogue_features(turns: pd.DataFrame, repairs: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-dialogue features from the turn and repair frames.
+
+    Repairs of dialogues that are not in ``turns`` are ignored. Word means
+    are 0 for dialogues without turns (of that speaker).
+
+    Returns:
+        DataFrame with dialogue_id, student_id, week, task, num_turns,
+        num_repairs, mean_words_per_turn, mean_learner_words, mean_bot_words,
+        li_count, bi_count, r_count, ua_count, up_count and unresolved_count
+    """
+    dialogue_ids = turns["dialogue_id"].cat.categories
+    features = parse_dialogue_ids(dialogue_ids).set_index(pd.Index(dialogue_ids, name="dialogue_id"))
+    by_dialogue = turns.groupby("dialogue_id", observed=False, sort=False)
+    features["num_turns"] = by_dialogue.size()
+    features["mean_words_per_turn"] = by_dialogue["words"].mean().fillna(0.0)
+
+    speaker_means = (turns.groupby(["dialogue_id", "speaker"], observed=True)["words"]
+                     .mean().unstack("speaker"))
+    for speaker in SPEAKERS:
+        column = speaker_means[speaker] if speaker in speaker_means else np.nan
+        features[f"mean_{speaker}_words"] = column
+    features[["mean_learner_words", "mean_bot_words"]] = features[["mean_learner_words", "mean_bot_words"]].fillna(0.0)
+
+    repair_dialogues = repairs["dialogue_id"].astype(str)
+    features["num_repairs"] = repair_dialogues.value_counts().reindex(features.index, fill_value=0)
+    for column, values in (("li_count", ("initiation", "LI")), ("bi_count", ("initiation", "BI")),
+                           ("r_count", ("resolution", "R")), ("ua_count", ("resolution", "U-A")),
+                           ("up_count", ("resolution", "U-P"))):
+        field, label = values
+        counts = repair_dialogues[repairs[field] == label].value_counts()
+        features[column] = counts.reindex(features.index, fill_value=0)
+    features["unresolved_count"] = features["ua_count"] + features["up_count"]
+
+    order = ["student_id", "week", "task", "num_turns", "num_repairs", "mean_words_per_turn",
+             "mean_learner_words", "mean_bot_words", "li_count", "bi_count", "r_count",
+             "ua_count", "up_count", "unresolved_count"]
+    return features[order].reset_index()
+
+
+def load_corpus(processed_dir: Path = PROCESSED_DIR, repairs_dir: Path = REPAIRS_DIR) -> Dict[str, pd.DataFrame]:
+    """
+    Load turns and repairs and compute the dialogue features.
+
+    Returns:
+        Dictionary with 'turns', 'repairs' and 'dialogues' frames
+    """
+    turns = load_turns(Path(processed_dir))
+    repairs = load_repairs(Path(repairs_dir))
+    return {"turns": turns, "repairs": repairs, "dialogues": dialogue_features(turns, repairs)}
+
+
+def descriptive_statistics(dialogues: pd.DataFrame, repairs: pd.DataFrame) -> pd.DataFrame:
+    """Codebook descriptive statistics as a one-column ('Value') frame, rounded to 2 decimals."""
+    descriptives = {
+        'Mean Repairs per Session': dialogues['num_repairs'].mean(),
+        'Median Repairs per Session': dialogues['num_repairs'].median(),
+        'SD Repairs per Session': dialogues['num_repairs'].std(),
+        'Min Repairs': dialogues['num_repairs'].min(),
+        'Max Repairs': dialogues['num_repairs'].max(),
+        'Mean Turns per Dialogue': dialogues['num_turns'].mean(),
+        'Median Turns per Dialogue': dialogues['num_turns'].median(),
+        'SD Turns per Dialogue': dialogues['num_turns'].std(),
+        'Mean Words per Turn': dialogues['mean_words_per_turn'].mean(),
+        'Mean Learner Words per Turn': dialogues['mean_learner_words'].mean(),
+        'Mean Bot Words per Turn': dialogues['mean_bot_words'].mean(),
+        'Total Dialogues': len(dialogues),
+        'Total Repair Sequences': len(repairs),
+    }
+    return pd.DataFrame({'Value': pd.Series(descriptives, dtype=float)}).round(2)
+
+
+def weekly_statistics(dialogues: pd.DataFrame) -> pd.DataFrame:
+    """Repairs, turns and words per turn by week."""
+    return dialogues.groupby('week').agg({
+        'num_repairs': ['mean', 'std', 'count'],
+        'num_turns': ['mean', 'std'],
+        'mean_words_per_turn': 'mean',
+    }).round(2)
+
+
+def student_statistics(dialogues: pd.DataFrame) -> pd.DataFrame:
+    """Repairs, turns and words per turn by student."""
+    return dialogues.groupby('student_id').agg({
+        'num_repairs': ['mean', 'std', 'sum', 'count'],
+        'num_turns': ['mean', 'std'],
+        'mean_words_per_turn': 'mean',
+    }).round(2)
+
+
+def contingency_table(repairs: pd.DataFrame, rows: str = 'initiation', columns: str = 'resolution',
+                      margins: bool = False, normalize: bool = False) -> pd.DataFrame:
+    """
+    Cross-tabulate two repair columns (initiation x resolution by default).
+
+    Only observed categories are included.
+
+    Args:
+        repairs: Repair-level frame
+        rows: Column for the table rows
+        columns: Column for the table columns
+        margins: Add 'Total' row and column
+        normalize: Row percentages instead of counts
+
+    Returns:
+        The contingency table
+    """
+    row_values = repairs[rows].astype(str)
+    column_values = repairs[columns].astype(str)
+    if normalize:
+        return pd.crosstab(row_values, column_values, normalize='index') * 100
+    return pd.crosstab(row_values, column_values, margins=margins, margins_name='Total')
+
+
+def chi_square_test(table: pd.DataFrame, alpha: float = SIGNIFICANCE_LEVEL) -> Dict[str, Any]:
+    """
+    Pearson chi-square test of independence on a contingency table.
+
+    Rows and columns without observations are dropped; tables smaller than
+    2x2 are not tested (test_performed False, p_value 1.0).
+
+    Args:
+        table: Contingency table of counts (without margins)
+        alpha: Significance level
+
+    Returns:
+        Dictionary with chi2_statistic, p_value, degrees_of_freedom,
+        significant, test_performed and expected (frequencies as a frame)
+    """
+    from scipy.stats import chi2_contingency
+
+    table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+    if table.shape[0] < 2 or table.shape[1] < 2:
+        return {'chi2_statistic': 0.0, 'p_value': 1.0, 'degrees_of_freedom': 0,
+                'significant': False, 'test_performed': False, 'expected': table.astype(float)}
+
+    chi2, p_value, dof, expected = chi2_contingency(table)
+    return {
+        'chi2_statistic': float(chi2),
+        'p_value': float(p_value),
+        'degrees_of_freedom': int(dof),
+        'significant': bool(p_value < alpha),
+        'test_performed': True,
+        'expected': pd.DataFrame(expected, index=table.index, columns=table.columns),
+    }
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Descriptive tables and chi-square test for a repair batch")
+    parser.add_argument("--processed-dir", default=str(PROCESSED_DIR), help="Directory of processed dialogues")
+    parser.add_argument("--repairs-dir", default=str(REPAIRS_DIR), help="Directory of *_repairs.json files")
+    args = parser.parse_args()
+
+    corpus = load_corpus(Path(args.processed_dir), Path(args.repairs_dir))
+    dialogues, repairs = corpus["dialogues"], corpus["repairs"]
+    print(f"[INFO] {len(dialogues)} dialogues, {len(corpus['turns'])} turns, {len(repairs)} repairs")
+
+    for title, table in (("DESCRIPTIVE STATISTICS", descriptive_statistics(dialogues, repairs)),
+                         ("STATISTICS BY WEEK", weekly_statistics(dialogues)),
+                         ("CONTINGENCY TABLE: Initiation × Resolution", contingency_table(repairs, margins=True))):
+        print("=" * 60)
+        print(title)
+        print("=" * 60)
+        print(table)
+        print()
+
+    result = chi_square_test(contingency_table(repairs))
+    print("=" * 60)
+    print("CHI-SQUARE TEST: Initiation × Resolution")
+    print("=" * 60)
+    if not result['test_performed']:
+        print("[WARNING] Contingency table is too small for a chi-square test (needs 2x2)")
+    else:
+        print(f"Chi-square statistic: {result['chi2_statistic']:.4f}")
+        print(f"Degrees of freedom: {result['degrees_of_freedom']}")
+        print(f"P-value: {result['p_value']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,40 @@
 """
 Cross-validate repairs against source dialogues and extracted text.
 Performs detailed quality checks.
+
+The checks are registered as "cross" rules of the validation engine, which
+runs them in its single pass over the corpus (see validation_engine.py).
 """
-import json
+import sys
 from pathlib import Path
-from typing import Dict, List, Any, Set, Tuple
-import re
+from typing import Dict, List, Any, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from artifact_writer import write_json
+from validation_engine import WORD_PATTERN, DialogueIndex, DialogueRecord, finding, load_record, rule, run_rules, run_validation
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
-EXTRACTED_TEXT_DIR = PROJECT_ROOT / "data" / "extracted_text"
-
-
-def load_dialogue(file_path: Path) -> Dict[str, Any]:
-    """Load a dialogue JSON file."""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-
-def load_repairs(dialogue_file: Path) -> List[Dict[str, Any]]:
-    """Load repair annotations for a dialogue."""
-    dialogue_name = dialogue_file.stem
-    
-    # Check all batch directories
-    for batch_dir in REPAIRS_DIR.iterdir():
-        if batch_dir.is_dir():
-            repair_file = batch_dir / f"{dialogue_name}_repairs.json"
-            if repair_file.exists():
-                with open(repair_file, 'r', encoding='utf-8') as f:
-                    repairs = json.load(f)
-                    return repairs if isinstance(repairs, list) else []
-    return []
-
 
-def load_extracted_text(dialogue_file: Path) -> str:
-    """Load extracted source text if available."""
-    # Try to find extracted text file
-    student_id = dialogue_file.stem.split('_')[0]
-    week = dialogue_file.stem.split('_')[1]
-    
-    extracted_file = EXTRACTED_TEXT_DIR / f"{student_id}_{week}.txt"
-    if extracted_file.exists():
-        with open(extracted_file, 'r', encoding='utf-8') as f:
-            return f.read()
-    
-    return ""
+# Substrings that signal communication trouble or a repair attempt in a turn
+TROUBLE_KEYWORDS = ['understand', 'repeat', 'clarify', 'confus', 'sorry', 'mean']
 
 
-def get_turn_text(dialogue_data: Dict[str, Any], turn_num: int) -> str:
-    """Get text of a specific turn."""
-    turns = dialogue_data.get('turns', [])
-    for turn in turns:
-        if turn.get('turn') == turn_num:
-            return turn.get('text', '')
-    return ""
+def get_turn_text(dialogue_data: Dict[str, Any], turn_num: int, index: Optional[DialogueIndex] = None) -> str:
+    """Get text of a specific turn (O(1) with a prebuilt index of the dialogue)."""
+    index = index or DialogueIndex.from_dialogue(dialogue_data)
+    return index.turn_text(turn_num)
 
 
-def validate_repair_turn_indices(repair: Dict[str, Any], dialogue_data: Dict[str, Any]) -> List[str]:
+def validate_repair_turn_indices(repair: Dict[str, Any], dialogue_data: Dict[str, Any],
+                                 index: Optional[DialogueIndex] = None) -> List[str]:
     """Validate turn indices are correct and turns exist."""
     issues = []
     
-    turns = dialogue_data.get('turns', [])
-    max_turn = max([t.get('turn', 0) for t in turns], default=0)
+    index = index or DialogueIndex.from_dialogue(dialogue_data)
+    max_turn = index.max_turn
     
     turn_indices = repair.get('turn_indices', [])
     
@@ -73,17 +45,18 @@ def validate_repair_turn_indices(repair: Dict[str, Any], dialogue_data: Dict[str
             issues.append(f"Turn index {turn_idx} exceeds maximum turn {max_turn} in dialogue")
         else:
             # Verify turn exists
-            turn_exists = any(t.get('turn') == turn_idx for t in turns)
-            if not turn_exists:
+            if not index.has_turn(turn_idx):
                 issues.append(f"Turn {turn_idx} does not exist in dialogue turns")
     
     return issues
 
 
-def cross_validate_repair_content(repair: Dict[str, Any], dialogue_data: Dict[str, Any], source_text: str) -> List[str]:
+def cross_validate_repair_content(repair: Dict[str, Any], dialogue_data: Dict[str, Any], source_text: str,
+                                  index: Optional[DialogueIndex] = None) -> Tuple[List[str], List[str]]:
     """Cross-validate repair content against dialogue and source."""
     issues = []
     warnings = []
+    index = index or DialogueIndex.from_dialogue(dialogue_data)
     
     turn_indices = repair.get('turn_indices', [])
     trigger = repair.get('trigger', '')
@@ -95,7 +68,7 @@ def cross_validate_repair_content(repair: Dict[str, Any], dialogue_data: Dict[st
     if len(turn_indices) > 0:
         repair_turns = []
         for turn_idx in turn_indices:
-            turn_text = get_turn_text(dialogue_data, turn_idx)
+            turn_text = index.turn_text(turn_idx)
             if turn_text:
                 repair_turns.append((turn_idx, turn_text))
         
@@ -109,12 +82,7 @@ def cross_validate_repair_content(repair: Dict[str, Any], dialogue_data: Dict[st
         # Validate initiation matches actual dialogue
         if turn_indices:
             first_turn_idx = min(turn_indices)
-            first_turn = get_turn_text(dialogue_data, first_turn_idx)
-            first_turn_speaker = None
-            for turn in dialogue_data.get('turns', []):
-                if turn.get('turn') == first_turn_idx:
-                    first_turn_speaker = turn.get('speaker')
-                    break
+            first_turn_speaker = index.turn_speaker(first_turn_idx)
             
             # Check if initiation type matches speaker
             if first_turn_speaker:
@@ -129,7 +97,7 @@ def cross_validate_repair_content(repair: Dict[str, Any], dialogue_data: Dict[st
             trigger_lower = trigger.lower()
             found_keywords = False
             for turn_idx, turn_text in repair_turns:
-                if any(keyword in turn_text.lower() for keyword in ['understand', 'repeat', 'clarify', 'confus', 'sorry', 'mean']):
+                if any(keyword in turn_text.lower() for keyword in TROUBLE_KEYWORDS):
                     found_keywords = True
                     break
             
@@ -139,12 +107,10 @@ def cross_validate_repair_content(repair: Dict[str, Any], dialogue_data: Dict[st
         # Validate resolution makes sense
         if turn_indices:
             last_turn_idx = max(turn_indices)
-            last_turn = get_turn_text(dialogue_data, last_turn_idx)
             
             if resolution == "R":
                 # Check if conversation continues smoothly after
-                all_turns = dialogue_data.get('turns', [])
-                last_turn_idx_in_dialogue = max([t.get('turn', 0) for t in all_turns], default=0)
+                last_turn_idx_in_dialogue = index.max_turn
                 
                 # If repair ends near the end of dialogue, resolution might be uncertain
                 if last_turn_idx >= last_turn_idx_in_dialogue - 2:
@@ -152,16 +118,13 @@ def cross_validate_repair_content(repair: Dict[str, Any], dialogue_data: Dict[st
     
     # Check evidence summary mentions actual turn content
     if evidence and turn_indices:
-        evidence_lower = evidence.lower()
+        evidence_words = set(WORD_PATTERN.findall(evidence.lower()))
         some_turn_mentioned = False
         
         for turn_idx in turn_indices[:3]:  # Check first 3 turns
-            turn_text = get_turn_text(dialogue_data, turn_idx)
-            if turn_text:
+            if index.turn_text(turn_idx):
                 # Check if any words from turn appear in evidence
-                turn_words = set(re.findall(r'\b\w+\b', turn_text.lower()))
-                evidence_words = set(re.findall(r'\b\w+\b', evidence_lower))
-                if turn_words & evidence_words:
+                if index.turn_tokens(turn_idx) & evidence_words:
                     some_turn_mentioned = True
                     break
         
@@ -171,12 +134,20 @@ def cross_validate_repair_content(repair: Dict[str, Any], dialogue_data: Dict[st
     return issues, warnings
 
 
-def cross_validate_dialogue(dialogue_file: Path) -> Dict[str, Any]:
-    """Cross-validate a single dialogue and its repairs."""
-    dialogue_name = dialogue_file.stem
-    
+@rule("cross", scope="repair")
+def repair_turn_indices_rule(record: DialogueRecord, position: int, repair: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [finding("error", issue) for issue in validate_repair_turn_indices(repair, record.data, record.index)]
+
+
+@rule("cross", scope="repair")
+def repair_content_rule(record: DialogueRecord, position: int, repair: Dict[str, Any]) -> List[Dict[str, Any]]:
+    issues, warnings = cross_validate_repair_content(repair, record.data, record.source_text, record.index)
+    return [finding("error", issue) for issue in issues] + [finding("warning", warning) for warning in warnings]
+
+
+def _dialogue_result(record: DialogueRecord) -> Dict[str, Any]:
     result = {
-        'dialogue_file': dialogue_name,
+        'dialogue_file': record.name,
         'has_repairs': False,
         'repair_count': 0,
         'issues': [],
@@ -185,9 +156,8 @@ def cross_validate_dialogue(dialogue_file: Path) -> Dict[str, Any]:
     }
     
     try:
-        dialogue_data = load_dialogue(dialogue_file)
-        repairs = load_repairs(dialogue_file)
-        source_text = load_extracted_text(dialogue_file)
+        record.require()
+        repairs = record.repairs
         
         if not repairs:
             return result
@@ -195,24 +165,14 @@ def cross_validate_dialogue(dialogue_file: Path) -> Dict[str, Any]:
         result['has_repairs'] = True
         result['repair_count'] = len(repairs)
         
-        all_issues = []
-        all_warnings = []
-        
-        for repair in repairs:
-            # Validate turn indices
-            turn_issues = validate_repair_turn_indices(repair, dialogue_data)
-            all_issues.extend([f"Repair {repair.get('repair_id')}: {issue}" for issue in turn_issues])
-            
-            # Cross-validate content
-            content_issues, content_warnings = cross_validate_repair_content(repair, dialogue_data, source_text)
-            all_issues.extend([f"Repair {repair.get('repair_id')}: {issue}" for issue in content_issues])
-            all_warnings.extend([f"Repair {repair.get('repair_id')}: {warning}" for warning in content_warnings])
+        findings = run_rules("cross", record)
+        all_issues = [f"Repair {f['repair_id']}: {f['message']}" for f in findings if f['severity'] == "error"]
+        all_warnings = [f"Repair {f['repair_id']}: {f['message']}" for f in findings if f['severity'] == "warning"]
         
         result['issues'] = all_issues
         result['warnings'] = all_warnings
         
         # Calculate validation score (1.0 = perfect, lower = more issues)
-        total_checks = len(repairs) * 5  # Rough estimate
         issue_count = len(all_issues)
         warning_count = len(all_warnings)
         
@@ -225,24 +185,47 @@ def cross_validate_dialogue(dialogue_file: Path) -> Dict[str, Any]:
     return result
 
 
-def cross_validate_all() -> Dict[str, Any]:
+def file_result(record: DialogueRecord) -> Optional[Dict[str, Any]]:
+    """Per-dialogue result of the "cross" report; None for dialogues without repairs."""
+    if not record.repairs:
+        return None
+    return _dialogue_result(record)
+
+
+def cross_validate_dialogue(dialogue_file: Path, repairs_dir: Path = REPAIRS_DIR) -> Dict[str, Any]:
+    """Cross-validate a single dialogue and its repairs."""
+    return _dialogue_result(load_record(dialogue_file, repairs_dir))
+
+
+def cross_validate_all(processed_dir: Path = PROCESSED_DIR, repairs_dir: Path = REPAIRS_DIR) -> Dict[str, Any]:
     """Cross-validate all dialogues."""
+    run = run_validation(processed_dir, repairs_dir, ["cross"], verbose=False)
+    return write_report(run['results']['cross'], run['total_dialogues'], processed_dir, repairs_dir)
+
+
+def write_report(results: List[Dict[str, Any]], total_dialogues: int,
+                 processed_dir: Path = PROCESSED_DIR, repairs_dir: Path = REPAIRS_DIR) -> Dict[str, Any]:
+    """
+    Summarise cross-validation results, print them and save CROSS_VALIDATION_REPORT.json.
+    
+    Args:
+        results: Per-dialogue results from file_result (dialogues with repairs)
+        total_dialogues: Number of dialogue files validated
+        processed_dir: Directory with processed dialogue JSON files
+        repairs_dir: Directory where CROSS_VALIDATION_REPORT.json is written
+    
+    Returns:
+        The saved report
+    """
     print("=" * 80)
     print("CROSS-VALIDATION OF REPAIR DETECTION RESULTS")
     print("=" * 80)
     print()
-    
-    # Get all dialogue files
-    new_files = sorted(PROCESSED_DIR.glob('S*_W*_T*.json'))
-    legacy_files = sorted(PROCESSED_DIR.glob('W*_T*.json'))
-    all_dialogue_files = sorted(set(new_files) | set(legacy_files))
-    
-    print(f"Found {len(all_dialogue_files)} dialogue files to cross-validate")
+    print(f"Found {total_dialogues} dialogue files to cross-validate")
     print()
     
-    results = []
     summary = {
-        'total_dialogues': len(all_dialogue_files),
+        'total_dialogues': total_dialogues,
         'dialogues_with_repairs': 0,
         'total_repairs': 0,
         'total_issues': 0,
@@ -252,18 +235,7 @@ def cross_validate_all() -> Dict[str, Any]:
         'average_validation_score': 0.0
     }
     
-    # Validate files with repairs
-    for i, dialogue_file in enumerate(all_dialogue_files, 1):
-        repairs = load_repairs(dialogue_file)
-        if not repairs:
-            continue
-        
-        if i % 20 == 0:
-            print(f"Cross-validating... {i}/{len(all_dialogue_files)} (files with repairs)")
-        
-        result = cross_validate_dialogue(dialogue_file)
-        results.append(result)
-        
+    for result in results:
         summary['dialogues_with_repairs'] += 1
         summary['total_repairs'] += result['repair_count']
         summary['total_issues'] += len(result['issues'])
@@ -320,9 +292,8 @@ def cross_validate_all() -> Dict[str, Any]:
         ]
     }
     
-    output_file = REPAIRS_DIR / 'CROSS_VALIDATION_REPORT.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(report, f, indent=2, ensure_ascii=False)
+    output_file = repairs_dir / 'CROSS_VALIDATION_REPORT.json'
+    write_json(output_file, report)
     
     print(f"\n✅ Cross-validation report saved to: {output_file}")
     print("=" * 80)
@@ -0,0 +1,290 @@
+"""
+Pluggable repair detector backends.
+
+Every backend exposes the same interface (``RepairDetectorBackend``), so the
+runners, calibration and benchmarks can switch between Gemini, OpenAI and a
+deterministic offline detector without changing call sites:
+
+    backend = create_backend("local")
+    backend.prepare()
+    repairs = backend.detect(dialogue_data)
+
+Provider SDKs are imported only when the corresponding backend is prepared,
+so the local backend runs without API keys or network access.
+"""
+from typing import Any, Callable, Dict, List, Optional, Protocol
+
+from cross_validate_repairs import TROUBLE_KEYWORDS
+
+RepairCallback = Callable[[Dict[str, Any]], None]
+
+DEFAULT_BACKEND = "gemini"
+
+
+class RepairDetectorBackend(Protocol):
+    """Common interface for repair detectors."""
+
+    name: str
+
+    def prepare(self) -> None:
+        """Initialise clients/models; raise if the backend cannot be used."""
+        ...
+
+    def describe(self) -> str:
+        """Human-readable backend and model name for logs."""
+        ...
+
+    def detect(
+        self,
+        dialogue_data: Dict[str, Any],
+        stream: bool = False,
+        on_repair: Optional[RepairCallback] = None
+    ) -> List[Dict[str, Any]]:
+        """Return repair annotations for a dialogue."""
+        ...
+
+
+class GeminiBackend:
+    """Gemini detector (``repair_detector.detect_repairs``)."""
+
+    name = "gemini"
+
+    def __init__(
+        self,
+        model=None,
+        model_name: Optional[str] = None,
+        temperature: Optional[float] = None,
+        raise_errors: bool = False
+    ):
+        self.model = model
+        self.model_name = model_name
+        self.temperature = temperature
+        self.raise_errors = raise_errors
+
+    def prepare(self) -> None:
+        if self.model is None:
+            from repair_detector import get_gemini_model
+            self.model = get_gemini_model(self.model_name)
+
+    def describe(self) -> str:
+        model_name = getattr(self.model, "_model_name", None) or self.model_name or "auto"
+        return f"{self.name} ({model_name})"
+
+    def detect(self, dialogue_data, stream=False, on_repair=None):
+        from repair_detector import detect_repairs
+        self.prepare()
+        options = {"raise_errors": self.raise_errors}
+        if self.temperature is not None:
+            options["temperature"] = self.temperature
+        return detect_repairs(dialogue_data, model=self.model, stream=stream, on_repair=on_repair, **options)
+
+
+class OpenAIBackend:
+    """
+    OpenAI detector: plain prompt (``detect_repairs_gpt``) or enhanced few-shot prompt.
+
+    The enhanced prompt retrieves the most similar validated repairs as its
+    few-shot examples (``few_shot_index``); with ``dynamic_examples=False``, or
+    when no labelled repairs are available, it uses the static examples.
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        enhanced: bool = False,
+        client=None,
+        temperature: Optional[float] = None,
+        dynamic_examples: bool = True,
+        raise_errors: bool = False
+    ):
+        self.enhanced = enhanced
+        self.name = "openai-enhanced" if enhanced else "openai"
+        self.model_name = model or ("gpt-4o" if enhanced else "gpt-4-turbo-preview")
+        self.client = client
+        self.temperature = temperature
+        self.dynamic_examples = dynamic_examples
+        self.few_shot_index = None
+        self.raise_errors = raise_errors
+
+    def prepare(self) -> None:
+        if self.client is None:
+            from repair_detector_gpt import get_openai_client
+            self.client = get_openai_client()
+        if self.enhanced and self.dynamic_examples and self.few_shot_index is None:
+            from few_shot_index import load_or_build_index
+            try:
+                self.few_shot_index = load_or_build_index()
+            except ValueError as e:
+                print(f"[WARNING] Few-shot index unavailable, using static examples: {e}")
+                self.dynamic_examples = False
+
+    def describe(self) -> str:
+        return f"{self.name} ({self.model_name})"
+
+    def detect(self, dialogue_data, stream=False, on_repair=None):
+        self.prepare()
+        options = {"raise_errors": self.raise_errors}
+        if self.temperature is not None:
+            options["temperature"] = self.temperature
+        if self.enhanced:
+            from repair_detector_enhanced import detect_repairs_enhanced
+            return detect_repairs_enhanced(
+                dialogue_data,
+                model=self.model_name,
+                client=self.client,
+                stream=stream,
+                on_repair=on_repair,
+                few_shot_index=self.few_shot_index,
+                **options
+            )
+
+        from repair_detector_gpt import detect_repairs_gpt
+        return detect_repairs_gpt(
+            dialogue_data,
+            model=self.model_name,
+            client=self.client,
+            stream=stream,
+            on_repair=on_repair,
+            **options
+        )
+
+
+class LocalRuleBackend:
+    """
+    Deterministic, offline rule-based detector.
+
+    A turn containing one of ``TROUBLE_KEYWORDS`` is a trouble signal. Each
+    signal covers the turn before it (the likely trouble source), itself and
+    the reply after it; overlapping or adjacent windows merge into one repair.
+    Initiation follows the speaker of the first signal. Resolution is U-P
+    when the learner signals trouble more than once in the same episode, U-A
+    when the episode runs to the end of the dialogue, and R otherwise.
+
+    Much less accurate than the LLM backends; meant for offline runs,
+    throughput/regression testing and cheap pre-screening.
+    """
+
+    name = "local"
+
+    def __init__(self, keywords: Optional[List[str]] = None, context: int = 1):
+        self.keywords = [k.lower() for k in (keywords or TROUBLE_KEYWORDS)]
+        self.context = context
+
+    def prepare(self) -> None:
+        pass
+
+    def describe(self) -> str:
+        return f"{self.name} (rule-based, {len(self.keywords)} keywords)"
+
+    def find_signals(self, turns: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return the turns that contain a trouble keyword, with the keyword hit."""
+        signals = []
+        for turn in turns:
+            text = turn.get('text', '').lower()
+            hit = next((k for k in self.keywords if k in text), None)
+            if hit is not None:
+                signals.append({'turn': turn.get('turn'), 'speaker': turn.get('speaker'), 'keyword': hit})
+        return signals
+
+    def detect(self, dialogue_data, stream=False, on_repair=None):
+        turns = dialogue_data.get('turns', [])
+        dialogue_id = dialogue_data.get('dialogue_id', 'UNKNOWN')
+        turn_numbers = sorted(t.get('turn') for t in turns if isinstance(t.get('turn'), int))
+        if not turn_numbers:
+            return []
+        first_turn, last_turn = turn_numbers[0], turn_numbers[-1]
+
+        # Group signals into episodes of overlapping/adjacent windows
+        episodes = []
+        for signal in self.find_signals(turns):
+            if not isinstance(signal['turn'], int):
+                continue
+            start = max(first_turn, signal['turn'] - self.context)
+            end = min(last_turn, signal['turn'] + self.context)
+            if episodes and start <= episodes[-1]['end'] + 1:
+                episodes[-1]['end'] = max(episodes[-1]['end'], end)
+                episodes[-1]['signals'].append(signal)
+            else:
+                episodes.append({'start': start, 'end': end, 'signals': [signal]})
+
+        existing = set(turn_numbers)
+        repairs = []
+        for repair_id, episode in enumerate(episodes, 1):
+            first_signal = episode['signals'][0]
+            learner_signals = sum(1 for s in episode['signals'] if s['speaker'] == 'learner')
+            if learner_signals > 1:
+                resolution = "U-P"
+            elif episode['end'] >= last_turn:
+                resolution = "U-A"
+            else:
+                resolution = "R"
+
+            keywords = sorted({s['keyword'] for s in episode['signals']})
+            repair = {
+                "dialogue_id": dialogue_id,
+                "repair_id": repair_id,
+                "turn_indices": [t for t in range(episode['start'], episode['end'] + 1) if t in existing],
+                "initiation": "LI" if first_signal['speaker'] == 'learner' else "BI",
+                "resolution": resolution,
+                "trigger": f"other – trouble keyword ({', '.join(keywords)})",
+                "evidence_summary": (
+                    f"Rule-based detection: turn {first_signal['turn']} ({first_signal['speaker']}) "
+                    f"contains '{first_signal['keyword']}'; {len(episode['signals'])} signal(s) in the episode."
+                ),
+            }
+            repairs.append(repair)
+            if on_repair is not None:
+                on_repair(repair)
+
+        return repairs
+
+
+# Backends whose output may replace the reference LLM labels in data/repairs/production;
+# the rule-based and ensemble backends write to a separate directory by default
+REFERENCE_BACKENDS = ("gemini", "openai", "openai-enhanced")
+
+BACKENDS = {
+    "gemini": lambda model=None, **options: GeminiBackend(model_name=model, **options),
+    "openai": lambda model=None, **options: OpenAIBackend(model=model, enhanced=False, **options),
+    "openai-enhanced": lambda model=None, **options: OpenAIBackend(model=model, enhanced=True, **options),
+    "local": lambda model=None, **options: LocalRuleBackend(**options),
+    "cascade": lambda model=None, **options: _create_cascade(model, **options),
+    "self-consistency": lambda model=None, **options: _create_self_consistency(model, **options),
+}
+
+
+def _create_cascade(model: Optional[str] = None, **options) -> RepairDetectorBackend:
+    # Imported here: repair_cascade builds on this module
+    from repair_cascade import CascadeBackend
+    return CascadeBackend(cheap_model=model, **options)
+
+
+def _create_self_consistency(model: Optional[str] = None, **options) -> RepairDetectorBackend:
+    from self_consistency import SelfConsistencyBackend
+    return SelfConsistencyBackend(model=model, **options)
+
+
+def create_backend(name: str, model: Optional[str] = None, **options) -> RepairDetectorBackend:
+    """
+    Create a detector backend by name.
+
+    Args:
+        name: One of ``BACKENDS`` (gemini, openai, openai-enhanced, local, cascade, self-consistency)
+        model: Optional model name for LLM backends
+        **options: Backend-specific keyword arguments
+
+    Returns:
+        A backend instance (not yet prepared)
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown detector backend: {name}. Available: {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name](model=model, **options)
+
+
+def backend_from_config(config: Dict[str, Any], name: Optional[str] = None, model: Optional[str] = None) -> RepairDetectorBackend:
+    """Create the backend selected on the command line, falling back to the config file."""
+    settings = config.get("repair_detection", {})
+    return create_backend(
+        name or settings.get("backend", DEFAULT_BACKEND),
+        model=model or settings.get("model"),
+    )
@@ -2,10 +2,11 @@
 Dialogue parsing utilities to extract and normalize speaker turns.
 """
 import re
-import json
 from typing import List, Dict, Optional, Tuple, Any
 from pathlib import Path
 
+from artifact_writer import write_json
+
 
 class DialogueParser:
     """Parser for extracting and normalizing dialogue turns from text."""
@@ -713,11 +714,11 @@ class DialogueParser:
         turns: List[Dict],
         output_path: str,
         student_id: Optional[int] = None,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        compact: bool = False
     ) -> None:
-        """Save dialogue turns to JSON file."""
+        """Save dialogue turns to JSON file (atomically; compact drops the indentation)."""
         output_path = Path(output_path)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
         
         # Add metadata if student_id is provided
         if metadata:
@@ -732,8 +733,7 @@ class DialogueParser:
         else:
             output_data = turns
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        write_json(output_path, output_data, compact=compact)
         
         print(f"Saved dialogue to: {output_path} ({len(turns)} turns)")
 
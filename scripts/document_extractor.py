@@ -1,27 +1,19 @@
 """
 Document extraction utilities for Word and PDF files.
+
+python-docx, pdfplumber and PyPDF2 are imported on first use, so importing
+this module (e.g. for validation) does not pay for the document libraries.
 """
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from typing import Optional, Tuple
 
-try:
-    from docx import Document
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
-
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+from artifact_writer import write_text
 
-try:
-    import PyPDF2
-    PYPDF2_AVAILABLE = True
-except ImportError:
-    PYPDF2_AVAILABLE = False
+DOCX_AVAILABLE = find_spec("docx") is not None
+PDFPLUMBER_AVAILABLE = find_spec("pdfplumber") is not None
+PYPDF2_AVAILABLE = find_spec("PyPDF2") is not None
 
 
 def extract_text_from_docx(file_path: str) -> str:
@@ -37,6 +29,7 @@ def extract_text_from_docx(file_path: str) -> str:
     if not DOCX_AVAILABLE:
         raise ImportError("python-docx is required. Install with: pip install python-docx")
     
+    from docx import Document
     doc = Document(file_path)
     text_parts = []
     
@@ -63,6 +56,7 @@ def extract_text_from_pdf(file_path: str, extract_colors: bool = False) -> str:
     # Try pdfplumber first (better for formatted text and color extraction)
     if PDFPLUMBER_AVAILABLE:
         try:
+            import pdfplumber
             with pdfplumber.open(file_path) as pdf:
                 for page in pdf.pages:
                     if extract_colors:
@@ -93,6 +87,7 @@ def extract_text_from_pdf(file_path: str, extract_colors: bool = False) -> str:
     # Fallback to PyPDF2 (no color support)
     if PYPDF2_AVAILABLE:
         try:
+            import PyPDF2
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 for page in pdf_reader.pages:
@@ -122,7 +117,7 @@ def extract_text_with_colors_from_pdf(file_path: str) -> list:
 
 def extract_text(file_path: str) -> str:
     """
-    Extract text from a document (Word or PDF).
+    Extract text from a document (Word, PDF or plain text).
     
     Args:
         file_path: Path to the document file
@@ -141,23 +136,22 @@ def extract_text(file_path: str) -> str:
         return extract_text_from_docx(str(file_path))
     elif suffix == '.pdf':
         return extract_text_from_pdf(str(file_path))
+    elif suffix == '.txt':
+        return file_path.read_text(encoding='utf-8-sig')
     else:
-        raise ValueError(f"Unsupported file type: {suffix}. Supported: .docx, .pdf")
+        raise ValueError(f"Unsupported file type: {suffix}. Supported: .docx, .pdf, .txt")
 
 
 def save_extracted_text(text: str, output_path: str) -> None:
     """
-    Save extracted text to a file.
+    Save extracted text to a file (atomically, so a rerun never sees a partial file).
     
     Args:
         text: Text content to save
         output_path: Path where to save the text file
     """
     output_path = Path(output_path)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(text)
+    write_text(output_path, text)
     
     print(f"Saved extracted text to: {output_path}")
 
@@ -0,0 +1,296 @@
+"""
+Retrieval-based few-shot example selection for the enhanced detector.
+
+All validated repair annotations are turned into formatted few-shot examples
+once and stored with a hashed TF-IDF vector per example (rows of a NumPy
+matrix, L2-normalised). At request time the target dialogue is vectorised the
+same way and one matrix-vector product ranks every example; the top matches
+are added until a token budget is reached, so prompt size stays bounded as the
+example pool grows.
+
+Examples from the dialogue being annotated are never selected (no label
+leakage during calibration).
+
+The index is cached in ``data/repairs/few_shot_index.npz`` and rebuilt
+automatically when any source repair or dialogue file changes.
+
+Usage:
+    python scripts/few_shot_index.py                       # build and report
+    python scripts/few_shot_index.py --query S18_W2_T1     # show selected examples
+"""
+import json
+import re
+import sys
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from create_few_shot_examples import create_few_shot_example
+from repair_prefilter import load_labelled_dialogues
+from repair_schema import repair_schema_issues
+from validate_repair_results import validate_repair_against_dialogue
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
+INDEX_PATH = REPAIRS_DIR / "few_shot_index.npz"
+
+# Label sets in priority order: a dialogue labelled in several sets uses the first
+LABEL_SETS = ("validation", "pilot", "production")
+
+N_FEATURES = 2 ** 12
+DEFAULT_K = 3
+DEFAULT_TOKEN_BUDGET = 1500
+CHARS_PER_TOKEN = 4  # Rough estimate for English prompt text
+
+_TOKEN = re.compile(r"[a-z']+")
+
+FEW_SHOT_HEADER = """
+===============================
+FEW-SHOT EXAMPLES
+===============================
+
+These examples show correct repair annotations from real dialogues. Study them carefully to understand the expected format and reasoning.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (no tokenizer dependency)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def hashed_counts(text: str, n_features: int = N_FEATURES) -> np.ndarray:
+    """Term counts of unigrams and bigrams, hashed into ``n_features`` buckets."""
+    words = _TOKEN.findall(text.lower())
+    terms = words + [a + " " + b for a, b in zip(words, words[1:])]
+    buckets = np.fromiter((zlib.crc32(t.encode("utf-8")) % n_features for t in terms), dtype=np.int64, count=len(terms))
+    return np.bincount(buckets, minlength=n_features).astype(np.float32)
+
+
+def _tfidf(counts: np.ndarray, idf: np.ndarray) -> np.ndarray:
+    """Sublinear TF-IDF with L2-normalised rows (works on a vector or a matrix)."""
+    weights = np.log1p(counts) * idf
+    norms = np.linalg.norm(weights, axis=-1, keepdims=True)
+    return weights / np.where(norms == 0, 1, norms)
+
+
+def dialogue_text(dialogue_data: Dict[str, Any], turn_indices: Optional[Sequence[int]] = None) -> str:
+    """Concatenate turn texts (optionally only the given turns)."""
+    wanted = set(turn_indices) if turn_indices is not None else None
+    return "\n".join(
+        turn.get('text', '') for turn in dialogue_data.get('turns', [])
+        if wanted is None or turn.get('turn') in wanted
+    )
+
+
+def source_fingerprint(processed_dir: Path, repairs_dir: Path, label_sets: Sequence[str] = LABEL_SETS) -> str:
+    """Checksum over the names, sizes and mtimes of every source file."""
+    parts = []
+    for label_set in label_sets:
+        for repair_file in sorted((repairs_dir / label_set).glob("*_repairs.json")):
+            dialogue_file = processed_dir / repair_file.name.replace("_repairs", "")
+            for path in (repair_file, dialogue_file):
+                if path.exists():
+                    stat = path.stat()
+                    parts.append(f"{label_set}/{path.name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return f"{zlib.crc32(chr(10).join(parts).encode('utf-8')):08x}"
+
+
+class FewShotIndex:
+    """Precomputed matrix of few-shot examples for similarity-based selection."""
+
+    def __init__(
+        self,
+        examples: List[str],
+        dialogue_ids: List[str],
+        matrix: np.ndarray,
+        idf: np.ndarray,
+        fingerprint: str = ""
+    ):
+        self.examples = examples
+        self.dialogue_ids = np.asarray(dialogue_ids)
+        self.matrix = matrix
+        self.idf = idf
+        self.fingerprint = fingerprint
+        self.token_counts = np.array([estimate_tokens(e) for e in examples], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    @classmethod
+    def build(
+        cls,
+        processed_dir: Path = PROCESSED_DIR,
+        repairs_dir: Path = REPAIRS_DIR,
+        label_sets: Sequence[str] = LABEL_SETS,
+        n_features: int = N_FEATURES
+    ) -> "FewShotIndex":
+        """Build the index from every repair that passes validation."""
+        examples, dialogue_ids, counts = [], [], []
+        seen = set()
+        for label_set in label_sets:
+            labels_dir = repairs_dir / label_set
+            if not labels_dir.exists():
+                continue
+            for dialogue_name, dialogue_data, repairs in load_labelled_dialogues(processed_dir, labels_dir):
+                if dialogue_name in seen:
+                    continue
+                seen.add(dialogue_name)
+                for repair in repairs:
+                    if repair_schema_issues(repair) or validate_repair_against_dialogue(repair, dialogue_data):
+                        continue
+                    excerpt = dialogue_text(dialogue_data, repair['turn_indices'])
+                    examples.append(create_few_shot_example(dialogue_data, repair))
+                    dialogue_ids.append(dialogue_name)
+                    counts.append(hashed_counts(excerpt + "\n" + repair.get('trigger', ''), n_features))
+
+        if not examples:
+            raise ValueError(f"No validated repairs found under {repairs_dir}")
+
+        counts_matrix = np.vstack(counts)
+        document_frequency = np.count_nonzero(counts_matrix, axis=0)
+        idf = (np.log((1 + len(examples)) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix = _tfidf(counts_matrix, idf).astype(np.float32)
+        return cls(examples, dialogue_ids, matrix, idf, source_fingerprint(processed_dir, repairs_dir, label_sets))
+
+    def save(self, path: Path = INDEX_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(
+            path,
+            matrix=self.matrix,
+            idf=self.idf,
+            examples=np.array(self.examples),
+            dialogue_ids=self.dialogue_ids,
+            fingerprint=np.array(self.fingerprint),
+        )
+
+    @classmethod
+    def load(cls, path: Path = INDEX_PATH) -> "FewShotIndex":
+        with np.load(path) as data:
+            return cls(
+                [str(e) for e in data["examples"]],
+                [str(d) for d in data["dialogue_ids"]],
+                data["matrix"],
+                data["idf"],
+                str(data["fingerprint"]),
+            )
+
+    def similarities(self, dialogue_data: Dict[str, Any]) -> np.ndarray:
+        """Cosine similarity of every example to the dialogue (one matrix-vector product)."""
+        query = _tfidf(hashed_counts(dialogue_text(dialogue_data), self.matrix.shape[1]), self.idf)
+        return self.matrix @ query.astype(np.float32)
+
+    def select(
+        self,
+        dialogue_data: Dict[str, Any],
+        k: int = DEFAULT_K,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        max_per_dialogue: int = 1
+    ) -> List[Tuple[int, float]]:
+        """
+        Pick up to ``k`` most similar examples whose combined size fits the budget.
+
+        At most ``max_per_dialogue`` examples are taken from any one source
+        dialogue so the examples are not near-duplicates.
+
+        Returns:
+            List of (example index, similarity), most similar first
+        """
+        scores = self.similarities(dialogue_data)
+        dialogue_id = dialogue_data.get('dialogue_id')
+        if dialogue_id is not None:
+            scores[self.dialogue_ids == dialogue_id] = -np.inf
+
+        selected, used, per_dialogue = [], 0, {}
+        for i in np.argsort(-scores, kind="stable"):
+            if len(selected) >= k or not np.isfinite(scores[i]):
+                break
+            source = self.dialogue_ids[i]
+            if used + self.token_counts[i] > token_budget or per_dialogue.get(source, 0) >= max_per_dialogue:
+                continue
+            selected.append((int(i), float(scores[i])))
+            used += int(self.token_counts[i])
+            per_dialogue[source] = per_dialogue.get(source, 0) + 1
+        return selected
+
+    def few_shot_section(
+        self,
+        dialogue_data: Dict[str, Any],
+        k: int = DEFAULT_K,
+        token_budget: int = DEFAULT_TOKEN_BUDGET
+    ) -> str:
+        """Prompt section with the selected examples, in the static section's format."""
+        selected = self.select(dialogue_data, k=k, token_budget=token_budget)
+        examples = "\n".join(self.examples[i] for i, _ in selected)
+        return f"{FEW_SHOT_HEADER}\n{examples}\n===============================\n"
+
+
+_INDEX_CACHE: Dict[str, FewShotIndex] = {}
+
+
+def load_or_build_index(
+    path: Path = INDEX_PATH,
+    processed_dir: Path = PROCESSED_DIR,
+    repairs_dir: Path = REPAIRS_DIR
+) -> FewShotIndex:
+    """Return the cached index, rebuilding it if the source annotations changed."""
+    key = str(path)
+    fingerprint = source_fingerprint(processed_dir, repairs_dir)
+    cached = _INDEX_CACHE.get(key)
+    if cached is not None and cached.fingerprint == fingerprint:
+        return cached
+
+    index = None
+    if path.exists():
+        try:
+            index = FewShotIndex.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARNING] Could not read few-shot index {path}: {e}")
+    if index is None or index.fingerprint != fingerprint:
+        index = FewShotIndex.build(processed_dir, repairs_dir)
+        index.save(path)
+
+    _INDEX_CACHE[key] = index
+    return index
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the few-shot example index and preview selections")
+    parser.add_argument("--query", help="Dialogue name (e.g. S18_W2_T1) to select examples for")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="Maximum number of examples")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="Token budget for the examples")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild even if the cached index is current")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        index = FewShotIndex.build()
+        index.save()
+    else:
+        index = load_or_build_index()
+
+    print("=" * 80)
+    print("FEW-SHOT INDEX")
+    print("=" * 80)
+    print(f"Examples: {len(index)} from {len(set(index.dialogue_ids.tolist()))} dialogues")
+    print(f"Matrix: {index.matrix.shape[0]} x {index.matrix.shape[1]} ({index.matrix.nbytes / 1024:.0f} KB)")
+    print(f"Saved to: {INDEX_PATH}")
+
+    if args.query:
+        dialogue_file = PROCESSED_DIR / f"{args.query}.json"
+        with open(dialogue_file, 'r', encoding='utf-8-sig') as f:
+            dialogue_data = json.load(f)
+        selected = index.select(dialogue_data, k=args.k, token_budget=args.token_budget)
+        print(f"\nSelected for {args.query}:")
+        for i, score in selected:
+            print(f"  {index.dialogue_ids[i]}  similarity={score:.3f}  ~{index.token_counts[i]} tokens")
+        print(index.few_shot_section(dialogue_data, k=args.k, token_budget=args.token_budget))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,227 +1,327 @@
-"""Fix identified repair annotation issues."""
+"""
+Fix repair annotation issues found by validation.
+
+The "repairs" report of the validation engine records, for every dialogue
+with issues or warnings, its repair file and machine-readable findings
+(rule, category, repair position, details; see VALIDATION_REPORT.json).
+Fixers register for the finding categories they resolve; only the repair
+files that have such findings are loaded, fixed in parallel and written
+atomically, so the work is proportional to the number of issues.
+
+Registered fixers, in the order they run on a file:
+
+- ``clamp_turn_indices`` (turn_index): drop turn indices that do not exist in
+  the dialogue; repairs left with fewer than 2 turns are removed,
+- ``rewrite_dialogue_id`` (dialogue_id): set dialogue_id to the dialogue's id,
+- ``renumber_repairs`` (repair_id, repair_id_sequence, or repairs removed by
+  an earlier fixer): number repairs 1..n in file order.
+
+    python scripts/fix_repair_issues.py            # validate every batch, print the diff of every fix (dry run)
+    python scripts/fix_repair_issues.py --apply
+    python scripts/fix_repair_issues.py --batch production --apply
+    python scripts/fix_repair_issues.py --report data/repairs/VALIDATION_REPORT.json --apply
+"""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from difflib import unified_diff
 from pathlib import Path
 import json
-from typing import Dict, List, Any
-
-PROCESSED_DIR = Path('data/processed')
-REPAIRS_DIR = Path('data/repairs')
-
-
-def load_dialogue(file_path: Path) -> Dict[str, Any]:
-    """Load dialogue JSON."""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-
-def load_repairs(dialogue_file: Path) -> tuple:
-    """Load repairs from all batches, return the best one."""
-    dialogue_name = dialogue_file.stem
-    
-    repair_files = []
-    for batch_dir in REPAIRS_DIR.iterdir():
-        if batch_dir.is_dir():
-            repair_file = batch_dir / f"{dialogue_name}_repairs.json"
-            if repair_file.exists():
-                try:
-                    with open(repair_file, 'r', encoding='utf-8') as f:
-                        repairs = json.load(f)
-                        repair_files.append((batch_dir.name, repair_file, repairs if isinstance(repairs, list) else []))
-                except:
-                    pass
-    
-    return repair_files
-
-
-def fix_turn_indices(repairs: List[Dict[str, Any]], dialogue_data: Dict[str, Any]) -> tuple:
-    """Fix turn indices that are out of bounds."""
-    turns = dialogue_data.get('turns', [])
-    max_turn = max([t.get('turn', 0) for t in turns], default=0)
-    
-    fixed_repairs = []
-    removed_repairs = []
-    
-    for repair in repairs:
+import sys
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from artifact_writer import batched_directory_sync, write_json
+from validation_engine import DialogueIndex, load_record, report_module, run_rules, run_validation
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
+DEFAULT_WORKERS = 8
+
+
+@dataclass
+class FixContext:
+    """What a fixer knows about the file it fixes."""
+    dialogue_id: str
+    index: DialogueIndex
+    findings: List[Dict[str, Any]]
+
+
+@dataclass
+class Fixer:
+    name: str
+    categories: Set[str]
+    fix: Callable[[List[Any], FixContext], Tuple[List[Any], List[str]]]
+
+
+FIXERS: List[Fixer] = []
+
+
+def fixer(*categories: str):
+    """
+    Register a fix for findings of the given categories; fixers run in registration order.
+
+    A fix takes (repairs, context) and returns (fixed repairs, notes). It must
+    not modify the repairs it is given.
+    """
+    def register(fix):
+        new_fixer = Fixer(fix.__name__, set(categories), fix)
+        for i, existing in enumerate(FIXERS):
+            if existing.name == new_fixer.name:
+                FIXERS[i] = new_fixer
+                break
+        else:
+            FIXERS.append(new_fixer)
+        return fix
+    return register
+
+
+def fixable_categories() -> Set[str]:
+    return set().union(*(f.categories for f in FIXERS))
+
+
+@fixer("turn_index")
+def clamp_turn_indices(repairs: List[Any], context: FixContext) -> Tuple[List[Any], List[str]]:
+    """Keep only existing turns in the flagged repairs; remove those left with fewer than 2."""
+    flagged = {f.get('repair') for f in context.findings if f.get('category') == "turn_index"}
+    fixed, notes = [], []
+    for position, repair in enumerate(repairs, 1):
+        if position not in flagged or not isinstance(repair, dict):
+            fixed.append(repair)
+            continue
         turn_indices = repair.get('turn_indices', [])
-        valid_indices = [t for t in turn_indices if 1 <= t <= max_turn]
-        
+        valid_indices = [t for t in turn_indices if isinstance(t, int) and t >= 1 and context.index.has_turn(t)]
         if len(valid_indices) < 2:
-            # Not enough valid turns, remove this repair
-            removed_repairs.append(repair)
+            notes.append(f"Repair {repair.get('repair_id')}: removed (fewer than 2 valid turns in {turn_indices})")
             continue
-        
-        # Keep repair with valid indices only
-        fixed_repair = repair.copy()
-        fixed_repair['turn_indices'] = valid_indices
-        fixed_repairs.append(fixed_repair)
-    
-    # Renumber repair IDs
-    for idx, repair in enumerate(fixed_repairs, 1):
-        repair['repair_id'] = idx
-    
-    return fixed_repairs, removed_repairs
-
-
-def fix_dialogue_id_mismatches(repairs: List[Dict[str, Any]], expected_dialogue_id: str) -> List[Dict[str, Any]]:
-    """Fix dialogue_id to match expected format."""
-    fixed = []
+        fixed.append({**repair, 'turn_indices': valid_indices})
+        notes.append(f"Repair {repair.get('repair_id')}: turn indices {turn_indices} -> {valid_indices}")
+    return fixed, notes
+
+
+@fixer("dialogue_id")
+def rewrite_dialogue_id(repairs: List[Any], context: FixContext) -> Tuple[List[Any], List[str]]:
+    """Set every repair's dialogue_id to the dialogue's id."""
+    fixed, notes = [], []
     for repair in repairs:
-        fixed_repair = repair.copy()
-        fixed_repair['dialogue_id'] = expected_dialogue_id
-        fixed.append(fixed_repair)
-    return fixed
+        if isinstance(repair, dict) and repair.get('dialogue_id') != context.dialogue_id:
+            notes.append(f"Repair {repair.get('repair_id')}: dialogue_id {repair.get('dialogue_id')!r} -> {context.dialogue_id!r}")
+            repair = {**repair, 'dialogue_id': context.dialogue_id}
+        fixed.append(repair)
+    return fixed, notes
+
+
+@fixer("repair_id", "repair_id_sequence")
+def renumber_repairs(repairs: List[Any], context: FixContext) -> Tuple[List[Any], List[str]]:
+    """Number repairs 1..n in file order."""
+    fixed, notes = [], []
+    for position, repair in enumerate(repairs, 1):
+        if isinstance(repair, dict) and repair.get('repair_id') != position:
+            notes.append(f"Repair {repair.get('repair_id')}: renumbered to {position}")
+            repair = {**repair, 'repair_id': position}
+        fixed.append(repair)
+    return fixed, notes
+
+
+def apply_fixers(repairs: List[Any], context: FixContext) -> Tuple[List[Any], List[str], List[str]]:
+    """
+    Run the fixers whose categories occur in the context's findings.
+
+    Returns:
+        (fixed repairs, names of the fixers that changed something, notes)
+    """
+    categories = {f.get('category') for f in context.findings}
+    applied, notes = [], []
+    for f in FIXERS:
+        if not f.categories & categories:
+            continue
+        before = len(repairs)
+        fixed, fix_notes = f.fix(repairs, context)
+        if fixed != repairs:
+            applied.append(f.name)
+            notes.extend(fix_notes)
+        if len(fixed) != before:
+            # Removing repairs leaves gaps in the numbering
+            categories.add("repair_id_sequence")
+        repairs = fixed
+    return repairs, applied, notes
+
+
+def _resolve(path: str) -> Path:
+    return Path(path) if Path(path).is_absolute() else PROJECT_ROOT / path
+
 
+def fix_target(target: Dict[str, Any], processed_dir: Path = PROCESSED_DIR, dry_run: bool = True) -> Dict[str, Any]:
+    """
+    Fix one repair file from its validation findings.
 
-def fix_repair_file(dialogue_file: Path, dry_run: bool = True) -> Dict[str, Any]:
-    """Fix issues in repair file for a dialogue."""
-    dialogue_name = dialogue_file.stem
-    
+    Args:
+        target: Report entry with dialogue, repair_file and findings
+        processed_dir: Directory with the processed dialogue JSON files
+        dry_run: Only compute the fix and its diff
+
+    Returns:
+        Result with dialogue_file, repair_file, action (none, would_fix, fixed
+        or error), fixers applied, notes and a unified diff of the repair file
+    """
     result = {
-        'dialogue_file': dialogue_name,
-        'issues_found': [],
-        'issues_fixed': [],
-        'action': 'none'
+        'dialogue_file': target['dialogue'],
+        'repair_file': target.get('repair_file'),
+        'action': 'none',
+        'fixers': [],
+        'notes': [],
+        'diff': ''
     }
-    
+
     try:
-        dialogue_data = load_dialogue(dialogue_file)
-        expected_dialogue_id = dialogue_data.get('dialogue_id', dialogue_name)
-        turns = dialogue_data.get('turns', [])
-        max_turn = max([t.get('turn', 0) for t in turns], default=0)
-        
-        # Get all repair files
-        repair_files = load_repairs(dialogue_file)
-        
-        if not repair_files:
+        dialogue_file = processed_dir / f"{target['dialogue']}.json"
+        with open(dialogue_file, 'r', encoding='utf-8') as f:
+            dialogue_data = json.load(f)
+        repair_file = _resolve(target['repair_file'])
+        with open(repair_file, 'r', encoding='utf-8-sig') as f:
+            repairs = json.load(f)
+        if not isinstance(repairs, list):
             return result
-        
-        # Use the repair file from production batch (most recent)
-        best_batch = None
-        best_file = None
-        best_repairs = None
-        
-        for batch_name, repair_file, repairs in repair_files:
-            if batch_name == 'production':
-                best_batch = batch_name
-                best_file = repair_file
-                best_repairs = repairs
-                break
-        
-        if not best_repairs:
-            # Use validation batch
-            for batch_name, repair_file, repairs in repair_files:
-                if batch_name == 'validation':
-                    best_batch = batch_name
-                    best_file = repair_file
-                    best_repairs = repairs
-                    break
-        
-        if not best_repairs:
-            # Use any available
-            best_batch, best_file, best_repairs = repair_files[0]
-        
-        if not best_repairs:
+
+        context = FixContext(dialogue_data.get('dialogue_id', target['dialogue']),
+                             DialogueIndex.from_dialogue(dialogue_data), target.get('findings', []))
+        fixed, result['fixers'], result['notes'] = apply_fixers(repairs, context)
+        if fixed == repairs:
             return result
-        
-        # Check for issues
-        fixed_repairs = []
-        for repair in best_repairs:
-            turn_indices = repair.get('turn_indices', [])
-            invalid_indices = [t for t in turn_indices if t < 1 or t > max_turn]
-            
-            if invalid_indices:
-                result['issues_found'].append(f"Repair {repair.get('repair_id')}: Invalid turn indices {invalid_indices} (max turn is {max_turn})")
-                
-                # Fix by removing invalid indices
-                valid_indices = [t for t in turn_indices if 1 <= t <= max_turn]
-                if len(valid_indices) >= 2:
-                    fixed_repair = repair.copy()
-                    fixed_repair['turn_indices'] = valid_indices
-                    fixed_repairs.append(fixed_repair)
-                    result['issues_fixed'].append(f"Repair {repair.get('repair_id')}: Removed invalid indices, kept {valid_indices}")
-                else:
-                    result['issues_found'].append(f"Repair {repair.get('repair_id')}: Not enough valid turns after fixing, will remove")
-            else:
-                fixed_repairs.append(repair)
-        
-        # Fix dialogue_id if needed
-        for repair in fixed_repairs:
-            if repair.get('dialogue_id') != expected_dialogue_id:
-                repair['dialogue_id'] = expected_dialogue_id
-        
-        # Renumber repair IDs
-        for idx, repair in enumerate(fixed_repairs, 1):
-            repair['repair_id'] = idx
-        
-        if fixed_repairs != best_repairs:
+
+        before = json.dumps(repairs, indent=2, ensure_ascii=False).splitlines(keepends=True)
+        after = json.dumps(fixed, indent=2, ensure_ascii=False).splitlines(keepends=True)
+        result['diff'] = ''.join(unified_diff(before, after, fromfile=target['repair_file'],
+                                              tofile=f"{target['repair_file']} (fixed)", n=2))
+        if dry_run:
+            result['action'] = 'would_fix'
+        else:
+            write_json(repair_file, fixed)
             result['action'] = 'fixed'
-            if not dry_run:
-                # Save fixed repairs
-                with open(best_file, 'w', encoding='utf-8') as f:
-                    json.dump(fixed_repairs, f, indent=2, ensure_ascii=False)
-                result['issues_fixed'].append(f"Saved fixed repairs to {best_file}")
-        
+
     except Exception as e:
-        result['issues_found'].append(f"Error: {str(e)}")
-    
+        result['action'] = 'error'
+        result['notes'].append(f"Error: {str(e)}")
+
     return result
 
 
-def fix_all_issues(dry_run: bool = True):
-    """Fix all identified repair issues."""
+def fix_targets(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Entries of a repairs validation report that have a repair file and fixable findings."""
+    categories = fixable_categories()
+    targets = []
+    for entry in report.get('files_with_issues', []) + report.get('files_with_warnings', []):
+        if entry.get('repair_file') and any(f.get('category') in categories for f in entry.get('findings', [])):
+            targets.append(entry)
+    return targets
+
+
+def validation_report(processed_dir: Path = PROCESSED_DIR, repairs_dir: Path = REPAIRS_DIR,
+                      batches: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Run the "repairs" validation for each batch (nothing written) and return its findings in report form.
+
+    Args:
+        processed_dir: Directory with processed dialogue JSON files
+        repairs_dir: Directory with one subdirectory per repair batch
+        batches: Batches to validate (default: every batch directory)
+    """
+    if batches is None:
+        batches = sorted(p.name for p in repairs_dir.iterdir() if p.is_dir()) if repairs_dir.exists() else []
+    entries = []
+    for batch in batches:
+        run = run_validation(processed_dir, repairs_dir, ["repairs"], verbose=False, batches=[batch])
+        entries.extend({'dialogue': r['dialogue_file'], 'repair_file': r['repair_file'], 'findings': r['findings']}
+                       for r in run['results']['repairs'] if r['findings'])
+    return {'files_with_issues': entries}
+
+
+def fix_repair_file(dialogue_file: Path, dry_run: bool = True, repairs_dir: Path = REPAIRS_DIR) -> Dict[str, Any]:
+    """Validate one dialogue's repair file and apply the registered fixers to it."""
+    report_module("repairs")
+    record = load_record(dialogue_file, repairs_dir)
+    record.require()
+    if record.repair_file is None:
+        return {'dialogue_file': dialogue_file.stem, 'repair_file': None, 'action': 'none',
+                'fixers': [], 'notes': [], 'diff': ''}
+    target = {'dialogue': dialogue_file.stem, 'repair_file': str(record.repair_file),
+              'findings': run_rules("repairs", record)}
+    return fix_target(target, dialogue_file.parent, dry_run)
+
+
+def fix_all_issues(report: Optional[Dict[str, Any]] = None, processed_dir: Path = PROCESSED_DIR,
+                   repairs_dir: Path = REPAIRS_DIR, dry_run: bool = True,
+                   workers: int = DEFAULT_WORKERS, batches: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Fix every repair file with fixable validation findings.
+
+    Args:
+        report: Repairs validation report (VALIDATION_REPORT.json); batches are validated afresh if omitted
+        processed_dir: Directory with processed dialogue JSON files
+        repairs_dir: Directory with one subdirectory per repair batch
+        dry_run: Print the diffs without writing
+        workers: Files fixed concurrently
+        batches: Batches to validate when no report is given (default: all)
+
+    Returns:
+        One fix_target result per affected file
+    """
     print("=" * 80)
     print(f"{'DRY RUN - ' if dry_run else ''}FIXING REPAIR ANNOTATION ISSUES")
     print("=" * 80)
     print()
-    
-    # Files with issues from validation
-    problematic_files = [
-        'S12_W1_T1',  # Turn indices out of bounds
-        'W1_T1',  # Dialogue ID mismatch
-        'W1_T2',  # Dialogue ID mismatch
-        'W2_T1',  # Dialogue ID mismatch
-        'W3_T1',  # Dialogue ID mismatch
-        'W3_T2',  # Dialogue ID mismatch
-        'W3_T3',  # Dialogue ID mismatch
-    ]
-    
-    results = []
-    
-    for dialogue_name in problematic_files:
-        dialogue_file = PROCESSED_DIR / f"{dialogue_name}.json"
-        if dialogue_file.exists():
-            result = fix_repair_file(dialogue_file, dry_run=dry_run)
-            results.append(result)
-            
-            if result['issues_found'] or result['issues_fixed']:
-                print(f"File: {dialogue_name}")
-                if result['issues_found']:
-                    print(f"  Issues found: {len(result['issues_found'])}")
-                    for issue in result['issues_found']:
-                        print(f"    - {issue}")
-                if result['issues_fixed']:
-                    print(f"  Issues fixed: {len(result['issues_fixed'])}")
-                    for fix in result['issues_fixed']:
-                        print(f"    ✓ {fix}")
-                print()
-    
+
+    if report is None:
+        report = validation_report(processed_dir, repairs_dir, batches)
+    targets = fix_targets(report)
+    print(f"Files with fixable findings: {len(targets)}")
+    print()
+
+    if not targets:
+        return []
+    with batched_directory_sync(), ThreadPoolExecutor(max_workers=max(1, min(workers, len(targets)))) as pool:
+        results = list(pool.map(lambda target: fix_target(target, processed_dir, dry_run), targets))
+
+    for result in results:
+        if result['action'] == 'none':
+            continue
+        print(f"File: {result['dialogue_file']} ({result['repair_file']})")
+        if result['fixers']:
+            print(f"  Fixers: {', '.join(result['fixers'])}")
+        for note in result['notes']:
+            print(f"    - {note}")
+        if dry_run and result['diff']:
+            print(result['diff'], end='')
+        print()
+
+    counts = {action: sum(1 for r in results if r['action'] == action) for action in ('would_fix', 'fixed', 'error')}
+    print("=" * 80)
     if not dry_run:
-        print("=" * 80)
-        print("FIXES APPLIED")
-        print("=" * 80)
+        print(f"FIXES APPLIED: {counts['fixed']} file(s) rewritten, {counts['error']} error(s)")
     else:
-        print("=" * 80)
-        print("DRY RUN COMPLETE - No files modified")
+        print(f"DRY RUN COMPLETE - {counts['would_fix']} file(s) would change, {counts['error']} error(s)")
         print("Run with --apply to fix issues")
-        print("=" * 80)
-    
+    print("=" * 80)
+
     return results
 
 
 if __name__ == "__main__":
     import argparse
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(description="Apply registered fixers to repair files with validation findings")
     parser.add_argument("--apply", action="store_true", help="Actually apply fixes (default is dry run)")
+    parser.add_argument("--report", help="Repairs validation report to fix from (default: validate now)")
+    parser.add_argument("--processed-dir", default=str(PROCESSED_DIR), help="Processed dialogue JSON directory")
+    parser.add_argument("--repairs-dir", default=str(REPAIRS_DIR), help="Directory of repair batches")
+    parser.add_argument("--batch", nargs="+", help="Batches to validate and fix (default: all)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Files fixed concurrently")
     args = parser.parse_args()
-    
-    fix_all_issues(dry_run=not args.apply)
 
+    report = None
+    if args.report:
+        with open(args.report, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+
+    fix_all_issues(report, Path(args.processed_dir), Path(args.repairs_dir),
+                   dry_run=not args.apply, workers=args.workers, batches=args.batch)
@@ -1,159 +1,336 @@
-"""Generate comprehensive final statistics for all repair detection batches."""
+"""
+Generate comprehensive final statistics for all repair detection batches.
+
+Statistics are built from mergeable per-file summaries (file and repair
+counts, initiation/resolution distributions, trigger categories). Each
+batch directory keeps its summaries in ``.repair_summaries.json``, keyed by
+the repairs file's SHA-256 (with size and mtime to skip unchanged files
+without reading them), so a rerun only reads files that changed.
+Summaries are added up per week, student, batch and overall.
+
+    python scripts/generate_final_statistics.py                  # refresh FINAL_STATISTICS.json
+    python scripts/generate_final_statistics.py --add data/repairs/production/S12_W1_T1_repairs.json
+
+``--add`` updates FINAL_STATISTICS.json for new, changed or deleted repairs
+files by subtracting their previous summaries and adding the new ones:
+one read of the repairs file, its batch cache and the statistics file.
+"""
 from pathlib import Path
+import hashlib
 import json
-from collections import defaultdict
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from artifact_writer import write_json
+
+SUMMARY_CACHE_NAME = '.repair_summaries.json'
+# Bump when the summary format changes; older caches and statistics are rebuilt
+SUMMARY_VERSION = 1
+COUNT_FIELDS = ('total_files', 'files_with_repairs', 'files_without_repairs', 'total_repairs')
+DISTRIBUTION_FIELDS = ('initiation_distribution', 'resolution_distribution', 'trigger_categories')
+FILE_KEY_PATTERN = re.compile(r'^(?:(S\d+)_)?(W\d+)_')
+
 
 def load_repairs(repair_file: Path) -> list:
     """Load repair annotations."""
     if not repair_file.exists():
         return []
     try:
-        with open(repair_file, 'r', encoding='utf-8') as f:
+        with open(repair_file, 'r', encoding='utf-8-sig') as f:
             return json.load(f)
     except:
         return []
 
-def aggregate_statistics():
-    """Aggregate statistics from all batches."""
-    repairs_dir = Path('data/repairs')
-    
-    stats = {
-        'total_files': 0,
-        'files_with_repairs': 0,
-        'files_without_repairs': 0,
-        'total_repairs': 0,
-        'initiation_distribution': defaultdict(int),
-        'resolution_distribution': defaultdict(int),
-        'trigger_categories': defaultdict(int),
-        'batches': {}
-    }
-    
-    # Process each batch
-    for batch_dir in repairs_dir.iterdir():
-        if not batch_dir.is_dir():
-            continue
-        
-        batch_name = batch_dir.name
-        if batch_name == 'production' and (batch_dir / 'batch_summary.json').exists():
-            # Use existing review report if available
-            review_report = batch_dir / 'review_report.json'
-            if review_report.exists():
-                with open(review_report, 'r', encoding='utf-8') as f:
-                    batch_stats = json.load(f)
-                    stats['batches'][batch_name] = batch_stats
-                    stats['total_files'] += batch_stats.get('total_files', 0)
-                    stats['files_with_repairs'] += batch_stats.get('files_with_repairs', 0)
-                    stats['files_without_repairs'] += batch_stats.get('files_without_repairs', 0)
-                    stats['total_repairs'] += batch_stats.get('total_repairs', 0)
-                    continue
-        
-        # Process repair files
-        batch_stats = {
-            'total_files': 0,
-            'files_with_repairs': 0,
-            'files_without_repairs': 0,
-            'total_repairs': 0,
-            'initiation_distribution': defaultdict(int),
-            'resolution_distribution': defaultdict(int),
-            'trigger_categories': defaultdict(int),
-        }
-        
-        repair_files = list(batch_dir.glob("*_repairs.json"))
-        batch_stats['total_files'] = len(repair_files)
-        
-        for repair_file in repair_files:
-            if 'batch_summary' in repair_file.name or 'review_report' in repair_file.name:
-                continue
-            
-            repairs = load_repairs(repair_file)
-            
-            if repairs:
-                batch_stats['files_with_repairs'] += 1
-                batch_stats['total_repairs'] += len(repairs)
-                
-                for repair in repairs:
-                    batch_stats['initiation_distribution'][repair.get('initiation', 'unknown')] += 1
-                    batch_stats['resolution_distribution'][repair.get('resolution', 'unknown')] += 1
-                    
-                    trigger = repair.get('trigger', 'other')
-                    trigger_cat = trigger.split('–')[0].strip() if '–' in trigger else trigger.split(':')[0].strip() if ':' in trigger else 'other'
-                    batch_stats['trigger_categories'][trigger_cat.lower()] += 1
+
+def trigger_category(trigger: str) -> str:
+    """Category of a trigger: the text before an en dash or colon, lowercased ('other' without one)."""
+    category = trigger.split('–')[0].strip() if '–' in trigger else trigger.split(':')[0].strip() if ':' in trigger else 'other'
+    return category.lower()
+
+
+def empty_summary() -> Dict[str, Any]:
+    summary: Dict[str, Any] = {field: 0 for field in COUNT_FIELDS}
+    summary.update({field: {} for field in DISTRIBUTION_FIELDS})
+    return summary
+
+
+def summarise_repairs(repairs: Any) -> Dict[str, Any]:
+    """Summary of one repairs file."""
+    summary = empty_summary()
+    summary['total_files'] = 1
+    repairs = [r for r in repairs if isinstance(r, dict)] if isinstance(repairs, list) else []
+    if not repairs:
+        summary['files_without_repairs'] = 1
+        return summary
+    summary['files_with_repairs'] = 1
+    summary['total_repairs'] = len(repairs)
+    for repair in repairs:
+        for field, value in (('initiation_distribution', repair.get('initiation', 'unknown')),
+                             ('resolution_distribution', repair.get('resolution', 'unknown')),
+                             ('trigger_categories', trigger_category(str(repair.get('trigger', 'other'))))):
+            summary[field][value] = summary[field].get(value, 0) + 1
+    return summary
+
+
+def merge_summaries(target: Dict[str, Any], summary: Dict[str, Any], sign: int = 1) -> Dict[str, Any]:
+    """
+    Add (sign=1) or subtract (sign=-1) a summary into target in place.
+
+    Only the count and distribution fields are touched, so target can be any
+    level of the statistics tree; distribution entries that reach 0 are dropped.
+    """
+    for field in COUNT_FIELDS:
+        target[field] = target.get(field, 0) + sign * summary.get(field, 0)
+    for field in DISTRIBUTION_FIELDS:
+        distribution = target.setdefault(field, {})
+        for key, count in summary.get(field, {}).items():
+            value = distribution.get(key, 0) + sign * count
+            if value:
+                distribution[key] = value
             else:
-                batch_stats['files_without_repairs'] += 1
-        
-        # Aggregate to main stats
-        stats['total_files'] += batch_stats['total_files']
-        stats['files_with_repairs'] += batch_stats['files_with_repairs']
-        stats['files_without_repairs'] += batch_stats['files_without_repairs']
-        stats['total_repairs'] += batch_stats['total_repairs']
-        
-        for k, v in batch_stats['initiation_distribution'].items():
-            stats['initiation_distribution'][k] += v
-        for k, v in batch_stats['resolution_distribution'].items():
-            stats['resolution_distribution'][k] += v
-        for k, v in batch_stats['trigger_categories'].items():
-            stats['trigger_categories'][k] += v
-        
-        stats['batches'][batch_name] = {
-            'total_files': batch_stats['total_files'],
-            'files_with_repairs': batch_stats['files_with_repairs'],
-            'files_without_repairs': batch_stats['files_without_repairs'],
-            'total_repairs': batch_stats['total_repairs']
-        }
-    
-    # Convert defaultdicts to regular dicts
-    stats['initiation_distribution'] = dict(stats['initiation_distribution'])
-    stats['resolution_distribution'] = dict(stats['resolution_distribution'])
-    stats['trigger_categories'] = dict(stats['trigger_categories'])
-    
-    return stats
+                distribution.pop(key, None)
+    return target
 
-def main():
-    """Generate and display final statistics."""
-    print("=" * 80)
-    print("PHASE 2: FINAL STATISTICS")
-    print("=" * 80)
-    print()
-    
-    stats = aggregate_statistics()
-    
+
+def file_key(repair_file: Path) -> Tuple[str, str]:
+    """(student, week) of a repairs file; legacy W*_T* files have student 'unknown'."""
+    match = FILE_KEY_PATTERN.match(repair_file.name)
+    if not match:
+        return 'unknown', 'unknown'
+    return match.group(1) or 'unknown', match.group(2)
+
+
+def _batch_node(stats: Dict[str, Any], batch: str) -> Dict[str, Any]:
+    return stats['batches'].setdefault(batch, {**empty_summary(), 'students': {}})
+
+
+def apply_file_summary(stats: Dict[str, Any], batch: str, repair_file: Path,
+                       summary: Dict[str, Any], sign: int = 1) -> None:
+    """Add or subtract one file's summary at every level: overall, batch, student and week."""
+    student, week = file_key(repair_file)
+    batch_node = _batch_node(stats, batch)
+    student_node = batch_node['students'].setdefault(student, {**empty_summary(), 'weeks': {}})
+    week_node = student_node['weeks'].setdefault(week, empty_summary())
+    for node in (stats, batch_node, student_node, week_node):
+        merge_summaries(node, summary, sign)
+    if week_node['total_files'] == 0:
+        del student_node['weeks'][week]
+    if student_node['total_files'] == 0:
+        del batch_node['students'][student]
+
+
+class SummaryCache:
+    """
+    Per-file summaries of one batch directory, stored in its .repair_summaries.json.
+
+    With ``reuse=False`` existing entries are ignored (every file is read) but
+    the fresh summaries are still saved, so later ``--add`` updates subtract
+    exactly what the statistics counted.
+    """
+
+    def __init__(self, batch_dir: Path, reuse: bool = True, save: bool = True):
+        self.path = batch_dir / SUMMARY_CACHE_NAME
+        self.save_enabled = save
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.reads = 0
+        self.changed = False
+        if reuse and self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached.get('version') == SUMMARY_VERSION:
+                    self.entries = cached.get('files', {})
+            except (OSError, ValueError, AttributeError):
+                self.entries = {}
+
+    def summary(self, repair_file: Path) -> Optional[Dict[str, Any]]:
+        """
+        Current summary of a repairs file (None if it no longer exists).
+
+        The file is only read when its size or mtime changed since it was
+        summarised, and only re-summarised when its hash changed too.
+        """
+        name = repair_file.name
+        entry = self.entries.get(name)
+        try:
+            stat = repair_file.stat()
+        except FileNotFoundError:
+            if entry is not None:
+                del self.entries[name]
+                self.changed = True
+            return None
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['summary']
+
+        data = repair_file.read_bytes()
+        self.reads += 1
+        sha256 = hashlib.sha256(data).hexdigest()
+        if not entry or entry['sha256'] != sha256:
+            try:
+                repairs = json.loads(data.decode('utf-8-sig'))
+            except ValueError:
+                repairs = []
+            entry = {'sha256': sha256, 'summary': summarise_repairs(repairs)}
+        self.entries[name] = {**entry, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        self.changed = True
+        return entry['summary']
+
+    def prune(self, names: List[str]) -> None:
+        """Forget files that are no longer in the batch."""
+        for name in set(self.entries) - set(names):
+            del self.entries[name]
+            self.changed = True
+
+    def save(self) -> None:
+        if self.save_enabled and self.changed:
+            write_json(self.path, {'version': SUMMARY_VERSION, 'files': self.entries}, compact=True, durable=False)
+            self.changed = False
+
+
+def aggregate_statistics(repairs_dir: Path = Path('data/repairs'), use_cache: bool = True,
+                         save_cache: bool = True) -> Tuple[Dict[str, Any], int]:
+    """
+    Aggregate statistics from all batches (one subdirectory of repairs_dir each).
+
+    Args:
+        repairs_dir: Directory with one subdirectory per repair batch
+        use_cache: Reuse the summaries in each batch's .repair_summaries.json
+            (False: read every file)
+        save_cache: Write the current summaries back to the caches; keep this
+            on whenever the result is saved as FINAL_STATISTICS.json, since
+            ``update_statistics`` subtracts the cached summaries
+
+    Returns:
+        (statistics, files_read): overall counts and distributions, with the
+        same per batch, per student of a batch and per week of a student; and
+        the number of repairs files that had to be read (not saved, since it
+        depends on the cache state)
+    """
+    stats: Dict[str, Any] = {**empty_summary(), 'summary_version': SUMMARY_VERSION, 'batches': {}}
+    files_read = 0
+
+    for batch_dir in sorted(p for p in repairs_dir.iterdir() if p.is_dir()):
+        cache = SummaryCache(batch_dir, reuse=use_cache, save=save_cache)
+        repair_files = sorted(batch_dir.glob("*_repairs.json"))
+        _batch_node(stats, batch_dir.name)
+        for repair_file in repair_files:
+            summary = cache.summary(repair_file)
+            if summary is not None:
+                apply_file_summary(stats, batch_dir.name, repair_file, summary)
+        cache.prune([f.name for f in repair_files])
+        cache.save()
+        files_read += cache.reads
+
+    return stats, files_read
+
+
+def update_statistics(repair_files: List[Path], repairs_dir: Path = Path('data/repairs')) -> Tuple[Dict[str, Any], int]:
+    """
+    Update FINAL_STATISTICS.json for added, changed or deleted repairs files.
+
+    Each file's previous summary (from its batch cache) is subtracted and its
+    new summary added, so the work does not depend on the corpus size. Falls
+    back to a full aggregation when there are no compatible statistics yet.
+
+    Args:
+        repair_files: Repairs files inside batch subdirectories of repairs_dir
+        repairs_dir: Directory with one subdirectory per repair batch
+
+    Returns:
+        (statistics, files_read): the updated statistics (also saved to
+        FINAL_STATISTICS.json) and the number of repairs files read
+    """
+    output_file = repairs_dir / 'FINAL_STATISTICS.json'
+    stats = None
+    if output_file.exists():
+        with open(output_file, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+    if not stats or stats.get('summary_version') != SUMMARY_VERSION:
+        stats, files_read = aggregate_statistics(repairs_dir)
+        write_json(output_file, stats)
+        return stats, files_read
+    # Saved by an earlier version, which included this run counter
+    stats.pop('files_read', None)
+
+    caches: Dict[Path, SummaryCache] = {}
+    files_read = 0
+    for repair_file in repair_files:
+        batch_dir = repair_file.parent
+        cache = caches.setdefault(batch_dir, SummaryCache(batch_dir))
+        previous = cache.entries.get(repair_file.name, {}).get('summary')
+        current = cache.summary(repair_file)
+        if previous is not None:
+            apply_file_summary(stats, batch_dir.name, repair_file, previous, sign=-1)
+        if current is not None:
+            apply_file_summary(stats, batch_dir.name, repair_file, current)
+    for cache in caches.values():
+        cache.save()
+        files_read += cache.reads
+
+    write_json(output_file, stats)
+    return stats, files_read
+
+
+def print_statistics(stats: Dict[str, Any]) -> None:
     print(f"Total Files Processed: {stats['total_files']}")
     print(f"Files with Repairs: {stats['files_with_repairs']}")
     print(f"Files without Repairs: {stats['files_without_repairs']}")
     print(f"Total Repairs Detected: {stats['total_repairs']}")
     print()
-    
+
     print("Initiation Distribution:")
     for k, v in sorted(stats['initiation_distribution'].items(), key=lambda x: -x[1]):
         print(f"  {k}: {v}")
     print()
-    
+
     print("Resolution Distribution:")
     for k, v in sorted(stats['resolution_distribution'].items(), key=lambda x: -x[1]):
         print(f"  {k}: {v}")
     print()
-    
+
     print("Top Trigger Categories:")
     for k, v in sorted(stats['trigger_categories'].items(), key=lambda x: -x[1])[:10]:
         print(f"  {k}: {v}")
     print()
-    
+
     print("Batch Breakdown:")
     for batch_name, batch_stats in stats['batches'].items():
         print(f"  {batch_name}:")
         print(f"    Files: {batch_stats['total_files']}")
         print(f"    With Repairs: {batch_stats['files_with_repairs']}")
         print(f"    Total Repairs: {batch_stats['total_repairs']}")
+        print(f"    Students: {len(batch_stats['students'])}")
+    print()
+
+
+def main():
+    """Generate and display final statistics."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Aggregate repair statistics across batches")
+    parser.add_argument("--repairs-dir", default="data/repairs", help="Directory of repair batches")
+    parser.add_argument("--add", nargs="+", metavar="REPAIRS_FILE",
+                        help="Only update the statistics for these new, changed or deleted repairs files")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Read every repairs file and rebuild the summary caches from them")
+    args = parser.parse_args()
+    repairs_dir = Path(args.repairs_dir)
+    output_file = repairs_dir / 'FINAL_STATISTICS.json'
+
+    print("=" * 80)
+    print("PHASE 2: FINAL STATISTICS")
+    print("=" * 80)
     print()
-    
-    # Save to file
-    output_file = Path('data/repairs/FINAL_STATISTICS.json')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(stats, f, indent=2, ensure_ascii=False)
-    
+
+    if args.add:
+        stats, files_read = update_statistics([Path(p) for p in args.add], repairs_dir)
+    else:
+        stats, files_read = aggregate_statistics(repairs_dir, use_cache=not args.no_cache)
+        write_json(output_file, stats)
+
+    print_statistics(stats)
+    print(f"[INFO] {files_read} repairs file(s) read; the rest came from summary caches")
     print(f"✅ Statistics saved to: {output_file}")
     print("=" * 80)
 
 if __name__ == "__main__":
     main()
-
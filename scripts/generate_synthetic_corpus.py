@@ -0,0 +1,605 @@
+"""
+Generate a synthetic corpus for scale testing.
+
+Writes a tree with the same layout as the project's ``data/`` and ``config/``
+so every stage can run against it:
+
+    <output>/config/preprocessing_config.json   students, weeks, label sets
+    <output>/data/raw/#<id>/#<id>. Week<w>.docx|.pdf|.txt
+    <output>/data/extracted_text/S<id>_W<w>.txt
+    <output>/data/processed/S<id>_W<w>_T<t>.json  ground-truth turns
+    <output>/data/repairs/synthetic/*_repairs.json ground-truth repairs
+    <output>/synthetic_manifest.json
+
+Transcripts follow the real layouts: Week 1-2 ("TASK n：", labels on their
+own line, quoted learner turns), Week 3 ("Week 3 – Task n", labels with
+timestamps) and Week 4 ("Task n:", inline labels; unlabeled alternating lines
+when rendered as PDF). Labels come from the student's label set
+(english_standard, portuguese, korean, ...). Repair episodes (LI/BI with
+R/U-A/U-P outcomes) are inserted at ``--repair-density`` and annotated with
+their exact turn indices. The ground-truth turns hold the text the parser
+keeps (Week 1-2 learner turns with their quotes); ``--verify`` parses the
+generated documents and fails on any turn that differs from the ground truth.
+
+    python scripts/generate_synthetic_corpus.py --students 300 --output data/synthetic
+    python scripts/preprocessing_pipeline.py --config data/synthetic/config/preprocessing_config.json \\
+        --raw-dir data/synthetic/data/raw --extracted-text-dir data/synthetic/data/extracted_text --force
+    python scripts/validate_repair_results.py --processed-dir data/synthetic/data/processed \\
+        --repairs-dir data/synthetic/data/repairs
+    python scripts/generate_final_statistics.py --repairs-dir data/synthetic/data/repairs
+
+``--no-documents`` skips the .docx/.pdf rendering (the slow part) when only
+the processed JSON and annotations are needed, e.g. 10k+ dialogues for the
+validators and statistics.
+"""
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from preprocessing_pipeline import CONFIG_PATH, load_config, project_relative, run_pipeline
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_OUTPUT_DIR = PROJECT_ROOT / "data" / "synthetic"
+DEFAULT_LABEL_SETS = ("english_standard", "portuguese", "korean")
+DEFAULT_FORMATS = ("docx", "pdf", "txt")
+WEEKS = (1, 2, 3, 4)
+QUOTED_WEEKS = (1, 2)
+BATCH_NAME = "synthetic"
+
+SCENARIOS = {
+    "cafe": {
+        "learner": [
+            "Hi, could I please get an Americano?",
+            "I would like a medium size, please.",
+            "Do you have any cakes today?",
+            "I will take it to go, thank you.",
+            "Can I pay by card?",
+            "What do you recommend for breakfast?",
+            "I want a chocolate cookie too.",
+            "No sugar, just a little milk.",
+        ],
+        "bot": [
+            "Absolutely, an Americano sounds great! Would you like any milk or sugar with that?",
+            "Sure thing. Is that for here or to go?",
+            "We have a lovely almond croissant and a chocolate cake today.",
+            "Of course, card is fine. Anything else for you?",
+            "Great choice! I will add that to your order.",
+            "Our breakfast sandwich is very popular in the morning.",
+        ],
+    },
+    "internet_support": {
+        "learner": [
+            "My internet has stopped working since yesterday.",
+            "The light on the modem is red.",
+            "I already restarted it two times.",
+            "When can you send a technician?",
+            "I use the internet for my work at home.",
+            "Can you check my account, please?",
+            "Thank you for your help today.",
+        ],
+        "bot": [
+            "Thanks for calling today. Can you tell me what is happening with your connection?",
+            "I am sorry to hear that. Have you tried restarting the modem?",
+            "Let me check the service status in your area.",
+            "I can schedule a technician visit for tomorrow morning.",
+            "Your account looks fine. The issue seems to be with the line.",
+            "Is there anything else I can help you with today?",
+        ],
+    },
+    "hotel": {
+        "learner": [
+            "I would like to book a room for two nights.",
+            "Is breakfast included in the price?",
+            "Can I have a room with a view of the sea?",
+            "We will arrive on Friday evening.",
+            "Is there parking near the hotel?",
+            "How much is it per night?",
+        ],
+        "bot": [
+            "Certainly! What dates are you thinking of staying with us?",
+            "Breakfast is included and served from seven to ten.",
+            "We have a sea view room available for those dates.",
+            "Parking is free for our guests behind the building.",
+            "The rate is ninety dollars per night including taxes.",
+            "Wonderful. May I have your name for the booking?",
+        ],
+    },
+    "doctor": {
+        "learner": [
+            "I have a headache since three days.",
+            "I also feel very tired in the morning.",
+            "I take some medicine but it does not help.",
+            "Do I need to take a test?",
+            "Can I go to work tomorrow?",
+            "Thank you, doctor.",
+        ],
+        "bot": [
+            "I am sorry you are not feeling well. When did the symptoms start?",
+            "Have you had a fever or any trouble sleeping?",
+            "Which medicine have you been taking so far?",
+            "I would suggest resting and drinking plenty of water.",
+            "If it does not improve, we can run a blood test next week.",
+            "You can go to work if you feel well enough.",
+        ],
+    },
+}
+
+# (trigger category, detail, trouble-source utterance); triggers are written "category – detail"
+TROUBLE_SOURCES = [
+    ("lexical", "unknown word '{word}'", "Could you describe the {word} option for me?"),
+    ("pronunciation", "unclear ASR transcription", "I want the, uh, merrick channel thing."),
+    ("bot misunderstanding", "misinterpreted request", "I said the other one, not this."),
+    ("grammar", "ungrammatical request", "Yesterday I go there and it not work."),
+    ("fast speech", "long bot turn", "Okay, okay."),
+]
+HARD_WORDS = ["oat milk", "decaf", "modem reset", "deposit", "prescription", "late checkout", "router firmware"]
+
+# Episode templates: (initiation, resolution, turns after the trouble source as (speaker, text))
+EPISODES = [
+    ("LI", "R", [
+        ("learner", "Sorry, I don't understand. Can you say that again?"),
+        ("bot", "Of course! Let me say it more simply."),
+        ("learner", "Ah, okay. Now I understand, thank you."),
+    ]),
+    ("LI", "U-A", [
+        ("learner", "Sorry, what do you mean?"),
+        ("bot", "I mean that we can take care of it another way."),
+        ("learner", "Okay. Anyway, let me ask something else."),
+    ]),
+    ("LI", "U-P", [
+        ("learner", "Sorry, I don't understand the question."),
+        ("bot", "No problem. I was asking about your preference."),
+        ("learner", "Sorry, I still don't understand."),
+        ("bot", "That's okay, we can come back to it later."),
+    ]),
+    ("BI", "R", [
+        ("bot", "Just to clarify, do you mean the first option?"),
+        ("learner", "Yes, the first one, please."),
+        ("bot", "Perfect, thank you for clarifying."),
+    ]),
+    ("BI", "U-P", [
+        ("bot", "I'm not sure I caught that. Could you repeat it?"),
+        ("learner", "The thing I said before."),
+        ("bot", "I see. Let's continue and I will note that down."),
+    ]),
+]
+
+TIMESTAMPS = ("00:01", "00:03", "00:07", "00:12")
+
+
+def _task_header(week: int, task: int) -> str:
+    if week in (1, 2):
+        return f"TASK {task}："
+    if week == 3:
+        return f"Week 3 – Task {task}"
+    return f"Task {task}:"
+
+
+def generate_dialogue(
+    rng: random.Random,
+    dialogue_id: str,
+    turns: int,
+    repair_density: float,
+    quote_learner: bool = False
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    One dialogue of roughly ``turns`` alternating turns with annotated repairs.
+
+    Each learner turn outside a repair starts an episode with probability
+    ``repair_density``; the episode's annotation covers the trouble source
+    (the turn before it) through the end of the episode. With
+    ``quote_learner`` (Week 1-2 layout) learner turns are wrapped in curly
+    quotes, as they appear in the transcript and in the parsed output.
+    """
+    scenario = SCENARIOS[rng.choice(sorted(SCENARIOS))]
+    dialogue: List[Dict[str, Any]] = []
+    repairs: List[Dict[str, Any]] = []
+
+    def add(speaker: str, text: str) -> int:
+        if quote_learner and speaker == "learner":
+            text = f"“{text}”"
+        dialogue.append({"turn": len(dialogue) + 1, "speaker": speaker, "text": text})
+        return len(dialogue)
+
+    while len(dialogue) < turns:
+        speaker = "learner" if len(dialogue) % 2 == 0 else "bot"
+        if speaker == "learner" and len(dialogue) >= 2 and rng.random() < repair_density:
+            initiation, resolution, template = rng.choice(EPISODES)
+            category, detail, source_text = rng.choice(TROUBLE_SOURCES)
+            word = rng.choice(HARD_WORDS)
+            # The trouble source is the learner's previous turn for BI, the bot's for LI
+            if initiation == "BI":
+                source = add("learner", source_text.format(word=word))
+            else:
+                add("learner", rng.choice(scenario["learner"]))
+                source = add("bot", f"We can offer the {word} option for that.")
+            indices = [source]
+            for episode_speaker, text in template:
+                if (episode_speaker == "learner") != (len(dialogue) % 2 == 0):
+                    # Keep strict alternation: let the other speaker acknowledge first
+                    add("bot" if len(dialogue) % 2 else "learner", "Okay, I see.")
+                indices.append(add(episode_speaker, text))
+            repairs.append({
+                "dialogue_id": dialogue_id,
+                "repair_id": len(repairs) + 1,
+                "turn_indices": list(range(indices[0], indices[-1] + 1)),
+                "initiation": initiation,
+                "resolution": resolution,
+                "trigger": f"{category} – {detail.format(word=word)}",
+                "evidence_summary": (
+                    f"Synthetic {initiation} episode: trouble source in turn {indices[0]}, "
+                    f"{'resolved' if resolution == 'R' else 'not resolved'} by turn {indices[-1]}."
+                ),
+            })
+        else:
+            add(speaker, rng.choice(scenario[speaker]))
+    return dialogue, repairs
+
+
+def render_document(
+    tasks: List[List[Dict[str, Any]]],
+    week: int,
+    learner_label: str,
+    bot_label: str,
+    rng: random.Random,
+    labeled: bool = True
+) -> str:
+    """Plain text of one week's transcript in that week's layout."""
+    lines: List[str] = []
+    for task_number, turns in enumerate(tasks, 1):
+        if lines:
+            lines.append("")
+        lines.append(_task_header(week, task_number))
+        if week in QUOTED_WEEKS:
+            lines.append("")
+        for turn in turns:
+            learner = turn["speaker"] == "learner"
+            text = turn["text"]
+            if not labeled:
+                lines.append(text)
+            elif week in QUOTED_WEEKS:
+                lines.append(learner_label if learner else bot_label)
+                lines.append(text)
+            elif week == 3:
+                lines.append(learner_label if learner else bot_label)
+                lines.append(text)
+                if learner and rng.random() < 0.3:
+                    lines.append(rng.choice(TIMESTAMPS))
+            else:
+                lines.append(f"{learner_label if learner else bot_label} {text}")
+    return "\n".join(lines) + "\n"
+
+
+def write_docx(text: str, path: Path) -> None:
+    from docx import Document
+
+    document = Document()
+    for line in text.split("\n"):
+        document.add_paragraph(line)
+    document.save(str(path))
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(text: str, path: Path, lines_per_page: int = 60) -> None:
+    """Minimal text-only PDF (Helvetica, one line per text row); Latin-1 text only."""
+    lines = text.rstrip("\n").split("\n")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    objects: List[bytes] = []
+    n_pages = len(pages)
+    page_ids = [4 + 2 * i for i in range(n_pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in page_ids)}] /Count {n_pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    for i, page_lines in enumerate(pages):
+        rows = "\n".join(f"({_pdf_escape(line)}) Tj T*" for line in page_lines)
+        stream = f"BT /F1 9 Tf 12 TL 40 760 Td\n{rows}\nET".encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_ids[i] + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(output))
+
+
+def generate_corpus(
+    output_dir: Path = DEFAULT_OUTPUT_DIR,
+    students: int = 30,
+    weeks: Sequence[int] = WEEKS,
+    tasks_per_week: int = 3,
+    turns_per_dialogue: int = 30,
+    turn_spread: int = 8,
+    repair_density: float = 0.08,
+    label_sets: Sequence[str] = DEFAULT_LABEL_SETS,
+    formats: Sequence[str] = DEFAULT_FORMATS,
+    documents: bool = True,
+    seed: int = 0,
+    base_config_path: Path = CONFIG_PATH,
+    verbose: bool = True
+) -> Dict[str, Any]:
+    """
+    Write a synthetic corpus and its config under ``output_dir``.
+
+    Args:
+        output_dir: Root of the generated tree (config/ and data/ are created in it)
+        students: Number of synthetic students (ids 1..students)
+        weeks: Weeks per student (1-4; each uses its own layout)
+        tasks_per_week: Dialogues per week document
+        turns_per_dialogue: Mean turns per dialogue
+        turn_spread: Dialogue lengths vary uniformly by +/- this many turns
+        repair_density: Probability that a learner turn starts a repair episode
+        label_sets: Label sets assigned to students in rotation
+        formats: Raw document formats in rotation (PDF is used for Week 4 only,
+            where real transcripts are unlabeled)
+        documents: Render raw documents and extracted text (False: processed JSON
+            and annotations only)
+        seed: Random seed; the same arguments always give the same corpus
+        base_config_path: Config whose label sets and defaults are copied
+
+    Returns:
+        Manifest with the parameters and counts
+    """
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    base_config = load_config(base_config_path)
+    all_label_sets = base_config.get("label_sets", {})
+    unknown = [name for name in label_sets if name not in all_label_sets]
+    if unknown:
+        raise ValueError(f"Unknown label set(s): {', '.join(unknown)}. Available: {', '.join(sorted(all_label_sets))}")
+
+    output_dir = Path(output_dir)
+    raw_dir = output_dir / "data" / "raw"
+    text_dir = output_dir / "data" / "extracted_text"
+    processed_dir = output_dir / "data" / "processed"
+    repairs_dir = output_dir / "data" / "repairs" / BATCH_NAME
+    for directory in (processed_dir, repairs_dir) + ((raw_dir, text_dir) if documents else ()):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    config = {
+        "naming": {**base_config.get("naming", {}), "processed_dir": str(processed_dir.resolve())},
+        "repair_detection": base_config.get("repair_detection", {}),
+        "defaults": {**base_config.get("defaults", {}), "tasks_per_week": tasks_per_week},
+        "label_sets": all_label_sets,
+        "students": {},
+    }
+    counts = {"students": students, "documents": 0, "dialogues": 0, "turns": 0, "repairs": 0,
+              "formats": {}, "label_sets": {}}
+
+    document_index = 0
+    for student_id in range(1, students + 1):
+        label_set_name = label_sets[(student_id - 1) % len(label_sets)]
+        label_set = all_label_sets[label_set_name]
+        config["students"][str(student_id)] = {
+            "label_set": label_set_name,
+            "weeks": {str(week): {"tasks": tasks_per_week} for week in weeks},
+        }
+        counts["label_sets"][label_set_name] = counts["label_sets"].get(label_set_name, 0) + 1
+
+        for week in weeks:
+            tasks = []
+            suffix = formats[document_index % len(formats)]
+            document_index += 1
+            if suffix == "pdf" and week != 4:
+                suffix = next((f for f in formats if f != "pdf"), "docx")
+            source_path = raw_dir / f"#{student_id}" / f"#{student_id}. Week{week}.{suffix}"
+
+            for task in range(1, tasks_per_week + 1):
+                dialogue_id = f"S{student_id}_W{week}_T{task}"
+                length = max(4, turns_per_dialogue + rng.randint(-turn_spread, turn_spread))
+                turns, repairs = generate_dialogue(
+                    rng, dialogue_id, length, repair_density, quote_learner=week in QUOTED_WEEKS
+                )
+                tasks.append(turns)
+
+                dialogue = {
+                    "student_id": student_id,
+                    "week": week,
+                    "task": task,
+                    "task_label": f"T{task}",
+                    "dialogue_id": dialogue_id,
+                    "source_file": project_relative(source_path.resolve()),
+                    "turns": turns,
+                }
+                with open(processed_dir / f"{dialogue_id}.json", 'w', encoding='utf-8') as f:
+                    json.dump(dialogue, f, indent=2, ensure_ascii=False)
+                with open(repairs_dir / f"{dialogue_id}_repairs.json", 'w', encoding='utf-8') as f:
+                    json.dump(repairs, f, indent=2, ensure_ascii=False)
+                counts["dialogues"] += 1
+                counts["turns"] += len(turns)
+                counts["repairs"] += len(repairs)
+
+            if documents:
+                learner_label, bot_label = label_set["learner"][0], label_set["bot"][0]
+                text = render_document(tasks, week, learner_label, bot_label, rng, labeled=suffix != "pdf")
+                source_path.parent.mkdir(parents=True, exist_ok=True)
+                if suffix == "docx":
+                    write_docx(text, source_path)
+                elif suffix == "pdf":
+                    write_pdf(text, source_path)
+                else:
+                    source_path.write_text(text, encoding="utf-8")
+                (text_dir / f"S{student_id}_W{week}.txt").write_text(text, encoding="utf-8")
+                counts["documents"] += 1
+                counts["formats"][suffix] = counts["formats"].get(suffix, 0) + 1
+
+        if verbose and student_id % 100 == 0:
+            print(f"  Generated {student_id}/{students} students ({counts['dialogues']} dialogues)")
+
+    config_path = output_dir / "config" / "preprocessing_config.json"
+    config_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+
+    manifest = {
+        "parameters": {
+            "students": students,
+            "weeks": list(weeks),
+            "tasks_per_week": tasks_per_week,
+            "turns_per_dialogue": turns_per_dialogue,
+            "turn_spread": turn_spread,
+            "repair_density": repair_density,
+            "label_sets": list(label_sets),
+            "formats": list(formats),
+            "documents": documents,
+            "seed": seed,
+        },
+        "counts": counts,
+        "paths": {
+            "config": str(config_path),
+            "raw_dir": str(raw_dir),
+            "extracted_text_dir": str(text_dir),
+            "processed_dir": str(processed_dir),
+            "repairs_dir": str(repairs_dir.parent),
+        },
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+    with open(output_dir / "synthetic_manifest.json", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+def verify_round_trip(output_dir: Path = DEFAULT_OUTPUT_DIR, verbose: bool = False) -> Dict[str, Any]:
+    """
+    Parse a generated corpus with the preprocessing pipeline and compare it to the ground truth.
+
+    The documents are re-extracted and parsed into a temporary directory, so
+    the ground-truth processed JSON is left untouched. Every turn must match
+    in number, speaker and text.
+
+    Args:
+        output_dir: Root of a tree written by ``generate_corpus`` with documents
+        verbose: Print the preprocessing pipeline's progress
+
+    Returns:
+        Dict with the number of dialogues compared and a list of mismatches
+        (``dialogue_id``, ``turn``, ``expected``, ``parsed``; ``turn`` is None
+        when the dialogue is missing or has a different number of turns)
+    """
+    output_dir = Path(output_dir)
+    config = load_config(output_dir / "config" / "preprocessing_config.json")
+    truth_dir = Path(config["naming"]["processed_dir"])
+    mismatches: List[Dict[str, Any]] = []
+    dialogues = 0
+
+    with tempfile.TemporaryDirectory(prefix="synthetic_round_trip_") as tmp:
+        tmp_dir = Path(tmp)
+        parsed_dir = tmp_dir / "processed"
+        config["naming"] = {**config["naming"], "processed_dir": str(parsed_dir)}
+        config_path = tmp_dir / "preprocessing_config.json"
+        config_path.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+        run_pipeline(
+            force=True,
+            verbose=verbose,
+            config_path=config_path,
+            raw_dir=output_dir / "data" / "raw",
+            extracted_text_dir=tmp_dir / "extracted_text",
+        )
+
+        for truth_path in sorted(truth_dir.glob("*.json")):
+            dialogues += 1
+            dialogue_id = truth_path.stem
+            expected = json.loads(truth_path.read_text(encoding="utf-8"))["turns"]
+            parsed_path = parsed_dir / truth_path.name
+            if not parsed_path.exists():
+                mismatches.append({"dialogue_id": dialogue_id, "turn": None,
+                                   "expected": f"{len(expected)} turns", "parsed": "missing"})
+                continue
+            parsed = json.loads(parsed_path.read_text(encoding="utf-8"))["turns"]
+            if len(parsed) != len(expected):
+                mismatches.append({"dialogue_id": dialogue_id, "turn": None,
+                                   "expected": f"{len(expected)} turns", "parsed": f"{len(parsed)} turns"})
+                continue
+            for want, got in zip(expected, parsed):
+                fields = ("turn", "speaker", "text")
+                if any(want.get(k) != got.get(k) for k in fields):
+                    mismatches.append({"dialogue_id": dialogue_id, "turn": want["turn"],
+                                       "expected": {k: want.get(k) for k in fields},
+                                       "parsed": {k: got.get(k) for k in fields}})
+
+    return {"dialogues": dialogues, "mismatches": mismatches}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic dialogue corpus for scale testing")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT_DIR), help="Output root (default: data/synthetic)")
+    parser.add_argument("--students", type=int, default=30, help="Number of students")
+    parser.add_argument("--weeks", type=int, nargs="+", default=list(WEEKS), choices=WEEKS, help="Weeks per student")
+    parser.add_argument("--tasks", type=int, default=3, help="Dialogues per week")
+    parser.add_argument("--turns", type=int, default=30, help="Mean turns per dialogue")
+    parser.add_argument("--turn-spread", type=int, default=8, help="Dialogue length varies by +/- this many turns")
+    parser.add_argument("--repair-density", type=float, default=0.08,
+                        help="Probability that a learner turn starts a repair episode")
+    parser.add_argument("--label-sets", nargs="+", default=list(DEFAULT_LABEL_SETS), help="Label sets to rotate through")
+    parser.add_argument("--formats", nargs="+", default=list(DEFAULT_FORMATS), choices=DEFAULT_FORMATS,
+                        help="Raw document formats to rotate through")
+    parser.add_argument("--no-documents", action="store_true",
+                        help="Only write processed JSON and annotations (fast, for 10k+ dialogues)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--verify", action="store_true",
+                        help="Parse the generated documents and fail if any turn differs from the ground truth")
+    args = parser.parse_args()
+    if args.verify and args.no_documents:
+        parser.error("--verify needs the documents; drop --no-documents")
+
+    print(f"[INFO] Generating {args.students} student(s) x {len(args.weeks)} week(s) x {args.tasks} task(s)...")
+    try:
+        manifest = generate_corpus(
+            output_dir=Path(args.output),
+            students=args.students,
+            weeks=args.weeks,
+            tasks_per_week=args.tasks,
+            turns_per_dialogue=args.turns,
+            turn_spread=args.turn_spread,
+            repair_density=args.repair_density,
+            label_sets=args.label_sets,
+            formats=args.formats,
+            documents=not args.no_documents,
+            seed=args.seed,
+        )
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+    counts, paths = manifest["counts"], manifest["paths"]
+    print(f"[OK] {counts['dialogues']} dialogues, {counts['turns']} turns, {counts['repairs']} repairs, "
+          f"{counts['documents']} documents in {manifest['seconds']:.1f}s")
+    print(f"  Config: {paths['config']}")
+    print(f"  Processed: {paths['processed_dir']}")
+    print(f"  Repairs: {paths['repairs_dir']}")
+
+    if args.verify:
+        result = verify_round_trip(Path(args.output))
+        mismatches = result["mismatches"]
+        if mismatches:
+            dialogues = len({m["dialogue_id"] for m in mismatches})
+            print(f"[ERROR] Round trip: {dialogues} of {result['dialogues']} dialogues differ from the ground truth")
+            for mismatch in mismatches[:10]:
+                turn = f" turn {mismatch['turn']}" if mismatch["turn"] is not None else ""
+                print(f"  {mismatch['dialogue_id']}{turn}: expected {mismatch['expected']}, parsed {mismatch['parsed']}")
+            sys.exit(1)
+        print(f"[OK] Round trip: all {result['dialogues']} dialogues parse back to the ground truth")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Incremental JSON-array parser for streamed LLM responses.
+
+The detectors ask for a single JSON array of repair objects. Models wrap that
+array in markdown fences, prefix it with prose, wrap it in an object
+(``{"repairs": [...]}``) or get cut off mid-object. This parser consumes the
+response in arbitrary chunks and emits each array element as soon as its
+closing brace arrives, so:
+
+- partial results survive timeouts and truncated completions,
+- validation can run while the model is still generating,
+- the text is scanned exactly once (no regex passes or re-counting).
+
+Usage:
+    parser = JsonArrayStreamParser()
+    for chunk in stream:
+        for repair in parser.feed(chunk):
+            ...
+    parser.close()
+
+or, for a complete response:
+    repairs = parse_repair_array(response_text)
+"""
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Characters that change parser state once inside the target array
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+# Characters that end or escape a JSON string
+_STRING_SPECIAL = re.compile(r'["\\]')
+# Start of the target array: '[' followed by an object or an immediate ']'
+_ARRAY_START = re.compile(r'\[\s*(?=[{\]])')
+
+
+class JsonArrayStreamParser:
+    """
+    Streaming parser that yields the object elements of the first JSON array.
+
+    The first '[' that is directly followed by '{' or ']' is taken as the
+    start of the repair array; anything before it (prose, code fences, an
+    enclosing ``{"repairs":`` wrapper) is ignored. Non-object elements are
+    skipped, and any object that fails to decode is counted in
+    ``skipped_elements`` rather than aborting the stream.
+    """
+
+    def __init__(self):
+        self._buffer = ""        # Unconsumed text (pre-array lookahead or current element)
+        self._pos = 0            # Scan position within _buffer
+        self._in_array = False
+        self._depth = 0          # Nesting depth relative to the target array
+        self._in_string = False
+        self._escape = False
+        self._element_start: Optional[int] = None
+        self.complete = False    # Closing ']' of the target array was seen
+        self.started = False     # Opening '[' of the target array was seen
+        self.emitted = 0
+        self.skipped_elements = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of text and return any objects completed by it."""
+        if self.complete or not chunk:
+            return []
+        self._buffer += chunk
+        completed: List[Dict[str, Any]] = []
+
+        if not self._in_array and not self._find_array_start():
+            return completed
+
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            if self._in_string:
+                if self._escape:
+                    # Backslash ended the previous chunk; skip the escaped character
+                    self._escape = False
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                pos = match.end()
+                if match.group() == '\\':
+                    if pos < len(buffer):
+                        pos += 1  # Skip the escaped character
+                    else:
+                        self._escape = True
+                    continue
+                self._in_string = False
+                continue
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            char = match.group()
+            index = match.start()
+            pos = match.end()
+
+            if char == '"':
+                self._in_string = True
+            elif char in '[{':
+                if self._depth == 0 and char == '{':
+                    self._element_start = index
+                self._depth += 1
+            else:
+                if self._depth == 0:
+                    # Closing bracket of the target array
+                    self.complete = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._element_start is not None:
+                    element = self._decode(buffer[self._element_start:pos])
+                    if element is not None:
+                        completed.append(element)
+                    self._element_start = None
+
+        # Drop text that can no longer be part of an element
+        if self._element_start is not None:
+            self._buffer = buffer[self._element_start:]
+            self._pos = pos - self._element_start
+            self._element_start = 0
+        else:
+            self._buffer = ""
+            self._pos = 0
+
+        return completed
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        Finish the stream.
+
+        Returns an empty list: a trailing, unterminated element is truncated
+        output and is dropped. Kept for symmetry with ``feed`` so callers can
+        treat end-of-stream uniformly.
+        """
+        if self._element_start is not None:
+            self.skipped_elements += 1
+        self._buffer = ""
+        self._pos = 0
+        self._element_start = None
+        return []
+
+    @property
+    def truncated(self) -> bool:
+        """True if the array was opened but never closed."""
+        return self.started and not self.complete
+
+    def _find_array_start(self) -> bool:
+        """Locate the target array in the buffered prefix."""
+        match = _ARRAY_START.search(self._buffer)
+        if match is None:
+            # Keep a short tail: '[' may be followed by whitespace in the next chunk
+            last_bracket = self._buffer.rfind('[')
+            if last_bracket >= 0 and not self._buffer[last_bracket + 1:].strip():
+                self._buffer = self._buffer[last_bracket:]
+            else:
+                self._buffer = ""
+            return False
+
+        self._in_array = True
+        self.started = True
+        self._buffer = self._buffer[match.end():]
+        self._pos = 0
+        return True
+
+    def _decode(self, text: str) -> Optional[Dict[str, Any]]:
+        try:
+            element = json.loads(text)
+        except json.JSONDecodeError:
+            self.skipped_elements += 1
+            return None
+        if not isinstance(element, dict):
+            self.skipped_elements += 1
+            return None
+        self.emitted += 1
+        return element
+
+
+def iter_repair_objects(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield repair objects from an iterable of text chunks as they complete."""
+    parser = JsonArrayStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+        if parser.complete:
+            break
+    yield from parser.close()
+
+
+def parse_repair_array(response_text: str) -> List[Dict[str, Any]]:
+    """Parse a complete response into a list of repair objects."""
+    parser = JsonArrayStreamParser()
+    repairs = parser.feed(response_text or "")
+    repairs.extend(parser.close())
+    return repairs
@@ -20,7 +20,10 @@ from document_extractor import (
     extract_text_with_colors_from_pdf,
     save_extracted_text,
 )
+from artifact_writer import batched_directory_sync, is_complete_json
 from dialogue_parser import DialogueParser
+from stage_timing import stage
+from turn_alignment import SourceAligner, alignment_metadata
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -29,7 +32,9 @@ RAW_DATA_DIR = PROJECT_ROOT / "data" / "raw"
 EXTRACTED_TEXT_DIR = PROJECT_ROOT / "data" / "extracted_text"
 
 DOC_PATTERN = re.compile(r"#(\d+)\.\s*Week\s*(\d+)", re.IGNORECASE)
-SUPPORTED_SUFFIXES = {".docx", ".pdf"}
+SUPPORTED_SUFFIXES = {".docx", ".pdf", ".txt"}
+# When a student/week has several documents, the lowest rank wins
+SUFFIX_PREFERENCE = {".docx": 0, ".pdf": 1, ".txt": 2}
 
 
 @dataclass
@@ -54,15 +59,15 @@ def load_config(config_path: Path = CONFIG_PATH) -> Dict[str, Any]:
         return json.load(f)
 
 
-def discover_documents(config: Dict[str, Any]) -> List[DocumentRecord]:
-    """Scan data/raw for dialogue documents and attach metadata."""
+def discover_documents(config: Dict[str, Any], raw_dir: Path = RAW_DATA_DIR) -> List[DocumentRecord]:
+    """Scan raw_dir (default data/raw) for dialogue documents and attach metadata."""
     documents: Dict[Tuple[str, str], DocumentRecord] = {}
     label_sets = config.get("label_sets", {})
     defaults = config.get("defaults", {})
     default_label_set = defaults.get("label_set", "english_standard")
     default_tasks = defaults.get("tasks_per_week", 3)
 
-    for file_path in RAW_DATA_DIR.rglob("*"):
+    for file_path in raw_dir.rglob("*"):
         if not file_path.is_file():
             continue
         suffix = file_path.suffix.lower()
@@ -101,8 +106,8 @@ def discover_documents(config: Dict[str, Any]) -> List[DocumentRecord]:
             documents[key] = record
             continue
 
-        # Prefer DOCX over PDF; otherwise keep the most recent file
-        if existing.suffix == ".pdf" and record.suffix == ".docx":
+        # Prefer DOCX over PDF over TXT; otherwise keep the most recent file
+        if SUFFIX_PREFERENCE[record.suffix] < SUFFIX_PREFERENCE[existing.suffix]:
             documents[key] = record
         elif existing.suffix == record.suffix:
             existing_mtime = existing.path.stat().st_mtime
@@ -184,6 +189,14 @@ def filter_skip_sections(text: str, skip_keywords: List[str]) -> Tuple[str, List
     return filtered_text, removed_sections
 
 
+def project_relative(path: Path) -> str:
+    """Path relative to the project root, or absolute for files outside it (e.g. synthetic corpora)."""
+    try:
+        return str(path.relative_to(PROJECT_ROOT))
+    except ValueError:
+        return str(path)
+
+
 def ensure_processed_dir(config: Dict[str, Any]) -> Path:
     processed_dir = config.get("naming", {}).get("processed_dir", "data/processed")
     processed_path = (PROJECT_ROOT / processed_dir).resolve()
@@ -192,11 +205,15 @@ def ensure_processed_dir(config: Dict[str, Any]) -> Path:
 
 
 def should_skip_output(output_file: Path, source_file: Path, force: bool) -> bool:
+    """Skip an output that is newer than its source, unless it is not a complete JSON document."""
     if force:
         return False
     if not output_file.exists():
         return False
-    return output_file.stat().st_mtime >= source_file.stat().st_mtime
+    if output_file.stat().st_mtime < source_file.stat().st_mtime:
+        return False
+    # A truncated artifact (e.g. from an interrupted run before writes were atomic) is redone
+    return is_complete_json(output_file)
 
 
 def parse_tasks_for_document(
@@ -243,23 +260,32 @@ def format_dialogue_metadata(
         "task": task_idx,
         "task_label": task_label,
         "dialogue_id": dialogue_id,
-        "source_file": str(record.path.relative_to(PROJECT_ROOT)),
+        "source_file": project_relative(record.path),
     }
 
 
+# Outputs are fsync'ed one by one; each output directory once at the end of the run
+@batched_directory_sync()
 def run_pipeline(
     selected_students: Optional[List[int]] = None,
     selected_weeks: Optional[List[int]] = None,
     force: bool = False,
     dry_run: bool = False,
     verbose: bool = True,
+    config_path: Path = CONFIG_PATH,
+    raw_dir: Path = RAW_DATA_DIR,
+    extracted_text_dir: Path = EXTRACTED_TEXT_DIR,
 ) -> Dict[str, Any]:
     """
     Run preprocessing for the requested subset (or all documents by default).
     
+    The path arguments default to the project's data layout; point them at
+    another tree (e.g. one from generate_synthetic_corpus.py) to process it.
+    Processed JSON goes to the config's naming.processed_dir.
+    
     Returns a summary dictionary with processed/skipped/error counts.
     """
-    config = load_config()
+    config = load_config(config_path)
     processed_dir = ensure_processed_dir(config)
     parser = DialogueParser()
     label_sets = config.get("label_sets", {})
@@ -269,7 +295,8 @@ def run_pipeline(
     student_filter = {str(s) for s in selected_students} if selected_students else None
     week_filter = {str(w) for w in selected_weeks} if selected_weeks else None
 
-    documents = discover_documents(config)
+    with stage("discovery"):
+        documents = discover_documents(config, raw_dir)
 
     summary = {
         "processed": [],
@@ -281,7 +308,7 @@ def run_pipeline(
         print("=" * 70)
         print("PREPROCESSING PIPELINE")
         print("=" * 70)
-        print(f"Discovered {len(documents)} documents in data/raw")
+        print(f"Discovered {len(documents)} documents in {project_relative(raw_dir)}")
 
     for record in documents:
         if student_filter and record.student_id not in student_filter:
@@ -291,10 +318,11 @@ def run_pipeline(
 
         if verbose:
             print(f"\nStudent {record.student_id} - Week {record.week}")
-            print(f"  Source: {record.path.relative_to(PROJECT_ROOT)}")
+            print(f"  Source: {project_relative(record.path)}")
 
         try:
-            raw_text = extract_text(str(record.path))
+            with stage("extraction"):
+                raw_text = extract_text(str(record.path))
         except Exception as exc:
             summary["errors"].append(
                 {
@@ -308,7 +336,8 @@ def run_pipeline(
             continue
 
         # Filter out sections with skip keywords instead of skipping entire document
-        filtered_text, removed_sections = filter_skip_sections(raw_text, skip_keywords)
+        with stage("filtering"):
+            filtered_text, removed_sections = filter_skip_sections(raw_text, skip_keywords)
         if removed_sections:
             if verbose:
                 print(f"  [INFO] Filtered {len(removed_sections)} section(s) containing skip keywords")
@@ -335,20 +364,29 @@ def run_pipeline(
 
         # Save extracted plain text for reference
         extracted_filename = f"S{record.student_id}_W{record.week}.txt"
-        extracted_path = EXTRACTED_TEXT_DIR / extracted_filename
-        save_extracted_text(raw_text, str(extracted_path))
+        extracted_path = extracted_text_dir / extracted_filename
+        with stage("write"):
+            save_extracted_text(raw_text, str(extracted_path))
+        # Turns of every task are aligned back to offsets in this text
+        aligner = SourceAligner(raw_text)
+        try:
+            aligned_text_file = extracted_path.resolve().relative_to(PROJECT_ROOT).as_posix()
+        except ValueError:
+            aligned_text_file = str(extracted_path)
 
         label_set = label_sets.get(record.label_set, {})
         learner_labels = label_set.get("learner", [])
         bot_labels = label_set.get("bot", [])
-        normalized_text = normalize_labels(raw_text, learner_labels, bot_labels)
+        with stage("normalisation"):
+            normalized_text = normalize_labels(raw_text, learner_labels, bot_labels)
 
-        tasks = parse_tasks_for_document(
-            parser=parser,
-            record=record,
-            text=normalized_text,
-            is_pdf=record.suffix == ".pdf",
-        )
+        with stage("task_splitting"):
+            tasks = parse_tasks_for_document(
+                parser=parser,
+                record=record,
+                text=normalized_text,
+                is_pdf=record.suffix == ".pdf",
+            )
 
         if verbose:
             print(f"  Tasks identified: {len(tasks)} (expected {record.expected_tasks})")
@@ -356,7 +394,8 @@ def run_pipeline(
         pdf_color_data = None
         if record.suffix == ".pdf":
             try:
-                pdf_color_data = extract_text_with_colors_from_pdf(str(record.path))
+                with stage("extraction"):
+                    pdf_color_data = extract_text_with_colors_from_pdf(str(record.path))
             except Exception:
                 pdf_color_data = None
 
@@ -377,12 +416,13 @@ def run_pipeline(
                     print(f"    [SKIP] {output_filename} is already up-to-date")
                 continue
 
-            turns = parse_turns_for_task(
-                parser=parser,
-                task_text=task_text,
-                is_pdf=record.suffix == ".pdf",
-                pdf_color_data=pdf_color_data,
-            )
+            with stage("turn_parsing"):
+                turns = parse_turns_for_task(
+                    parser=parser,
+                    task_text=task_text,
+                    is_pdf=record.suffix == ".pdf",
+                    pdf_color_data=pdf_color_data,
+                )
 
             if not turns:
                 summary["errors"].append(
@@ -397,7 +437,10 @@ def run_pipeline(
                     print(f"    [WARN] No turns parsed for task {task_idx}")
                 continue
 
+            with stage("alignment"):
+                alignment = alignment_metadata(aligner.align_turns(turns), raw_text, aligned_text_file)
             metadata = format_dialogue_metadata(record, task_idx, task_label)
+            metadata["source_alignment"] = alignment
 
             if dry_run:
                 if verbose:
@@ -406,11 +449,12 @@ def run_pipeline(
                         f"({len(turns)} turns)"
                     )
             else:
-                parser.save_dialogue_json(
-                    turns,
-                    str(output_path),
-                    metadata=metadata,
-                )
+                with stage("write"):
+                    parser.save_dialogue_json(
+                        turns,
+                        str(output_path),
+                        metadata=metadata,
+                    )
                 summary["processed"].append(
                     {
                         "student_id": record.student_id,
@@ -418,10 +462,14 @@ def run_pipeline(
                         "task": task_idx,
                         "file": output_filename,
                         "turns": len(turns),
+                        "alignment_coverage": alignment["coverage"],
                     }
                 )
                 if verbose:
-                    print(f"    [OK] Saved {output_filename} ({len(turns)} turns)")
+                    print(
+                        f"    [OK] Saved {output_filename} ({len(turns)} turns, "
+                        f"{alignment['coverage']:.0%} aligned to source text)"
+                    )
 
     if verbose:
         print("\n" + "=" * 70)
@@ -430,6 +478,10 @@ def run_pipeline(
         print(f"Processed files : {len(summary['processed'])}")
         print(f"Skipped files   : {len(summary['skipped'])}")
         print(f"Errors          : {len(summary['errors'])}")
+        processed_turns = sum(item["turns"] for item in summary["processed"])
+        if processed_turns:
+            aligned = sum(item["turns"] * item["alignment_coverage"] for item in summary["processed"])
+            print(f"Source alignment: {aligned / processed_turns:.1%} of turns")
 
     return summary
 
@@ -453,6 +505,21 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
         action="store_true",
         help="Reprocess files even if outputs are newer than sources",
     )
+    parser.add_argument(
+        "--config",
+        default=str(CONFIG_PATH),
+        help="Preprocessing config (default: config/preprocessing_config.json)",
+    )
+    parser.add_argument(
+        "--raw-dir",
+        default=str(RAW_DATA_DIR),
+        help="Directory scanned for source documents (default: data/raw)",
+    )
+    parser.add_argument(
+        "--extracted-text-dir",
+        default=str(EXTRACTED_TEXT_DIR),
+        help="Where extracted plain text is saved (default: data/extracted_text)",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -469,6 +536,9 @@ def main() -> None:
         force=args.force,
         dry_run=args.dry_run,
         verbose=True,
+        config_path=Path(args.config),
+        raw_dir=Path(args.raw_dir),
+        extracted_text_dir=Path(args.extracted_text_dir),
     )
 
 
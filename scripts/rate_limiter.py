@@ -0,0 +1,112 @@
+"""
+Process-wide request rate limits for the LLM providers.
+
+Every detector calls ``acquire(provider)`` right before it sends a request, so
+all callers in one process (pipeline, calibration, cascade, concurrent
+workers) share the same per-provider budget.
+
+Limits are requests per minute, read from
+``config/preprocessing_config.json`` (``repair_detection.rate_limits_per_minute``)
+with ``DEFAULT_RATE_LIMITS`` as the fallback.
+"""
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CONFIG_PATH = PROJECT_ROOT / "config" / "preprocessing_config.json"
+
+DEFAULT_RATE_LIMITS = {
+    "gemini": 60,
+    "openai": 500,
+}
+
+# Requests that may go out back to back after an idle period, so the
+# concurrent samples of one dialogue are not serialised
+DEFAULT_BURST = 5
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces requests evenly.
+
+    Each ``acquire`` reserves the next free slot (``60 / requests_per_minute``
+    seconds after the previous one) under a lock and then sleeps outside the
+    lock until that slot, so concurrent callers queue fairly without holding
+    the lock while waiting. Up to ``burst`` requests may go out back to back
+    after an idle period.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = DEFAULT_BURST):
+        self.requests_per_minute = requests_per_minute
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self.requests = 0
+        self.total_wait = 0.0
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; return the seconds spent waiting."""
+        if self.interval == 0:
+            with self._lock:
+                self.requests += 1
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            # Idle time earns back up to `burst` slots
+            slot = max(self._next_slot, now - (self.burst - 1) * self.interval)
+            self._next_slot = slot + self.interval
+            wait = max(0.0, slot - now)
+            self.requests += 1
+            self.total_wait += wait
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+_LIMITERS: Dict[str, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+_CONFIGURED_LIMITS: Optional[Dict[str, float]] = None
+
+
+def _configured_limits() -> Dict[str, float]:
+    global _CONFIGURED_LIMITS
+    if _CONFIGURED_LIMITS is None:
+        limits = dict(DEFAULT_RATE_LIMITS)
+        if CONFIG_PATH.exists():
+            try:
+                with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                limits.update(config.get("repair_detection", {}).get("rate_limits_per_minute", {}))
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Could not read rate limits from {CONFIG_PATH}: {e}")
+        _CONFIGURED_LIMITS = limits
+    return _CONFIGURED_LIMITS
+
+
+def configure_rate_limits(limits: Dict[str, float]) -> None:
+    """Override requests-per-minute limits (e.g. from the command line)."""
+    with _LIMITERS_LOCK:
+        _configured_limits().update(limits)
+        for provider in limits:
+            _LIMITERS.pop(provider, None)
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """Return the shared limiter for a provider (unlimited if none is configured)."""
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(provider)
+        if limiter is None:
+            limiter = RateLimiter(_configured_limits().get(provider, 0))
+            _LIMITERS[provider] = limiter
+        return limiter
+
+
+def acquire(provider: str) -> float:
+    """Wait for the provider's next request slot; return the seconds waited."""
+    return get_rate_limiter(provider).acquire()
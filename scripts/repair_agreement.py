@@ -0,0 +1,283 @@
+"""
+Corpus-wide agreement between repair annotation sources.
+
+Each source (a label batch such as ``pilot``/``production``/``validation``, or
+a detector's output directory) is converted into per-turn label arrays over
+one flattened corpus of dialogue turns:
+
+- ``in_repair``:  0 = outside any repair, 1 = inside a repair
+- ``initiation``: 0 = none, 1 = LI, 2 = BI
+- ``resolution``: 0 = none, 1 = R, 2 = U-A, 3 = U-P
+
+Turns of dialogues a source did not annotate are missing (-1). Agreement is
+then computed with vectorised NumPy over all dialogues at once:
+
+- Cohen's kappa and turn-level F1 for every pair of sources,
+- Fleiss' kappa over turns rated by every source,
+- Krippendorff's alpha (nominal, missing data allowed) over all sources,
+- span-level F1 from optimal repair matching (``repair_matching``).
+
+Usage:
+    python scripts/repair_agreement.py                       # the three label batches
+    python scripts/repair_agreement.py data/repairs/validation path/to/model_output
+"""
+import json
+import sys
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from artifact_writer import write_json
+from repair_matching import DEFAULT_MIN_OVERLAP, LABEL_SETS, load_label_set, score_all_pairs
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
+REPORT_PATH = REPAIRS_DIR / "AGREEMENT_REPORT.json"
+
+MISSING = -1
+INITIATION_CATEGORIES = {'LI': 1, 'BI': 2}
+RESOLUTION_CATEGORIES = {'R': 1, 'U-A': 2, 'U-P': 3}
+# Field name -> number of categories (including 0 = none)
+LABEL_FIELDS = {"in_repair": 2, "initiation": 3, "resolution": 4}
+
+
+class TurnCorpus:
+    """Flattened index of every turn of a set of dialogues."""
+
+    def __init__(self, dialogue_turns: Dict[str, Sequence[int]]):
+        self.dialogues = sorted(dialogue_turns)
+        self.turns = {name: np.array(sorted(dialogue_turns[name]), dtype=np.int64) for name in self.dialogues}
+        sizes = np.array([len(self.turns[name]) for name in self.dialogues], dtype=np.int64)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1])) if len(sizes) else sizes
+        self.offsets = dict(zip(self.dialogues, starts.tolist()))
+        self.size = int(sizes.sum())
+
+    @classmethod
+    def from_processed(cls, dialogue_names: Sequence[str], processed_dir: Path = PROCESSED_DIR) -> "TurnCorpus":
+        """Load turn numbers for the named dialogues (dialogues without a processed file are skipped)."""
+        dialogue_turns = {}
+        for name in dialogue_names:
+            dialogue_file = processed_dir / f"{name}.json"
+            if not dialogue_file.exists():
+                continue
+            with open(dialogue_file, 'r', encoding='utf-8-sig') as f:
+                dialogue_data = json.load(f)
+            dialogue_turns[name] = [t.get('turn') for t in dialogue_data.get('turns', []) if isinstance(t.get('turn'), int)]
+        return cls(dialogue_turns)
+
+    def positions(self, dialogue: str, turn_indices: Sequence[Any]) -> np.ndarray:
+        """Flat positions of the given turns (turns not in the dialogue are dropped)."""
+        turns = self.turns[dialogue]
+        wanted = np.array([t for t in turn_indices if isinstance(t, int) and not isinstance(t, bool)], dtype=np.int64)
+        present = np.intersect1d(wanted, turns)
+        return self.offsets[dialogue] + np.searchsorted(turns, present)
+
+
+def label_arrays(corpus: TurnCorpus, annotations: Dict[str, List[Dict[str, Any]]]) -> Dict[str, np.ndarray]:
+    """
+    Per-turn label arrays of one source over the whole corpus.
+
+    When repairs overlap, the later repair's codes win on the shared turns.
+    """
+    arrays = {field: np.full(corpus.size, MISSING, dtype=np.int8) for field in LABEL_FIELDS}
+    for dialogue in corpus.dialogues:
+        if dialogue not in annotations:
+            continue
+        start = corpus.offsets[dialogue]
+        stop = start + len(corpus.turns[dialogue])
+        for field in LABEL_FIELDS:
+            arrays[field][start:stop] = 0
+        for repair in annotations[dialogue]:
+            if not isinstance(repair, dict):
+                continue
+            positions = corpus.positions(dialogue, repair.get('turn_indices', []) or [])
+            arrays["in_repair"][positions] = 1
+            arrays["initiation"][positions] = INITIATION_CATEGORIES.get(repair.get('initiation'), 0)
+            arrays["resolution"][positions] = RESOLUTION_CATEGORIES.get(repair.get('resolution'), 0)
+    return arrays
+
+
+def cohen_kappa(a: np.ndarray, b: np.ndarray, n_categories: int) -> float:
+    """Cohen's kappa over units rated by both sources."""
+    both = (a != MISSING) & (b != MISSING)
+    if not both.any():
+        return float('nan')
+    a, b = a[both].astype(np.int64), b[both].astype(np.int64)
+    confusion = np.bincount(a * n_categories + b, minlength=n_categories ** 2).reshape(n_categories, n_categories)
+    total = confusion.sum()
+    observed = np.trace(confusion) / total
+    expected = (confusion.sum(axis=1) @ confusion.sum(axis=0)) / total ** 2
+    return float((observed - expected) / (1 - expected)) if expected < 1 else 1.0
+
+
+def _category_counts(ratings: np.ndarray, n_categories: int) -> np.ndarray:
+    """Units x categories matrix of how many sources chose each category (missing ignored)."""
+    n_units = ratings.shape[1]
+    valid = ratings != MISSING
+    units = np.broadcast_to(np.arange(n_units), ratings.shape)[valid]
+    flat = units * n_categories + ratings[valid].astype(np.int64)
+    return np.bincount(flat, minlength=n_units * n_categories).reshape(n_units, n_categories)
+
+
+def fleiss_kappa(ratings: np.ndarray, n_categories: int) -> float:
+    """Fleiss' kappa over units rated by every source (ratings: sources x units)."""
+    complete = (ratings != MISSING).all(axis=0)
+    n_raters = ratings.shape[0]
+    if n_raters < 2 or not complete.any():
+        return float('nan')
+    counts = _category_counts(ratings[:, complete], n_categories).astype(np.float64)
+    per_unit = (np.sum(counts * counts, axis=1) - n_raters) / (n_raters * (n_raters - 1))
+    observed = per_unit.mean()
+    proportions = counts.sum(axis=0) / counts.sum()
+    expected = np.sum(proportions ** 2)
+    return float((observed - expected) / (1 - expected)) if expected < 1 else 1.0
+
+
+def krippendorff_alpha(ratings: np.ndarray, n_categories: int) -> float:
+    """Krippendorff's alpha (nominal) with missing ratings (ratings: sources x units)."""
+    counts = _category_counts(ratings, n_categories).astype(np.float64)
+    raters_per_unit = counts.sum(axis=1)
+    pairable = raters_per_unit >= 2
+    if not pairable.any():
+        return float('nan')
+    counts = counts[pairable]
+    weights = 1.0 / (raters_per_unit[pairable] - 1)
+
+    # Coincidence matrix: o_ck = sum_u n_uc * (n_uk - [c == k]) / (m_u - 1)
+    coincidence = counts.T @ (counts * weights[:, None]) - np.diag(counts.T @ weights)
+    marginals = coincidence.sum(axis=0)
+    total = marginals.sum()
+    disagreement_observed = coincidence.sum() - np.trace(coincidence)
+    disagreement_expected = total ** 2 - np.sum(marginals ** 2)
+    if disagreement_expected == 0:
+        return 1.0
+    return float(1 - (total - 1) * disagreement_observed / disagreement_expected)
+
+
+def turn_f1(a: np.ndarray, b: np.ndarray) -> float:
+    """F1 of in-repair turns between two sources, over turns rated by both."""
+    both = (a != MISSING) & (b != MISSING)
+    a, b = a[both] == 1, b[both] == 1
+    true_positives = np.count_nonzero(a & b)
+    denominator = np.count_nonzero(a) + np.count_nonzero(b)
+    return float(2 * true_positives / denominator) if denominator else float('nan')
+
+
+def agreement_report(
+    sources: Dict[str, Dict[str, List[Dict[str, Any]]]],
+    processed_dir: Path = PROCESSED_DIR,
+    min_overlap: float = DEFAULT_MIN_OVERLAP,
+    corpus: Optional[TurnCorpus] = None
+) -> Dict[str, Any]:
+    """
+    Agreement between every pair of sources and across all sources.
+
+    Args:
+        sources: Source name -> {dialogue name -> repairs}
+        processed_dir: Where the dialogues' turn lists are read from
+        min_overlap: Jaccard threshold for span-level matches
+        corpus: Optional prebuilt ``TurnCorpus`` (e.g. for in-memory dialogues)
+
+    Returns:
+        Report dictionary with "pairwise" and "overall" sections
+    """
+    if corpus is None:
+        all_dialogues = sorted(set().union(*(set(s) for s in sources.values()))) if sources else []
+        corpus = TurnCorpus.from_processed(all_dialogues, processed_dir)
+    names = list(sources)
+    arrays = {name: label_arrays(corpus, sources[name]) for name in names}
+    span_scores = {(r["a"], r["b"]): r for r in score_all_pairs(sources, min_overlap=min_overlap)}
+
+    pairwise = []
+    for name_a, name_b in combinations(names, 2):
+        a, b = arrays[name_a], arrays[name_b]
+        rated_by_both = int(np.count_nonzero((a["in_repair"] != MISSING) & (b["in_repair"] != MISSING)))
+        span = span_scores[(name_a, name_b)]
+        pairwise.append({
+            "a": name_a,
+            "b": name_b,
+            "shared_dialogues": span["shared_dialogues"],
+            "shared_turns": rated_by_both,
+            "cohen_kappa": {field: cohen_kappa(a[field], b[field], k) for field, k in LABEL_FIELDS.items()},
+            "turn_f1": turn_f1(a["in_repair"], b["in_repair"]),
+            "span_f1": span["metrics"]["overlap_f1"],
+            "exact_f1": span["metrics"]["f1_score"],
+            "label_f1": span["metrics"]["label_f1"],
+        })
+
+    overall = {}
+    if len(names) >= 2:
+        for field, k in LABEL_FIELDS.items():
+            ratings = np.vstack([arrays[name][field] for name in names])
+            overall[field] = {
+                "fleiss_kappa": fleiss_kappa(ratings, k),
+                "krippendorff_alpha": krippendorff_alpha(ratings, k),
+            }
+        overall["turns_rated_by_all"] = int(np.count_nonzero(
+            np.vstack([arrays[name]["in_repair"] for name in names]).min(axis=0) != MISSING
+        ))
+
+    return {
+        "sources": {name: {"dialogues": len(sources[name])} for name in names},
+        "corpus_turns": corpus.size,
+        "corpus_dialogues": len(corpus.dialogues),
+        "min_overlap": min_overlap,
+        "pairwise": pairwise,
+        "overall": overall,
+    }
+
+
+def print_agreement_report(report: Dict[str, Any]) -> None:
+    print("=" * 80)
+    print("REPAIR ANNOTATION AGREEMENT")
+    print("=" * 80)
+    print(f"Corpus: {report['corpus_dialogues']} dialogues, {report['corpus_turns']} turns")
+    for name, info in report["sources"].items():
+        print(f"  {name}: {info['dialogues']} annotated dialogues")
+
+    for pair in report["pairwise"]:
+        kappa = pair["cohen_kappa"]
+        print(f"\n{pair['a']} vs {pair['b']} ({pair['shared_dialogues']} dialogues, {pair['shared_turns']} turns)")
+        print(f"  Cohen's kappa: in-repair {kappa['in_repair']:.3f}, initiation {kappa['initiation']:.3f}, "
+              f"resolution {kappa['resolution']:.3f}")
+        print(f"  Turn F1: {pair['turn_f1']:.2%}  Span F1: {pair['span_f1']:.2%}  "
+              f"Exact F1: {pair['exact_f1']:.2%}  Label F1: {pair['label_f1']:.2%}")
+
+    if report["overall"]:
+        overall = report["overall"]
+        print(f"\nAll sources ({overall['turns_rated_by_all']} turns rated by every source for Fleiss' kappa):")
+        for field in LABEL_FIELDS:
+            print(f"  {field:<11} Fleiss' kappa {overall[field]['fleiss_kappa']:.3f}, "
+                  f"Krippendorff's alpha {overall[field]['krippendorff_alpha']:.3f}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Corpus-wide agreement between repair annotation sources")
+    parser.add_argument("dirs", nargs="*", help="Directories with *_repairs.json (default: the pilot/production/validation batches)")
+    parser.add_argument("--min-overlap", type=float, default=DEFAULT_MIN_OVERLAP, help="Jaccard threshold for span matches")
+    parser.add_argument("--output", default=str(REPORT_PATH), help="Where to save the JSON report")
+    args = parser.parse_args()
+
+    dirs = [Path(d) for d in args.dirs] or [REPAIRS_DIR / name for name in LABEL_SETS]
+    sources = {d.name: load_label_set(d) for d in dirs if d.exists()}
+    if len(sources) < 2:
+        print("[ERROR] Need at least two annotation directories to compare")
+        sys.exit(1)
+
+    report = agreement_report(sources, min_overlap=args.min_overlap)
+    print_agreement_report(report)
+
+    output_path = Path(args.output)
+    write_json(output_path, report)
+    print(f"\n[OK] Agreement report saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
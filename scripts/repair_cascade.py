@@ -0,0 +1,193 @@
+"""
+Model cascade: run the cheap detector first, escalate only uncertain dialogues.
+
+The cheap backend (Gemini flash by default) is sampled one or more times.
+A dialogue is escalated to the enhanced GPT-4o detector when any uncertainty
+signal fires:
+
+- disagreement: the cheap samples do not produce the same repair spans/codes,
+- sample failure: a cheap sample raised (API error, unparseable response),
+  so its silence cannot count as agreement,
+- validation: a cheap repair fails the schema or references turns that do
+  not exist in the dialogue,
+- ambiguous resolution: a repair is coded U-A/U-P, or a resolved repair ends
+  at the very end of the dialogue where resolution cannot be observed.
+
+Every routing decision is appended to a JSONL log so escalation rates and
+reasons can be audited, and the cascade can be scored with the existing
+calibration metrics (``calibrate_repair_detection.py --model cascade``).
+"""
+import copy
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from detector_backends import RepairDetectorBackend, create_backend
+from repair_schema import repair_schema_issues
+from validate_repair_results import validate_repair_against_dialogue
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_LOG_PATH = PROJECT_ROOT / "data" / "telemetry" / "cascade_routing.jsonl"
+
+AMBIGUOUS_RESOLUTIONS = ('U-A', 'U-P')
+
+
+def repair_signature(repairs: List[Dict[str, Any]]) -> List[tuple]:
+    """Order-independent summary of a detector output used to compare samples."""
+    signature = []
+    for repair in repairs:
+        if not isinstance(repair, dict):
+            continue
+        turns = [t for t in repair.get('turn_indices', []) if isinstance(t, int)]
+        span = (min(turns), max(turns)) if turns else (None, None)
+        signature.append(span + (repair.get('initiation'), repair.get('resolution')))
+    return sorted(signature, key=repr)
+
+
+def uncertainty_reasons(
+    samples: List[List[Dict[str, Any]]],
+    dialogue_data: Dict[str, Any],
+    ambiguous_resolutions: Sequence[str] = AMBIGUOUS_RESOLUTIONS
+) -> List[str]:
+    """Return the uncertainty signals raised by the cheap detector's samples."""
+    reasons = []
+
+    signatures = [repair_signature(sample) for sample in samples]
+    if any(sig != signatures[0] for sig in signatures[1:]):
+        counts = [len(sample) for sample in samples]
+        reasons.append(f"disagreement: samples differ (repair counts {counts})")
+
+    primary = samples[0] if samples else []
+    turn_numbers = [t.get('turn', 0) for t in dialogue_data.get('turns', [])]
+    last_turn = max(turn_numbers, default=0)
+
+    for repair in primary:
+        repair_id = repair.get('repair_id') if isinstance(repair, dict) else None
+        issues = repair_schema_issues(repair)
+        if not issues:
+            issues = validate_repair_against_dialogue(repair, dialogue_data)
+        if issues:
+            reasons.append(f"validation: repair {repair_id}: {issues[0]}")
+            continue
+
+        resolution = repair.get('resolution')
+        if resolution in ambiguous_resolutions:
+            reasons.append(f"ambiguous_resolution: repair {repair_id} coded {resolution}")
+        elif resolution == 'R' and max(repair['turn_indices']) >= last_turn - 1:
+            reasons.append(f"ambiguous_resolution: repair {repair_id} coded R but ends at dialogue end")
+
+    return reasons
+
+
+class CascadeBackend:
+    """Cheap-first detector that escalates uncertain dialogues to an expensive backend."""
+
+    name = "cascade"
+
+    def __init__(
+        self,
+        cheap: str = "gemini",
+        cheap_model: Optional[str] = None,
+        expensive: str = "openai-enhanced",
+        expensive_model: Optional[str] = None,
+        samples: int = 2,
+        sample_temperature: float = 0.7,
+        ambiguous_resolutions: Sequence[str] = AMBIGUOUS_RESOLUTIONS,
+        log_path: Optional[Path] = DEFAULT_LOG_PATH
+    ):
+        self.cheap = create_backend(cheap, model=cheap_model)
+        self.expensive = create_backend(expensive, model=expensive_model)
+        for backend in (self.cheap, self.expensive):
+            if hasattr(backend, 'raise_errors'):
+                # A failed call must not look like "no repairs": samples would agree on []
+                backend.raise_errors = True
+        self.samples = max(1, samples)
+        self.sample_temperature = sample_temperature
+        self.ambiguous_resolutions = tuple(ambiguous_resolutions)
+        self.log_path = log_path
+        self._sample_backends: List[RepairDetectorBackend] = []
+        self._lock = threading.Lock()
+        self.dialogues = 0
+        self.escalated = 0
+
+    def prepare(self) -> None:
+        self.cheap.prepare()
+        if not self._sample_backends:
+            # Extra samples reuse the prepared client/model at a higher temperature
+            self._sample_backends = [self.cheap]
+            for _ in range(self.samples - 1):
+                sampler = copy.copy(self.cheap)
+                if hasattr(sampler, 'temperature'):
+                    sampler.temperature = self.sample_temperature
+                self._sample_backends.append(sampler)
+        # The expensive backend is prepared lazily, on first escalation
+
+    def describe(self) -> str:
+        return (f"{self.name} ({self.cheap.describe()} x{self.samples} -> "
+                f"{self.expensive.describe()})")
+
+    def detect(self, dialogue_data, stream=False, on_repair=None):
+        self.prepare()
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=len(self._sample_backends)) as pool:
+            futures = [pool.submit(b.detect, dialogue_data, stream) for b in self._sample_backends]
+        samples, failures = [], []
+        for index, future in enumerate(futures, 1):
+            try:
+                samples.append(future.result())
+            except Exception as e:
+                failures.append(f"sample_failed: sample {index}/{self.samples}: {e}")
+        cheap_seconds = time.perf_counter() - started
+
+        reasons = failures + uncertainty_reasons(samples, dialogue_data, self.ambiguous_resolutions)
+        escalate = bool(reasons)
+        if escalate:
+            # Raises if the expensive backend fails too; the caller records a failure
+            repairs = self.expensive.detect(dialogue_data, stream=stream)
+        else:
+            repairs = samples[0]
+
+        with self._lock:
+            self.dialogues += 1
+            self.escalated += int(escalate)
+
+        self._log({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "dialogue_id": dialogue_data.get('dialogue_id'),
+            "cheap_backend": self.cheap.describe(),
+            "samples": self.samples,
+            "cheap_repair_counts": [len(sample) for sample in samples],
+            "cheap_failures": len(failures),
+            "escalated": escalate,
+            "expensive_backend": self.expensive.describe() if escalate else None,
+            "reasons": reasons,
+            "final_repair_count": len(repairs),
+            "cheap_seconds": round(cheap_seconds, 3),
+            "total_seconds": round(time.perf_counter() - started, 3),
+        })
+
+        if on_repair is not None:
+            for repair in repairs:
+                on_repair(repair)
+        return repairs
+
+    def routing_summary(self) -> Dict[str, Any]:
+        """Escalation counts for this run."""
+        with self._lock:
+            return {
+                "dialogues": self.dialogues,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / self.dialogues if self.dialogues else 0.0,
+            }
+
+    def _log(self, entry: Dict[str, Any]) -> None:
+        if self.log_path is None:
+            return
+        with self._lock:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
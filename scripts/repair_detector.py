@@ -4,14 +4,13 @@ Implements Phase 2: LLM Repair Detection.
 """
 import os
 import json
-import re
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from dotenv import load_dotenv
-import google.generativeai as genai
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator
 
-# Load environment variables
-load_dotenv()
+from artifact_writer import write_json
+from json_array_stream import JsonArrayStreamParser
+from telemetry import gemini_usage, note_parse, track_call
+from repair_schema import PARSE_STATS, gemini_generation_config, repair_schema_issues
 
 
 # System prompt for repair detection
@@ -309,14 +308,37 @@ Make sure every repair object has ALL required fields:
 Return the complete JSON array now:"""
 
 
-def get_gemini_model():
-    """Get the best available Gemini model."""
-    api_key = os.getenv("GEMINI_API_KEY")
+_ENV_LOADED = False
+
+
+def get_api_key(name: str) -> Optional[str]:
+    """
+    Read an API key from the environment, loading ``.env`` on first use.
+    
+    Deferred so that preprocessing- and validation-only runs never touch
+    python-dotenv or the provider SDKs.
+    """
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _ENV_LOADED = True
+    return os.getenv(name)
+
+
+def get_gemini_model(model_name: Optional[str] = None):
+    """Get the requested Gemini model, or the best available one."""
+    api_key = get_api_key("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY not found in environment variables")
     
+    # Imported here: the SDK takes most of a second to import
+    import google.generativeai as genai
     genai.configure(api_key=api_key)
     
+    if model_name:
+        return genai.GenerativeModel(model_name.split('/')[-1])
+    
     # List available models
     models = genai.list_models()
     available_models = [m.name for m in models if 'generateContent' in m.supported_generation_methods]
@@ -346,6 +368,8 @@ def get_gemini_model():
 def create_user_prompt(dialogue_data: Dict[str, Any]) -> str:
     """Create the user prompt with dialogue JSON."""
     dialogue_id = dialogue_data.get('dialogue_id', 'UNKNOWN')
+    # Source-text offsets are for reviewers, not the model
+    prompt_data = {key: value for key, value in dialogue_data.items() if key != 'source_alignment'}
     
     prompt = f"""You are given a single learner–AI dialogue in JSON format.
 
@@ -363,7 +387,7 @@ Use the `dialogue_id` exactly as given below.
 Here is the dialogue JSON:
 
 ```json
-{json.dumps(dialogue_data, ensure_ascii=False, indent=2)}
+{json.dumps(prompt_data, ensure_ascii=False, indent=2)}
 ```
 
 Return the JSON array of repair annotations only."""
@@ -372,114 +396,104 @@ Return the JSON array of repair annotations only."""
 
 
 def extract_json_from_response(response_text: str) -> List[Dict[str, Any]]:
-    """Extract JSON array from Gemini response, handling markdown code blocks and incomplete responses."""
-    # Remove markdown code blocks if present
-    original_text = response_text.strip()
+    """Extract the repair array from a complete model response.
+
+    Handles markdown code blocks, surrounding prose, ``{"repairs": [...]}``
+    wrappers and truncated output (complete objects before the cut are kept).
+    """
+    parser = JsonArrayStreamParser()
+    repairs = parser.feed(response_text or "")
+    repairs.extend(parser.close())
+    parsed_ok = parser.complete and parser.skipped_elements == 0
+    PARSE_STATS.record(parsed_ok)
+    note_parse(parsed_ok, len(repairs))
+    
+    if not parser.started:
+        print("Warning: No JSON array found in response")
+        print(f"Response text (first 1000 chars): {(response_text or '')[:1000]}")
+    elif parser.truncated:
+        print(f"Warning: Response was truncated; kept {len(repairs)} complete repair(s)")
     
-    # First, try to extract from markdown code blocks
-    # Find content between ```json and ``` markers
-    code_block_match = re.search(r'```(?:json)?\s*(.*?)\s*```', original_text, re.DOTALL)
-    if code_block_match:
-        response_text = code_block_match.group(1).strip()
-        # If it starts with [, it's likely a JSON array
-        if response_text.startswith('['):
-            # Use bracket counting to find the complete array
-            bracket_count = 0
-            for i, char in enumerate(response_text):
-                if char == '[':
-                    bracket_count += 1
-                elif char == ']':
-                    bracket_count -= 1
-                    if bracket_count == 0:
-                        response_text = response_text[:i+1]
-                        break
-    else:
-        # Try to find JSON array directly (greedy match)
-        json_match = re.search(r'(\[.*\])', original_text, re.DOTALL)
-        if json_match:
-            response_text = json_match.group(1)
-        else:
-            response_text = original_text
+    return repairs
+
+
+def collect_streamed_repairs(
+    chunks: Iterable[str],
+    on_repair: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Consume a stream of text chunks, emitting each repair as soon as it closes.
     
-    # If no match, try to find incomplete JSON and fix it
-    if not response_text.startswith('['):
-        # Look for start of array
-        start_idx = response_text.find('[')
-        if start_idx >= 0:
-            response_text = response_text[start_idx:]
+    If the stream fails part-way (timeout, connection reset), the repairs that
+    were already complete are returned instead of being discarded.
     
-    # Try to fix incomplete JSON by finding the last complete object
-    if response_text.startswith('['):
-        # Count brackets to find where array might be complete
-        bracket_count = 0
-        last_complete_idx = -1
-        
-        for i, char in enumerate(response_text):
-            if char == '[':
-                bracket_count += 1
-            elif char == ']':
-                bracket_count -= 1
-                if bracket_count == 0:
-                    last_complete_idx = i
-                    break
-        
-        # If we found a complete array, use it
-        if last_complete_idx > 0:
-            response_text = response_text[:last_complete_idx + 1]
-        else:
-            # Try to close incomplete JSON manually
-            # Find last complete object
-            objects = []
-            current_obj = ""
-            brace_count = 0
-            
-            for char in response_text:
-                current_obj += char
-                if char == '{':
-                    brace_count += 1
-                elif char == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        objects.append(current_obj)
-                        current_obj = ""
-            
-            # If we have at least one complete object, reconstruct array
-            if objects:
-                response_text = '[' + ','.join(objects) + ']'
+    Args:
+        chunks: Iterable of response text fragments
+        on_repair: Optional callback invoked with each completed repair
+    
+    Returns:
+        List of repair annotation dictionaries
+    """
+    parser = JsonArrayStreamParser()
+    repairs = []
+    interrupted = False
     
-    # Parse JSON
     try:
-        repairs = json.loads(response_text)
-        if not isinstance(repairs, list):
-            return []
-        return repairs
-    except json.JSONDecodeError as e:
-        # Try one more time with more aggressive fixing
-        try:
-            # Remove any trailing incomplete content
-            if response_text.count('[') > response_text.count(']'):
-                # Find last complete object and close array
-                last_brace = response_text.rfind('}')
-                if last_brace > 0:
-                    response_text = response_text[:last_brace + 1] + ']'
-                    repairs = json.loads(response_text)
-                    if isinstance(repairs, list):
-                        return repairs
-        except:
-            pass
-        
-        print(f"Warning: Failed to parse JSON from response: {e}")
-        print(f"Response text (first 1000 chars): {response_text[:1000]}")
-        return []
+        for chunk in chunks:
+            for repair in parser.feed(chunk):
+                repairs.append(repair)
+                if on_repair is not None:
+                    on_repair(repair)
+            if parser.complete:
+                break
+    except Exception as e:
+        interrupted = True
+        print(f"Warning: Stream interrupted after {len(repairs)} repair(s): {e}")
+    
+    parser.close()
+    parsed_ok = not interrupted and parser.complete and parser.skipped_elements == 0
+    PARSE_STATS.record(parsed_ok)
+    note_parse(parsed_ok, len(repairs))
+    if parser.truncated:
+        print(f"Warning: Streamed response was truncated; kept {len(repairs)} complete repair(s)")
+    
+    return repairs
 
 
-def detect_repairs(dialogue_data: Dict[str, Any], model=None) -> List[Dict[str, Any]]:
+def _gemini_text_chunks(response) -> Iterator[str]:
+    """Yield text from a streamed Gemini response."""
+    for chunk in response:
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunk carries no text part (e.g. safety or finish metadata)
+            continue
+        if text:
+            yield text
+
+
+def detect_repairs(
+    dialogue_data: Dict[str, Any],
+    model=None,
+    stream: bool = False,
+    on_repair: Optional[Callable[[Dict[str, Any]], None]] = None,
+    structured: bool = True,
+    temperature: float = 0.1,
+    user_prompt: Optional[str] = None,
+    raise_errors: bool = False
+) -> List[Dict[str, Any]]:
     """
     Detect repair sequences in a dialogue using Gemini API.
     
     Args:
         dialogue_data: Dialogue JSON with student_id, dialogue_id, and turns
         model: Optional Gemini model instance (will create one if not provided)
+        stream: Consume the response incrementally, keeping partial results
+        on_repair: Optional callback invoked with each repair as it completes
+        structured: Constrain decoding to the repair schema (JSON mime type + response_schema)
+        temperature: Sampling temperature (default 0.1)
+        user_prompt: Precomputed ``create_user_prompt(dialogue_data)`` (built here if omitted)
+        raise_errors: Re-raise API errors instead of printing them and returning []
     
     Returns:
         List of repair annotation dictionaries
@@ -488,69 +502,68 @@ def detect_repairs(dialogue_data: Dict[str, Any], model=None) -> List[Dict[str,
         model = get_gemini_model()
     
     # Create user prompt
-    user_prompt = create_user_prompt(dialogue_data)
+    if user_prompt is None:
+        user_prompt = create_user_prompt(dialogue_data)
     
     # Generate response with generation config to ensure complete output
     try:
         generation_config = {
-            "temperature": 0.1,  # Lower temperature for more consistent output
+            "temperature": temperature,  # Low by default for more consistent output
             "max_output_tokens": 8192,  # Ensure enough tokens for complete JSON
         }
+        if structured:
+            generation_config = gemini_generation_config(generation_config)
         
-        response = model.generate_content(
-            REPAIR_DETECTION_SYSTEM_PROMPT + "\n\n" + user_prompt,
-            generation_config=generation_config
-        )
-        
-        response_text = response.text
+        model_name = (getattr(model, "model_name", None) or "").replace("models/", "") or None
+        with track_call("gemini", model_name, dialogue_data, stream=stream) as call:
+            response = call.request(lambda: model.generate_content(
+                REPAIR_DETECTION_SYSTEM_PROMPT + "\n\n" + user_prompt,
+                generation_config=generation_config,
+                stream=stream
+            ))
+            
+            if stream:
+                repairs = collect_streamed_repairs(_gemini_text_chunks(response), on_repair=on_repair)
+                call.set_usage(**gemini_usage(response))
+                return repairs
+            
+            response_text = response.text
+            call.set_usage(**gemini_usage(response))
+            
+            # Extract JSON from response
+            repairs = extract_json_from_response(response_text)
         
-        # Extract JSON from response
-        repairs = extract_json_from_response(response_text)
+        if on_repair is not None:
+            for repair in repairs:
+                on_repair(repair)
         
         return repairs
         
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error calling Gemini API: {e}")
         return []
 
 
 def validate_repair_annotation(repair: Dict[str, Any], dialogue_id: str) -> bool:
     """Validate a repair annotation against the schema."""
-    required_fields = ['repair_id', 'turn_indices', 'initiation', 'resolution', 'trigger', 'evidence_summary']
-    
-    for field in required_fields:
-        if field not in repair:
-            print(f"Warning: Missing required field '{field}' in repair annotation")
-            return False
+    issues = repair_schema_issues(repair)
+    if issues:
+        for issue in issues:
+            print(f"Warning: {issue}")
+        return False
     
     # Validate dialogue_id matches
     if repair.get('dialogue_id') != dialogue_id:
         repair['dialogue_id'] = dialogue_id  # Fix it
     
-    # Validate initiation
-    if repair['initiation'] not in ['LI', 'BI']:
-        print(f"Warning: Invalid initiation value: {repair['initiation']}")
-        return False
-    
-    # Validate resolution
-    if repair['resolution'] not in ['R', 'U-A', 'U-P']:
-        print(f"Warning: Invalid resolution value: {repair['resolution']}")
-        return False
-    
-    # Validate turn_indices is a list
-    if not isinstance(repair['turn_indices'], list):
-        print(f"Warning: turn_indices must be a list")
-        return False
-    
     return True
 
 
-def save_repair_annotations(repairs: List[Dict[str, Any]], output_path: Path) -> None:
-    """Save repair annotations to a JSON file."""
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(repairs, f, ensure_ascii=False, indent=2)
+def save_repair_annotations(repairs: List[Dict[str, Any]], output_path: Path, compact: bool = False) -> None:
+    """Save repair annotations to a JSON file (atomically; compact drops the indentation)."""
+    write_json(output_path, repairs, compact=compact)
     
     print(f"  [OK] Saved {len(repairs)} repair annotations to: {output_path}")
 
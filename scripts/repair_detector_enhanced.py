@@ -2,19 +2,23 @@
 Enhanced repair detection with few-shot examples and improved prompt.
 Uses GPT-4o for best accuracy.
 """
-import os
-import json
-import re
-from pathlib import Path
-from typing import List, Dict, Any, Optional
-from dotenv import load_dotenv
-from openai import OpenAI
-
-# Load environment variables
-load_dotenv()
+from typing import List, Dict, Any, Optional, Callable, TYPE_CHECKING
 
 # Import base prompt
-from repair_detector import REPAIR_DETECTION_SYSTEM_PROMPT, create_user_prompt, validate_repair_annotation
+from repair_detector import (
+    REPAIR_DETECTION_SYSTEM_PROMPT,
+    create_user_prompt,
+    extract_json_from_response,
+    collect_streamed_repairs,
+    get_api_key,
+)
+from repair_detector_gpt import openai_text_chunks
+from telemetry import openai_usage, track_call
+from repair_schema import OBJECT_WRAPPER_INSTRUCTION, openai_response_format
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from few_shot_index import FewShotIndex
 
 # Load few-shot examples
 FEW_SHOT_EXAMPLES = """
@@ -73,12 +77,6 @@ This contains TWO separate repairs:
 ===============================
 """
 
-# Enhanced prompt with few-shot examples
-ENHANCED_REPAIR_DETECTION_PROMPT = REPAIR_DETECTION_SYSTEM_PROMPT.replace(
-    "===============================\nTHEORETICAL DEFINITIONS\n===============================",
-    FEW_SHOT_EXAMPLES + "\n===============================\nTHEORETICAL DEFINITIONS\n==============================="
-)
-
 # Add chain-of-thought reasoning section
 CHAIN_OF_THOUGHT_SECTION = """
 
@@ -124,27 +122,48 @@ Only after completing this reasoning for ALL potential repairs, output the JSON
 
 """
 
-# Final enhanced prompt
-FINAL_ENHANCED_PROMPT = ENHANCED_REPAIR_DETECTION_PROMPT.replace(
-    "===============================\nDECISION STRATEGY\n===============================",
-    CHAIN_OF_THOUGHT_SECTION + "\n===============================\nDECISION STRATEGY\n==============================="
-)
 
+def build_enhanced_prompt(few_shot_section: str) -> str:
+    """Insert a few-shot section and the reasoning section into the base prompt."""
+    prompt = REPAIR_DETECTION_SYSTEM_PROMPT.replace(
+        "===============================\nTHEORETICAL DEFINITIONS\n===============================",
+        few_shot_section + "\n===============================\nTHEORETICAL DEFINITIONS\n==============================="
+    )
+    return prompt.replace(
+        "===============================\nDECISION STRATEGY\n===============================",
+        CHAIN_OF_THOUGHT_SECTION + "\n===============================\nDECISION STRATEGY\n==============================="
+    )
+
+
+# Final enhanced prompt (static examples)
+FINAL_ENHANCED_PROMPT = build_enhanced_prompt(FEW_SHOT_EXAMPLES)
 
-def get_openai_client() -> OpenAI:
+
+def get_openai_client() -> "OpenAI":
     """Get OpenAI client with API key."""
-    api_key = os.getenv("OPENAI_API_KEY")
+    from openai import OpenAI
+    
+    api_key = get_api_key("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY not found in environment variables")
     
-    return OpenAI(api_key=api_key)
+    # Retries are handled (and counted) by telemetry.CallTelemetry.request
+    return OpenAI(api_key=api_key, max_retries=0)
 
 
 def detect_repairs_enhanced(
     dialogue_data: Dict[str, Any],
     model: str = "gpt-4o",
-    client: Optional[OpenAI] = None,
-    use_enhanced_prompt: bool = True
+    client: Optional["OpenAI"] = None,
+    use_enhanced_prompt: bool = True,
+    stream: bool = False,
+    on_repair: Optional[Callable[[Dict[str, Any]], None]] = None,
+    structured: bool = True,
+    temperature: float = 0,
+    few_shot_index: Optional["FewShotIndex"] = None,
+    few_shot_k: int = 3,
+    user_prompt: Optional[str] = None,
+    raise_errors: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Detect repair sequences using enhanced GPT-4o with few-shot examples.
@@ -154,6 +173,16 @@ def detect_repairs_enhanced(
         model: GPT model to use (default: gpt-4o - newest and best)
         client: Optional OpenAI client
         use_enhanced_prompt: Whether to use enhanced prompt with few-shot examples
+        stream: Consume the response incrementally, keeping partial results
+        on_repair: Optional callback invoked with each repair as it completes
+        structured: Request schema-constrained JSON (strict json_schema where the
+            model supports it, json_object otherwise)
+        temperature: Sampling temperature (default 0)
+        few_shot_index: Optional ``FewShotIndex``; when given, the static examples
+            are replaced by the most similar validated repairs (within the default token budget)
+        few_shot_k: Maximum number of retrieved examples
+        user_prompt: Precomputed ``create_user_prompt(dialogue_data)`` (built here if omitted)
+        raise_errors: Re-raise API errors instead of printing them and returning []
     
     Returns:
         List of repair annotation dictionaries
@@ -162,70 +191,67 @@ def detect_repairs_enhanced(
         client = get_openai_client()
     
     # Create user prompt
-    user_prompt = create_user_prompt(dialogue_data)
+    if user_prompt is None:
+        user_prompt = create_user_prompt(dialogue_data)
     
     # Use enhanced prompt if requested
-    system_prompt = FINAL_ENHANCED_PROMPT if use_enhanced_prompt else REPAIR_DETECTION_SYSTEM_PROMPT
+    if not use_enhanced_prompt:
+        system_prompt = REPAIR_DETECTION_SYSTEM_PROMPT
+    elif few_shot_index is not None:
+        system_prompt = build_enhanced_prompt(few_shot_index.few_shot_section(dialogue_data, k=few_shot_k))
+    else:
+        system_prompt = FINAL_ENHANCED_PROMPT
     
     # Combine prompts
     full_prompt = system_prompt + "\n\n" + user_prompt
     
+    # Both OpenAI JSON modes require a top-level object: ask for {"repairs": [...]}
+    request_options = {}
+    if structured:
+        full_prompt += "\n" + OBJECT_WRAPPER_INSTRUCTION
+        request_options["response_format"] = openai_response_format(model)
+    
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert analyst of learner–AI dialogues. Follow the instructions precisely and return only valid JSON."
-                },
-                {
-                    "role": "user",
-                    "content": full_prompt
-                }
-            ],
-            temperature=0,  # Maximum determinism for consistency
-            max_tokens=8192,  # Ensure enough tokens for complete JSON
-            # Note: gpt-4o may support response_format, but test first
-        )
+        if stream:
+            # Ask for a final usage chunk so streamed calls report tokens too
+            request_options["stream_options"] = {"include_usage": True}
         
-        response_text = response.choices[0].message.content
+        with track_call("openai", model, dialogue_data, stream=stream) as call:
+            response = call.request(lambda: client.chat.completions.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are an expert analyst of learner–AI dialogues. Follow the instructions precisely and return only valid JSON."
+                    },
+                    {
+                        "role": "user",
+                        "content": full_prompt
+                    }
+                ],
+                temperature=temperature,  # 0 by default for maximum determinism
+                max_tokens=8192,  # Ensure enough tokens for complete JSON
+                stream=stream,
+                **request_options
+            ))
+            
+            if stream:
+                return collect_streamed_repairs(openai_text_chunks(response), on_repair=on_repair)
+            
+            response_text = response.choices[0].message.content
+            call.set_usage(**openai_usage(response.usage))
+            
+            # Extract JSON from response
+            repairs = extract_json_from_response(response_text)
         
-        # Extract JSON from response
-        repairs = extract_json_from_response(response_text)
+        if on_repair is not None:
+            for repair in repairs:
+                on_repair(repair)
         
         return repairs
         
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error calling OpenAI API: {e}")
         return []
-
-
-def extract_json_from_response(response_text: str) -> List[Dict[str, Any]]:
-    """Extract JSON array from GPT response, handling markdown code blocks."""
-    # Remove markdown code blocks if present
-    if "```json" in response_text:
-        response_text = re.sub(r'```json\s*', '', response_text)
-        response_text = re.sub(r'```\s*$', '', response_text)
-    elif "```" in response_text:
-        response_text = re.sub(r'```\s*', '', response_text)
-    
-    # Try to find JSON array
-    json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-    if json_match:
-        response_text = json_match.group(0)
-    
-    # Parse JSON
-    try:
-        repairs = json.loads(response_text)
-        if not isinstance(repairs, list):
-            # If it's a dict with a 'repairs' key, extract that
-            if isinstance(repairs, dict) and 'repairs' in repairs:
-                repairs = repairs['repairs']
-            else:
-                return []
-        return repairs
-    except json.JSONDecodeError as e:
-        print(f"Warning: Failed to parse JSON from GPT response: {e}")
-        print(f"Response text (first 500 chars): {response_text[:500]}")
-        return []
-
@@ -2,16 +2,12 @@
 Repair detection using OpenAI GPT-4 Turbo API.
 Alternative implementation for higher-quality repair detection.
 """
-import os
 import json
-import re
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, Callable, Iterator, TYPE_CHECKING
 
-# Load environment variables
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 # Import the system prompt from the original repair_detector
 try:
@@ -25,20 +21,46 @@ except ImportError:
     def validate_repair_annotation(repair, dialogue_id):
         return True
 
+from repair_detector import extract_json_from_response, collect_streamed_repairs, get_api_key
+from telemetry import note_usage, openai_usage, track_call
+from repair_schema import OBJECT_WRAPPER_INSTRUCTION, openai_response_format
 
-def get_openai_client() -> OpenAI:
+
+def get_openai_client() -> "OpenAI":
     """Get OpenAI client with API key."""
-    api_key = os.getenv("OPENAI_API_KEY")
+    from openai import OpenAI
+    
+    api_key = get_api_key("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY not found in environment variables")
     
-    return OpenAI(api_key=api_key)
+    # Retries are handled (and counted) by telemetry.CallTelemetry.request
+    return OpenAI(api_key=api_key, max_retries=0)
+
+
+def openai_text_chunks(response) -> Iterator[str]:
+    """Yield text deltas from a streamed chat completion."""
+    for chunk in response:
+        if getattr(chunk, "usage", None) is not None:
+            # Final chunk when stream_options={"include_usage": True}
+            note_usage(**openai_usage(chunk.usage))
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content
+        if text:
+            yield text
 
 
 def detect_repairs_gpt(
     dialogue_data: Dict[str, Any], 
     model: str = "gpt-4-turbo-preview",
-    client: Optional[OpenAI] = None
+    client: Optional["OpenAI"] = None,
+    stream: bool = False,
+    on_repair: Optional[Callable[[Dict[str, Any]], None]] = None,
+    structured: bool = True,
+    temperature: float = 0.1,
+    user_prompt: Optional[str] = None,
+    raise_errors: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Detect repair sequences using GPT-4 Turbo.
@@ -47,6 +69,13 @@ def detect_repairs_gpt(
         dialogue_data: Dialogue JSON with student_id, dialogue_id, and turns
         model: GPT model to use (default: gpt-4-turbo-preview)
         client: Optional OpenAI client (will create one if not provided)
+        stream: Consume the response incrementally, keeping partial results
+        on_repair: Optional callback invoked with each repair as it completes
+        structured: Request schema-constrained JSON (strict json_schema where the
+            model supports it, json_object otherwise)
+        temperature: Sampling temperature (default 0.1)
+        user_prompt: Precomputed ``create_user_prompt(dialogue_data)`` (built here if omitted)
+        raise_errors: Re-raise API errors instead of printing them and returning []
     
     Returns:
         List of repair annotation dictionaries
@@ -55,71 +84,64 @@ def detect_repairs_gpt(
         client = get_openai_client()
     
     # Create user prompt
-    user_prompt = create_user_prompt(dialogue_data)
+    if user_prompt is None:
+        user_prompt = create_user_prompt(dialogue_data)
     
     # Combine system and user prompts
     full_prompt = REPAIR_DETECTION_SYSTEM_PROMPT_GPT + "\n\n" + user_prompt
     
+    # Both OpenAI JSON modes require a top-level object: ask for {"repairs": [...]}
+    request_options = {}
+    if structured:
+        full_prompt += "\n" + OBJECT_WRAPPER_INSTRUCTION
+        request_options["response_format"] = openai_response_format(model)
+    
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert analyst of learner–AI dialogues. Follow the instructions precisely and return only valid JSON."
-                },
-                {
-                    "role": "user",
-                    "content": full_prompt
-                }
-            ],
-            temperature=0.1,  # Low temperature for consistent output
-            max_tokens=8192,  # Ensure enough tokens for complete JSON
-            response_format={"type": "json_object"}  # Request JSON mode (if supported)
-        )
+        if stream:
+            # Ask for a final usage chunk so streamed calls report tokens too
+            request_options["stream_options"] = {"include_usage": True}
         
-        response_text = response.choices[0].message.content
+        with track_call("openai", model, dialogue_data, stream=stream) as call:
+            response = call.request(lambda: client.chat.completions.create(
+                model=model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are an expert analyst of learner–AI dialogues. Follow the instructions precisely and return only valid JSON."
+                    },
+                    {
+                        "role": "user",
+                        "content": full_prompt
+                    }
+                ],
+                temperature=temperature,  # Low by default for consistent output
+                max_tokens=8192,  # Ensure enough tokens for complete JSON
+                stream=stream,
+                **request_options
+            ))
+            
+            if stream:
+                return collect_streamed_repairs(openai_text_chunks(response), on_repair=on_repair)
+            
+            response_text = response.choices[0].message.content
+            call.set_usage(**openai_usage(response.usage))
+            
+            # Extract JSON from response
+            repairs = extract_json_from_response(response_text)
         
-        # Extract JSON from response
-        repairs = extract_json_from_response(response_text)
+        if on_repair is not None:
+            for repair in repairs:
+                on_repair(repair)
         
         return repairs
         
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error calling OpenAI API: {e}")
         return []
 
 
-def extract_json_from_response(response_text: str) -> List[Dict[str, Any]]:
-    """Extract JSON array from GPT response, handling markdown code blocks."""
-    # Remove markdown code blocks if present
-    if "```json" in response_text:
-        response_text = re.sub(r'```json\s*', '', response_text)
-        response_text = re.sub(r'```\s*$', '', response_text)
-    elif "```" in response_text:
-        response_text = re.sub(r'```\s*', '', response_text)
-    
-    # Try to find JSON array
-    json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-    if json_match:
-        response_text = json_match.group(0)
-    
-    # Parse JSON
-    try:
-        repairs = json.loads(response_text)
-        if not isinstance(repairs, list):
-            # If it's a dict with a 'repairs' key, extract that
-            if isinstance(repairs, dict) and 'repairs' in repairs:
-                repairs = repairs['repairs']
-            else:
-                return []
-        return repairs
-    except json.JSONDecodeError as e:
-        print(f"Warning: Failed to parse JSON from GPT response: {e}")
-        print(f"Response text (first 500 chars): {response_text[:500]}")
-        return []
-
-
 def compare_models(
     dialogue_data: Dict[str, Any],
     gpt_model: str = "gpt-4-turbo-preview"
@@ -159,12 +181,29 @@ def compare_models(
     except Exception as e:
         results["gemini"] = {"error": str(e)}
     
-    # Compare if both succeeded
+    # Compare if both succeeded: match repairs by turn overlap, not by whole-dict equality
     if results["gpt"].get("count") is not None and results["gemini"].get("count") is not None:
+        from repair_agreement import TurnCorpus, agreement_report
+        from repair_matching import score_repairs
+
+        gpt_repairs = results["gpt"]["repairs"]
+        gemini_repairs = results["gemini"]["repairs"]
+        dialogue_id = dialogue_data.get("dialogue_id") or "dialogue"
+        span = score_repairs(gpt_repairs, gemini_repairs)
+        corpus = TurnCorpus({dialogue_id: [t.get('turn') for t in dialogue_data.get('turns', []) if isinstance(t.get('turn'), int)]})
+        agreement = agreement_report(
+            {"gpt": {dialogue_id: gpt_repairs}, "gemini": {dialogue_id: gemini_repairs}},
+            corpus=corpus
+        )["pairwise"][0]
         results["comparison"] = {
             "count_difference": results["gpt"]["count"] - results["gemini"]["count"],
-            "gpt_only": len([r for r in results["gpt"]["repairs"] if r not in results["gemini"]["repairs"]]),
-            "gemini_only": len([r for r in results["gemini"]["repairs"] if r not in results["gpt"]["repairs"]])
+            "gpt_only": results["gpt"]["count"] - span["overlap_matches"],
+            "gemini_only": results["gemini"]["count"] - span["overlap_matches"],
+            "matched": span["overlap_matches"],
+            "span_f1": agreement["span_f1"],
+            "label_f1": agreement["label_f1"],
+            "turn_f1": agreement["turn_f1"],
+            "cohen_kappa": agreement["cohen_kappa"]
         }
     
     return results
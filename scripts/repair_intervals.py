@@ -0,0 +1,223 @@
+"""
+Interval sweep over repair turn spans.
+
+Repairs are sorted by their first turn and swept once; only repairs whose
+[first turn, last turn] spans overlap are compared, and for those the exact
+shared turns are computed. Checking n repairs costs O(n log n) plus the
+number of span-overlapping pairs, instead of comparing all n² pairs.
+
+Used by:
+
+- validation (``validate_repair_results.check_repair_overlap``),
+- the calibration matcher (``repair_matching.match_repairs`` only scores
+  pairs that share turns),
+- self-consistency merging (clusters are built with ``match_repairs``).
+
+Corpus-wide queries go through ``RepairSpanIndex``:
+
+    # every repair touching turns 10-15, in any batch
+    python scripts/repair_intervals.py --turns 10 15
+
+    python scripts/repair_intervals.py --turns 10 15 --dialogue S12_W1_T1 --batch production validation
+"""
+import heapq
+import json
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Sequence, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
+
+
+def repair_turns(repair: Any) -> frozenset:
+    """Integer turn indices of a repair (empty for malformed repairs)."""
+    if not isinstance(repair, dict):
+        return frozenset()
+    return frozenset(t for t in repair.get('turn_indices', []) or []
+                     if isinstance(t, int) and not isinstance(t, bool))
+
+
+def _sorted_spans(turn_sets: Sequence[Collection[int]]) -> List[Tuple[int, int, int]]:
+    """(first turn, last turn, position) of every non-empty turn set, by first turn."""
+    return sorted((min(turns), max(turns), i) for i, turns in enumerate(turn_sets) if turns)
+
+
+def overlapping_pairs(turn_sets: Sequence[Collection[int]]) -> List[Tuple[int, int, frozenset]]:
+    """
+    Pairs of turn sets that share at least one turn.
+
+    Args:
+        turn_sets: Turn sets (e.g. ``repair_turns`` of each repair in a dialogue)
+
+    Returns:
+        (i, j, shared turns) with i < j, ordered by i then j
+    """
+    sets = [frozenset(turns) for turns in turn_sets]
+    active: List[Tuple[int, int]] = []  # heap of (last turn, position) of spans still open
+    pairs = []
+    for first, last, i in _sorted_spans(sets):
+        while active and active[0][0] < first:
+            heapq.heappop(active)
+        for _, j in active:
+            shared = sets[i] & sets[j]
+            if shared:
+                pairs.append((min(i, j), max(i, j), shared))
+        heapq.heappush(active, (last, i))
+    pairs.sort(key=lambda pair: (pair[0], pair[1]))
+    return pairs
+
+
+def overlapping_pairs_between(
+    turn_sets_a: Sequence[Collection[int]],
+    turn_sets_b: Sequence[Collection[int]]
+) -> List[Tuple[int, int, frozenset]]:
+    """
+    Pairs (i from a, j from b) whose turn sets share at least one turn.
+
+    Both lists are swept together; a span is only compared with the open
+    spans of the other list.
+
+    Returns:
+        (i, j, shared turns), ordered by i then j
+    """
+    sets = ([frozenset(t) for t in turn_sets_a], [frozenset(t) for t in turn_sets_b])
+    events = sorted(
+        (first, last, side, i)
+        for side in (0, 1)
+        for first, last, i in _sorted_spans(sets[side])
+    )
+    active: Tuple[List[Tuple[int, int]], List[Tuple[int, int]]] = ([], [])
+    pairs = []
+    for first, last, side, i in events:
+        other = active[1 - side]
+        while other and other[0][0] < first:
+            heapq.heappop(other)
+        for _, j in other:
+            shared = sets[side][i] & sets[1 - side][j]
+            if shared:
+                pairs.append((i, j, shared) if side == 0 else (j, i, shared))
+        heapq.heappush(active[side], (last, i))
+    pairs.sort(key=lambda pair: (pair[0], pair[1]))
+    return pairs
+
+
+class RepairSpanIndex:
+    """
+    Repair spans of many dialogues and batches, for turn-range queries.
+
+    Spans are kept sorted by first turn per dialogue, together with the
+    longest span length, so a query only visits repairs whose first turn lies
+    in [first_turn - longest span, last_turn].
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, List[Tuple[int, int, str, Dict[str, Any], frozenset]]] = {}
+        self._starts: Dict[str, List[int]] = {}
+        self._longest: Dict[str, int] = {}
+
+    def add(self, batch: str, dialogue_id: str, repairs: Sequence[Any]) -> None:
+        """Add the repairs of one dialogue from one batch."""
+        entries = self._entries.setdefault(dialogue_id, [])
+        for repair in repairs:
+            turns = repair_turns(repair)
+            if turns:
+                entries.append((min(turns), max(turns), batch, repair, turns))
+                self._longest[dialogue_id] = max(self._longest.get(dialogue_id, 0), max(turns) - min(turns))
+        self._starts.pop(dialogue_id, None)
+
+    @classmethod
+    def from_repairs_dir(cls, repairs_dir: Path = REPAIRS_DIR,
+                         batches: Optional[Sequence[str]] = None) -> "RepairSpanIndex":
+        """Index every *_repairs.json in the batch subdirectories of repairs_dir."""
+        index = cls()
+        for batch_dir in sorted(p for p in Path(repairs_dir).iterdir() if p.is_dir()):
+            if batches and batch_dir.name not in batches:
+                continue
+            for repair_file in sorted(batch_dir.glob('*_repairs.json')):
+                try:
+                    with open(repair_file, 'r', encoding='utf-8-sig') as f:
+                        repairs = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"[WARNING] Skipping {repair_file}: {e}")
+                    continue
+                if isinstance(repairs, list):
+                    index.add(batch_dir.name, repair_file.name[:-len('_repairs.json')], repairs)
+        return index
+
+    def _sorted(self, dialogue_id: str) -> List[int]:
+        starts = self._starts.get(dialogue_id)
+        if starts is None:
+            entries = self._entries[dialogue_id]
+            entries.sort(key=lambda entry: (entry[0], entry[1], entry[2]))
+            starts = self._starts[dialogue_id] = [entry[0] for entry in entries]
+        return starts
+
+    def query(self, first_turn: int, last_turn: int, dialogue_ids: Optional[Sequence[str]] = None,
+              batches: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Repairs that include at least one turn in [first_turn, last_turn].
+
+        Args:
+            first_turn: First turn of the range
+            last_turn: Last turn of the range (inclusive)
+            dialogue_ids: Restrict to these dialogues (default: all)
+            batches: Restrict to these batches (default: all)
+
+        Returns:
+            Hits ordered by dialogue, first turn and batch, each with batch,
+            dialogue_id, repair_id, turn_indices and overlap_turns
+        """
+        hits = []
+        for dialogue_id in sorted(dialogue_ids if dialogue_ids is not None else self._entries):
+            if dialogue_id not in self._entries:
+                continue
+            starts = self._sorted(dialogue_id)
+            entries = self._entries[dialogue_id]
+            lo = bisect_left(starts, first_turn - self._longest.get(dialogue_id, 0))
+            hi = bisect_right(starts, last_turn)
+            for first, last, batch, repair, turns in entries[lo:hi]:
+                if last < first_turn or (batches and batch not in batches):
+                    continue
+                overlap = sorted(t for t in turns if first_turn <= t <= last_turn)
+                if overlap:
+                    hits.append({
+                        "batch": batch,
+                        "dialogue_id": dialogue_id,
+                        "repair_id": repair.get('repair_id'),
+                        "turn_indices": repair.get('turn_indices'),
+                        "overlap_turns": overlap,
+                    })
+        return hits
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find repairs overlapping a turn range across batches")
+    parser.add_argument("--turns", nargs=2, type=int, required=True, metavar=("FIRST", "LAST"),
+                        help="Turn range (inclusive)")
+    parser.add_argument("--dialogue", nargs="+", help="Dialogue ids (default: all)")
+    parser.add_argument("--batch", nargs="+", help="Batches (default: all)")
+    parser.add_argument("--repairs-dir", default=str(REPAIRS_DIR), help="Directory of repair batches")
+    parser.add_argument("--json", action="store_true", help="Print hits as JSON")
+    args = parser.parse_args()
+
+    index = RepairSpanIndex.from_repairs_dir(Path(args.repairs_dir), args.batch)
+    first_turn, last_turn = sorted(args.turns)
+    hits = index.query(first_turn, last_turn, args.dialogue, args.batch)
+
+    if args.json:
+        print(json.dumps(hits, indent=2, ensure_ascii=False))
+        return
+    print(f"Repairs overlapping turns {first_turn}-{last_turn} ({len(hits)} of {len(index)} indexed):")
+    for hit in hits:
+        print(f"  {hit['batch']:<12} {hit['dialogue_id']:<12} repair {hit['repair_id']}: "
+              f"turns {hit['turn_indices']} (shared {hit['overlap_turns']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Optimal matching of repair annotations between two sources.
+
+Predicted and reference repairs (or two annotators / batches) are matched
+one-to-one by solving an assignment problem over the Jaccard similarity of
+their turn-index sets, instead of greedy first-fit loops. A one-turn boundary
+difference is then a high-overlap match rather than one false positive plus
+one false negative. Only pairs that share turns are scored (found with the
+interval sweep in ``repair_intervals``), and the assignment is solved per
+group of mutually overlapping repairs, so long candidate lists stay cheap.
+
+Agreement is reported at three levels:
+
+- exact:   identical turn sets (and, for ``exact_matches``, identical
+           initiation and resolution codes),
+- overlap: Jaccard similarity >= ``min_overlap`` (span-level detection),
+- label:   overlap match whose initiation and resolution codes agree.
+
+Usage (all-pairs agreement between the label batches):
+    python scripts/repair_matching.py
+"""
+import json
+import sys
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from repair_intervals import overlapping_pairs_between, repair_turns
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
+LABEL_SETS = ("pilot", "production", "validation")
+
+DEFAULT_MIN_OVERLAP = 0.5
+# Among equally overlapping candidates, prefer the pair whose codes agree
+_LABEL_TIE_BREAK = 1e-3
+
+# Count fields that are summed when aggregating per-dialogue results
+COUNT_KEYS = (
+    "total_predicted", "total_actual",
+    "exact_matches", "partial_matches", "true_positives", "false_positives", "false_negatives",
+    "overlap_matches", "label_matches", "initiation_agreements", "resolution_agreements",
+)
+
+
+def _turn_sets(repairs: Sequence[Any]) -> List[Tuple[frozenset, Optional[str], Optional[str]]]:
+    """(turn set, initiation, resolution) for each well-formed repair."""
+    return [(repair_turns(repair), repair.get('initiation'), repair.get('resolution'))
+            for repair in repairs if isinstance(repair, dict)]
+
+
+def _overlap_groups(edges: Sequence[Tuple[int, int]]) -> List[Tuple[List[int], List[int]]]:
+    """Connected groups (predicted rows, actual columns) of a bipartite overlap graph."""
+    parent: Dict[Tuple[int, int], Tuple[int, int]] = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for i, j in edges:
+        parent[find((0, i))] = find((1, j))
+    groups: Dict[Tuple[int, int], Tuple[List[int], List[int]]] = {}
+    for node in sorted(parent):
+        rows, cols = groups.setdefault(find(node), ([], []))
+        (rows if node[0] == 0 else cols).append(node[1])
+    return list(groups.values())
+
+
+def match_repairs(
+    predicted: Sequence[Any],
+    actual: Sequence[Any],
+    min_overlap: float = DEFAULT_MIN_OVERLAP
+) -> List[Dict[str, Any]]:
+    """
+    One-to-one matching that maximises total turn overlap.
+
+    Repairs that share no turn can never be matched, so only overlapping
+    pairs are scored and each connected group of overlapping repairs is
+    assigned on its own (a single pair needs no solver).
+
+    Returns:
+        Matched pairs with indices into the well-formed repairs of each side,
+        their Jaccard similarity and whether the codes agree; pairs below
+        ``min_overlap`` (or with no overlap) are left unmatched.
+    """
+    pred = _turn_sets(predicted)
+    gold = _turn_sets(actual)
+    shared = overlapping_pairs_between([p[0] for p in pred], [g[0] for g in gold])
+    if not shared:
+        return []
+
+    similarity: Dict[Tuple[int, int], float] = {}
+    for i, j, turns in shared:
+        union = len(pred[i][0]) + len(gold[j][0]) - len(turns)
+        # float32 like the incidence-matrix computation this replaced, so scores are unchanged
+        similarity[i, j] = float(np.float32(len(turns)) / np.float32(union))
+
+    def codes_agree(i, j):
+        return pred[i][1] == gold[j][1], pred[i][2] == gold[j][2]
+
+    assigned = []
+    for rows, cols in _overlap_groups(list(similarity)):
+        if len(rows) == 1 and len(cols) == 1:
+            assigned.append((rows[0], cols[0]))
+            continue
+        weights = np.zeros((len(rows), len(cols)))
+        for r, i in enumerate(rows):
+            for c, j in enumerate(cols):
+                weights[r, c] = similarity.get((i, j), 0.0) + _LABEL_TIE_BREAK * all(codes_agree(i, j))
+        # Imported here: scipy.optimize adds ~0.5 s to the import of every entry point
+        from scipy.optimize import linear_sum_assignment
+        group_rows, group_cols = linear_sum_assignment(weights, maximize=True)
+        assigned.extend((rows[r], cols[c]) for r, c in zip(group_rows, group_cols))
+
+    pairs = []
+    for i, j in sorted(assigned):
+        jaccard = similarity.get((i, j), 0.0)
+        if jaccard <= 0 or jaccard < min_overlap:
+            continue
+        same_initiation, same_resolution = codes_agree(i, j)
+        pairs.append({
+            "predicted": int(i),
+            "actual": int(j),
+            "jaccard": jaccard,
+            "exact_span": jaccard == 1.0,
+            "same_initiation": same_initiation,
+            "same_resolution": same_resolution,
+        })
+    return pairs
+
+
+def _prf(true_positives: int, total_predicted: int, total_actual: int) -> Tuple[float, float, float]:
+    precision = true_positives / total_predicted if total_predicted > 0 else 0
+    recall = true_positives / total_actual if total_actual > 0 else 0
+    f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    return precision, recall, f1
+
+
+def derive_rates(counts: Dict[str, Any]) -> Dict[str, Any]:
+    """Add precision/recall/F1 and agreement rates to a dict of summed counts."""
+    total_pred = counts["total_predicted"]
+    total_actual = counts["total_actual"]
+    overlap = counts["overlap_matches"]
+
+    result = dict(counts)
+    result["precision"], result["recall"], result["f1_score"] = _prf(counts["true_positives"], total_pred, total_actual)
+    result["overlap_precision"], result["overlap_recall"], result["overlap_f1"] = _prf(overlap, total_pred, total_actual)
+    result["label_precision"], result["label_recall"], result["label_f1"] = _prf(counts["label_matches"], total_pred, total_actual)
+    result["initiation_agreement"] = counts["initiation_agreements"] / overlap if overlap else 0
+    result["resolution_agreement"] = counts["resolution_agreements"] / overlap if overlap else 0
+    result["mean_jaccard"] = counts.get("jaccard_sum", 0.0) / overlap if overlap else 0
+    return result
+
+
+def score_repairs(
+    predicted: Sequence[Any],
+    actual: Sequence[Any],
+    min_overlap: float = DEFAULT_MIN_OVERLAP
+) -> Dict[str, Any]:
+    """
+    Agreement metrics for one dialogue.
+
+    ``exact_matches``/``partial_matches``/``true_positives``/``false_positives``/
+    ``false_negatives`` and ``precision``/``recall``/``f1_score`` keep their
+    original meaning (identical turn sets, codes equal for exact); the
+    ``overlap_*`` and ``label_*`` fields add the thresholded span level and
+    the span-plus-codes level.
+    """
+    pairs = match_repairs(predicted, actual, min_overlap=min_overlap)
+    exact_span = [p for p in pairs if p["exact_span"]]
+    exact = sum(1 for p in exact_span if p["same_initiation"] and p["same_resolution"])
+    labelled = [p for p in pairs if p["same_initiation"] and p["same_resolution"]]
+
+    total_pred = len(predicted)
+    total_actual = len(actual)
+    counts = {
+        "total_predicted": total_pred,
+        "total_actual": total_actual,
+        "exact_matches": exact,
+        "partial_matches": len(exact_span) - exact,
+        "true_positives": exact,
+        "false_positives": total_pred - len(exact_span),
+        "false_negatives": total_actual - len(exact_span),
+        "overlap_matches": len(pairs),
+        "label_matches": len(labelled),
+        "initiation_agreements": sum(1 for p in pairs if p["same_initiation"]),
+        "resolution_agreements": sum(1 for p in pairs if p["same_resolution"]),
+        "jaccard_sum": sum(p["jaccard"] for p in pairs),
+    }
+    return derive_rates(counts)
+
+
+def aggregate_scores(per_dialogue: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Micro-average: sum the counts of per-dialogue ``score_repairs`` results."""
+    counts = {key: sum(m.get(key, 0) for m in per_dialogue) for key in COUNT_KEYS}
+    counts["jaccard_sum"] = sum(m.get("jaccard_sum", 0.0) for m in per_dialogue)
+    return derive_rates(counts)
+
+
+def load_label_set(labels_dir: Path) -> Dict[str, List[Dict[str, Any]]]:
+    """Map dialogue name -> repairs for every *_repairs.json in a directory."""
+    labels = {}
+    for repair_file in sorted(labels_dir.glob("*_repairs.json")):
+        with open(repair_file, 'r', encoding='utf-8-sig') as f:
+            repairs = json.load(f)
+        labels[repair_file.stem.replace("_repairs", "")] = repairs if isinstance(repairs, list) else []
+    return labels
+
+
+def score_all_pairs(
+    sources: Dict[str, Dict[str, List[Dict[str, Any]]]],
+    min_overlap: float = DEFAULT_MIN_OVERLAP
+) -> List[Dict[str, Any]]:
+    """
+    Score every pair of sources (batches or detectors) on their shared dialogues.
+
+    The first source of each pair is treated as "predicted", the second as
+    "actual"; the span/label F1 values are symmetric.
+    """
+    results = []
+    for name_a, name_b in combinations(sources, 2):
+        shared = sorted(set(sources[name_a]) & set(sources[name_b]))
+        per_dialogue = [score_repairs(sources[name_a][d], sources[name_b][d], min_overlap) for d in shared]
+        results.append({
+            "a": name_a,
+            "b": name_b,
+            "shared_dialogues": len(shared),
+            "metrics": aggregate_scores(per_dialogue),
+        })
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="All-pairs repair agreement between label batches or detector outputs")
+    parser.add_argument("dirs", nargs="*", help="Directories with *_repairs.json (default: the pilot/production/validation batches)")
+    parser.add_argument("--min-overlap", type=float, default=DEFAULT_MIN_OVERLAP, help="Jaccard threshold for an overlap match")
+    args = parser.parse_args()
+
+    dirs = [Path(d) for d in args.dirs] or [REPAIRS_DIR / name for name in LABEL_SETS]
+    sources = {d.name: load_label_set(d) for d in dirs if d.exists()}
+    if len(sources) < 2:
+        print("[ERROR] Need at least two label directories to compare")
+        sys.exit(1)
+
+    print("=" * 80)
+    print(f"REPAIR AGREEMENT (overlap threshold: Jaccard >= {args.min_overlap})")
+    print("=" * 80)
+    for result in score_all_pairs(sources, min_overlap=args.min_overlap):
+        m = result["metrics"]
+        print(f"\n{result['a']} vs {result['b']} ({result['shared_dialogues']} shared dialogues, "
+              f"{m['total_predicted']} vs {m['total_actual']} repairs)")
+        print(f"  Exact:   F1 {m['f1_score']:.2%} ({m['exact_matches']} matches, {m['partial_matches']} same span/different codes)")
+        print(f"  Overlap: F1 {m['overlap_f1']:.2%} ({m['overlap_matches']} matches, mean Jaccard {m['mean_jaccard']:.2f})")
+        print(f"  Label:   F1 {m['label_f1']:.2%} (initiation agreement {m['initiation_agreement']:.2%}, "
+              f"resolution agreement {m['resolution_agreement']:.2%})")
+
+
+if __name__ == "__main__":
+    main()
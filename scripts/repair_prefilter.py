@@ -0,0 +1,353 @@
+"""
+Cheap local pre-filter that predicts "no repair" before any LLM call.
+
+Each turn gets a small binary feature vector (clarification requests,
+apologies, bot interpretation checks, corrections, hesitations, repeated
+learner questions, speaker-alternation anomalies, very short learner turns).
+Features are computed with one regex pass per feature over the whole
+dialogue, mapped back to turns with ``np.searchsorted``. A dialogue's score is
+the highest weighted feature sum over a sliding window of turns; dialogues
+below the threshold are predicted to contain no repair and skip the LLM.
+
+Weights and threshold are calibrated against existing labels (by default
+``data/repairs/production``) so that a target dialogue-level recall is kept on
+held-out students (k-fold cross-validation grouped by student):
+
+    python scripts/repair_prefilter.py --target-recall 0.95
+
+The calibration is saved to ``config/prefilter_calibration.json`` and reports
+the held-out recall and how many LLM calls the threshold saves.
+"""
+import argparse
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from artifact_writer import write_json
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+LABELS_DIR = PROJECT_ROOT / "data" / "repairs" / "production"
+CALIBRATION_PATH = PROJECT_ROOT / "config" / "prefilter_calibration.json"
+
+# (feature name, speaker restriction or None, pattern)
+REGEX_FEATURES: List[Tuple[str, Optional[str], str]] = [
+    ("clarification_request", "learner",
+     r"what do you mean|what does .{1,40} mean|could you (?:please )?(?:repeat|say that again|clarify|explain)"
+     r"|can you (?:please )?(?:repeat|say that again|clarify|explain)|pardon|i don'?t (?:understand|get)"
+     r"|didn'?t (?:catch|understand|hear)|sorry\?|what\?"),
+    ("apology", None, r"\bsorry\b|\bapologi[sz]e"),
+    ("bot_interpretation", "bot",
+     r"did you mean|do you mean|you mean|sounds like you|just to (?:confirm|clarify)|to clarify"
+     r"|i(?:'m| am) not (?:sure|quite sure)|could you (?:please )?(?:rephrase|clarify)|i think you(?:'re| are)"),
+    ("correction", None, r"no,? i mean|\bi meant\b|\bactually\b|\bsorry,? i\b|\bnot\b.{1,30}\bbut\b"),
+    ("hesitation", "learner", r"\b(?:u+m+|u+h+|e+r+m*|hmm+)\b|\.\.\.|--"),
+    ("trouble_keyword", None, r"understand|repeat|clarify|confus|\bmean"),
+]
+STRUCTURAL_FEATURES = ["repeated_question", "same_speaker", "short_learner_turn"]
+FEATURE_NAMES = [name for name, _, _ in REGEX_FEATURES] + STRUCTURAL_FEATURES
+
+_COMPILED = [(name, speaker, re.compile(pattern)) for name, speaker, pattern in REGEX_FEATURES]
+_WORD = re.compile(r"[a-z']+")
+
+
+def turn_features(turns: List[Dict[str, Any]]) -> np.ndarray:
+    """Return an (n_turns, n_features) 0/1 feature matrix for a dialogue."""
+    n_turns = len(turns)
+    features = np.zeros((n_turns, len(FEATURE_NAMES)), dtype=np.float32)
+    if n_turns == 0:
+        return features
+
+    texts = [str(turn.get('text', '')).lower() for turn in turns]
+    speakers = np.array([turn.get('speaker', '') for turn in turns])
+    is_learner = speakers == 'learner'
+    is_bot = speakers == 'bot'
+
+    # One regex pass per feature over the joined dialogue
+    lengths = np.fromiter((len(text) + 1 for text in texts), dtype=np.int64, count=n_turns)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    joined = "\n".join(texts)
+    for col, (_, speaker, pattern) in enumerate(_COMPILED):
+        positions = np.fromiter((m.start() for m in pattern.finditer(joined)), dtype=np.int64)
+        if positions.size:
+            features[np.searchsorted(starts, positions, side='right') - 1, col] = 1.0
+        if speaker == 'learner':
+            features[~is_learner, col] = 0.0
+        elif speaker == 'bot':
+            features[~is_bot, col] = 0.0
+
+    offset = len(_COMPILED)
+
+    # Learner repeats (most of) their previous question
+    word_sets = [set(_WORD.findall(text)) for text in texts]
+    previous_learner = None
+    for i in np.flatnonzero(is_learner):
+        words = word_sets[i]
+        if previous_learner is not None and len(words) >= 3:
+            previous = word_sets[previous_learner]
+            if len(words & previous) / len(words | previous) >= 0.6:
+                features[i, offset] = 1.0
+        previous_learner = i
+
+    # Two consecutive turns from the same speaker
+    features[1:, offset + 1] = (speakers[1:] == speakers[:-1]).astype(np.float32)
+
+    # Very short learner turns are often unintelligible/ASR fragments
+    word_counts = np.fromiter((len(words) for words in word_sets), dtype=np.int64, count=n_turns)
+    features[:, offset + 2] = (is_learner & (word_counts <= 2)).astype(np.float32)
+
+    return features
+
+
+def window_scores(features: np.ndarray, weights: np.ndarray, window: int = 3) -> np.ndarray:
+    """Weighted feature sum per turn, smoothed over a sliding window of turns."""
+    if features.shape[0] == 0:
+        return np.zeros(0, dtype=np.float32)
+    per_turn = features @ weights
+    return np.convolve(per_turn, np.ones(window, dtype=np.float32), mode='same')
+
+
+class RepairPrefilter:
+    """Calibrated "no repair" predictor."""
+
+    def __init__(
+        self,
+        weights: Optional[np.ndarray] = None,
+        threshold: float = 0.0,
+        window: int = 3,
+        metrics: Optional[Dict[str, Any]] = None
+    ):
+        self.weights = np.ones(len(FEATURE_NAMES), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        self.threshold = threshold
+        self.window = window
+        self.metrics = metrics or {}
+
+    def score(self, dialogue_data: Dict[str, Any]) -> float:
+        """Highest windowed trouble score in the dialogue (0.0 if no signals)."""
+        scores = window_scores(turn_features(dialogue_data.get('turns', [])), self.weights, self.window)
+        return float(scores.max()) if scores.size else 0.0
+
+    def is_candidate(self, dialogue_data: Dict[str, Any]) -> bool:
+        """True if the dialogue should be sent to the LLM."""
+        return self.score(dialogue_data) >= self.threshold
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "feature_names": FEATURE_NAMES,
+            "weights": [float(w) for w in self.weights],
+            "threshold": float(self.threshold),
+            "window": self.window,
+            "metrics": self.metrics,
+        }
+
+    def save(self, path: Path = CALIBRATION_PATH) -> None:
+        write_json(path, self.to_dict())
+
+    @classmethod
+    def load(cls, path: Path = CALIBRATION_PATH) -> "RepairPrefilter":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("feature_names") != FEATURE_NAMES:
+            raise ValueError(f"Prefilter calibration at {path} uses different features; recalibrate")
+        return cls(
+            weights=np.array(data["weights"], dtype=np.float32),
+            threshold=data["threshold"],
+            window=data.get("window", 3),
+            metrics=data.get("metrics", {}),
+        )
+
+
+def route_dialogues(
+    dialogues: List[Tuple[Any, Dict[str, Any]]],
+    prefilter: RepairPrefilter
+) -> Tuple[List[Any], List[Any]]:
+    """
+    Split (key, dialogue) pairs into LLM candidates and predicted no-repair dialogues.
+
+    Returns:
+        (candidate_keys, skipped_keys)
+    """
+    candidates, skipped = [], []
+    for key, dialogue_data in dialogues:
+        (candidates if prefilter.is_candidate(dialogue_data) else skipped).append(key)
+    return candidates, skipped
+
+
+def load_labelled_dialogues(processed_dir: Path, labels_dir: Path) -> List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]]:
+    """Load (name, dialogue, repairs) for every labelled dialogue."""
+    labelled = []
+    for repair_file in sorted(labels_dir.glob("*_repairs.json")):
+        dialogue_name = repair_file.stem.replace("_repairs", "")
+        dialogue_file = processed_dir / f"{dialogue_name}.json"
+        if not dialogue_file.exists():
+            continue
+        with open(dialogue_file, 'r', encoding='utf-8-sig') as f:
+            dialogue_data = json.load(f)
+        with open(repair_file, 'r', encoding='utf-8-sig') as f:
+            repairs = json.load(f)
+        labelled.append((dialogue_name, dialogue_data, repairs if isinstance(repairs, list) else []))
+    return labelled
+
+
+def fit_weights(matrices: List[np.ndarray], turn_labels: List[np.ndarray]) -> np.ndarray:
+    """
+    Smoothed log-odds of each feature firing on repair turns vs. other turns.
+
+    Clipped at zero, so no feature can argue *against* a repair.
+    """
+    X = np.vstack(matrices)
+    y = np.concatenate(turn_labels)
+    pos_rate = (X[y].sum(axis=0) + 1.0) / (y.sum() + 2.0)
+    neg_rate = (X[~y].sum(axis=0) + 1.0) / ((~y).sum() + 2.0)
+    return np.clip(np.log(pos_rate / neg_rate), 0.0, None).astype(np.float32)
+
+
+def dialogue_scores(matrices: List[np.ndarray], weights: np.ndarray, window: int) -> np.ndarray:
+    """Highest windowed score of each dialogue."""
+    return np.array([
+        float(window_scores(m, weights, window).max()) if m.shape[0] else 0.0
+        for m in matrices
+    ])
+
+
+def pick_threshold(scores: np.ndarray, has_repair: np.ndarray, target_recall: float) -> float:
+    """Highest threshold that routes at least ``target_recall`` of the dialogues with repairs."""
+    positive_scores = np.sort(scores[has_repair])
+    if not positive_scores.size:
+        return float(scores.max()) + 1.0
+    allowed_misses = int(np.floor((1.0 - target_recall) * positive_scores.size))
+    return float(positive_scores[allowed_misses])
+
+
+def student_folds(names: List[str], folds: int, seed: int = 0) -> np.ndarray:
+    """
+    Fold number of each dialogue, grouping all dialogues of a student in one fold.
+
+    Students are shuffled with ``seed`` and dealt round-robin, so folds have
+    similar numbers of students.
+    """
+    students = sorted({name.split('_')[0] for name in names})
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(students))
+    fold_of = {students[i]: rank % folds for rank, i in enumerate(order)}
+    return np.array([fold_of[name.split('_')[0]] for name in names], dtype=np.int64)
+
+
+def calibrate_prefilter(
+    processed_dir: Path = PROCESSED_DIR,
+    labels_dir: Path = LABELS_DIR,
+    target_recall: float = 0.95,
+    window: int = 3,
+    folds: int = 5,
+    seed: int = 0
+) -> RepairPrefilter:
+    """
+    Fit feature weights and pick the highest threshold that keeps ``target_recall`` on held-out dialogues.
+
+    Dialogues are split into ``folds`` folds by student. Each dialogue is
+    scored with weights fitted on the other folds, and the threshold is taken
+    from these out-of-fold scores, so the reported recall and savings are not
+    measured on the labels the weights were fitted to. The saved weights are
+    then fitted on all labels. Recall is measured at the dialogue level: a
+    dialogue with at least one labelled repair must be routed to the LLM.
+    """
+    labelled = load_labelled_dialogues(processed_dir, labels_dir)
+    if not labelled:
+        raise ValueError(f"No labelled dialogues found in {labels_dir}")
+
+    names = [name for name, _, _ in labelled]
+    matrices, turn_labels = [], []
+    for _, dialogue_data, repairs in labelled:
+        turns = dialogue_data.get('turns', [])
+        matrices.append(turn_features(turns))
+        in_repair = {t for r in repairs if isinstance(r, dict) for t in r.get('turn_indices', []) if isinstance(t, int)}
+        turn_labels.append(np.fromiter((turn.get('turn') in in_repair for turn in turns), dtype=bool, count=len(turns)))
+    has_repair = np.array([bool(repairs) for _, _, repairs in labelled])
+
+    fold_ids = student_folds(names, max(2, folds), seed)
+    n_folds = int(fold_ids.max()) + 1
+    if n_folds < 2:
+        raise ValueError(f"Held-out calibration needs labels from at least 2 students in {labels_dir}")
+    held_out_scores = np.zeros(len(labelled))
+    for fold in range(n_folds):
+        test = fold_ids == fold
+        train = np.flatnonzero(~test)
+        fold_weights = fit_weights([matrices[i] for i in train], [turn_labels[i] for i in train])
+        held_out_scores[test] = dialogue_scores([matrices[i] for i in np.flatnonzero(test)], fold_weights, window)
+
+    threshold = pick_threshold(held_out_scores, has_repair, target_recall)
+    weights = fit_weights(matrices, turn_labels)
+    in_sample_routed = dialogue_scores(matrices, weights, window) >= threshold
+
+    routed = held_out_scores >= threshold
+    recall = float(routed[has_repair].mean()) if has_repair.any() else 1.0
+    fold_recalls = [
+        float(routed[(fold_ids == fold) & has_repair].mean())
+        for fold in range(n_folds) if ((fold_ids == fold) & has_repair).any()
+    ]
+    try:
+        labels_name = str(labels_dir.relative_to(PROJECT_ROOT))
+    except ValueError:
+        labels_name = str(labels_dir)
+    metrics = {
+        "labels_dir": labels_name,
+        "dialogues": int(len(labelled)),
+        "dialogues_with_repairs": int(has_repair.sum()),
+        "target_recall": target_recall,
+        "evaluation": f"{n_folds}-fold cross-validation by student",
+        "recall": recall,
+        "fold_recall_min": min(fold_recalls) if fold_recalls else 1.0,
+        "fold_recall_max": max(fold_recalls) if fold_recalls else 1.0,
+        "in_sample_recall": float(in_sample_routed[has_repair].mean()) if has_repair.any() else 1.0,
+        "llm_calls": int(routed.sum()),
+        "llm_calls_saved": int((~routed).sum()),
+        "calls_saved_rate": float((~routed).mean()),
+        "true_negatives_skipped": int((~routed & ~has_repair).sum()),
+        "missed_dialogues": [name for name, r, h in zip(names, routed, has_repair) if h and not r],
+    }
+    return RepairPrefilter(weights=weights, threshold=threshold, window=window, metrics=metrics)
+
+
+def print_prefilter_report(prefilter: RepairPrefilter) -> None:
+    """Print calibration weights, recall and savings."""
+    m = prefilter.metrics
+    print("=" * 70)
+    print("REPAIR PRE-FILTER CALIBRATION")
+    print("=" * 70)
+    for name, weight in zip(FEATURE_NAMES, prefilter.weights):
+        print(f"  {name:<24} {weight:6.3f}")
+    print(f"\nThreshold: {prefilter.threshold:.3f}")
+    print(f"Dialogues: {m.get('dialogues')} ({m.get('dialogues_with_repairs')} with repairs)")
+    print(f"Held-out recall: {m.get('recall', 0):.2%} (target {m.get('target_recall', 0):.0%}, "
+          f"{m.get('evaluation', 'in-sample')}; folds {m.get('fold_recall_min', 0):.0%}-{m.get('fold_recall_max', 0):.0%})")
+    print(f"In-sample recall: {m.get('in_sample_recall', 0):.2%} (final weights on the calibration labels)")
+    print(f"Held-out LLM calls saved: {m.get('llm_calls_saved')}/{m.get('dialogues')} ({m.get('calls_saved_rate', 0):.1%})")
+    if m.get('missed_dialogues'):
+        print(f"Missed dialogues: {', '.join(m['missed_dialogues'][:10])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the local no-repair pre-filter")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="Dialogue-level recall to keep")
+    parser.add_argument("--window", type=int, default=3, help="Sliding window size in turns")
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds (dialogues grouped by student)")
+    parser.add_argument("--labels-dir", type=Path, default=LABELS_DIR, help="Directory of *_repairs.json labels")
+    parser.add_argument("--output", type=Path, default=CALIBRATION_PATH, help="Where to save the calibration")
+    args = parser.parse_args()
+
+    prefilter = calibrate_prefilter(
+        labels_dir=args.labels_dir.resolve(),
+        target_recall=args.target_recall,
+        window=args.window,
+        folds=args.folds,
+    )
+    print_prefilter_report(prefilter)
+    prefilter.save(args.output)
+    print(f"\n[OK] Calibration saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
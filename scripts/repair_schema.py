@@ -0,0 +1,204 @@
+"""
+Repair annotation schema, defined once and shared by all detectors and validators.
+
+Provides:
+- the JSON schema for a repair annotation (and its extension with
+  self-consistency confidence fields),
+- provider-specific structured-output settings (Gemini ``response_schema``,
+  OpenAI ``json_schema`` / ``json_object`` response formats),
+- a single field-level validator used by ``validate_repair_annotation`` and
+  ``validate_repair_results``,
+- a parse-failure counter so malformed-output rates can be compared per 100 calls.
+"""
+import copy
+import threading
+from typing import Any, Dict, List
+
+INITIATION_CODES = ('LI', 'BI')
+RESOLUTION_CODES = ('R', 'U-A', 'U-P')
+REQUIRED_FIELDS = ['repair_id', 'turn_indices', 'initiation', 'resolution', 'trigger', 'evidence_summary']
+
+REPAIR_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "dialogue_id": {"type": "string"},
+        "repair_id": {"type": "integer"},
+        "turn_indices": {"type": "array", "items": {"type": "integer"}},
+        "initiation": {"type": "string", "enum": list(INITIATION_CODES)},
+        "resolution": {"type": "string", "enum": list(RESOLUTION_CODES)},
+        "trigger": {"type": "string"},
+        "evidence_summary": {"type": "string"},
+    },
+    "required": ["dialogue_id"] + REQUIRED_FIELDS,
+    "additionalProperties": False,
+}
+
+REPAIR_ARRAY_SCHEMA: Dict[str, Any] = {
+    "type": "array",
+    "items": REPAIR_SCHEMA,
+}
+
+# Extended schema for vote-aggregated repairs (``self_consistency``); never sent to a model
+CONFIDENCE_PROPERTIES: Dict[str, Any] = {
+    "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+    "label_confidence": {"type": "number", "minimum": 0, "maximum": 1},
+    "votes": {
+        "type": "object",
+        "properties": {
+            "samples": {"type": "integer"},
+            "of": {"type": "integer"},
+            "initiation": {"type": "object"},
+            "resolution": {"type": "object"},
+        },
+    },
+}
+
+REPAIR_SCHEMA_WITH_CONFIDENCE: Dict[str, Any] = {
+    **REPAIR_SCHEMA,
+    "properties": {**REPAIR_SCHEMA["properties"], **CONFIDENCE_PROPERTIES},
+    "required": REPAIR_SCHEMA["required"] + ["confidence"],
+}
+
+# Keys understood by Gemini's OpenAPI-subset schema
+_GEMINI_SCHEMA_KEYS = {"type", "items", "properties", "required", "enum", "description", "format"}
+
+# OpenAI models that accept response_format={"type": "json_schema", ...}
+_JSON_SCHEMA_MODEL_PREFIXES = ('gpt-4o', 'gpt-4.1', 'gpt-5', 'o1', 'o3', 'o4')
+_JSON_SCHEMA_UNSUPPORTED = ('gpt-4o-2024-05-13',)
+
+# Appended to the user prompt when the provider forces a top-level object
+OBJECT_WRAPPER_INSTRUCTION = """
+Structured output mode: wrap the array in a JSON object of the form
+{"repairs": [ ... ]} where each element follows the schema above.
+If there are no repair sequences, return {"repairs": []}."""
+
+
+def _strip_for_gemini(schema: Dict[str, Any]) -> Dict[str, Any]:
+    stripped = {k: copy.deepcopy(v) for k, v in schema.items() if k in _GEMINI_SCHEMA_KEYS}
+    if "items" in stripped:
+        stripped["items"] = _strip_for_gemini(stripped["items"])
+    if "properties" in stripped:
+        stripped["properties"] = {
+            name: _strip_for_gemini(prop) for name, prop in stripped["properties"].items()
+        }
+    return stripped
+
+
+def gemini_generation_config(base_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Add JSON mime type and the repair array schema to a Gemini generation config."""
+    config = dict(base_config)
+    config["response_mime_type"] = "application/json"
+    config["response_schema"] = _strip_for_gemini(REPAIR_ARRAY_SCHEMA)
+    return config
+
+
+def supports_json_schema(model: str) -> bool:
+    """Whether an OpenAI chat model accepts strict JSON-schema responses."""
+    if model in _JSON_SCHEMA_UNSUPPORTED:
+        return False
+    return model.startswith(_JSON_SCHEMA_MODEL_PREFIXES)
+
+
+def openai_response_format(model: str) -> Dict[str, Any]:
+    """
+    Response format for an OpenAI chat model.
+
+    Both OpenAI JSON modes require a top-level object, so the repair array is
+    wrapped as ``{"repairs": [...]}``; the stream parser unwraps it.
+    """
+    if not supports_json_schema(model):
+        return {"type": "json_object"}
+
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "repair_annotations",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"repairs": REPAIR_ARRAY_SCHEMA},
+                "required": ["repairs"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def repair_schema_issues(repair: Any) -> List[str]:
+    """
+    Check a repair annotation against the schema.
+
+    Returns a list of human-readable issues (empty if the repair is valid).
+    ``dialogue_id`` is not checked here: callers own that value and rewrite it.
+    """
+    if not isinstance(repair, dict):
+        return [f"Repair must be an object, got {type(repair).__name__}"]
+
+    issues = []
+    for field in REQUIRED_FIELDS:
+        if field not in repair:
+            issues.append(f"Missing required field: {field}")
+
+    if 'initiation' in repair and repair['initiation'] not in INITIATION_CODES:
+        issues.append(f"Invalid initiation: {repair['initiation']} (must be LI or BI)")
+
+    if 'resolution' in repair and repair['resolution'] not in RESOLUTION_CODES:
+        issues.append(f"Invalid resolution: {repair['resolution']} (must be R, U-A, or U-P)")
+
+    if 'turn_indices' in repair:
+        turn_indices = repair['turn_indices']
+        if not isinstance(turn_indices, list):
+            issues.append(f"turn_indices must be a list, got {type(turn_indices)}")
+        elif not turn_indices:
+            issues.append("turn_indices is empty")
+        elif not all(isinstance(t, int) and not isinstance(t, bool) for t in turn_indices):
+            issues.append("turn_indices contains non-integer values")
+
+    if 'trigger' in repair and not isinstance(repair['trigger'], str):
+        issues.append(f"trigger must be a string, got {type(repair['trigger'])}")
+
+    if 'evidence_summary' in repair and not isinstance(repair['evidence_summary'], str):
+        issues.append(f"evidence_summary must be a string, got {type(repair['evidence_summary'])}")
+
+    for field in ('confidence', 'label_confidence'):
+        if field in repair:
+            value = repair[field]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+                issues.append(f"{field} must be a number between 0 and 1, got {value!r}")
+
+    return issues
+
+
+class ParseStats:
+    """Thread-safe counter of model responses that could not be fully parsed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.parse_failures = 0
+
+    def record(self, parsed_ok: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            if not parsed_ok:
+                self.parse_failures += 1
+
+    def failures_per_100_calls(self) -> float:
+        with self._lock:
+            return 100.0 * self.parse_failures / self.calls if self.calls else 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.parse_failures = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "parse_failures": self.parse_failures,
+            "failures_per_100_calls": self.failures_per_100_calls(),
+        }
+
+
+# Process-wide counter updated by every detector
+PARSE_STATS = ParseStats()
@@ -0,0 +1,78 @@
+"""
+On-disk cache of detector results.
+
+Results are keyed by a SHA-256 over everything that determines a model's
+answer (backend and model, dialogue content, sampling options, sample
+number), so repeated runs (self-consistency samples, re-calibration,
+benchmark reruns) do not pay for the same request twice.
+
+Entries are stored one JSON file per key under ``data/cache/responses``
+and written atomically, so concurrent workers and interrupted runs never
+leave a half-written entry behind.
+"""
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from artifact_writer import write_json
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = PROJECT_ROOT / "data" / "cache" / "responses"
+
+
+def dialogue_fingerprint(dialogue_data: Dict[str, Any]) -> str:
+    """Hash of the dialogue id and turns (what the detectors see)."""
+    content = json.dumps(
+        {"dialogue_id": dialogue_data.get("dialogue_id"), "turns": dialogue_data.get("turns", [])},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe JSON file cache."""
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """Stable key for the given request parts."""
+        content = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None on a miss (or a disabled cache)."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a JSON-serialisable value."""
+        if not self.enabled:
+            return
+        # Atomic but not fsync'ed: a lost entry is only a cache miss
+        write_json(self._path(key), value, compact=True, durable=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
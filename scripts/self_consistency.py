@@ -0,0 +1,266 @@
+"""
+Self-consistency detection: sample a detector N times and vote on repairs.
+
+The N requests are issued concurrently (at varied temperatures) through the
+shared rate limiter and the response cache, so wall-clock latency is close
+to a single call and reruns are free. Repairs from the samples are clustered
+by optimal turn-overlap matching (``repair_matching``); a cluster supported by
+a majority of samples becomes one consensus repair with:
+
+- ``turn_indices``: turns included by a majority of the cluster's members,
+- ``initiation`` / ``resolution``: majority codes,
+- ``confidence``: fraction of samples that produced the repair,
+- ``label_confidence``: agreement on the codes among those samples,
+- ``votes``: the raw vote counts.
+
+Dialogues with low-confidence or rejected minority repairs are flagged for
+human review in ``data/telemetry/self_consistency_review.jsonl``.
+
+Cached results are keyed by backend, model, temperature, sample number and
+dialogue content; clear ``data/cache/responses`` after changing prompts.
+"""
+import copy
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from detector_backends import create_backend
+from repair_matching import DEFAULT_MIN_OVERLAP, match_repairs
+from repair_schema import repair_schema_issues
+from response_cache import ResponseCache, dialogue_fingerprint
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_LOG_PATH = PROJECT_ROOT / "data" / "telemetry" / "self_consistency_review.jsonl"
+
+DEFAULT_SAMPLES = 5
+DEFAULT_TEMPERATURES = (0.1, 0.4, 0.7, 1.0)
+DEFAULT_REVIEW_THRESHOLD = 0.8
+
+
+def cluster_samples(
+    samples: List[List[Dict[str, Any]]],
+    min_overlap: float = DEFAULT_MIN_OVERLAP
+) -> List[List[Tuple[int, Dict[str, Any]]]]:
+    """
+    Group repairs from different samples that describe the same episode.
+
+    Each sample is matched one-to-one against the clusters built so far
+    (compared with each cluster's first repair); unmatched repairs start new
+    clusters. Returns clusters as lists of (sample index, repair).
+    """
+    clusters: List[List[Tuple[int, Dict[str, Any]]]] = []
+    for sample_index, sample in enumerate(samples):
+        valid = [r for r in sample if not repair_schema_issues(r)]
+        anchors = [cluster[0][1] for cluster in clusters]
+        matched = set()
+        for pair in match_repairs(valid, anchors, min_overlap=min_overlap):
+            clusters[pair["actual"]].append((sample_index, valid[pair["predicted"]]))
+            matched.add(pair["predicted"])
+        for i, repair in enumerate(valid):
+            if i not in matched:
+                clusters.append([(sample_index, repair)])
+    return clusters
+
+
+def consensus_repair(cluster: List[Tuple[int, Dict[str, Any]]], n_samples: int) -> Dict[str, Any]:
+    """Merge a cluster of matching repairs into one repair with vote-based confidence."""
+    members = [repair for _, repair in cluster]
+    votes = len(members)
+
+    turn_votes = Counter(t for repair in members for t in set(repair['turn_indices']))
+    turns = sorted(t for t, count in turn_votes.items() if 2 * count > votes) or sorted(set(members[0]['turn_indices']))
+    initiation_votes = Counter(repair['initiation'] for repair in members)
+    resolution_votes = Counter(repair['resolution'] for repair in members)
+    initiation = initiation_votes.most_common(1)[0][0]
+    resolution = resolution_votes.most_common(1)[0][0]
+
+    # Take wording from the member closest to the consensus
+    turn_set = set(turns)
+
+    def closeness(repair):
+        span = set(repair['turn_indices'])
+        same_codes = repair['initiation'] == initiation and repair['resolution'] == resolution
+        return (same_codes, len(span & turn_set) / len(span | turn_set))
+
+    representative = max(members, key=closeness)
+    label_votes = sum(1 for r in members if r['initiation'] == initiation and r['resolution'] == resolution)
+
+    return {
+        "turn_indices": turns,
+        "initiation": initiation,
+        "resolution": resolution,
+        "trigger": representative.get('trigger', ''),
+        "evidence_summary": representative.get('evidence_summary', ''),
+        "confidence": round(votes / n_samples, 3),
+        "label_confidence": round(label_votes / votes, 3),
+        "votes": {
+            "samples": votes,
+            "of": n_samples,
+            "initiation": dict(initiation_votes),
+            "resolution": dict(resolution_votes),
+        },
+    }
+
+
+def aggregate_samples(
+    samples: List[List[Dict[str, Any]]],
+    dialogue_id: str,
+    min_votes: Optional[int] = None,
+    min_overlap: float = DEFAULT_MIN_OVERLAP
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Vote on repairs across samples.
+
+    Args:
+        samples: Repairs returned by each successful sample
+        dialogue_id: Written into every consensus repair
+        min_votes: Samples needed to keep a repair (default: strict majority)
+        min_overlap: Jaccard threshold for two repairs to count as the same episode
+
+    Returns:
+        (accepted consensus repairs, rejected minority repairs), both with confidence
+    """
+    n_samples = len(samples)
+    if n_samples == 0:
+        return [], []
+    if min_votes is None:
+        min_votes = n_samples // 2 + 1
+
+    accepted, rejected = [], []
+    for cluster in cluster_samples(samples, min_overlap=min_overlap):
+        repair = consensus_repair(cluster, n_samples)
+        (accepted if repair["votes"]["samples"] >= min_votes else rejected).append(repair)
+
+    accepted.sort(key=lambda r: (r['turn_indices'][0], r['turn_indices'][-1]))
+    accepted = [
+        {"dialogue_id": dialogue_id, "repair_id": repair_id, **repair}
+        for repair_id, repair in enumerate(accepted, 1)
+    ]
+    rejected = [{"dialogue_id": dialogue_id, **repair} for repair in rejected]
+    return accepted, rejected
+
+
+class SelfConsistencyBackend:
+    """Runs a base backend N times concurrently and returns vote-aggregated repairs."""
+
+    name = "self-consistency"
+
+    def __init__(
+        self,
+        base: str = "gemini",
+        model: Optional[str] = None,
+        samples: int = DEFAULT_SAMPLES,
+        temperatures: Sequence[float] = DEFAULT_TEMPERATURES,
+        min_votes: Optional[int] = None,
+        review_threshold: float = DEFAULT_REVIEW_THRESHOLD,
+        cache: Optional[ResponseCache] = None,
+        log_path: Optional[Path] = DEFAULT_LOG_PATH
+    ):
+        self.base = create_backend(base, model=model)
+        self.samples = max(1, samples)
+        self.temperatures = tuple(temperatures)
+        self.min_votes = min_votes
+        self.review_threshold = review_threshold
+        self.cache = cache if cache is not None else ResponseCache()
+        self.log_path = log_path
+        self._samplers = []
+        self._lock = threading.Lock()
+        self.dialogues = 0
+        self.flagged = 0
+
+    def prepare(self) -> None:
+        self.base.prepare()
+        if not self._samplers:
+            for i in range(self.samples):
+                sampler = copy.copy(self.base)
+                if hasattr(sampler, 'temperature'):
+                    sampler.temperature = self.temperatures[i % len(self.temperatures)]
+                if hasattr(sampler, 'raise_errors'):
+                    # Failed samples must not be cached or counted as "no repairs"
+                    sampler.raise_errors = True
+                self._samplers.append(sampler)
+
+    def describe(self) -> str:
+        return f"{self.name} ({self.base.describe()} x{self.samples})"
+
+    def _run_sample(self, index: int, dialogue_data: Dict[str, Any], fingerprint: str) -> Optional[List[Dict[str, Any]]]:
+        sampler = self._samplers[index]
+        key = ResponseCache.make_key(
+            backend=sampler.describe(),
+            temperature=getattr(sampler, 'temperature', None),
+            sample=index,
+            dialogue=fingerprint,
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            repairs = sampler.detect(dialogue_data)
+        except Exception as e:
+            print(f"  [WARNING] Sample {index + 1}/{self.samples} failed: {e}")
+            return None
+        self.cache.put(key, repairs)
+        return repairs
+
+    def detect(self, dialogue_data, stream=False, on_repair=None):
+        self.prepare()
+        started = time.perf_counter()
+        dialogue_id = dialogue_data.get('dialogue_id', 'UNKNOWN')
+        fingerprint = dialogue_fingerprint(dialogue_data)
+
+        with ThreadPoolExecutor(max_workers=self.samples) as pool:
+            results = list(pool.map(lambda i: self._run_sample(i, dialogue_data, fingerprint), range(self.samples)))
+        samples = [r for r in results if r is not None]
+        if not samples:
+            # Nothing to vote on: report a failure instead of an empty annotation
+            raise RuntimeError(f"All {self.samples} self-consistency samples failed for {dialogue_id}")
+
+        repairs, rejected = aggregate_samples(samples, dialogue_id, min_votes=self.min_votes)
+        low_confidence = [r['repair_id'] for r in repairs
+                          if min(r['confidence'], r['label_confidence']) < self.review_threshold]
+        needs_review = bool(low_confidence or rejected or len(samples) < self.samples)
+
+        with self._lock:
+            self.dialogues += 1
+            self.flagged += int(needs_review)
+        self._log({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "dialogue_id": dialogue_id,
+            "backend": self.describe(),
+            "samples_ok": len(samples),
+            "sample_repair_counts": [len(s) for s in samples],
+            "repairs": len(repairs),
+            "low_confidence_repairs": low_confidence,
+            "rejected_repairs": [
+                {"turn_indices": r["turn_indices"], "confidence": r["confidence"]} for r in rejected
+            ],
+            "needs_review": needs_review,
+            "seconds": round(time.perf_counter() - started, 3),
+        })
+
+        if on_repair is not None:
+            for repair in repairs:
+                on_repair(repair)
+        return repairs
+
+    def review_summary(self) -> Dict[str, Any]:
+        """How many dialogues were flagged for human review in this run."""
+        with self._lock:
+            return {
+                "dialogues": self.dialogues,
+                "needs_review": self.flagged,
+                "review_rate": self.flagged / self.dialogues if self.dialogues else 0.0,
+                "cache": self.cache.stats(),
+            }
+
+    def _log(self, entry: Dict[str, Any]) -> None:
+        if self.log_path is None:
+            return
+        with self._lock:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
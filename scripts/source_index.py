@@ -0,0 +1,149 @@
+"""
+Cross-reference parsed dialogue turns with the documents they came from.
+
+Task files are grouped by ``source_file`` so each source document is
+handled once, however many tasks it was split into:
+
+1. its text is loaded from ``data/cache/source_text`` (keyed by a hash of
+   the document bytes) or extracted with ``document_extractor`` and cached,
+2. a normalised word-trigram index of the text is built once,
+3. every turn of every task from that source is looked up in the index
+   (O(turn length) per turn, no scan of the source text).
+
+Sources are processed in parallel worker processes.
+"""
+import hashlib
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path, PureWindowsPath
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from response_cache import ResponseCache
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SOURCE_TEXT_CACHE_DIR = PROJECT_ROOT / "data" / "cache" / "source_text"
+
+NGRAM = 3
+# Turns with fewer words are too generic to look up ("Yes, I do.")
+MIN_TURN_WORDS = 3
+# A turn is found when this share of its word trigrams occurs in the source
+MATCH_THRESHOLD = 0.6
+
+_WORDS = re.compile(r"\w+")
+
+# (source_file as stored in the dialogue JSON, [(turn number, text), ...])
+SourceCheck = Tuple[str, List[Tuple[Any, str]]]
+
+
+def resolve_source_path(source_file: str, root: Path = PROJECT_ROOT) -> Path:
+    """Path of a ``source_file`` value; accepts Windows separators and paths relative to root."""
+    path = Path(*PureWindowsPath(source_file).parts) if "\\" in source_file else Path(source_file)
+    return path if path.is_absolute() else root / path
+
+
+def normalise_words(text: str) -> List[str]:
+    """Lowercase word tokens; quotes, punctuation and whitespace differences are ignored."""
+    return _WORDS.findall(text.lower())
+
+
+class SourceTextIndex:
+    """Set of word trigrams of a source text, for constant-time phrase lookups."""
+
+    def __init__(self, text: str):
+        words = normalise_words(text)
+        self.ngrams = {tuple(words[i:i + NGRAM]) for i in range(len(words) - NGRAM + 1)}
+
+    def match(self, turn_text: str) -> Optional[bool]:
+        """True/False whether the turn occurs in the source; None if too short to check."""
+        words = normalise_words(turn_text)
+        if len(words) < MIN_TURN_WORDS:
+            return None
+        grams = [tuple(words[i:i + NGRAM]) for i in range(len(words) - NGRAM + 1)]
+        hits = sum(1 for gram in grams if gram in self.ngrams)
+        return hits >= MATCH_THRESHOLD * len(grams)
+
+
+def load_source_text(path: Path, cache: Optional[ResponseCache] = None) -> str:
+    """Extracted text of a source document, cached by the document's content hash."""
+    cache = cache or ResponseCache(SOURCE_TEXT_CACHE_DIR)
+    key = ResponseCache.make_key(kind="source_text", sha256=hashlib.sha256(path.read_bytes()).hexdigest())
+    cached = cache.get(key)
+    if isinstance(cached, dict) and isinstance(cached.get("text"), str):
+        return cached["text"]
+    from document_extractor import extract_text
+    text = extract_text(str(path))
+    cache.put(key, {"source_file": str(path), "text": text})
+    return text
+
+
+def check_source(source_file: str, tasks: Sequence[List[Tuple[Any, str]]],
+                 root: Path = PROJECT_ROOT) -> List[Dict[str, Any]]:
+    """
+    Look up every turn of the tasks parsed from one source document.
+
+    Args:
+        source_file: ``source_file`` value shared by the tasks
+        tasks: For each task, its (turn number, text) pairs
+        root: Directory relative source paths are resolved against
+
+    Returns:
+        Per task: checked, found and missing turn numbers, or an error
+        ("not_found" or the extraction error message)
+    """
+    path = resolve_source_path(source_file, root)
+    if not path.exists():
+        return [{"error": "not_found"} for _ in tasks]
+    try:
+        index = SourceTextIndex(load_source_text(path))
+    except Exception as e:
+        return [{"error": str(e)} for _ in tasks]
+
+    results = []
+    for turns in tasks:
+        checked, found, missing = 0, 0, []
+        for turn_num, text in turns:
+            matched = index.match(text or "")
+            if matched is None:
+                continue
+            checked += 1
+            if matched:
+                found += 1
+            else:
+                missing.append(turn_num)
+        results.append({"checked": checked, "found": found, "missing": missing})
+    return results
+
+
+def check_sources(checks: Sequence[SourceCheck], workers: Optional[int] = None,
+                  root: Path = PROJECT_ROOT) -> List[Dict[str, Any]]:
+    """
+    Cross-reference many task files, each source document once, in parallel.
+
+    Args:
+        checks: (source_file, turns) per task file
+        workers: Worker processes (default: CPU count; 1 runs in-process)
+        root: Directory relative source paths are resolved against
+
+    Returns:
+        One result per entry of ``checks``, as returned by ``check_source``
+    """
+    groups: Dict[str, List[int]] = {}
+    for position, (source_file, _) in enumerate(checks):
+        groups.setdefault(source_file, []).append(position)
+
+    results: List[Dict[str, Any]] = [{} for _ in checks]
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    jobs = [(source_file, [checks[p][1] for p in positions]) for source_file, positions in groups.items()]
+
+    if workers <= 1 or len(jobs) <= 1:
+        outputs = [check_source(source_file, tasks, root) for source_file, tasks in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            outputs = list(pool.map(check_source, [j[0] for j in jobs], [j[1] for j in jobs],
+                                    [root] * len(jobs), chunksize=4))
+
+    for (source_file, positions), output in zip(groups.items(), outputs):
+        for position, result in zip(positions, output):
+            results[position] = result
+    return results
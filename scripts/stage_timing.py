@@ -0,0 +1,299 @@
+"""
+Hierarchical stage timing for the preprocessing and repair pipeline.
+
+Pipeline code wraps each stage in ``stage("name")``; nested stages are
+recorded under their parent's path (``preprocessing/extraction``), so a
+report shows both where the time went overall and inside each step:
+
+- calls, total and self time (total minus nested stages), slowest call,
+- with profiling enabled: peak and net traced memory per stage
+  (tracemalloc) and one cProfile dump per stage, each covering only the
+  code not inside a nested stage.
+
+Reports are written to ``data/profiles/<run id>/timing.json`` (run ids match
+the LLM telemetry ledger). Compare two runs to find the regressed stage:
+
+    python scripts/stage_timing.py                        # latest run vs the one before
+    python scripts/stage_timing.py --run RUN --compare BASELINE
+    python -m pstats data/profiles/<run>/preprocessing.extraction.prof
+"""
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from artifact_writer import write_json
+from telemetry import RUN_ID
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROFILES_DIR = PROJECT_ROOT / "data" / "profiles"
+TOP_ALLOCATIONS = 15
+
+
+class _Frame:
+    __slots__ = ("path", "started", "child_seconds", "profiler", "memory_start", "memory_peak")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.perf_counter()
+        self.child_seconds = 0.0
+        self.profiler: Optional[cProfile.Profile] = None
+        self.memory_start = 0
+        self.memory_peak = 0
+
+
+class StageTimer:
+    """
+    Thread-safe collector of nested stage timings.
+
+    Each thread keeps its own stack of open stages; stages opened in worker
+    threads start a new root path. Totals are aggregated by stage path.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.profile = False
+        self._profilers: Dict[str, cProfile.Profile] = {}
+        self.started = time.perf_counter()
+
+    def enable_profiling(self) -> None:
+        """Also collect cProfile statistics and traced memory per stage."""
+        self.profile = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self) -> List[_Frame]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _profiler(self, path: str) -> cProfile.Profile:
+        with self._lock:
+            profiler = self._profilers.get(path)
+            if profiler is None:
+                profiler = self._profilers[path] = cProfile.Profile()
+            return profiler
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        frame = _Frame(f"{parent.path}/{name}" if parent else name)
+
+        # Only the main thread is profiled: cProfile allows one active profiler
+        profiling = self.profile and threading.current_thread() is threading.main_thread()
+        if profiling:
+            if parent is not None and parent.profiler is not None:
+                parent.profiler.disable()
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                parent.memory_peak = max(parent.memory_peak, peak)
+            tracemalloc.reset_peak()
+            frame.memory_start = frame.memory_peak = current
+            frame.profiler = self._profiler(frame.path)
+            frame.profiler.enable()
+
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = time.perf_counter() - frame.started
+            memory = None
+            if frame.profiler is not None:
+                frame.profiler.disable()
+                current, peak = tracemalloc.get_traced_memory()
+                frame.memory_peak = max(frame.memory_peak, peak)
+                tracemalloc.reset_peak()
+                memory = (frame.memory_peak - frame.memory_start, current - frame.memory_start)
+                if parent is not None:
+                    parent.memory_peak = max(parent.memory_peak, frame.memory_peak)
+                    if parent.profiler is not None:
+                        parent.profiler.enable()
+            if parent is not None:
+                parent.child_seconds += elapsed
+            self._record(frame.path, elapsed, elapsed - frame.child_seconds, memory)
+
+    def _record(self, path: str, elapsed: float, self_seconds: float, memory) -> None:
+        with self._lock:
+            stats = self.stages.get(path)
+            if stats is None:
+                stats = self.stages[path] = {
+                    "calls": 0, "total_seconds": 0.0, "self_seconds": 0.0, "max_seconds": 0.0,
+                }
+            stats["calls"] += 1
+            stats["total_seconds"] += elapsed
+            stats["self_seconds"] += self_seconds
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            if memory is not None:
+                peak, net = memory
+                stats["peak_memory_kib"] = max(stats.get("peak_memory_kib", 0.0), peak / 1024)
+                stats["net_memory_kib"] = stats.get("net_memory_kib", 0.0) + net / 1024
+
+    def report(self) -> Dict[str, Any]:
+        """Machine-readable timing report for this run."""
+        with self._lock:
+            stages = [
+                {
+                    "path": path,
+                    "name": path.rsplit("/", 1)[-1],
+                    "depth": path.count("/"),
+                    **{k: round(v, 6) if isinstance(v, float) else v for k, v in stats.items()},
+                }
+                for path, stats in self.stages.items()
+            ]
+        stages.sort(key=lambda s: s["path"])
+        report = {
+            "run_id": RUN_ID,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "wall_seconds": round(time.perf_counter() - self.started, 6),
+            "profiled": self.profile,
+            "stages": stages,
+        }
+        if self.profile and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ])
+            report["top_allocations"] = [
+                {"location": str(stat.traceback), "size_kib": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+            ]
+        return report
+
+    def save(self, output_dir: Optional[Path] = None) -> Path:
+        """Write timing.json (and per-stage .prof files when profiling) for this run."""
+        output_dir = Path(output_dir) if output_dir else PROFILES_DIR / RUN_ID
+        output_dir.mkdir(parents=True, exist_ok=True)
+        report_path = output_dir / "timing.json"
+        write_json(report_path, self.report())
+        with self._lock:
+            profilers = dict(self._profilers)
+        for path, profiler in profilers.items():
+            profiler.dump_stats(str(output_dir / f"{path.replace('/', '.')}.prof"))
+        return report_path
+
+
+TIMER = StageTimer()
+
+
+def stage(name: str):
+    """Time a pipeline stage on the process-wide timer."""
+    return TIMER.span(name)
+
+
+@contextmanager
+def use_timer(timer: StageTimer) -> Iterator[StageTimer]:
+    """Record ``stage()`` spans on ``timer`` instead of the process-wide timer (e.g. one per benchmark run)."""
+    global TIMER
+    previous, TIMER = TIMER, timer
+    try:
+        yield timer
+    finally:
+        TIMER = previous
+
+
+def load_report(path: Path) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_reports(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Per-stage changes between two runs, most regressed first.
+
+    Stages are ranked by the change in self time, so a slow parent whose
+    time is really spent in one child points at that child.
+    """
+    current = {s["path"]: s for s in report["stages"]}
+    previous = {s["path"]: s for s in baseline["stages"]}
+    rows = []
+    for path in sorted(set(current) | set(previous)):
+        now, before = current.get(path, {}), previous.get(path, {})
+        rows.append({
+            "path": path,
+            "self_seconds": now.get("self_seconds", 0.0),
+            "baseline_self_seconds": before.get("self_seconds", 0.0),
+            "self_change": now.get("self_seconds", 0.0) - before.get("self_seconds", 0.0),
+            "total_seconds": now.get("total_seconds", 0.0),
+            "baseline_total_seconds": before.get("total_seconds", 0.0),
+            "calls": now.get("calls", 0),
+            "baseline_calls": before.get("calls", 0),
+        })
+    rows.sort(key=lambda r: r["self_change"], reverse=True)
+    return rows
+
+
+def print_timing_report(report: Dict[str, Any], limit: Optional[int] = None) -> None:
+    """Print stages as an indented tree with call counts and times."""
+    print(f"Stage timings (run {report['run_id']}, wall {report['wall_seconds']:.2f}s):")
+    stages = report["stages"]
+    slowest = sorted(stages, key=lambda s: s["self_seconds"], reverse=True)[:limit] if limit else stages
+    shown = {s["path"] for s in slowest}
+    for s in stages:
+        if s["path"] not in shown:
+            continue
+        memory = f"  peak {s['peak_memory_kib']:.0f} KiB" if "peak_memory_kib" in s else ""
+        print(f"  {'  ' * s['depth']}{s['name']:<{max(4, 28 - 2 * s['depth'])}} "
+              f"{s['total_seconds']:>9.3f}s total {s['self_seconds']:>9.3f}s self  x{s['calls']}{memory}")
+
+
+def print_comparison(rows: List[Dict[str, Any]], limit: int = 10) -> None:
+    print(f"{'Stage':<40} {'Self (s)':>10} {'Baseline':>10} {'Change':>10} {'Calls':>12}")
+    print("-" * 86)
+    for row in rows[:limit]:
+        base = row["baseline_self_seconds"]
+        pct = f" ({100.0 * row['self_change'] / base:+.0f}%)" if base else ""
+        print(f"{row['path']:<40} {row['self_seconds']:>10.3f} {base:>10.3f} {row['self_change']:>+10.3f}"
+              f" {row['calls']:>5}/{row['baseline_calls']:<5}{pct}")
+    if rows and rows[0]["self_change"] > 0:
+        print(f"\nLargest regression: {rows[0]['path']} ({rows[0]['self_change']:+.3f}s self time)")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or compare pipeline stage timing reports")
+    parser.add_argument("--run", help="Run id or timing.json path (default: latest run)")
+    parser.add_argument("--compare", help="Baseline run id or timing.json path (default: the run before)")
+    parser.add_argument("--profiles-dir", default=str(PROFILES_DIR), help="Directory with per-run reports")
+    args = parser.parse_args()
+
+    profiles_dir = Path(args.profiles_dir)
+    runs = sorted(p.parent.name for p in profiles_dir.glob("*/timing.json"))
+
+    def resolve(ref: Optional[str]) -> Optional[Path]:
+        if ref is None:
+            return None
+        path = Path(ref)
+        return path if path.suffix == ".json" else profiles_dir / ref / "timing.json"
+
+    run_path = resolve(args.run) or (profiles_dir / runs[-1] / "timing.json" if runs else None)
+    if run_path is None or not run_path.exists():
+        print(f"[ERROR] No timing report found ({args.run or profiles_dir})")
+        return
+    report = load_report(run_path)
+
+    baseline_path = resolve(args.compare)
+    if baseline_path is None and report["run_id"] in runs and runs.index(report["run_id"]) > 0:
+        baseline_path = profiles_dir / runs[runs.index(report["run_id"]) - 1] / "timing.json"
+
+    print_timing_report(report)
+    if baseline_path is not None:
+        if not baseline_path.exists():
+            print(f"[ERROR] Baseline report not found: {baseline_path}")
+            return
+        baseline = load_report(baseline_path)
+        print(f"\nCompared with run {baseline['run_id']} (wall {baseline['wall_seconds']:.2f}s):\n")
+        print_comparison(compare_reports(report, baseline))
+
+
+if __name__ == "__main__":
+    main()
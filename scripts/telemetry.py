@@ -0,0 +1,357 @@
+"""
+Per-call telemetry for LLM requests.
+
+Every provider call made by the detectors is wrapped in ``track_call``, which
+records into an append-only JSONL ledger (``data/telemetry/llm_calls.jsonl``):
+
+- wall time, time spent waiting for the rate limiter and in retry backoff,
+  and model latency of each attempt (``latency_seconds`` is the last one),
+- prompt / completion / cached tokens from the provider's usage metadata,
+- retries of transient errors (rate limits, timeouts, 5xx); OpenAI clients
+  are built with ``max_retries=0`` so every retry happens, and is counted, here,
+- whether the response parsed cleanly, how many repairs it produced,
+- estimated cost from ``config/model_pricing.json``.
+
+Each process gets a run id, so reports can compare runs:
+
+    python scripts/telemetry.py                  # latest run vs the one before
+    python scripts/telemetry.py --run 20250101-120000-1234
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from rate_limiter import acquire
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+LEDGER_PATH = PROJECT_ROOT / "data" / "telemetry" / "llm_calls.jsonl"
+PRICING_PATH = PROJECT_ROOT / "config" / "model_pricing.json"
+
+MAX_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 2.0
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+_RETRYABLE_NAMES = ("RateLimit", "Timeout", "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "APIConnection")
+
+RUN_ID = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+_current = threading.local()
+_pricing: Optional[Dict[str, Dict[str, float]]] = None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient provider errors worth retrying."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status in _RETRYABLE_STATUS:
+        return True
+    return any(name in type(error).__name__ for name in _RETRYABLE_NAMES)
+
+
+def load_pricing(path: Path = PRICING_PATH) -> Dict[str, Dict[str, float]]:
+    """USD per 1M tokens by model name."""
+    global _pricing
+    if _pricing is None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                _pricing = json.load(f).get("models", {})
+        except (OSError, ValueError):
+            _pricing = {}
+    return _pricing
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: Optional[int], completion_tokens: Optional[int],
+                  cached_tokens: Optional[int] = None) -> Optional[float]:
+    """Estimated USD cost of one call (None if the model or token counts are unknown)."""
+    if not model or prompt_tokens is None or completion_tokens is None:
+        return None
+    pricing = load_pricing()
+    # Exact name, else the longest known prefix (e.g. dated snapshots)
+    matches = [name for name in pricing if model == name or model.startswith(name + "-")]
+    if not matches:
+        return None
+    price = pricing[max(matches, key=len)]
+    cached = cached_tokens or 0
+    cached_price = price.get("cached_input", price["input"])
+    return ((prompt_tokens - cached) * price["input"] + cached * cached_price
+            + completion_tokens * price["output"]) / 1_000_000
+
+
+class TelemetryLedger:
+    """Thread-safe append-only JSONL ledger."""
+
+    def __init__(self, path: Optional[Path] = LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        if self.path is None:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def read(self, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """All records (optionally of one run); a partially written last line is skipped."""
+        if self.path is None or not self.path.exists():
+            return []
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if run_id is None or record.get("run_id") == run_id:
+                    records.append(record)
+        return records
+
+
+LEDGER = TelemetryLedger()
+
+
+class CallTelemetry:
+    """Measurements of one provider call; written to the ledger by ``track_call``."""
+
+    def __init__(self, provider: str, model: Optional[str], dialogue_id: Optional[str], stream: bool):
+        self.provider = provider
+        self.model = model
+        self.dialogue_id = dialogue_id
+        self.stream = stream
+        self.started = time.perf_counter()
+        self.queue_wait = 0.0
+        self.backoff = 0.0
+        self.retries = 0
+        self.failed_attempts: List[float] = []
+        self._attempt_started: Optional[float] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.cached_tokens: Optional[int] = None
+        self.parse_ok: Optional[bool] = None
+        self.repairs: Optional[int] = None
+
+    def request(self, send: Callable[[], Any], max_retries: int = MAX_RETRIES) -> Any:
+        """
+        Send a request under the provider's rate limit, retrying transient errors.
+
+        Each attempt is timed from the moment it leaves the rate limiter; the
+        last attempt runs until the call is recorded, so a consumed stream
+        counts towards its latency.
+        """
+        for attempt in range(max_retries + 1):
+            self.queue_wait += acquire(self.provider)
+            self._attempt_started = time.perf_counter()
+            try:
+                return send()
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable(e):
+                    raise
+                self.failed_attempts.append(time.perf_counter() - self._attempt_started)
+                self.retries += 1
+                delay = RETRY_BACKOFF_SECONDS * 2 ** attempt
+                time.sleep(delay)
+                self.backoff += delay
+
+    def set_usage(self, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None,
+                  cached_tokens: Optional[int] = None) -> None:
+        if prompt_tokens is not None:
+            self.prompt_tokens = prompt_tokens
+        if completion_tokens is not None:
+            self.completion_tokens = completion_tokens
+        if cached_tokens is not None:
+            self.cached_tokens = cached_tokens
+
+    def to_record(self, error: Optional[str] = None) -> Dict[str, Any]:
+        now = time.perf_counter()
+        wall = now - self.started
+        if self._attempt_started is not None:
+            latency = now - self._attempt_started
+        else:
+            latency = wall - self.queue_wait
+        return {
+            "run_id": RUN_ID,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "provider": self.provider,
+            "model": self.model,
+            "dialogue_id": self.dialogue_id,
+            "stream": self.stream,
+            "wall_seconds": round(wall, 4),
+            "queue_wait_seconds": round(self.queue_wait, 4),
+            "backoff_seconds": round(self.backoff, 4),
+            "latency_seconds": round(latency, 4),
+            "attempt_latency_seconds": [round(s, 4) for s in self.failed_attempts + [latency]],
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "retries": self.retries,
+            "parse_ok": self.parse_ok,
+            "repairs": self.repairs,
+            "error": error,
+            "estimated_cost_usd": estimate_cost(self.model, self.prompt_tokens, self.completion_tokens, self.cached_tokens),
+        }
+
+
+@contextmanager
+def track_call(provider: str, model: Optional[str], dialogue_data: Dict[str, Any], stream: bool = False) -> Iterator[CallTelemetry]:
+    """Record one provider call; errors are logged and re-raised."""
+    call = CallTelemetry(provider, model, dialogue_data.get("dialogue_id"), stream)
+    previous = getattr(_current, "call", None)
+    _current.call = call
+    try:
+        yield call
+    except Exception as e:
+        LEDGER.append(call.to_record(error=f"{type(e).__name__}: {e}"))
+        raise
+    else:
+        LEDGER.append(call.to_record())
+    finally:
+        _current.call = previous
+
+
+def current_call() -> Optional[CallTelemetry]:
+    """The call being tracked on this thread, if any."""
+    return getattr(_current, "call", None)
+
+
+def note_parse(parsed_ok: bool, repairs: int) -> None:
+    """Attach the parse outcome to the call being tracked on this thread."""
+    call = current_call()
+    if call is not None:
+        call.parse_ok = parsed_ok
+        call.repairs = repairs
+
+
+def note_usage(**usage: Optional[int]) -> None:
+    """Attach token usage (e.g. from the last chunk of a stream) to the current call."""
+    call = current_call()
+    if call is not None:
+        call.set_usage(**usage)
+
+
+def gemini_usage(response) -> Dict[str, Optional[int]]:
+    """Token counts from a Gemini response (complete or fully consumed stream)."""
+    try:
+        usage = response.usage_metadata
+    except Exception:
+        # Interrupted streams may not expose usage
+        return {}
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "completion_tokens": getattr(usage, "candidates_token_count", None),
+        "cached_tokens": getattr(usage, "cached_content_token_count", None),
+    }
+
+
+def openai_usage(usage) -> Dict[str, Optional[int]]:
+    """Token counts from an OpenAI ``CompletionUsage``."""
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "cached_tokens": getattr(details, "cached_tokens", None) if details is not None else None,
+    }
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None}
+    import numpy as np
+
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(np.mean(values))}
+
+
+def run_report(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Latency, token and cost summary of a set of ledger records."""
+    calls = len(records)
+    tokens_per_dialogue: Dict[Any, int] = {}
+    for r in records:
+        tokens = (r.get("prompt_tokens") or 0) + (r.get("completion_tokens") or 0)
+        tokens_per_dialogue[r.get("dialogue_id")] = tokens_per_dialogue.get(r.get("dialogue_id"), 0) + tokens
+    parse_failures = sum(1 for r in records if r.get("parse_ok") is False)
+    costs = [r["estimated_cost_usd"] for r in records if r.get("estimated_cost_usd") is not None]
+
+    return {
+        "calls": calls,
+        "errors": sum(1 for r in records if r.get("error")),
+        "retries": sum(r.get("retries", 0) for r in records),
+        "parse_failures_per_100_calls": 100.0 * parse_failures / calls if calls else 0.0,
+        "wall_seconds": _percentiles([r["wall_seconds"] for r in records]),
+        "latency_seconds": _percentiles([r["latency_seconds"] for r in records]),
+        "queue_wait_seconds": _percentiles([r["queue_wait_seconds"] for r in records]),
+        "tokens_per_dialogue": _percentiles(list(tokens_per_dialogue.values())),
+        "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in records),
+        "completion_tokens": sum(r.get("completion_tokens") or 0 for r in records),
+        "cached_tokens": sum(r.get("cached_tokens") or 0 for r in records),
+        "estimated_cost_usd": sum(costs),
+        "calls_without_cost": calls - len(costs),
+    }
+
+
+def print_run_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None, title: str = "LLM CALL TELEMETRY") -> None:
+    """Print a run report, with changes relative to a baseline run if given."""
+
+    def delta(section: str, key: str) -> str:
+        if baseline is None or baseline.get(section, {}).get(key) in (None, 0) or report[section][key] is None:
+            return ""
+        change = 100.0 * (report[section][key] - baseline[section][key]) / baseline[section][key]
+        return f" ({change:+.1f}%)"
+
+    print("=" * 80)
+    print(title)
+    print("=" * 80)
+    print(f"Calls: {report['calls']}  Errors: {report['errors']}  Retries: {report['retries']}  "
+          f"Parse failures: {report['parse_failures_per_100_calls']:.1f}/100 calls")
+    for section, unit in (("wall_seconds", "s"), ("latency_seconds", "s"), ("queue_wait_seconds", "s"), ("tokens_per_dialogue", "")):
+        stats = report[section]
+        if stats["p50"] is None:
+            continue
+        print(f"{section:<20} p50 {stats['p50']:.2f}{unit}{delta(section, 'p50')}  "
+              f"p95 {stats['p95']:.2f}{unit}{delta(section, 'p95')}  p99 {stats['p99']:.2f}{unit}{delta(section, 'p99')}")
+    print(f"Tokens: {report['prompt_tokens']} prompt ({report['cached_tokens']} cached), {report['completion_tokens']} completion")
+    cost_change = ""
+    if baseline is not None and baseline.get("estimated_cost_usd"):
+        cost_change = f" ({100.0 * (report['estimated_cost_usd'] - baseline['estimated_cost_usd']) / baseline['estimated_cost_usd']:+.1f}%)"
+    print(f"Estimated cost: ${report['estimated_cost_usd']:.4f}{cost_change}"
+          + (f" ({report['calls_without_cost']} calls without pricing)" if report['calls_without_cost'] else ""))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report latency, tokens and cost from the LLM call ledger")
+    parser.add_argument("--run", help="Run id to report (default: latest run)")
+    parser.add_argument("--compare", help="Baseline run id (default: the run before)")
+    parser.add_argument("--ledger", default=str(LEDGER_PATH), help="Ledger file")
+    args = parser.parse_args()
+
+    ledger = TelemetryLedger(Path(args.ledger))
+    records = ledger.read()
+    run_ids = list(dict.fromkeys(r.get("run_id") for r in records))
+    if not run_ids:
+        print(f"[ERROR] No telemetry records in {args.ledger}")
+        return
+
+    run_id = args.run or run_ids[-1]
+    if run_id not in run_ids:
+        print(f"[ERROR] Run not found: {run_id}")
+        return
+    baseline_id = args.compare
+    if baseline_id is None and run_ids.index(run_id) > 0:
+        baseline_id = run_ids[run_ids.index(run_id) - 1]
+
+    baseline = run_report([r for r in records if r.get("run_id") == baseline_id]) if baseline_id else None
+    print_run_report(run_report([r for r in records if r.get("run_id") == run_id]), baseline,
+                     title=f"LLM CALL TELEMETRY: run {run_id}" + (f" vs {baseline_id}" if baseline_id else ""))
+
+
+if __name__ == "__main__":
+    main()
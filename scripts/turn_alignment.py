@@ -0,0 +1,304 @@
+"""
+Align parsed turns back to character offsets in the extracted source text.
+
+Each turn of a dialogue is mapped to a [start, end) span of
+``data/extracted_text/S{id}_W{week}.txt`` with an anchored fuzzy matcher:
+
+1. the week's text is tokenised once into lowercase words with their
+   character offsets, and every word trigram is indexed by position,
+2. for each turn (tasks in order, turns in order) a few of its trigrams are
+   looked up as anchors at or after the end of the previous aligned turn,
+3. from each anchor the match is extended forwards and backwards word by
+   word, skipping up to ``LOOKAHEAD`` inserted or dropped words, and the
+   anchor covering most of the turn's words wins.
+
+Work is proportional to the length of the turns plus the text, never
+turns x text. The spans are stored in the processed dialogue JSON as
+
+    "source_alignment": {"text_file": ..., "text_sha256": ..., "coverage": 0.97,
+                         "aligned_turns": 30, "total_turns": 31,
+                         "spans": [[start, end], null, ...]}   # one entry per turn
+
+(kept outside ``turns`` so detector prompts and response-cache keys do not
+change). Usage:
+
+    python scripts/turn_alignment.py                     # align data/processed, report coverage
+    python scripts/turn_alignment.py --dry-run
+    python scripts/turn_alignment.py --show S12_W1_T1    # turns next to their source spans
+"""
+import hashlib
+import json
+import re
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from artifact_writer import batched_directory_sync, write_json
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+EXTRACTED_TEXT_DIR = PROJECT_ROOT / "data" / "extracted_text"
+
+NGRAM = 3
+# Trigram anchors tried per turn
+ANCHORS = 4
+# Inserted/dropped words skipped when resynchronising
+LOOKAHEAD = 3
+# Turns shorter than a trigram are searched for within this many words after the previous turn
+SHORT_TURN_WINDOW = 60
+# Share of the turn's words that must match for the turn to count as aligned
+MIN_SCORE = 0.6
+
+_TOKEN = re.compile(r"\w+")
+
+
+class SourceAligner:
+    """
+    Sequential aligner over one source text.
+
+    Turns are aligned in source order: within a task each search starts
+    after the previous aligned turn, and each task starts where the previous
+    task started (split tasks may repeat earlier text), so call
+    ``align_turns`` for the tasks of a week in order.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.words: List[str] = []
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        for match in _TOKEN.finditer(text):
+            self.words.append(match.group().lower())
+            self.starts.append(match.start())
+            self.ends.append(match.end())
+        self.grams: Dict[Tuple[str, ...], List[int]] = {}
+        for i in range(len(self.words) - NGRAM + 1):
+            self.grams.setdefault(tuple(self.words[i:i + NGRAM]), []).append(i)
+        self.cursor = 0
+        self.task_start = 0
+
+    def _extend(self, words: List[str], t: int, s: int) -> Tuple[int, int, int]:
+        """Match words[t:] forwards from source word s and words[:t] backwards; (matched, first, last)."""
+        n = len(self.words)
+        matched, first, last = 0, s, s
+
+        ti, si = t, s
+        while ti < len(words) and si < n:
+            if words[ti] == self.words[si]:
+                matched += 1
+                last = si
+                ti += 1
+                si += 1
+                continue
+            skip = next((d for d in range(1, LOOKAHEAD + 1) if si + d < n and self.words[si + d] == words[ti]), 0)
+            if skip:
+                si += skip
+                continue
+            skip = next((d for d in range(1, LOOKAHEAD + 1) if ti + d < len(words) and words[ti + d] == self.words[si]), 0)
+            ti, si = (ti + skip, si) if skip else (ti + 1, si + 1)
+
+        ti, si = t - 1, s - 1
+        while ti >= 0 and si >= self.cursor:
+            if words[ti] == self.words[si]:
+                matched += 1
+                first = si
+                ti -= 1
+                si -= 1
+                continue
+            skip = next((d for d in range(1, LOOKAHEAD + 1) if si - d >= self.cursor and self.words[si - d] == words[ti]), 0)
+            if skip:
+                si -= skip
+                continue
+            skip = next((d for d in range(1, LOOKAHEAD + 1) if ti - d >= 0 and words[ti - d] == self.words[si]), 0)
+            ti, si = (ti - skip, si) if skip else (ti - 1, si - 1)
+
+        return matched, first, last
+
+    def _anchors(self, words: List[str]) -> List[Tuple[int, int]]:
+        """(turn word index, source word index) pairs to extend from."""
+        anchors = []
+        if len(words) >= NGRAM:
+            step = max(1, (len(words) - NGRAM + 1) // ANCHORS)
+            for k in range(0, len(words) - NGRAM + 1, step):
+                positions = self.grams.get(tuple(words[k:k + NGRAM]))
+                if positions:
+                    i = bisect_left(positions, self.cursor)
+                    if i < len(positions):
+                        anchors.append((k, positions[i]))
+                if len(anchors) == ANCHORS:
+                    break
+        else:
+            stop = min(len(self.words), self.cursor + SHORT_TURN_WINDOW)
+            for s in range(self.cursor, stop):
+                if self.words[s] == words[0]:
+                    anchors.append((0, s))
+                    break
+        return anchors
+
+    def align_turn(self, text: str) -> Optional[Tuple[int, int, float]]:
+        """(start, end, score) of one turn in the source text, or None if it cannot be placed."""
+        words = [w.lower() for w in _TOKEN.findall(text or "")]
+        if not words:
+            return None
+        best = None
+        for k, s in self._anchors(words):
+            matched, first, last = self._extend(words, k, s)
+            candidate = (matched / len(words), -first, first, last)
+            if best is None or candidate > best:
+                best = candidate
+        if best is None or best[0] < MIN_SCORE:
+            return None
+        score, _, first, last = best
+        self.cursor = last + 1
+        return self.starts[first], self.ends[last], round(score, 3)
+
+    def align_turns(self, turns: List[Dict[str, Any]]) -> List[Optional[Tuple[int, int, float]]]:
+        """Align the turns of one task; spans are (start, end, score) or None."""
+        self.cursor = self.task_start
+        spans = [self.align_turn(turn.get('text', '')) for turn in turns]
+        first = next((span for span in spans if span is not None), None)
+        if first is not None:
+            self.task_start = bisect_left(self.starts, first[0])
+        return spans
+
+
+def text_fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def alignment_metadata(spans: List[Optional[Tuple[int, int, float]]], text: str, text_file: str) -> Dict[str, Any]:
+    """The ``source_alignment`` block stored in a processed dialogue."""
+    aligned = sum(1 for span in spans if span is not None)
+    return {
+        "text_file": text_file,
+        "text_sha256": text_fingerprint(text),
+        "aligned_turns": aligned,
+        "total_turns": len(spans),
+        "coverage": round(aligned / len(spans), 4) if spans else 0.0,
+        "spans": [[span[0], span[1]] if span is not None else None for span in spans],
+    }
+
+
+def turn_source_text(dialogue_data: Dict[str, Any], position: int, source_text: str) -> Optional[str]:
+    """Source text of the turn at a 0-based position, via its stored span (None if unaligned)."""
+    spans = (dialogue_data.get("source_alignment") or {}).get("spans") or []
+    if position >= len(spans) or spans[position] is None:
+        return None
+    start, end = spans[position]
+    return source_text[start:end]
+
+
+def _week_key(dialogue_file: Path) -> Optional[Tuple[str, int]]:
+    match = re.match(r'(S\d+_W\d+)_T(\d+)$', dialogue_file.stem)
+    return (match.group(1), int(match.group(2))) if match else None
+
+
+@batched_directory_sync()
+def align_corpus(processed_dir: Path = PROCESSED_DIR, extracted_text_dir: Path = EXTRACTED_TEXT_DIR,
+                 dry_run: bool = False, verbose: bool = True) -> Dict[str, Any]:
+    """
+    Align every processed dialogue to its week's extracted text and store the spans.
+
+    Args:
+        processed_dir: Directory with S*_W*_T*.json dialogues
+        extracted_text_dir: Directory with S{id}_W{week}.txt files
+        dry_run: Compute and report coverage without rewriting dialogues
+        verbose: Print per-week coverage
+
+    Returns:
+        Summary with dialogue/turn counts, corpus coverage, updated files and
+        dialogues whose week has no extracted text
+    """
+    weeks: Dict[str, List[Tuple[int, Path]]] = {}
+    for dialogue_file in processed_dir.glob("S*_W*_T*.json"):
+        key = _week_key(dialogue_file)
+        if key:
+            weeks.setdefault(key[0], []).append((key[1], dialogue_file))
+
+    summary = {"dialogues": 0, "turns": 0, "aligned_turns": 0, "updated": 0, "missing_text": []}
+    for week in sorted(weeks):
+        text_file = extracted_text_dir / f"{week}.txt"
+        tasks = [path for _, path in sorted(weeks[week])]
+        if not text_file.exists():
+            summary["missing_text"].extend(path.stem for path in tasks)
+            continue
+        text = text_file.read_text(encoding='utf-8')
+        aligner = SourceAligner(text)
+        try:
+            stored_name = text_file.resolve().relative_to(PROJECT_ROOT).as_posix()
+        except ValueError:
+            stored_name = str(text_file)
+
+        week_turns = week_aligned = 0
+        for dialogue_file in tasks:
+            with open(dialogue_file, 'r', encoding='utf-8') as f:
+                dialogue_data = json.load(f)
+            turns = dialogue_data.get('turns', [])
+            alignment = alignment_metadata(aligner.align_turns(turns), text, stored_name)
+            summary["dialogues"] += 1
+            week_turns += alignment["total_turns"]
+            week_aligned += alignment["aligned_turns"]
+            if dialogue_data.get("source_alignment") != alignment:
+                summary["updated"] += 1
+                if not dry_run:
+                    dialogue_data["source_alignment"] = alignment
+                    write_json(dialogue_file, dialogue_data)
+        summary["turns"] += week_turns
+        summary["aligned_turns"] += week_aligned
+        if verbose:
+            coverage = week_aligned / week_turns if week_turns else 0.0
+            print(f"  {week}: {week_aligned}/{week_turns} turns aligned ({coverage:.1%})")
+
+    summary["coverage"] = summary["aligned_turns"] / summary["turns"] if summary["turns"] else 0.0
+    return summary
+
+
+def show_dialogue(dialogue_file: Path, extracted_text_dir: Path = EXTRACTED_TEXT_DIR) -> None:
+    """Print each turn of an aligned dialogue next to its source span."""
+    with open(dialogue_file, 'r', encoding='utf-8') as f:
+        dialogue_data = json.load(f)
+    alignment = dialogue_data.get("source_alignment")
+    if not alignment:
+        print(f"[ERROR] {dialogue_file.stem} has no source_alignment (run without --show first)")
+        return
+    text_file = PROJECT_ROOT / alignment["text_file"]
+    if not text_file.exists():
+        text_file = extracted_text_dir / Path(alignment["text_file"]).name
+    source_text = text_file.read_text(encoding='utf-8')
+    if text_fingerprint(source_text) != alignment["text_sha256"]:
+        print(f"[WARNING] {text_file.name} changed since alignment; spans may be off")
+    for position, turn in enumerate(dialogue_data.get('turns', [])):
+        source = turn_source_text(dialogue_data, position, source_text)
+        span = alignment["spans"][position] if position < len(alignment["spans"]) else None
+        print(f"[{turn.get('turn')}] {turn.get('speaker')}: {turn.get('text', '')}")
+        print(f"    source {span}: {source!r}" if source is not None else "    source: (not aligned)")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Align processed turns to offsets in the extracted source text")
+    parser.add_argument("--processed-dir", default=str(PROCESSED_DIR), help="Processed dialogue JSON directory")
+    parser.add_argument("--extracted-text-dir", default=str(EXTRACTED_TEXT_DIR), help="Extracted text directory")
+    parser.add_argument("--dry-run", action="store_true", help="Report coverage without rewriting dialogues")
+    parser.add_argument("--show", metavar="DIALOGUE_ID", help="Print one aligned dialogue next to its source spans")
+    parser.add_argument("--quiet", action="store_true", help="Only print the corpus summary")
+    args = parser.parse_args()
+
+    processed_dir, extracted_text_dir = Path(args.processed_dir), Path(args.extracted_text_dir)
+    if args.show:
+        show_dialogue(processed_dir / f"{args.show}.json", extracted_text_dir)
+        return
+
+    summary = align_corpus(processed_dir, extracted_text_dir, dry_run=args.dry_run, verbose=not args.quiet)
+    print(f"\n[OK] {summary['aligned_turns']}/{summary['turns']} turns in {summary['dialogues']} dialogues "
+          f"aligned to source text ({summary['coverage']:.1%} coverage)")
+    action = "would update" if args.dry_run else "updated"
+    print(f"[INFO] {summary['updated']} dialogue file(s) {action}")
+    if summary["missing_text"]:
+        print(f"[WARNING] No extracted text for {len(summary['missing_text'])} dialogue(s): "
+              f"{', '.join(summary['missing_text'][:10])}")
+
+
+if __name__ == "__main__":
+    main()
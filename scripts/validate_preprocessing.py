@@ -5,9 +5,13 @@ This script performs multiple validation checks:
 1. Metadata consistency (filename matches JSON content)
 2. Turn structure validation (numbering, speaker labels)
 3. Content quality checks (encoding, artifacts)
-4. Cross-reference with extracted text
+4. Cross-reference with the source document (every turn, one extraction per source)
+   and coverage of the stored turn-to-source-text alignment
 5. Statistical validation (turn counts, speaker distribution)
 6. Missing or duplicate detection
+
+The checks are registered as "preprocessing" rules of the validation engine,
+which runs them in its single pass over the corpus (see validation_engine.py).
 """
 import json
 import re
@@ -20,7 +24,14 @@ import sys
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_ROOT / 'scripts'))
 
-from document_extractor import extract_text
+from artifact_writer import write_json
+from source_index import SourceCheck, check_sources
+from validation_engine import DialogueRecord, REPAIRS_DIR, rule, run_rules, run_validation
+
+# Warn when fewer than this share of a dialogue's checkable turns occur in the source
+SOURCE_COVERAGE_WARNING = 0.8
+# Warn when fewer than this share of a dialogue's turns are aligned to the extracted text
+ALIGNMENT_COVERAGE_WARNING = 0.8
 
 
 class ValidationResult:
@@ -30,6 +41,8 @@ class ValidationResult:
         self.issues: List[Dict[str, Any]] = []
         self.warnings: List[Dict[str, Any]] = []
         self.stats: Dict[str, Any] = {}
+        # (source_file, turns) awaiting the grouped source cross-reference
+        self.source_check: Optional[SourceCheck] = None
     
     def add_issue(self, severity: str, category: str, message: str, details: Optional[Dict] = None):
         """Add a validation issue."""
@@ -232,17 +245,20 @@ def validate_content_quality(turns: List[Dict]) -> List[Dict[str, Any]]:
     return issues
 
 
-def validate_speaker_alternation(turns: List[Dict]) -> List[Dict[str, Any]]:
-    """Check if speaker alternation makes sense."""
+def validate_speaker_alternation(turns: List[Dict], speakers: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+    """Check if speaker alternation makes sense (speakers: prebuilt speaker array, one per turn)."""
     issues = []
     
     if len(turns) < 2:
         return issues
     
+    if speakers is None:
+        speakers = [turn.get("speaker") for turn in turns]
+    
     # Count consecutive same-speaker turns
     consecutive_same = []
     for i in range(len(turns) - 1):
-        if turns[i].get("speaker") == turns[i + 1].get("speaker"):
+        if speakers[i] == speakers[i + 1]:
             consecutive_same.append((i + 1, i + 2))
     
     if consecutive_same:
@@ -258,120 +274,188 @@ def validate_speaker_alternation(turns: List[Dict]) -> List[Dict[str, Any]]:
     return issues
 
 
-def cross_reference_with_source(json_data: Dict, file_path: Path) -> List[Dict[str, Any]]:
-    """Cross-reference JSON content with source extracted text."""
+def validate_source_alignment(json_data: Dict, turns: List[Dict]) -> List[Dict[str, Any]]:
+    """Check the stored turn-to-source-text alignment (see turn_alignment.py)."""
     issues = []
+    alignment = json_data.get("source_alignment")
     
+    if not alignment:
+        issues.append({
+            "severity": "warning",
+            "category": "source_alignment",
+            "message": "No source alignment (run scripts/turn_alignment.py)",
+            "details": {}
+        })
+    elif len(alignment.get("spans", [])) != len(turns):
+        issues.append({
+            "severity": "warning",
+            "category": "source_alignment",
+            "message": f"Source alignment is stale: {len(alignment.get('spans', []))} spans for {len(turns)} turns",
+            "details": {"spans": len(alignment.get("spans", [])), "turns": len(turns)}
+        })
+    elif turns and alignment.get("coverage", 0.0) < ALIGNMENT_COVERAGE_WARNING:
+        # Empty dialogues are reported by the turn checks; there is nothing to align
+        unaligned = [turn.get("turn") for turn, span in zip(turns, alignment["spans"]) if span is None]
+        issues.append({
+            "severity": "warning",
+            "category": "source_alignment",
+            "message": f"Only {alignment.get('aligned_turns')} of {len(turns)} turns aligned to the extracted text",
+            "details": {"coverage": alignment.get("coverage"), "unaligned_turns": unaligned[:20]}
+        })
+    
+    return issues
+
+
+def source_check_for(json_data: Dict) -> Optional[SourceCheck]:
+    """What to cross-reference for a dialogue: its source_file and (turn, text) pairs."""
     source_file = json_data.get("source_file")
     if not source_file:
-        return issues
+        return None
+    return source_file, [(turn.get("turn"), turn.get("text", "")) for turn in json_data.get("turns", [])]
+
+
+def source_reference_issues(source_file: str, outcome: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Issues for one task file from its source lookup (see source_index.check_source)."""
+    issues = []
     
-    source_path = PROJECT_ROOT / source_file
-    if not source_path.exists():
+    if outcome.get("error") == "not_found":
         issues.append({
             "severity": "warning",
             "category": "source_reference",
             "message": f"Source file not found: {source_file}",
             "details": {"source_file": source_file}
         })
-        return issues
-    
-    try:
-        extracted_text = extract_text(str(source_path))
-        
-        # Check if dialogue turns appear in source text
-        turns = json_data.get("turns", [])
-        if not turns:
-            return issues
-        
-        # Sample check: verify first few turns appear in source
-        found_count = 0
-        sample_size = min(5, len(turns))
-        
-        for turn in turns[:sample_size]:
-            turn_text = turn.get("text", "").strip()
-            # Remove quotes and normalize whitespace for comparison
-            normalized_turn = re.sub(r'["""]', '', turn_text)
-            normalized_turn = re.sub(r'\s+', ' ', normalized_turn).strip()
-            
-            # Check if substantial portion appears in source
-            if len(normalized_turn) > 10:
-                # Look for key phrases (first 20 chars)
-                key_phrase = normalized_turn[:20].lower()
-                if key_phrase in extracted_text.lower():
-                    found_count += 1
-        
-        if found_count == 0 and sample_size > 0:
-            issues.append({
-                "severity": "warning",
-                "category": "source_reference",
-                "message": "Dialogue turns not found in source text (possible parsing issue)",
-                "details": {"checked_turns": sample_size, "found": found_count}
-            })
-    
-    except Exception as e:
+    elif "error" in outcome:
+        issues.append({
+            "severity": "warning",
+            "category": "source_reference",
+            "message": f"Could not cross-reference with source: {outcome['error']}",
+            "details": {"error": outcome["error"]}
+        })
+    elif outcome["checked"] > 0 and outcome["found"] == 0:
+        issues.append({
+            "severity": "warning",
+            "category": "source_reference",
+            "message": "Dialogue turns not found in source text (possible parsing issue)",
+            "details": {"checked_turns": outcome["checked"], "found": 0}
+        })
+    elif outcome["found"] < SOURCE_COVERAGE_WARNING * outcome["checked"]:
         issues.append({
             "severity": "warning",
             "category": "source_reference",
-            "message": f"Could not cross-reference with source: {e}",
-            "details": {"error": str(e)}
+            "message": f"Only {outcome['found']} of {outcome['checked']} turns found in source text",
+            "details": {"checked_turns": outcome["checked"], "found": outcome["found"],
+                        "missing_turns": outcome["missing"][:20]}
         })
     
     return issues
 
 
-def validate_json_file(file_path: Path) -> ValidationResult:
-    """Validate a single JSON file."""
-    result = ValidationResult(file_path)
+def cross_reference_with_source(json_data: Dict, file_path: Path) -> List[Dict[str, Any]]:
+    """Cross-reference every turn of one dialogue with its source document."""
+    check = source_check_for(json_data)
+    if check is None:
+        return []
+    return source_reference_issues(check[0], check_sources([check], workers=1)[0])
+
+
+def finish_results(results: List[ValidationResult], workers: Optional[int] = None) -> None:
+    """
+    Run the source cross-reference for all results at once.
+    
+    Task files are grouped by source document, so each document is extracted
+    (or loaded from cache) and indexed once; sources run in parallel.
+    
+    Args:
+        results: Per-file results whose source_check is pending
+        workers: Worker processes (default: CPU count)
+    """
+    pending = [r for r in results if r.source_check is not None]
+    if not pending:
+        return
+    outcomes = check_sources([r.source_check for r in pending], workers=workers)
+    for result, outcome in zip(pending, outcomes):
+        result.issues.extend(source_reference_issues(result.source_check[0], outcome))
+        if "error" not in outcome:
+            result.stats["source_turns_checked"] = outcome["checked"]
+            result.stats["source_turns_found"] = outcome["found"]
+        result.source_check = None
+
+
+@rule("preprocessing")
+def filename_metadata_rule(record: DialogueRecord) -> List[Dict[str, Any]]:
+    return validate_filename_metadata(record.data, record.path)
+
+
+@rule("preprocessing")
+def turn_structure_rule(record: DialogueRecord) -> List[Dict[str, Any]]:
+    return validate_turn_structure(record.index.turns)
+
+
+@rule("preprocessing")
+def content_quality_rule(record: DialogueRecord) -> List[Dict[str, Any]]:
+    return validate_content_quality(record.index.turns)
+
+
+@rule("preprocessing")
+def speaker_alternation_rule(record: DialogueRecord) -> List[Dict[str, Any]]:
+    return validate_speaker_alternation(record.index.turns, record.index.speakers)
+
+
+@rule("preprocessing")
+def source_alignment_rule(record: DialogueRecord) -> List[Dict[str, Any]]:
+    return validate_source_alignment(record.data, record.index.turns)
+
+
+def _validation_result(record: DialogueRecord) -> ValidationResult:
+    result = ValidationResult(record.path)
     
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
-    except json.JSONDecodeError as e:
-        result.add_issue("error", "json_syntax", f"Invalid JSON: {e}", {"error": str(e)})
+    if isinstance(record.error, json.JSONDecodeError):
+        result.add_issue("error", "json_syntax", f"Invalid JSON: {record.error}", {"error": str(record.error)})
         return result
-    except Exception as e:
-        result.add_issue("error", "file_read", f"Could not read file: {e}", {"error": str(e)})
+    if record.error is not None:
+        result.add_issue("error", "file_read", f"Could not read file: {record.error}", {"error": str(record.error)})
         return result
     
     # Collect statistics
-    turns = json_data.get("turns", [])
+    json_data = record.data
     result.stats = {
-        "total_turns": len(turns),
+        "total_turns": len(record.index.turns),
         "student_id": json_data.get("student_id"),
         "week": json_data.get("week"),
         "task": json_data.get("task"),
         "dialogue_id": json_data.get("dialogue_id"),
-        "speaker_distribution": dict(Counter(turn.get("speaker") for turn in turns))
+        "speaker_distribution": dict(Counter(record.index.speakers))
     }
+    if json_data.get("source_alignment"):
+        result.stats["alignment_coverage"] = json_data["source_alignment"].get("coverage")
     
     # Run all validations
-    result.issues.extend(validate_filename_metadata(json_data, file_path))
-    result.issues.extend(validate_turn_structure(turns))
-    result.issues.extend(validate_content_quality(turns))
-    result.issues.extend(validate_speaker_alternation(turns))
-    result.issues.extend(cross_reference_with_source(json_data, file_path))
+    for item in run_rules("preprocessing", record):
+        result.issues.append({key: item[key] for key in ("severity", "category", "message", "details")})
+    
+    # Checked later for all files together (see finish_results)
+    result.source_check = source_check_for(json_data)
     
     return result
 
 
-def validate_all_files(processed_dir: Path) -> Dict[str, Any]:
-    """Validate all JSON files in processed directory."""
-    json_files = sorted(processed_dir.glob("S*_W*_T*.json"))
-    
-    if not json_files:
-        return {
-            "total_files": 0,
-            "valid_files": 0,
-            "invalid_files": 0,
-            "results": []
-        }
-    
-    results = []
-    for file_path in json_files:
-        result = validate_json_file(file_path)
-        results.append(result)
-    
+def file_result(record: DialogueRecord) -> Optional[ValidationResult]:
+    """Per-file result of the "preprocessing" report; legacy W*_T* files are not covered."""
+    if not record.path.match("S*_W*_T*.json"):
+        return None
+    return _validation_result(record)
+
+
+def validate_json_file(file_path: Path) -> ValidationResult:
+    """Validate a single JSON file."""
+    result = _validation_result(DialogueRecord(file_path))
+    finish_results([result], workers=1)
+    return result
+
+
+def summarise_results(results: List[ValidationResult]) -> Dict[str, Any]:
+    """Aggregate per-file validation results into the summary used by the report."""
     valid_count = sum(1 for r in results if r.is_valid())
     invalid_count = len(results) - valid_count
     
@@ -380,6 +464,11 @@ def validate_all_files(processed_dir: Path) -> Dict[str, Any]:
     error_count = sum(len([i for i in r.issues if i["severity"] == "error"]) for r in results)
     warning_count = sum(len([i for i in r.issues if i["severity"] == "warning"]) for r in results)
     
+    # Turn-weighted share of turns aligned to the extracted text, over aligned files
+    aligned_files = [r for r in results if r.stats.get("alignment_coverage") is not None]
+    aligned_turns = sum(r.stats["alignment_coverage"] * r.stats["total_turns"] for r in aligned_files)
+    alignment_turns = sum(r.stats["total_turns"] for r in aligned_files)
+    
     return {
         "total_files": len(results),
         "valid_files": valid_count,
@@ -387,10 +476,18 @@ def validate_all_files(processed_dir: Path) -> Dict[str, Any]:
         "total_turns": total_turns,
         "total_errors": error_count,
         "total_warnings": warning_count,
+        "aligned_files": len(aligned_files),
+        "alignment_coverage": round(aligned_turns / alignment_turns, 4) if alignment_turns else None,
         "results": results
     }
 
 
+def validate_all_files(processed_dir: Path) -> Dict[str, Any]:
+    """Validate all JSON files in processed directory."""
+    run = run_validation(processed_dir, reports=["preprocessing"], verbose=False)
+    return summarise_results(run["results"]["preprocessing"])
+
+
 def print_validation_report(summary: Dict[str, Any], verbose: bool = True):
     """Print a formatted validation report."""
     print("=" * 70)
@@ -402,6 +499,9 @@ def print_validation_report(summary: Dict[str, Any], verbose: bool = True):
     print(f"Total turns: {summary['total_turns']}")
     print(f"Total errors: {summary['total_errors']}")
     print(f"Total warnings: {summary['total_warnings']}")
+    if summary['alignment_coverage'] is not None:
+        print(f"Source alignment coverage: {summary['alignment_coverage']:.1%} "
+              f"of turns ({summary['aligned_files']} aligned files)")
     
     if not verbose:
         return
@@ -436,19 +536,25 @@ def print_validation_report(summary: Dict[str, Any], verbose: bool = True):
                     print(f"  [WARN] {warning['category']}: {warning['message']}")
 
 
-def main():
-    """Main validation function."""
-    processed_dir = PROJECT_ROOT / "data" / "processed"
-    
-    if not processed_dir.exists():
-        print(f"[ERROR] Processed directory not found: {processed_dir}")
-        return
-    
-    summary = validate_all_files(processed_dir)
+def write_report(results: List[ValidationResult], total_dialogues: int,
+                 processed_dir: Path, repairs_dir: Path = REPAIRS_DIR) -> Dict[str, Any]:
+    """
+    Print the preprocessing report and save validation_report.json next to processed_dir.
+    
+    Args:
+        results: Per-file results from file_result
+        total_dialogues: Number of dialogue files scanned (unused; results cover S*_W*_T* files)
+        processed_dir: Directory with processed dialogue JSON files
+        repairs_dir: Unused; accepted so every report has the same writer signature
+    
+    Returns:
+        The saved report (summary and per-file stats and issues)
+    """
+    summary = summarise_results(results)
     print_validation_report(summary, verbose=True)
     
     # Save detailed report to file
-    report_file = PROJECT_ROOT / "data" / "validation_report.json"
+    report_file = processed_dir.parent / "validation_report.json"
     report_data = {
         "summary": {
             "total_files": summary["total_files"],
@@ -456,11 +562,13 @@ def main():
             "invalid_files": summary["invalid_files"],
             "total_turns": summary["total_turns"],
             "total_errors": summary["total_errors"],
-            "total_warnings": summary["total_warnings"]
+            "total_warnings": summary["total_warnings"],
+            "aligned_files": summary["aligned_files"],
+            "alignment_coverage": summary["alignment_coverage"]
         },
         "files": [
             {
-                "file": str(r.file_path.relative_to(PROJECT_ROOT)),
+                "file": _relative_path(r.file_path),
                 "valid": r.is_valid(),
                 "stats": r.stats,
                 "issues": r.issues
@@ -469,17 +577,36 @@ def main():
         ]
     }
     
-    with open(report_file, 'w', encoding='utf-8') as f:
-        json.dump(report_data, f, indent=2, ensure_ascii=False)
+    write_json(report_file, report_data)
     
     print(f"\n[INFO] Detailed report saved to: {report_file}")
     
+    return report_data
+
+
+def _relative_path(path: Path) -> str:
+    try:
+        return str(path.resolve().relative_to(PROJECT_ROOT.resolve()))
+    except ValueError:
+        return str(path)
+
+
+def main():
+    """Main validation function."""
+    processed_dir = PROJECT_ROOT / "data" / "processed"
+    
+    if not processed_dir.exists():
+        print(f"[ERROR] Processed directory not found: {processed_dir}")
+        return
+    
+    run = run_validation(processed_dir, reports=["preprocessing"], verbose=False)
+    report = write_report(run["results"]["preprocessing"], run["total_dialogues"], processed_dir)
+    
     # Return exit code based on validation results
-    if summary["invalid_files"] > 0:
+    if report["summary"]["invalid_files"] > 0:
         sys.exit(1)
     sys.exit(0)
 
 
 if __name__ == "__main__":
     main()
-
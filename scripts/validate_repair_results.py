@@ -1,123 +1,91 @@
 """
 Comprehensive validation of repair detection results.
 Cross-checks repairs against dialogues, validates structure, and identifies issues.
+
+The checks are registered as "repairs" rules of the validation engine, which
+runs them in its single pass over the corpus (see validation_engine.py).
 """
-import json
 from pathlib import Path
-from typing import Dict, List, Any, Set
+from typing import Dict, List, Any, Optional, Set
 from collections import defaultdict
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from artifact_writer import write_json
+from repair_intervals import overlapping_pairs, repair_turns
+from repair_schema import repair_schema_issues
+from validation_engine import DialogueIndex, DialogueRecord, finding, load_record, rule, run_rules, run_validation
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
 
 
-def load_dialogue(file_path: Path) -> Dict[str, Any]:
-    """Load a dialogue JSON file."""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-
-def load_repairs(repair_file: Path) -> List[Dict[str, Any]]:
-    """Load repair annotations."""
-    if not repair_file.exists():
-        return []
-    try:
-        with open(repair_file, 'r', encoding='utf-8') as f:
-            repairs = json.load(f)
-            return repairs if isinstance(repairs, list) else []
-    except Exception as e:
-        print(f"Error loading {repair_file}: {e}")
-        return []
-
-
-def find_repair_file(dialogue_file: Path) -> Path:
-    """Find corresponding repair file for a dialogue."""
-    dialogue_name = dialogue_file.stem
-    
-    # Check all batch directories
-    for batch_dir in REPAIRS_DIR.iterdir():
-        if batch_dir.is_dir():
-            repair_file = batch_dir / f"{dialogue_name}_repairs.json"
-            if repair_file.exists():
-                return repair_file
-    
-    return None
-
-
-def validate_repair_structure(repair: Dict[str, Any], repair_id: int, dialogue_id: str) -> List[str]:
-    """Validate structure of a single repair annotation."""
-    issues = []
-    
-    required_fields = ['repair_id', 'turn_indices', 'initiation', 'resolution', 'trigger', 'evidence_summary']
-    for field in required_fields:
-        if field not in repair:
-            issues.append(f"Missing required field: {field}")
+def repair_structure_findings(repair: Dict[str, Any], repair_id: int, dialogue_id: str) -> List[Dict[str, Any]]:
+    """Structure findings for a single repair annotation (categories schema, repair_id, dialogue_id)."""
+    findings = [finding("error", issue, "schema") for issue in repair_schema_issues(repair)]
+    if not isinstance(repair, dict):
+        return findings
     
     # Validate repair_id
     if 'repair_id' in repair and repair['repair_id'] != repair_id:
-        issues.append(f"Repair ID mismatch: expected {repair_id}, got {repair['repair_id']}")
+        findings.append(finding("error", f"Repair ID mismatch: expected {repair_id}, got {repair['repair_id']}",
+                                "repair_id", {"expected": repair_id, "actual": repair['repair_id']}))
     
     # Validate dialogue_id
     if 'dialogue_id' in repair and repair['dialogue_id'] != dialogue_id:
-        issues.append(f"Dialogue ID mismatch: expected {dialogue_id}, got {repair.get('dialogue_id')}")
-    
-    # Validate initiation
-    if 'initiation' in repair and repair['initiation'] not in ['LI', 'BI']:
-        issues.append(f"Invalid initiation: {repair['initiation']} (must be LI or BI)")
-    
-    # Validate resolution
-    if 'resolution' in repair and repair['resolution'] not in ['R', 'U-A', 'U-P']:
-        issues.append(f"Invalid resolution: {repair['resolution']} (must be R, U-A, or U-P)")
-    
-    # Validate turn_indices
-    if 'turn_indices' in repair:
-        if not isinstance(repair['turn_indices'], list):
-            issues.append(f"turn_indices must be a list, got {type(repair['turn_indices'])}")
-        elif not repair['turn_indices']:
-            issues.append("turn_indices is empty")
-        elif not all(isinstance(t, int) for t in repair['turn_indices']):
-            issues.append("turn_indices contains non-integer values")
+        findings.append(finding("error", f"Dialogue ID mismatch: expected {dialogue_id}, got {repair.get('dialogue_id')}",
+                                "dialogue_id", {"expected": dialogue_id, "actual": repair.get('dialogue_id')}))
     
-    # Validate trigger
-    if 'trigger' in repair and not isinstance(repair['trigger'], str):
-        issues.append(f"trigger must be a string, got {type(repair['trigger'])}")
-    
-    # Validate evidence_summary
-    if 'evidence_summary' in repair and not isinstance(repair['evidence_summary'], str):
-        issues.append(f"evidence_summary must be a string, got {type(repair['evidence_summary'])}")
-    
-    return issues
+    return findings
 
 
-def validate_repair_against_dialogue(repair: Dict[str, Any], dialogue_data: Dict[str, Any]) -> List[str]:
-    """Validate repair annotations against the actual dialogue."""
-    issues = []
+def validate_repair_structure(repair: Dict[str, Any], repair_id: int, dialogue_id: str) -> List[str]:
+    """Validate structure of a single repair annotation."""
+    return [f['message'] for f in repair_structure_findings(repair, repair_id, dialogue_id)]
+
+
+def repair_turn_findings(repair: Dict[str, Any], dialogue_data: Dict[str, Any],
+                         index: Optional[DialogueIndex] = None) -> List[Dict[str, Any]]:
+    """
+    Findings for a repair's turn indices against the actual dialogue.
     
-    turns = dialogue_data.get('turns', [])
-    max_turn = max([t.get('turn', 0) for t in turns], default=0)
+    Args:
+        repair: Repair annotation
+        dialogue_data: Dialogue the repair belongs to
+        index: Prebuilt index of the dialogue's turns (built here if omitted)
+    
+    Returns:
+        Error findings with category turn_index (details: turn, max_turn),
+        duplicate_turns, turn_order or repair_span
+    """
+    findings = []
+    
+    index = index or DialogueIndex.from_dialogue(dialogue_data)
+    max_turn = index.max_turn
     
     turn_indices = repair.get('turn_indices', [])
     
     # Check if turn indices are valid
     for turn_idx in turn_indices:
+        details = {"turn": turn_idx, "max_turn": max_turn}
         if turn_idx < 1:
-            issues.append(f"Invalid turn index: {turn_idx} (must be >= 1)")
+            findings.append(finding("error", f"Invalid turn index: {turn_idx} (must be >= 1)", "turn_index", details))
         elif turn_idx > max_turn:
-            issues.append(f"Turn index {turn_idx} exceeds maximum turn {max_turn}")
+            findings.append(finding("error", f"Turn index {turn_idx} exceeds maximum turn {max_turn}", "turn_index", details))
         
         # Check if turn exists
-        turn_exists = any(t.get('turn') == turn_idx for t in turns)
-        if not turn_exists:
-            issues.append(f"Turn {turn_idx} does not exist in dialogue")
+        if not index.has_turn(turn_idx):
+            findings.append(finding("error", f"Turn {turn_idx} does not exist in dialogue", "turn_index", details))
     
     # Check for duplicate turn indices
     if len(turn_indices) != len(set(turn_indices)):
-        issues.append(f"Duplicate turn indices found: {turn_indices}")
+        findings.append(finding("error", f"Duplicate turn indices found: {turn_indices}", "duplicate_turns"))
     
     # Check if turns are in order
     if turn_indices != sorted(turn_indices):
-        issues.append(f"Turn indices not in order: {turn_indices}")
+        findings.append(finding("error", f"Turn indices not in order: {turn_indices}", "turn_order"))
     
     # Validate repair boundaries make sense
     if len(turn_indices) > 0:
@@ -126,57 +94,86 @@ def validate_repair_against_dialogue(repair: Dict[str, Any], dialogue_data: Dict
         
         # Check if repair spans are reasonable
         if max_turn_idx - min_turn > 20:
-            issues.append(f"Repair spans {max_turn_idx - min_turn + 1} turns (very large, may be error)")
+            findings.append(finding("error", f"Repair spans {max_turn_idx - min_turn + 1} turns (very large, may be error)",
+                                    "repair_span"))
     
-    return issues
+    return findings
+
+
+def validate_repair_against_dialogue(repair: Dict[str, Any], dialogue_data: Dict[str, Any],
+                                     index: Optional[DialogueIndex] = None) -> List[str]:
+    """Validate repair annotations against the actual dialogue; issue messages of repair_turn_findings."""
+    return [f['message'] for f in repair_turn_findings(repair, dialogue_data, index)]
 
 
 def check_repair_overlap(repairs: List[Dict[str, Any]]) -> List[str]:
-    """Check for overlapping repairs."""
+    """Check for overlapping repairs (interval sweep; only span-overlapping pairs are compared)."""
     issues = []
     
-    for i, repair1 in enumerate(repairs):
-        indices1 = set(repair1.get('turn_indices', []))
-        for j, repair2 in enumerate(repairs[i+1:], start=i+1):
-            indices2 = set(repair2.get('turn_indices', []))
-            
-            overlap = indices1 & indices2
-            if overlap:
-                issues.append(f"Repair {repair1.get('repair_id')} and {repair2.get('repair_id')} overlap on turns: {sorted(overlap)}")
+    for i, j, shared in overlapping_pairs([repair_turns(repair) for repair in repairs]):
+        issues.append(f"Repair {repairs[i].get('repair_id')} and {repairs[j].get('repair_id')} overlap on turns: {sorted(shared)}")
     
     return issues
 
 
-def validate_dialogue_file(dialogue_file: Path) -> Dict[str, Any]:
-    """Validate a single dialogue file and its repairs."""
-    dialogue_name = dialogue_file.stem
-    
+@rule("repairs", scope="repair")
+def repair_structure_rule(record: DialogueRecord, position: int, repair: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return repair_structure_findings(repair, position, record.dialogue_id)
+
+
+@rule("repairs", scope="repair")
+def repair_turns_rule(record: DialogueRecord, position: int, repair: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return repair_turn_findings(repair, record.data, record.index)
+
+
+@rule("repairs")
+def repair_overlap_rule(record: DialogueRecord) -> List[Dict[str, Any]]:
+    return [finding("warning", issue, "overlap") for issue in check_repair_overlap(record.repairs)]
+
+
+@rule("repairs")
+def repair_id_sequence_rule(record: DialogueRecord) -> List[Dict[str, Any]]:
+    expected_ids = list(range(1, len(record.repairs) + 1))
+    actual_ids = [r.get('repair_id') for r in record.repairs]
+    if actual_ids != expected_ids:
+        return [finding("warning", f"Repair IDs not sequential: {actual_ids} (expected {expected_ids})",
+                        "repair_id_sequence", {"actual": actual_ids})]
+    return []
+
+
+@rule("repairs")
+def repair_order_rule(record: DialogueRecord) -> List[Dict[str, Any]]:
+    first_turns = [min(r.get('turn_indices', []), default=0) for r in record.repairs]
+    if first_turns != sorted(first_turns):
+        return [finding("warning", "Repairs not sorted by first turn index", "repair_order")]
+    return []
+
+
+def file_result(record: DialogueRecord) -> Dict[str, Any]:
+    """Per-dialogue result of the "repairs" report for a loaded record."""
     result = {
-        'dialogue_file': dialogue_name,
+        'dialogue_file': record.name,
         'dialogue_exists': True,
         'repair_file_exists': False,
         'has_repairs': False,
         'repair_count': 0,
         'issues': [],
         'warnings': [],
-        'repairs_valid': True
+        'repairs_valid': True,
+        'repair_file': _relative_path(record.repair_file) if record.repair_file else None,
+        'findings': []
     }
     
     try:
-        dialogue_data = load_dialogue(dialogue_file)
-        dialogue_id = dialogue_data.get('dialogue_id', dialogue_name)
-        turns = dialogue_data.get('turns', [])
-        
-        # Find repair file
-        repair_file = find_repair_file(dialogue_file)
+        record.require()
         
-        if not repair_file:
-            result['issues'].append(f"No repair file found for {dialogue_name}")
+        if not record.repair_file:
+            result['issues'].append(f"No repair file found for {record.name}")
             result['repairs_valid'] = False
             return result
         
         result['repair_file_exists'] = True
-        repairs = load_repairs(repair_file)
+        repairs = record.repairs
         
         if not repairs:
             result['warnings'].append("Repair file exists but contains no repairs (empty array)")
@@ -185,34 +182,13 @@ def validate_dialogue_file(dialogue_file: Path) -> Dict[str, Any]:
         result['has_repairs'] = True
         result['repair_count'] = len(repairs)
         
-        # Validate each repair
-        repair_issues = []
-        for idx, repair in enumerate(repairs, 1):
-            # Structure validation
-            struct_issues = validate_repair_structure(repair, idx, dialogue_id)
-            repair_issues.extend([f"Repair {idx}: {issue}" for issue in struct_issues])
-            
-            # Dialogue validation
-            dialogue_issues = validate_repair_against_dialogue(repair, dialogue_data)
-            repair_issues.extend([f"Repair {idx}: {issue}" for issue in dialogue_issues])
-        
+        findings = run_rules("repairs", record)
+        result['findings'] = findings
+        repair_issues = [f"Repair {f['repair']}: {f['message']}"
+                         for f in findings if f['severity'] == "error" and 'repair' in f]
         result['issues'].extend(repair_issues)
-        
-        # Check for overlapping repairs
-        overlap_issues = check_repair_overlap(repairs)
-        if overlap_issues:
-            result['warnings'].extend(overlap_issues)
-        
-        # Check repair ID sequence
-        expected_ids = list(range(1, len(repairs) + 1))
-        actual_ids = [r.get('repair_id') for r in repairs]
-        if actual_ids != expected_ids:
-            result['warnings'].append(f"Repair IDs not sequential: {actual_ids} (expected {expected_ids})")
-        
-        # Check if repairs are sorted by appearance
-        first_turns = [min(r.get('turn_indices', []), default=0) for r in repairs]
-        if first_turns != sorted(first_turns):
-            result['warnings'].append("Repairs not sorted by first turn index")
+        result['issues'].extend(f['message'] for f in findings if f['severity'] == "error" and 'repair' not in f)
+        result['warnings'].extend(f['message'] for f in findings if f['severity'] == "warning")
         
         if repair_issues:
             result['repairs_valid'] = False
@@ -224,24 +200,50 @@ def validate_dialogue_file(dialogue_file: Path) -> Dict[str, Any]:
     return result
 
 
-def validate_all() -> Dict[str, Any]:
-    """Validate all dialogue files and their repairs."""
+def validate_dialogue_file(dialogue_file: Path, repairs_dir: Path = REPAIRS_DIR) -> Dict[str, Any]:
+    """Validate a single dialogue file and its repairs."""
+    return file_result(load_record(dialogue_file, repairs_dir))
+
+
+def validate_all(processed_dir: Path = PROCESSED_DIR, repairs_dir: Path = REPAIRS_DIR) -> Dict[str, Any]:
+    """
+    Validate all dialogue files and their repairs.
+    
+    Args:
+        processed_dir: Directory with processed dialogue JSON files
+        repairs_dir: Directory with one subdirectory per repair batch;
+            VALIDATION_REPORT.json is written here
+    
+    Returns:
+        The saved report (summary, files with issues, files with warnings)
+    """
+    run = run_validation(processed_dir, repairs_dir, ["repairs"], verbose=False)
+    return write_report(run['results']['repairs'], run['total_dialogues'], processed_dir, repairs_dir)
+
+
+def write_report(results: List[Dict[str, Any]], total_dialogues: int,
+                 processed_dir: Path = PROCESSED_DIR, repairs_dir: Path = REPAIRS_DIR) -> Dict[str, Any]:
+    """
+    Summarise per-dialogue results, print them and save VALIDATION_REPORT.json.
+    
+    Args:
+        results: Per-dialogue results from file_result
+        total_dialogues: Number of dialogue files validated
+        processed_dir: Directory with processed dialogue JSON files
+        repairs_dir: Directory where VALIDATION_REPORT.json is written
+    
+    Returns:
+        The saved report
+    """
     print("=" * 80)
     print("COMPREHENSIVE VALIDATION OF REPAIR DETECTION RESULTS")
     print("=" * 80)
     print()
-    
-    # Get all dialogue files
-    new_files = sorted(PROCESSED_DIR.glob('S*_W*_T*.json'))
-    legacy_files = sorted(PROCESSED_DIR.glob('W*_T*.json'))
-    all_dialogue_files = sorted(set(new_files) | set(legacy_files))
-    
-    print(f"Found {len(all_dialogue_files)} dialogue files to validate")
+    print(f"Found {total_dialogues} dialogue files to validate")
     print()
     
-    results = []
     summary = {
-        'total_dialogues': len(all_dialogue_files),
+        'total_dialogues': total_dialogues,
         'with_repair_files': 0,
         'with_repairs': 0,
         'without_repairs': 0,
@@ -255,14 +257,7 @@ def validate_all() -> Dict[str, Any]:
         'warnings': defaultdict(int)
     }
     
-    # Validate each file
-    for i, dialogue_file in enumerate(all_dialogue_files, 1):
-        if i % 50 == 0:
-            print(f"Validating... {i}/{len(all_dialogue_files)}")
-        
-        result = validate_dialogue_file(dialogue_file)
-        results.append(result)
-        
+    for result in results:
         # Update summary
         if result['repair_file_exists']:
             summary['with_repair_files'] += 1
@@ -342,22 +337,25 @@ def validate_all() -> Dict[str, Any]:
             {
                 'dialogue': r['dialogue_file'],
                 'issues': r['issues'],
-                'warnings': r['warnings']
+                'warnings': r['warnings'],
+                'repair_file': r.get('repair_file'),
+                'findings': r.get('findings', [])
             }
             for r in files_with_issues
         ],
         'files_with_warnings': [
             {
                 'dialogue': r['dialogue_file'],
-                'warnings': r['warnings']
+                'warnings': r['warnings'],
+                'repair_file': r.get('repair_file'),
+                'findings': r.get('findings', [])
             }
             for r in files_with_warnings if not r['issues']
         ]
     }
     
-    output_file = REPAIRS_DIR / 'VALIDATION_REPORT.json'
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(report, f, indent=2, ensure_ascii=False)
+    output_file = repairs_dir / 'VALIDATION_REPORT.json'
+    write_json(output_file, report)
     
     print(f"\n✅ Detailed validation report saved to: {output_file}")
     print("=" * 80)
@@ -365,6 +363,23 @@ def validate_all() -> Dict[str, Any]:
     return report
 
 
+def _relative_path(path: Path) -> str:
+    try:
+        return path.resolve().relative_to(PROJECT_ROOT).as_posix()
+    except ValueError:
+        return str(path)
+
+
+def main():
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Validate repair annotations against their dialogues")
+    parser.add_argument("--processed-dir", default=str(PROCESSED_DIR), help="Processed dialogue JSON directory")
+    parser.add_argument("--repairs-dir", default=str(REPAIRS_DIR), help="Directory of repair batches")
+    args = parser.parse_args()
+    validate_all(Path(args.processed_dir), Path(args.repairs_dir))
+
+
 if __name__ == "__main__":
-    validate_all()
+    main()
 
@@ -0,0 +1,363 @@
+"""
+Single-pass, rule-based validation of the processed corpus and its repairs.
+
+Each check registers as a rule for one report:
+
+- ``preprocessing``: dialogue structure and metadata (data/validation_report.json),
+- ``repairs``: repair structure against the dialogue (VALIDATION_REPORT.json),
+- ``cross``: repair content against the dialogue (CROSS_VALIDATION_REPORT.json).
+
+The corpus is read once: every dialogue file is loaded and indexed
+(dense per-turn-number text/speaker arrays, max turn) a single time, repair files
+are located with one scan of the batch directories, and all rules of all
+requested reports run over that shared record. The report modules only turn
+the findings into their existing per-file results and summaries. Checks that
+work better over the whole corpus (the preprocessing report's cross-reference
+with source documents, grouped by document) run after the pass in the report
+module's ``finish_results``.
+
+    python scripts/validation_engine.py                    # all three reports, one scan
+    python scripts/validation_engine.py --reports repairs cross
+"""
+import json
+import re
+import sys
+from dataclasses import dataclass
+from importlib import import_module
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+REPAIRS_DIR = PROJECT_ROOT / "data" / "repairs"
+EXTRACTED_TEXT_DIR = PROJECT_ROOT / "data" / "extracted_text"
+
+# Report name -> module that registers its rules and builds its per-file results
+REPORT_MODULES = {
+    "preprocessing": "validate_preprocessing",
+    "repairs": "validate_repair_results",
+    "cross": "cross_validate_repairs",
+}
+
+
+@dataclass
+class Rule:
+    name: str
+    report: str
+    scope: str  # "dialogue": check(record); "repair": check(record, position, repair)
+    check: Callable[..., List[Dict[str, Any]]]
+
+
+RULES: Dict[str, List[Rule]] = {report: [] for report in REPORT_MODULES}
+
+
+def rule(report: str, scope: str = "dialogue"):
+    """
+    Register a check for a report; rules run in registration order.
+
+    Re-registering a name replaces the rule in place, so a report module run as
+    a script (and imported again by the engine) does not register twice.
+    """
+    def register(check):
+        rules = RULES[report]
+        new_rule = Rule(check.__name__, report, scope, check)
+        for i, existing in enumerate(rules):
+            if existing.name == new_rule.name:
+                rules[i] = new_rule
+                break
+        else:
+            rules.append(new_rule)
+        return check
+    return register
+
+
+def finding(severity: str, message: str, category: str = "general",
+            details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """A rule result: severity is "error" or "warning"."""
+    return {"severity": severity, "category": category, "message": message, "details": details or {}}
+
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+# Turn numbers above this multiple of the turn count are looked up in a dict
+# instead of growing the dense arrays (guards against a stray huge turn number)
+DENSE_TURN_FACTOR = 4
+
+
+class DialogueIndex:
+    """
+    Turn lookups for one dialogue, built once and shared by every rule.
+
+    Text, speaker and presence are dense arrays indexed by turn number, so
+    checking a repair's turn indices costs O(1) per index instead of a scan
+    of the turn list. Token sets (lowercase words) are computed on first use.
+    When a turn number appears twice, the first turn wins, as in a linear scan.
+    """
+
+    def __init__(self, turns: List[Dict[str, Any]]):
+        self.turns = turns
+        self.speakers = [turn.get('speaker') for turn in turns]
+        numbers = [turn.get('turn', 0) for turn in turns]
+        self.max_turn = max([n for n in numbers if isinstance(n, (int, float))], default=0)
+
+        size = int(min(self.max_turn, DENSE_TURN_FACTOR * len(turns) + 1)) + 1 if self.max_turn > 0 else 1
+        self.present = [False] * size
+        self.text: List[Any] = [""] * size
+        self.speaker: List[Any] = [None] * size
+        self._tokens: List[Optional[Set[str]]] = [None] * size
+        self._overflow: Dict[Any, Dict[str, Any]] = {}
+        for number, turn in zip(numbers, turns):
+            if isinstance(number, int) and 0 <= number < size:
+                if not self.present[number]:
+                    self.present[number] = True
+                    self.text[number] = turn.get('text', '')
+                    self.speaker[number] = turn.get('speaker')
+            else:
+                try:
+                    self._overflow.setdefault(number, turn)
+                except TypeError:  # unhashable turn number
+                    pass
+
+    @classmethod
+    def from_dialogue(cls, dialogue_data: Dict[str, Any]) -> "DialogueIndex":
+        return cls(dialogue_data.get('turns', []))
+
+    def _slot(self, turn_num: Any) -> int:
+        """Dense-array slot of a turn number, -1 if it is in the overflow dict or absent."""
+        if isinstance(turn_num, int) and 0 <= turn_num < len(self.present) and self.present[turn_num]:
+            return turn_num
+        return -1
+
+    def has_turn(self, turn_num: Any) -> bool:
+        if self._slot(turn_num) >= 0:
+            return True
+        try:
+            return turn_num in self._overflow
+        except TypeError:
+            return False
+
+    def turn_text(self, turn_num: Any) -> str:
+        """Text of a turn ("" if the dialogue has no such turn)."""
+        slot = self._slot(turn_num)
+        if slot >= 0:
+            return self.text[slot]
+        return self._overflow_turn(turn_num).get('text', '')
+
+    def turn_speaker(self, turn_num: Any) -> Optional[str]:
+        slot = self._slot(turn_num)
+        if slot >= 0:
+            return self.speaker[slot]
+        return self._overflow_turn(turn_num).get('speaker')
+
+    def turn_tokens(self, turn_num: Any) -> Set[str]:
+        """Lowercase word set of a turn, cached per turn."""
+        slot = self._slot(turn_num)
+        if slot < 0:
+            return set(WORD_PATTERN.findall((self._overflow_turn(turn_num).get('text') or '').lower()))
+        tokens = self._tokens[slot]
+        if tokens is None:
+            tokens = self._tokens[slot] = set(WORD_PATTERN.findall((self.text[slot] or '').lower()))
+        return tokens
+
+    def _overflow_turn(self, turn_num: Any) -> Dict[str, Any]:
+        try:
+            return self._overflow.get(turn_num, {})
+        except TypeError:
+            return {}
+
+
+class DialogueRecord:
+    """A dialogue file, its parsed JSON, turn index and repairs, each loaded once."""
+
+    def __init__(self, path: Path, repair_file: Optional[Path] = None):
+        self.path = path
+        self.name = path.stem
+        self.repair_file = repair_file
+        self.data: Optional[Dict[str, Any]] = None
+        self.error: Optional[Exception] = None
+        self.index = DialogueIndex([])
+        self._repairs: Optional[List[Any]] = None
+        self._source_text: Optional[str] = None
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                self.data = json.load(f)
+            self.index = DialogueIndex.from_dialogue(self.data)
+        except Exception as e:
+            self.error = e
+
+    def require(self) -> Dict[str, Any]:
+        """The dialogue JSON; re-raises the load error for report-specific handling."""
+        if self.error is not None:
+            raise self.error
+        return self.data
+
+    @property
+    def dialogue_id(self) -> str:
+        return (self.data or {}).get('dialogue_id', self.name)
+
+    @property
+    def repairs(self) -> List[Any]:
+        if self._repairs is None:
+            self._repairs = []
+            if self.repair_file is not None:
+                try:
+                    with open(self.repair_file, 'r', encoding='utf-8-sig') as f:
+                        repairs = json.load(f)
+                    self._repairs = repairs if isinstance(repairs, list) else []
+                except Exception as e:
+                    print(f"Error loading {self.repair_file}: {e}")
+        return self._repairs
+
+    @property
+    def source_text(self) -> str:
+        """Extracted text of the dialogue's week (data/extracted_text/S{id}_W{week}.txt)."""
+        if self._source_text is None:
+            self._source_text = ""
+            parts = self.name.split('_')
+            if len(parts) >= 2:
+                extracted_file = EXTRACTED_TEXT_DIR / f"{parts[0]}_{parts[1]}.txt"
+                if extracted_file.exists():
+                    self._source_text = extracted_file.read_text(encoding='utf-8')
+        return self._source_text
+
+
+def discover_dialogues(processed_dir: Path) -> List[Path]:
+    """Processed dialogue files, new (S*_W*_T*) and legacy (W*_T*) naming."""
+    return sorted(set(processed_dir.glob('S*_W*_T*.json')) | set(processed_dir.glob('W*_T*.json')))
+
+
+def index_repair_files(repairs_dir: Path, batches: Optional[List[str]] = None) -> Dict[str, Path]:
+    """Map dialogue name -> repair file, scanning each batch directory once (first batch wins)."""
+    repair_files: Dict[str, Path] = {}
+    if not repairs_dir.exists():
+        return repair_files
+    for batch_dir in repairs_dir.iterdir():
+        if batch_dir.is_dir() and (not batches or batch_dir.name in batches):
+            for repair_file in batch_dir.glob('*_repairs.json'):
+                repair_files.setdefault(repair_file.name[:-len('_repairs.json')], repair_file)
+    return repair_files
+
+
+def find_repair_file(dialogue_file: Path, repairs_dir: Path = REPAIRS_DIR) -> Optional[Path]:
+    """Find the repair file for one dialogue (first batch directory that has it)."""
+    if not repairs_dir.exists():
+        return None
+    for batch_dir in repairs_dir.iterdir():
+        if batch_dir.is_dir():
+            repair_file = batch_dir / f"{dialogue_file.stem}_repairs.json"
+            if repair_file.exists():
+                return repair_file
+    return None
+
+
+def load_record(dialogue_file: Path, repairs_dir: Path = REPAIRS_DIR) -> DialogueRecord:
+    """Load one dialogue for validation outside a corpus pass."""
+    return DialogueRecord(dialogue_file, find_repair_file(dialogue_file, repairs_dir))
+
+
+def report_module(report: str):
+    """Import a report module; importing it registers its rules."""
+    return import_module(REPORT_MODULES[report])
+
+
+def run_rules(report: str, record: DialogueRecord) -> List[Dict[str, Any]]:
+    """
+    Run a report's rules over one record.
+
+    Repair-scoped rules run for each repair in file order, then dialogue-scoped
+    rules. Each finding is tagged with its rule and, for repair rules, the
+    repair's 1-based position and repair_id.
+    """
+    findings = []
+    rules = RULES[report]
+    repair_rules = [r for r in rules if r.scope == "repair"]
+    if repair_rules:
+        for position, repair in enumerate(record.repairs, 1):
+            for r in repair_rules:
+                for item in r.check(record, position, repair):
+                    item.update(rule=r.name, repair=position,
+                                repair_id=repair.get('repair_id') if isinstance(repair, dict) else None)
+                    findings.append(item)
+    for r in rules:
+        if r.scope == "dialogue":
+            for item in r.check(record):
+                item["rule"] = r.name
+                findings.append(item)
+    return findings
+
+
+def run_validation(processed_dir: Path = PROCESSED_DIR, repairs_dir: Path = REPAIRS_DIR,
+                   reports: Optional[List[str]] = None, verbose: bool = True,
+                   workers: Optional[int] = None, batches: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Validate the corpus in one pass.
+
+    Args:
+        processed_dir: Directory with processed dialogue JSON files
+        repairs_dir: Directory with one subdirectory per repair batch
+        reports: Report names to build (default: all)
+        verbose: Print progress every 50 dialogues
+        workers: Worker processes for post-pass stages (default: CPU count)
+        batches: Repair batch directories to read (default: all; first batch wins)
+
+    Returns:
+        Dictionary with total_dialogues and, per report, the list of per-file
+        results built by the report module (dialogues a report skips are omitted)
+    """
+    reports = list(reports or REPORT_MODULES)
+    modules = {report: report_module(report) for report in reports}
+    dialogue_files = discover_dialogues(processed_dir)
+    repair_files = index_repair_files(repairs_dir, batches)
+
+    results: Dict[str, List[Any]] = {report: [] for report in reports}
+    for i, dialogue_file in enumerate(dialogue_files, 1):
+        if verbose and i % 50 == 0:
+            print(f"Validating... {i}/{len(dialogue_files)}")
+        record = DialogueRecord(dialogue_file, repair_files.get(dialogue_file.stem))
+        for report, module in modules.items():
+            result = module.file_result(record)
+            if result is not None:
+                results[report].append(result)
+
+    for report, module in modules.items():
+        finish = getattr(module, "finish_results", None)
+        if finish is not None:
+            finish(results[report], workers=workers)
+
+    return {"total_dialogues": len(dialogue_files), "results": results}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run all validation reports in one pass over the corpus")
+    parser.add_argument("--processed-dir", default=str(PROCESSED_DIR), help="Processed dialogue JSON directory")
+    parser.add_argument("--repairs-dir", default=str(REPAIRS_DIR), help="Directory of repair batches")
+    parser.add_argument("--reports", nargs="+", choices=list(REPORT_MODULES), default=list(REPORT_MODULES),
+                        help="Reports to build (default: all)")
+    parser.add_argument("--batches", nargs="+", help="Repair batches to validate (default: all; first batch wins)")
+    parser.add_argument("--workers", type=int, help="Worker processes for source cross-referencing (default: CPU count)")
+    args = parser.parse_args()
+    processed_dir, repairs_dir = Path(args.processed_dir), Path(args.repairs_dir)
+
+    if not processed_dir.exists():
+        print(f"[ERROR] Processed directory not found: {processed_dir}")
+        sys.exit(1)
+
+    run = run_validation(processed_dir, repairs_dir, args.reports, workers=args.workers, batches=args.batches)
+    print(f"[OK] Validated {run['total_dialogues']} dialogues in one pass ({', '.join(args.reports)})")
+    print()
+
+    saved = {}
+    for report in args.reports:
+        saved[report] = report_module(report).write_report(run["results"][report], run["total_dialogues"],
+                                                           processed_dir, repairs_dir)
+        print()
+
+    # Same exit status as validate_preprocessing.py: 1 if any dialogue file is invalid
+    if "preprocessing" in saved and saved["preprocessing"]["summary"]["invalid_files"] > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Incremental statistics (--add) must always equal a full aggregation, whatever
+mix of cached and uncached runs came before.
+"""
+import json
+
+from generate_final_statistics import aggregate_statistics, update_statistics
+from artifact_writer import write_json
+
+
+def repair(initiation, resolution, trigger="lexical – unknown word"):
+    return {"turn_indices": [1, 2], "initiation": initiation, "resolution": resolution, "trigger": trigger}
+
+
+def write_repairs(path, repairs):
+    path.write_text(json.dumps(repairs), encoding="utf-8")
+
+
+def test_add_after_no_cache_run_matches_full_aggregation(tmp_path):
+    batch = tmp_path / "production"
+    batch.mkdir()
+    edited = batch / "S1_W1_T1_repairs.json"
+    write_repairs(edited, [repair("LI", "R"), repair("BI", "U-P")])
+    write_repairs(batch / "S2_W1_T1_repairs.json", [repair("LI", "U-A")])
+    write_json(tmp_path / "FINAL_STATISTICS.json", aggregate_statistics(tmp_path)[0])
+
+    # Edited, then counted by a full rebuild that ignores the caches
+    write_repairs(edited, [repair("LI", "R")])
+    write_json(tmp_path / "FINAL_STATISTICS.json", aggregate_statistics(tmp_path, use_cache=False)[0])
+
+    # Edited again and applied as a delta
+    write_repairs(edited, [])
+    incremental, files_read = update_statistics([edited], tmp_path)
+
+    assert files_read == 1
+    assert incremental == aggregate_statistics(tmp_path, use_cache=False, save_cache=False)[0]
+    assert incremental["total_repairs"] == 1
+
+
+def test_saved_statistics_do_not_depend_on_cache_state(tmp_path):
+    batch = tmp_path / "pilot"
+    batch.mkdir()
+    write_repairs(batch / "S1_W1_T1_repairs.json", [repair("LI", "R")])
+
+    cold, cold_reads = aggregate_statistics(tmp_path)
+    warm, warm_reads = aggregate_statistics(tmp_path)
+
+    assert (cold_reads, warm_reads) == (1, 0)
+    assert cold == warm
+    assert "files_read" not in cold
@@ -0,0 +1,22 @@
+"""
+Import-time budget of the entry points (see benchmark_pipeline).
+
+Each entry point is imported in a fresh interpreter: it must import cleanly,
+load none of the heavy ``DEFERRED_MODULES`` and stay within its budget.
+"""
+import pytest
+
+from benchmark_pipeline import DEFERRED_MODULES, IMPORT_BUDGET_SECONDS, measure_import_times
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGET_SECONDS))
+def test_entry_point_import_budget(module):
+    budget = IMPORT_BUDGET_SECONDS[module]
+    result = measure_import_times({module: budget})[module]
+
+    assert result["seconds"] is not None, f"importing {module} failed"
+    assert result["deferred_modules_loaded"] == [], (
+        f"importing {module} loads {', '.join(result['deferred_modules_loaded'])}; "
+        f"defer them to the stage that needs them (DEFERRED_MODULES: {', '.join(DEFERRED_MODULES)})"
+    )
+    assert result["seconds"] <= budget, f"{module} imports in {result['seconds']:.3f}s (budget {budget}s)"
@@ -0,0 +1,171 @@
+"""
+Tests for the incremental JSON-array parser used on streamed LLM responses.
+
+Every response is also fed in many chunkings (single characters, fixed sizes,
+each two-way split and random sizes): the parser keeps state across chunks, so
+a split inside a string, an escape or a \\uXXXX sequence must not change the
+result.
+"""
+import json
+import random
+from pathlib import Path
+
+import pytest
+
+from json_array_stream import JsonArrayStreamParser, iter_repair_objects, parse_repair_array
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+REPAIR_FILES = sorted((PROJECT_ROOT / "data" / "repairs").rglob("*_repairs.json"))
+
+TRICKY_ARRAY = (
+    '[{"trigger": "quote \\" and bracket ] and brace } inside", "turn_indices": [1, 2]},'
+    ' {"evidence_summary": "backslash \\\\ then quote \\"[{\\"", "nested": {"a": [1, {"b": 2}]}},'
+    ' {"text": "escaped close \\u005d\\u007d and emoji \\ud83d\\ude00", "raw": "“Sim” 안녕 😀"}]'
+)
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def random_chunks(text, seed, max_size=12):
+    rng = random.Random(seed)
+    chunks, pos = [], 0
+    while pos < len(text):
+        size = rng.randint(1, max_size)
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def feed_all(chunks):
+    parser = JsonArrayStreamParser()
+    objects = []
+    for chunk in chunks:
+        objects.extend(parser.feed(chunk))
+    objects.extend(parser.close())
+    return objects, parser
+
+
+def chunkings(text):
+    """Single characters, a few fixed sizes and a few random splittings."""
+    yield [text]
+    for size in (1, 2, 3, 5, 7, 64):
+        yield chunked(text, size)
+    for seed in range(5):
+        yield random_chunks(text, seed)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_fixed_chunk_sizes_match_json_loads(size):
+    objects, parser = feed_all(chunked(TRICKY_ARRAY, size))
+
+    assert objects == json.loads(TRICKY_ARRAY)
+    assert parser.complete and not parser.truncated
+    assert parser.skipped_elements == 0
+
+
+def test_every_two_way_split_matches_json_loads():
+    expected = json.loads(TRICKY_ARRAY)
+    for split in range(len(TRICKY_ARRAY) + 1):
+        objects, _ = feed_all([TRICKY_ARRAY[:split], TRICKY_ARRAY[split:]])
+        assert objects == expected, f"split at {split}: {TRICKY_ARRAY[split - 5:split]!r}|{TRICKY_ARRAY[split:split + 5]!r}"
+
+
+def test_split_after_backslash_keeps_escaped_quote_inside_string():
+    text = '[{"trigger": "say \\"again\\"", "turn_indices": [3]}]'
+    split = text.index('\\') + 1  # chunk ends with the backslash
+
+    objects, _ = feed_all([text[:split], text[split:]])
+
+    assert objects == [{"trigger": 'say "again"', "turn_indices": [3]}]
+
+
+def test_unicode_escapes_and_surrogate_pairs():
+    text = '[{"a": "\\u00e9\\u4e2d", "b": "\\ud83d\\ude00", "c": "\\u005b\\u005d"}]'
+    for chunks in chunkings(text):
+        objects, _ = feed_all(chunks)
+        assert objects == [{"a": "é中", "b": "😀", "c": "[]"}]
+
+
+def test_truncated_stream_keeps_completed_elements():
+    text = '[{"repair_id": 1, "turn_indices": [1, 2]}, {"repair_id": 2, "trigger": "cut off mid-str'
+    for chunks in chunkings(text):
+        objects, parser = feed_all(chunks)
+        assert objects == [{"repair_id": 1, "turn_indices": [1, 2]}]
+        assert parser.started and parser.truncated and not parser.complete
+        assert parser.skipped_elements == 1
+
+
+def test_truncated_before_array_starts():
+    objects, parser = feed_all(["Here are the repairs:\n```json\n["])
+
+    assert objects == []
+    assert not parser.started and not parser.truncated
+
+
+def test_wrapping_object_is_ignored():
+    text = '{"repairs": [{"repair_id": 1}, {"repair_id": 2}], "notes": [{"ignored": true}]}'
+    for chunks in chunkings(text):
+        objects, parser = feed_all(chunks)
+        assert objects == [{"repair_id": 1}, {"repair_id": 2}]
+        assert parser.complete
+
+
+def test_markdown_fence_and_prose_are_ignored():
+    text = (
+        "Sure! I found these repairs [see below]:\n\n```json\n"
+        '[\n  {"repair_id": 1, "initiation": "LI"}\n]\n```\n'
+        'Let me know if you need [{"more": "detail"}].'
+    )
+    for chunks in chunkings(text):
+        objects, parser = feed_all(chunks)
+        assert objects == [{"repair_id": 1, "initiation": "LI"}]
+        assert parser.complete
+
+
+def test_empty_array_and_empty_response():
+    assert parse_repair_array("```json\n[ ]\n```") == []
+    assert parse_repair_array("") == []
+    assert parse_repair_array(None) == []
+
+
+def test_invalid_and_non_object_elements_are_skipped():
+    parser = JsonArrayStreamParser()
+    objects = parser.feed('[{"ok": 1}, {"bad": tru}, {"ok": 2}]')
+
+    assert objects == [{"ok": 1}, {"ok": 2}]
+    assert parser.skipped_elements == 1
+    assert parser.emitted == 2
+
+
+def test_elements_are_emitted_as_soon_as_they_close():
+    parser = JsonArrayStreamParser()
+
+    assert parser.feed('[{"repair_id": 1}') == [{"repair_id": 1}]
+    assert parser.feed(', {"repair_id": 2') == []
+    assert parser.feed('}]') == [{"repair_id": 2}]
+    assert parser.feed('[{"after": "close"}]') == []
+
+
+def test_iter_repair_objects_stops_at_array_end():
+    chunks = iter(['[{"a": 1}', ']', '[{"b": 2}]'])
+
+    assert list(iter_repair_objects(chunks)) == [{"a": 1}]
+    assert next(chunks) == '[{"b": 2}]'
+
+
+@pytest.mark.parametrize("path", REPAIR_FILES, ids=lambda p: f"{p.parent.name}/{p.name}")
+def test_bundled_repair_files_match_json_loads(path):
+    text = path.read_text(encoding="utf-8-sig")
+    expected = [item for item in json.loads(text) if isinstance(item, dict)]
+
+    assert parse_repair_array(text) == expected
+    for seed in range(3):
+        objects, parser = feed_all(random_chunks(text, seed, max_size=40))
+        assert objects == expected
+        assert parser.skipped_elements == 0
+
+
+def test_bundled_repair_files_exist():
+    assert REPAIR_FILES, "expected repair files under data/repairs"
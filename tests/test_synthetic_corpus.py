@@ -0,0 +1,25 @@
+"""
+Round trip of the synthetic corpus: the preprocessing pipeline must parse the
+generated documents back into exactly the ground-truth turns.
+"""
+import json
+
+from generate_synthetic_corpus import generate_corpus, verify_round_trip
+
+
+def test_documents_parse_back_to_ground_truth(tmp_path):
+    manifest = generate_corpus(output_dir=tmp_path, students=6, verbose=False)
+    result = verify_round_trip(tmp_path)
+
+    assert result["dialogues"] == manifest["counts"]["dialogues"] == 72
+    assert result["mismatches"] == []
+
+
+def test_week_one_and_two_learner_turns_keep_quotes(tmp_path):
+    generate_corpus(output_dir=tmp_path, students=1, documents=False, verbose=False)
+    processed = tmp_path / "data" / "processed"
+
+    for week, quoted in ((1, True), (2, True), (3, False), (4, False)):
+        turns = json.loads((processed / f"S1_W{week}_T1.json").read_text(encoding="utf-8"))["turns"]
+        learner = [turn["text"] for turn in turns if turn["speaker"] == "learner"]
+        assert all(text.startswith("“") and text.endswith("”") for text in learner) == quoted